@@ -0,0 +1,121 @@
+"""
+Atomic file writes for generated outputs that other programs read while
+they are being regenerated (calendar feeds, static pages), and the
+manifest-tracked output directories they are exported into.
+
+An OutputDir keeps a manifest.json of the digest each file was last written
+from: a file whose digest is unchanged (and that still exists) is not
+rewritten, and files the previous export wrote but this one did not are
+removed.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+@contextlib.contextmanager
+def atomic_open(path, mode="w", encoding="utf-8", newline=None):
+    """
+    Opens a temporary file next to `path` for writing and renames it over
+    `path` when the block exits cleanly, so readers never see a partial
+    file. On error the temporary file is removed and `path` is untouched.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    binary = "b" in mode
+    f = open(tmp_path, mode, encoding=None if binary else encoding, newline=None if binary else newline)
+    try:
+        with f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def slug(value):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(value)).strip("_") or "unknown"
+
+
+def unique_slugs(values):
+    """
+    Filename slug per value. Values whose slugs collide (e.g. "B 1" and
+    "B/1") each get a short hash suffix, so no file overwrites another.
+    """
+    by_slug = defaultdict(list)
+    for value in values:
+        by_slug[slug(value)].append(value)
+    slugs = {}
+    for name, group in by_slug.items():
+        for value in group:
+            slugs[value] = name if len(group) == 1 else (
+                f"{name}_{hashlib.sha1(str(value).encode('utf-8')).hexdigest()[:8]}")
+    return slugs
+
+
+def digest(payload):
+    """
+    Stable SHA-256 of a JSON-serializable payload.
+    """
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class OutputDir:
+    """
+    One export into a manifest-tracked directory.
+
+    Args:
+        root (str): Output directory.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILENAME)
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.manifest = manifest if isinstance(manifest, dict) else {}
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.previous = self.manifest.get("files", {})
+        self.files = {}
+        self.result = {"written": [], "unchanged": [], "removed": []}
+
+    def write(self, filename, file_digest, render, newline=None):
+        """
+        Writes `filename` with render(f) unless the previous export wrote it
+        from the same digest and it still exists. Returns True if written.
+        """
+        self.files[filename] = file_digest
+        path = os.path.join(self.root, filename)
+        if self.previous.get(filename) == file_digest and os.path.exists(path):
+            self.result["unchanged"].append(filename)
+            return False
+        with atomic_open(path, "w", newline=newline) as f:
+            render(f)
+        self.result["written"].append(filename)
+        return True
+
+    def finish(self, **extra):
+        """
+        Removes files of the previous export that were not written this time
+        and saves the manifest (with any `extra` keys).
+
+        Returns:
+            dict: "written", "unchanged" and "removed" filename lists.
+        """
+        for filename in sorted(set(self.previous) - set(self.files)):
+            try:
+                os.remove(os.path.join(self.root, filename))
+                self.result["removed"].append(filename)
+            except FileNotFoundError:
+                pass
+        with atomic_open(self.manifest_path) as f:
+            json.dump(dict(extra, files=self.files), f, indent=4, ensure_ascii=False)
+        return self.result
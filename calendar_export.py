@@ -0,0 +1,272 @@
+"""
+iCalendar (.ics) export of the final routine, one file per section and one
+per teacher, for calendar subscriptions.
+
+Each routine entry becomes a weekly recurring event: its day and normalized
+time slot (see routine_index.parse_time_slot), the room as location and the
+teacher's contact details in the description. Events start on the first
+matching weekday on or after CALENDAR_START_DATE and repeat CALENDAR_WEEKS
+times (0 = no end). Without a CALENDAR_START_DATE each calendar starts on
+the current week; that anchor is kept while the calendar's own entries are
+unchanged and its weeks have not run out, and moves to the current week
+otherwise, so a subscription never ends up holding only past classes.
+Calendar files are streamed line by line into a temporary file and renamed
+into place, so a web server can serve CALENDAR_DIR while it is being
+regenerated.
+
+CALENDAR_DIR/manifest.json keeps a hash of each file's entries and settings;
+only files whose hash changed (or that went missing) are rewritten, and
+files for sections/teachers that disappeared are removed.
+
+Usage:
+    python calendar_export.py [ROUTINE_JSON]
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sys
+from collections import defaultdict
+
+from config import (
+    CALENDAR_DIR, CALENDAR_START_DATE, CALENDAR_WEEKS, CALENDAR_TIMEZONE, setup_logging,
+)
+from atomic_file import MANIFEST_FILENAME, OutputDir, digest, unique_slugs
+import routine_index
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SECTION_CALENDAR_TPL = "section_{name}.ics"
+TEACHER_CALENDAR_TPL = "teacher_{name}.ics"
+PRODID = "-//ucam-routine//calendar_export//EN"
+UID_DOMAIN = "ucam-routine"
+# Portal day label prefix -> (RRULE BYDAY, datetime.weekday()).
+WEEKDAYS = {
+    "SAT": ("SA", 5), "SUN": ("SU", 6), "MON": ("MO", 0), "TUE": ("TU", 1),
+    "WED": ("WE", 2), "THU": ("TH", 3), "FRI": ("FR", 4),
+}
+MAX_LINE_OCTETS = 75
+
+
+def calendar_dir():
+    return CALENDAR_DIR if os.path.isabs(CALENDAR_DIR) else os.path.join(BASE_DIR, CALENDAR_DIR)
+
+
+def escape_text(value):
+    """
+    Escapes a TEXT property value (RFC 5545 3.3.11).
+    """
+    return (str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold(line):
+    """
+    Folds a content line to 75-octet chunks joined by CRLF + space, never
+    splitting a UTF-8 character.
+    """
+    if len(line.encode("utf-8")) <= MAX_LINE_OCTETS:
+        return line + "\r\n"
+    chunks, current, size = [], [], 0
+    for char in line:
+        width = len(char.encode("utf-8"))
+        # Continuation lines spend one octet on the leading space.
+        limit = MAX_LINE_OCTETS if not chunks else MAX_LINE_OCTETS - 1
+        if size + width > limit:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(char)
+        size += width
+    chunks.append("".join(current))
+    return "\r\n ".join(chunks) + "\r\n"
+
+
+def calendar_groups(routine):
+    """
+    Groups routine entries into calendars.
+
+    Returns:
+        dict: filename -> (calendar title, kind, entries), kind being
+        "section" or "teacher".
+    """
+    sections, teachers = defaultdict(list), defaultdict(list)
+    for entry in routine:
+        if entry.get("Section"):
+            sections[entry["Section"]].append(entry)
+        teacher = (entry.get("Teacher") or "").strip()
+        if teacher and teacher.upper() not in routine_index.PLACEHOLDERS:
+            teachers[teacher].append(entry)
+    groups = {}
+    section_slugs, teacher_slugs = unique_slugs(sections), unique_slugs(teachers)
+    for section, entries in sections.items():
+        groups[SECTION_CALENDAR_TPL.format(name=section_slugs[section])] = (f"Section {section}", "section", entries)
+    for teacher, entries in teachers.items():
+        groups[TEACHER_CALENDAR_TPL.format(name=teacher_slugs[teacher])] = (teacher, "teacher", entries)
+    return groups
+
+
+def event_uid(entry):
+    """
+    Stable UID, so subscribed clients update events instead of duplicating them.
+    """
+    key = "|".join(str(entry.get(field) or "") for field in ("CourseCode", "Section", "Day", "TimeSlot"))
+    return f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]}@{UID_DOMAIN}"
+
+
+def first_occurrence(start_date, weekday):
+    return start_date + datetime.timedelta(days=(weekday - start_date.weekday()) % 7)
+
+
+def _timezone_offset(tzid, on_date):
+    """
+    UTC offset of `tzid` on `on_date` as "+HHMM", or None if the zone is unknown.
+    """
+    try:
+        from zoneinfo import ZoneInfo
+        offset = datetime.datetime.combine(on_date, datetime.time(12), ZoneInfo(tzid)).utcoffset()
+    except Exception as e:
+        logger.warning("Unknown calendar timezone %s (%s); writing floating local times.", tzid, e)
+        return None
+    minutes = int(offset.total_seconds() // 60)
+    sign = "+" if minutes >= 0 else "-"
+    return f"{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+
+
+def _event_sort_key(event):
+    _, (_, weekday), start, _ = event
+    # Week order as on the portal: Saturday first.
+    return ((weekday - 5) % 7, start)
+
+
+def iter_calendar_lines(title, kind, entries, start_date, weeks, tzid, dtstamp):
+    """
+    Yields the folded lines of one VCALENDAR, events in week order.
+    """
+    events = []
+    for entry in entries:
+        day = WEEKDAYS.get((entry.get("Day") or "").strip()[:3].upper())
+        interval = routine_index.parse_time_slot(entry.get("TimeSlot"))
+        if day is None or interval is None:
+            logger.debug("Calendar %s skips %s: no usable day/time slot.", title, entry.get("CourseCode"))
+            continue
+        events.append((entry, day, interval[0], interval[1]))
+    events.sort(key=_event_sort_key)
+
+    offset = _timezone_offset(tzid, start_date) if tzid else None
+    yield fold("BEGIN:VCALENDAR")
+    yield fold("VERSION:2.0")
+    yield fold(f"PRODID:{PRODID}")
+    yield fold("CALSCALE:GREGORIAN")
+    yield fold(f"X-WR-CALNAME:{escape_text(title)}")
+    if offset:
+        yield fold(f"X-WR-TIMEZONE:{tzid}")
+        for line in ("BEGIN:VTIMEZONE", f"TZID:{tzid}", "BEGIN:STANDARD", "DTSTART:19700101T000000",
+                     f"TZOFFSETFROM:{offset}", f"TZOFFSETTO:{offset}", "END:STANDARD", "END:VTIMEZONE"):
+            yield fold(line)
+
+    tz_param = f";TZID={tzid}" if offset else ""
+    for entry, (byday, weekday), start, end in events:
+        day = first_occurrence(start_date, weekday)
+        summary = f"{entry.get('CourseCode') or ''} {entry.get('CourseTitle') or ''}".strip()
+        if kind == "teacher" and entry.get("Section"):
+            summary += f" (Section {entry['Section']})"
+        contact = [f"Teacher: {entry.get('Teacher') or 'N/A'}"]
+        contact += [f"{label}: {entry[field]}" for label, field in (("Phone", "TeacherPhone"), ("Email", "TeacherEmail"))
+                    if entry.get(field)]
+        description = "\n".join(contact)
+        rrule = f"RRULE:FREQ=WEEKLY;BYDAY={byday}"
+        if weeks > 0:
+            rrule += f";COUNT={weeks}"
+
+        yield fold("BEGIN:VEVENT")
+        yield fold(f"UID:{event_uid(entry)}")
+        yield fold(f"DTSTAMP:{dtstamp}")
+        yield fold(f"DTSTART{tz_param}:{day:%Y%m%d}T{start // 60:02d}{start % 60:02d}00")
+        yield fold(f"DTEND{tz_param}:{day:%Y%m%d}T{end // 60:02d}{end % 60:02d}00")
+        yield fold(rrule)
+        yield fold(f"SUMMARY:{escape_text(summary)}")
+        if entry.get("Room"):
+            yield fold(f"LOCATION:{escape_text('Room ' + str(entry['Room']))}")
+        yield fold(f"DESCRIPTION:{escape_text(description)}")
+        yield fold("END:VEVENT")
+    yield fold("END:VCALENDAR")
+
+
+def week_start(day):
+    """
+    The Saturday starting `day`'s week, as on the portal.
+    """
+    return day - datetime.timedelta(days=(day.weekday() - 5) % 7)
+
+
+def _start_date(setting, anchor, content, weeks, today):
+    if setting:
+        return datetime.date.fromisoformat(setting)
+    # Without a configured term start, a calendar keeps its previous anchor
+    # while its own entries are unchanged and its occurrences still reach
+    # today, so unchanged calendars keep producing identical files;
+    # otherwise it restarts on the current week.
+    if anchor and anchor[0] == content:
+        start = datetime.date.fromisoformat(anchor[1])
+        if weeks <= 0 or today < start + datetime.timedelta(weeks=weeks):
+            return start
+    return week_start(today)
+
+
+def export_calendars(routine, out_dir=None, start_date=CALENDAR_START_DATE, weeks=CALENDAR_WEEKS,
+                     tzid=CALENDAR_TIMEZONE, today=None):
+    """
+    Writes one .ics per section and per teacher, skipping calendars whose
+    entries and settings are unchanged since the last export.
+
+    Args:
+        routine (list): Final routine entries.
+        out_dir (str): Output directory (default: CALENDAR_DIR).
+        start_date (str): Term start, YYYY-MM-DD ("" to anchor on the current week).
+        weeks (int): Occurrences per event (0 = repeat forever).
+        tzid (str): IANA timezone of the time slots.
+        today (datetime.date): Export date (default: today).
+
+    Returns:
+        dict: "written", "unchanged" and "removed" filename lists.
+    """
+    out_dir = out_dir or calendar_dir()
+    output = OutputDir(out_dir)
+    previous_anchors = output.manifest.get("anchors", {})
+    today = today or datetime.date.today()
+    dtstamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    anchors = {}
+    for filename, (title, kind, entries) in sorted(calendar_groups(routine).items()):
+        content = digest([title, kind, weeks, tzid, entries])
+        first_day = _start_date(start_date, previous_anchors.get(filename), content, weeks, today)
+        anchors[filename] = [content, first_day.isoformat()]
+        output.write(filename, digest([content, first_day.isoformat()]),
+                     lambda f: f.writelines(iter_calendar_lines(title, kind, entries, first_day, weeks, tzid,
+                                                                dtstamp)),
+                     newline="")
+
+    result = output.finish(anchors=anchors)
+    logger.info("Calendars in %s: %d written, %d unchanged, %d removed.", out_dir,
+                len(result["written"]), len(result["unchanged"]), len(result["removed"]))
+    return result
+
+
+def main(argv=None):
+    setup_logging()
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else routine_index.DEFAULT_ROUTINE_JSON
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            routine = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("Cannot read routine %s: %s", path, e)
+        return 1
+    export_calendars(routine)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,621 @@
+"""
+Chrome driven over the DevTools Protocol, without chromedriver.
+
+With DRIVER_BACKEND=cdp, create_driver() launches Chrome itself with
+--remote-debugging-port and talks to the page target over one websocket
+(websocket-client). There is no chromedriver process and no HTTP hop per
+command: each operation is one or two CDP messages.
+
+CDPDriver implements the part of the Selenium WebDriver/WebElement
+interface the scraper uses, so the scrape functions, WebDriverWait and the
+expected_conditions helpers work unchanged:
+
+    driver: get, title, current_url, page_source, find_element(s),
+            execute_script, implicitly_wait, get_cookies, add_cookie,
+            delete_all_cookies, get_screenshot_as_png, quit,
+            expect_response (CDP only: a response body from network events)
+    element: click, send_keys, clear, text, get_attribute, is_displayed,
+             is_enabled, find_element(s), parent
+
+Locators: By.ID, By.XPATH, By.CSS_SELECTOR, By.TAG_NAME, By.NAME. Errors are
+Selenium's exception types (NoSuchElementException,
+StaleElementReferenceException, TimeoutException, ...), so existing except
+clauses keep working. Every CDP command goes through CDPDriver.execute(),
+the hook driver_trace wraps. The browser pid is exposed as `browser_pid`
+for the resource monitor and the deadline watchdog.
+
+Chrome is started without --enable-automation, so navigator.webdriver stays
+false, and Runtime.enable is never sent.
+"""
+import base64
+import collections
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.request
+
+import websocket
+from selenium.common.exceptions import (
+    JavascriptException, NoSuchElementException, StaleElementReferenceException, TimeoutException,
+    WebDriverException,
+)
+from selenium.webdriver.common.by import By
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_TIMEOUT_S = 30
+COMMAND_TIMEOUT_S = 30
+PAGE_LOAD_TIMEOUT_S = 60
+# Unclaimed protocol events kept per connection.
+EVENT_BUFFER = 1000
+OBJECT_GROUP = "routine"
+DEVTOOLS_PORT_FILE = "DevToolsActivePort"
+# A request's final event: loadingFailed carries errorText.
+NETWORK_DONE_EVENTS = ("Network.loadingFinished", "Network.loadingFailed")
+# CDP error messages that mean the element's page or node is gone.
+STALE_MARKERS = ("Could not find object with given id", "Cannot find context with specified id",
+                 "stale element", "Node with given id does not belong to the document")
+
+# Finds one (all=false) or every (all=true) match under `root`.
+FIND_FUNCTION = """
+function(root, using, value, all) {
+    var doc = root.ownerDocument || root;
+    if (using === 'xpath') {
+        if (!all) {
+            return doc.evaluate(value, root, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        }
+        var snapshot = doc.evaluate(value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        var nodes = [];
+        for (var i = 0; i < snapshot.snapshotLength; i++) nodes.push(snapshot.snapshotItem(i));
+        return nodes;
+    }
+    var selector = value;
+    if (using === 'id') selector = '#' + CSS.escape(value);
+    else if (using === 'name') selector = '[name="' + CSS.escape(value) + '"]';
+    return all ? Array.prototype.slice.call(root.querySelectorAll(selector)) : root.querySelector(selector);
+}
+"""
+
+# Runs a Selenium-style script body and returns {value, nodes}, with DOM
+# nodes in the value replaced by {__node__: index into nodes}.
+SCRIPT_WRAPPER = """
+function() {
+    var result = (function() { %s }).apply(null, arguments);
+    var nodes = [];
+    function pack(value) {
+        if (value instanceof Node) { nodes.push(value); return {__node__: nodes.length - 1}; }
+        if (value instanceof NodeList || value instanceof HTMLCollection) value = Array.prototype.slice.call(value);
+        if (Array.isArray(value)) return value.map(pack);
+        if (value && typeof value === 'object') {
+            var packed = {};
+            Object.keys(value).forEach(function(key) { packed[key] = pack(value[key]); });
+            return packed;
+        }
+        return value === undefined ? null : value;
+    }
+    return {value: pack(result), nodes: nodes};
+}
+"""
+
+# Element operations, run with the element as `this`.
+ELEMENT_FUNCTIONS = {
+    "text": "function() { if (!this.isConnected) throw new Error('stale element'); "
+            "return (this.innerText || this.textContent || '').trim(); }",
+    "attribute": """function(name) {
+        if (!this.isConnected) throw new Error('stale element');
+        var value = this[name];
+        if (typeof value === 'boolean') return value ? 'true' : null;
+        if (value !== undefined && value !== null && typeof value !== 'object' && typeof value !== 'function') {
+            return String(value);
+        }
+        return this.getAttribute(name);
+    }""",
+    "displayed": """function() {
+        if (!this.isConnected) throw new Error('stale element');
+        var style = window.getComputedStyle(this);
+        return style.display !== 'none' && style.visibility !== 'hidden' && this.getClientRects().length > 0;
+    }""",
+    "enabled": "function() { if (!this.isConnected) throw new Error('stale element'); return !this.disabled; }",
+    "center": """function() {
+        if (!this.isConnected) throw new Error('stale element');
+        this.scrollIntoView({block: 'center', inline: 'center'});
+        var rect = this.getBoundingClientRect();
+        return {x: rect.left + rect.width / 2, y: rect.top + rect.height / 2,
+                width: rect.width, height: rect.height};
+    }""",
+    "focus": "function() { if (!this.isConnected) throw new Error('stale element'); this.focus(); return true; }",
+    "clear": """function() {
+        if (!this.isConnected) throw new Error('stale element');
+        this.value = '';
+        this.dispatchEvent(new Event('input', {bubbles: true}));
+        this.dispatchEvent(new Event('change', {bubbles: true}));
+        return true;
+    }""",
+}
+
+_BY_STRATEGIES = {By.ID: "id", By.XPATH: "xpath", By.CSS_SELECTOR: "css", By.TAG_NAME: "css", By.NAME: "name"}
+
+
+class CDPError(WebDriverException):
+    """
+    A CDP command returned an error.
+    """
+
+    def __init__(self, method, error):
+        self.method = method
+        self.code = error.get("code")
+        super().__init__(f"{method}: {error.get('message')} {error.get('data') or ''}".strip())
+
+
+def _is_stale(message):
+    return any(marker in (message or "") for marker in STALE_MARKERS)
+
+
+class Connection:
+    """
+    One websocket to a DevTools target. Commands are sent one at a time;
+    events that arrive meanwhile are buffered for wait_event().
+
+    Args:
+        url (str): Target's webSocketDebuggerUrl.
+    """
+
+    def __init__(self, url, timeout_s=COMMAND_TIMEOUT_S):
+        self._ws = websocket.create_connection(url, timeout=timeout_s, suppress_origin=True,
+                                               enable_multithread=True)
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self.events = collections.deque(maxlen=EVENT_BUFFER)
+
+    def _recv(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutException("DevTools did not answer in time")
+        self._ws.settimeout(remaining)
+        try:
+            raw = self._ws.recv()
+        except websocket.WebSocketTimeoutException:
+            raise TimeoutException("DevTools did not answer in time") from None
+        except (websocket.WebSocketException, OSError) as e:
+            raise WebDriverException(f"DevTools connection lost: {e}") from None
+        return json.loads(raw)
+
+    def send(self, method, params=None, timeout_s=COMMAND_TIMEOUT_S):
+        """
+        Sends a command and returns its result dict; raises CDPError.
+        """
+        with self._lock:
+            message_id = next(self._ids)
+            try:
+                self._ws.send(json.dumps({"id": message_id, "method": method, "params": params or {}}))
+            except (websocket.WebSocketException, OSError) as e:
+                raise WebDriverException(f"DevTools connection lost: {e}") from None
+            deadline = time.monotonic() + timeout_s
+            while True:
+                message = self._recv(deadline)
+                if message.get("id") == message_id:
+                    if "error" in message:
+                        raise CDPError(method, message["error"])
+                    return message.get("result", {})
+                if "method" in message:
+                    self.events.append((message["method"], message.get("params", {})))
+
+    def wait_event(self, method, timeout_s, predicate=None):
+        """
+        Returns the params of the first (buffered or new) `method` event
+        matching `predicate`; raises TimeoutException. `method` may be a
+        tuple of event names.
+        """
+        methods = (method,) if isinstance(method, str) else tuple(method)
+        with self._lock:
+            for event in list(self.events):
+                if event[0] in methods and (predicate is None or predicate(event[1])):
+                    self.events.remove(event)
+                    return event[1]
+            deadline = time.monotonic() + timeout_s
+            while True:
+                message = self._recv(deadline)
+                if "method" not in message:
+                    continue
+                if message["method"] in methods and (predicate is None or predicate(message.get("params", {}))):
+                    return message.get("params", {})
+                self.events.append((message["method"], message.get("params", {})))
+
+    def discard_events(self, method):
+        with self._lock:
+            for event in [event for event in self.events if event[0] == method]:
+                self.events.remove(event)
+
+    def close(self):
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+
+
+class ResponseWaiter:
+    """
+    Catches the next response whose request matches, from network events.
+    Created by CDPDriver.expect_response() before the request is triggered,
+    so no event is missed.
+
+    Args:
+        driver (CDPDriver): Driver with the Network domain enabled.
+        matches (callable): Takes a CDP Network.Request dict.
+    """
+
+    def __init__(self, driver, matches):
+        self.driver = driver
+        self.matches = matches
+
+    def body(self, timeout_s):
+        """
+        Waits for the matching request to finish loading and returns its
+        response body as text.
+
+        Raises:
+            TimeoutException: No matching request, or it did not finish.
+            WebDriverException: The request failed.
+        """
+        connection = self.driver.connection
+        deadline = time.monotonic() + timeout_s
+        sent = connection.wait_event("Network.requestWillBeSent", timeout_s,
+                                     lambda params: self.matches(params.get("request") or {}))
+        request_id = sent["requestId"]
+        done = connection.wait_event(NETWORK_DONE_EVENTS, max(deadline - time.monotonic(), 0),
+                                     lambda params: params.get("requestId") == request_id)
+        if "errorText" in done:
+            raise WebDriverException(f"Request to {sent['request'].get('url')} failed: {done['errorText']}")
+        result = self.driver.execute("Network.getResponseBody", {"requestId": request_id})
+        body = result.get("body", "")
+        if result.get("base64Encoded"):
+            body = base64.b64decode(body).decode("utf-8", "replace")
+        return body
+
+
+def _strategy(by):
+    if by not in _BY_STRATEGIES:
+        raise WebDriverException(f"Locator strategy {by!r} is not supported by the CDP backend")
+    return _BY_STRATEGIES[by]
+
+
+def _argument(value):
+    if isinstance(value, CDPElement):
+        return {"objectId": value.id}
+    return {"value": value}
+
+
+class CDPElement:
+    """
+    A DOM node held by its CDP remote object id.
+    """
+
+    def __init__(self, driver, object_id):
+        self.parent = driver
+        self.id = object_id
+
+    def __eq__(self, other):
+        return isinstance(other, CDPElement) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def _call(self, name, *args):
+        return self.parent._call_on(self.id, ELEMENT_FUNCTIONS[name], args)
+
+    @property
+    def text(self):
+        return self._call("text")
+
+    def get_attribute(self, name):
+        return self._call("attribute", name)
+
+    def is_displayed(self):
+        return bool(self._call("displayed"))
+
+    def is_enabled(self):
+        return bool(self._call("enabled"))
+
+    def click(self):
+        box = self._call("center")
+        if not box["width"] or not box["height"]:
+            raise WebDriverException("Element has no size and cannot be clicked")
+        self.parent._mouse_click(box["x"], box["y"])
+
+    def send_keys(self, *values):
+        self._call("focus")
+        self.parent.execute("Input.insertText", {"text": "".join(str(value) for value in values)})
+
+    def clear(self):
+        self._call("clear")
+
+    def find_element(self, by=By.ID, value=None):
+        return self.parent._find(self, by, value)
+
+    def find_elements(self, by=By.ID, value=None):
+        return self.parent._find_all(self, by, value)
+
+
+class CDPDriver:
+    """
+    The WebDriver subset the scraper needs, over one page target.
+
+    Args:
+        connection (Connection): Websocket to the page target.
+        process (subprocess.Popen): The Chrome process (None when attached
+            to a browser someone else started).
+        user_data_dir (str): Temporary profile directory removed on quit().
+    """
+
+    def __init__(self, connection, process=None, user_data_dir=None):
+        self.connection = connection
+        self.process = process
+        self.browser_pid = process.pid if process else None
+        self.user_data_dir = user_data_dir
+        self._implicit_wait_s = 0.0
+        self._network_enabled = False
+        self._closed = False
+        self.execute("Page.enable")
+
+    def execute(self, method, params=None):
+        """
+        Sends one CDP command (the hook driver_trace instruments).
+        """
+        return self.connection.send(method, params)
+
+    # -- scripts --------------------------------------------------------
+
+    def _result(self, response):
+        if "exceptionDetails" in response:
+            details = response["exceptionDetails"]
+            message = (details.get("exception") or {}).get("description") or details.get("text") or ""
+            if _is_stale(message):
+                raise StaleElementReferenceException(message)
+            raise JavascriptException(message)
+        return response["result"]
+
+    def _call_on(self, object_id, function, args=(), by_value=True):
+        try:
+            response = self.execute("Runtime.callFunctionOn", {
+                "objectId": object_id, "functionDeclaration": function, "arguments": [_argument(a) for a in args],
+                "returnByValue": by_value, "awaitPromise": False, "objectGroup": OBJECT_GROUP,
+            })
+        except CDPError as e:
+            if _is_stale(str(e)):
+                raise StaleElementReferenceException(str(e)) from None
+            raise
+        result = self._result(response)
+        return result.get("value") if by_value else result
+
+    def _evaluate(self, expression, by_value=True):
+        result = self._result(self.execute("Runtime.evaluate", {
+            "expression": expression, "returnByValue": by_value, "awaitPromise": False, "objectGroup": OBJECT_GROUP,
+        }))
+        return result.get("value") if by_value else result
+
+    def _unpack(self, value, nodes):
+        if isinstance(value, list):
+            return [self._unpack(item, nodes) for item in value]
+        if isinstance(value, dict):
+            if set(value) == {"__node__"}:
+                return nodes[value["__node__"]]
+            return {key: self._unpack(item, nodes) for key, item in value.items()}
+        return value
+
+    def _array_elements(self, remote):
+        """
+        CDPElements of a remote JS array of nodes.
+        """
+        if remote.get("subtype") == "null" or "objectId" not in remote:
+            return []
+        properties = self.execute("Runtime.getProperties", {"objectId": remote["objectId"], "ownProperties": True})
+        items = sorted((int(p["name"]), p["value"]["objectId"]) for p in properties.get("result", [])
+                       if p["name"].isdigit() and "objectId" in p.get("value", {}))
+        return [CDPElement(self, object_id) for _, object_id in items]
+
+    def execute_script(self, script, *args):
+        """
+        Runs a script body with `arguments` bound, like Selenium; DOM nodes
+        in the result come back as CDPElements.
+        """
+        wrapper = SCRIPT_WRAPPER % script
+        element = next((arg for arg in args if isinstance(arg, CDPElement)), None)
+        if element is not None:
+            remote = self._call_on(element.id, wrapper, args, by_value=False)
+        else:
+            remote = self._evaluate(f"({wrapper}).apply(null, {json.dumps(list(args))})", by_value=False)
+        packed = self._call_on(remote["objectId"], "function() { return [this.value, this.nodes.length]; }")
+        value, node_count = packed
+        if not node_count:
+            return value
+        nodes_ref = self._call_on(remote["objectId"], "function() { return this.nodes; }", by_value=False)
+        return self._unpack(value, self._array_elements(nodes_ref))
+
+    # -- navigation and page state ---------------------------------------
+
+    def get(self, url):
+        """
+        Navigates and waits for the load event, like Selenium's default
+        page load strategy.
+        """
+        self.connection.discard_events("Page.loadEventFired")
+        result = self.execute("Page.navigate", {"url": url})
+        if result.get("errorText"):
+            raise WebDriverException(f"Navigation to {url} failed: {result['errorText']}")
+        self.connection.wait_event("Page.loadEventFired", PAGE_LOAD_TIMEOUT_S)
+
+    @property
+    def title(self):
+        return self._evaluate("document.title")
+
+    @property
+    def current_url(self):
+        return self._evaluate("location.href")
+
+    @property
+    def page_source(self):
+        return self._evaluate("document.documentElement ? document.documentElement.outerHTML : ''")
+
+    def get_screenshot_as_png(self):
+        return base64.b64decode(self.execute("Page.captureScreenshot", {"format": "png"})["data"])
+
+    def implicitly_wait(self, seconds):
+        self._implicit_wait_s = max(float(seconds), 0.0)
+
+    # -- elements -------------------------------------------------------
+
+    def _find_once(self, root, by, value, all_matches):
+        strategy = _strategy(by)
+        if root is None:
+            return self._evaluate(f"({FIND_FUNCTION})(document, {json.dumps(strategy)}, {json.dumps(value)}, "
+                                  f"{json.dumps(all_matches)})", by_value=False)
+        return self._call_on(root.id, f"function(u, v, a) {{ return ({FIND_FUNCTION})(this, u, v, a); }}",
+                             (strategy, value, all_matches), by_value=False)
+
+    def _find(self, root, by, value):
+        deadline = time.monotonic() + self._implicit_wait_s
+        while True:
+            remote = self._find_once(root, by, value, False)
+            if remote.get("subtype") == "node" and "objectId" in remote:
+                return CDPElement(self, remote["objectId"])
+            if time.monotonic() >= deadline:
+                raise NoSuchElementException(f"Unable to locate element: {by}={value}")
+            time.sleep(0.1)
+
+    def _find_all(self, root, by, value):
+        deadline = time.monotonic() + self._implicit_wait_s
+        while True:
+            elements = self._array_elements(self._find_once(root, by, value, True))
+            if elements or time.monotonic() >= deadline:
+                return elements
+            time.sleep(0.1)
+
+    def find_element(self, by=By.ID, value=None):
+        return self._find(None, by, value)
+
+    def find_elements(self, by=By.ID, value=None):
+        return self._find_all(None, by, value)
+
+    # -- input ----------------------------------------------------------
+
+    def _mouse_click(self, x, y):
+        for event in ("mouseMoved", "mousePressed", "mouseReleased"):
+            params = {"type": event, "x": x, "y": y}
+            if event != "mouseMoved":
+                params.update(button="left", clickCount=1)
+            self.execute("Input.dispatchMouseEvent", params)
+
+    # -- network --------------------------------------------------------
+
+    def expect_response(self, matches):
+        """
+        Arms a ResponseWaiter for the next request `matches` accepts; call
+        before triggering the request. Enables the Network domain once.
+        """
+        if not self._network_enabled:
+            self.execute("Network.enable")
+            self._network_enabled = True
+        for method in ("Network.requestWillBeSent", *NETWORK_DONE_EVENTS):
+            self.connection.discard_events(method)
+        return ResponseWaiter(self, matches)
+
+    # -- cookies --------------------------------------------------------
+
+    def get_cookies(self):
+        return self.execute("Network.getCookies").get("cookies", [])
+
+    def add_cookie(self, cookie):
+        params = dict(cookie)
+        if "url" not in params and "domain" not in params:
+            params["url"] = self.current_url
+        if not self.execute("Network.setCookie", params).get("success", True):
+            raise WebDriverException(f"Cookie {cookie.get('name')!r} was rejected")
+
+    def delete_all_cookies(self):
+        self.execute("Network.clearBrowserCookies")
+
+    # -- lifecycle ------------------------------------------------------
+
+    def quit(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.process is not None:
+            try:
+                self.connection.send("Browser.close", timeout_s=5)
+            except Exception:
+                pass
+        self.connection.close()
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait(timeout=5)
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+
+def read_devtools_port(user_data_dir, process=None, timeout_s=LAUNCH_TIMEOUT_S):
+    """
+    The debugging port Chrome wrote to <user_data_dir>/DevToolsActivePort.
+    """
+    path = os.path.join(user_data_dir, DEVTOOLS_PORT_FILE)
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise WebDriverException(f"Chrome exited with status {process.returncode} during startup")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                first_line = f.readline().strip()
+            if first_line.isdigit():
+                return int(first_line)
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutException(f"Chrome did not open a DevTools port within {timeout_s:.0f}s")
+
+
+def page_websocket_url(port, timeout_s=COMMAND_TIMEOUT_S):
+    """
+    webSocketDebuggerUrl of the browser's first page target.
+    """
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/list", timeout=timeout_s) as response:
+        targets = json.loads(response.read())
+    for target in targets:
+        if target.get("type") == "page" and target.get("webSocketDebuggerUrl"):
+            return target["webSocketDebuggerUrl"]
+    raise WebDriverException("Chrome has no page target to attach to")
+
+
+def launch(chrome_path, arguments=(), headless=False, profile_id="", timeout_s=LAUNCH_TIMEOUT_S):
+    """
+    Starts Chrome with a temporary profile and returns a CDPDriver attached
+    to its first tab.
+    """
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(profile_id)) or "profile"
+    user_data_dir = tempfile.mkdtemp(prefix=f"routine-cdp-{slug}-")
+    command = [chrome_path, "--remote-debugging-port=0", f"--user-data-dir={user_data_dir}",
+               "--no-first-run", "--no-default-browser-check", *arguments]
+    if headless:
+        command.append("--headless=new")
+    command.append("about:blank")
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        port = read_devtools_port(user_data_dir, process, timeout_s)
+        driver = CDPDriver(Connection(page_websocket_url(port)), process, user_data_dir)
+    except BaseException:
+        process.kill()
+        process.wait(timeout=5)
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+        raise
+    logger.info("Chrome for %s started on DevTools port %d (pid %d).", profile_id or "session", port, process.pid)
+    return driver
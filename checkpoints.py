@@ -0,0 +1,113 @@
+"""
+Per-profile scrape checkpoints, so a failed run resumes instead of
+rescraping every profile.
+
+After a profile is scraped successfully its parsed entries are saved to
+CHECKPOINT_DIR/<profile>.json. The next run reuses a checkpoint younger than
+CHECKPOINT_TTL_MIN whose profile settings (section, portal URL) are
+unchanged, and only opens a browser for stale or failed profiles. A profile
+whose scrape fails loses its checkpoint.
+
+Before merging, the sections that made it are checked against
+REQUIRED_SECTIONS; a routine missing one is not merged or published unless
+the run allows a partial routine.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+from config import CHECKPOINT_DIR, CHECKPOINT_TTL_MIN, REQUIRED_SECTIONS
+from atomic_file import atomic_open, slug
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def profile_key(profile, common_urls):
+    """
+    Hash of the settings a checkpoint depends on.
+    """
+    payload = json.dumps([profile["id"], profile["section_label"], common_urls], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    One JSON checkpoint per profile in `root`.
+
+    Args:
+        root (str): Checkpoint directory.
+        ttl_s (float): Maximum checkpoint age in seconds (0 = never reuse).
+    """
+
+    def __init__(self, root, ttl_s):
+        self.root = root
+        self.ttl_s = ttl_s
+
+    def path(self, profile_id):
+        return os.path.join(self.root, f"{slug(profile_id)}.json")
+
+    def load(self, profile, common_urls):
+        """
+        Returns (entries, age in seconds) of a fresh checkpoint, or None.
+        """
+        if self.ttl_s <= 0:
+            return None
+        try:
+            with open(self.path(profile["id"]), "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+        age = time.time() - checkpoint.get("saved_at", 0)
+        if checkpoint.get("key") != profile_key(profile, common_urls) or not 0 <= age < self.ttl_s:
+            return None
+        return checkpoint.get("entries") or None, age
+
+    def save(self, profile, common_urls, entries):
+        with atomic_open(self.path(profile["id"])) as f:
+            json.dump({
+                "profile_id": profile["id"],
+                "section_label": profile["section_label"],
+                "key": profile_key(profile, common_urls),
+                "saved_at": time.time(),
+                "entries": entries,
+            }, f, ensure_ascii=False)
+
+    def discard(self, profile_id):
+        try:
+            os.remove(self.path(profile_id))
+        except FileNotFoundError:
+            pass
+
+
+def default_store():
+    root = CHECKPOINT_DIR if os.path.isabs(CHECKPOINT_DIR) else os.path.join(BASE_DIR, CHECKPOINT_DIR)
+    return CheckpointStore(root, CHECKPOINT_TTL_MIN * 60)
+
+
+def required_sections(users, setting=REQUIRED_SECTIONS):
+    """
+    Section labels a routine cannot be published without.
+
+    Args:
+        users (list): Profiles from the credentials file.
+        setting (str): "" for the primary (first) profile's section, "all"
+            for every profile's, or a comma-separated list of labels.
+    """
+    setting = (setting or "").strip()
+    if not setting:
+        return [users[0]["section_label"]] if users else []
+    if setting.lower() == "all":
+        return list(dict.fromkeys(user["section_label"] for user in users))
+    return [label.strip() for label in setting.split(",") if label.strip()]
+
+
+def missing_sections(users, collected_sections, setting=REQUIRED_SECTIONS):
+    """
+    Required sections (see required_sections) not in `collected_sections`.
+    """
+    collected = set(collected_sections)
+    return [label for label in required_sections(users, setting) if label not in collected]
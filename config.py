@@ -16,6 +16,18 @@ def _env_bool(name, default):
 # Browser Selection: "chrome" (recommended) or "firefox"
 PREFERRED_BROWSER = os.getenv("PREFERRED_BROWSER", "chrome")
 
+# Chrome driver backend: "selenium" (undetected-chromedriver, default) or
+# "cdp", which drives Chrome over the DevTools Protocol websocket directly
+# (cdp_driver.py): no chromedriver process and no HTTP hop per command.
+# Firefox always uses Selenium.
+DRIVER_BACKEND = os.getenv("DRIVER_BACKEND", "selenium").strip().lower()
+
+# Per-profile egress (egress.py): a user in ucam_login_credentials.json may
+# set "proxy" (http/https/socks4/socks5 URL, or "direct"); the others take the
+# top-level "proxies" pool in turn. Login attempts and Cloudflare challenges
+# are counted per egress in EGRESS_STATS_FILE ("" = off).
+EGRESS_STATS_FILE = os.getenv("EGRESS_STATS_FILE", "tmp/egress_stats.json")
+
 # Headless Mode: True to run without a visible window
 HEADLESS = _env_bool("HEADLESS", False)
 
@@ -27,9 +39,151 @@ CHROME_BINARY_PATH = os.getenv("CHROME_BINARY_PATH")
 SPREADSHEET_NAME = os.getenv("SPREADSHEET_NAME", "CSE-03_B_ClassRoutine")
 TARGET_SHEET_NAME = os.getenv("TARGET_SHEET_NAME", "backend")
 APP_SCRIPT_ID = os.getenv("APP_SCRIPT_ID", "YOUR_APP_SCRIPT_ID_GOES_HERE")
+# Send Sheets/Drive/Apps Script calls to a local stand-in instead of Google
+# (e.g. http://127.0.0.1:8766 for scripts/fake_google_api.py). Skips auth.
+GOOGLE_API_ENDPOINT = os.getenv("GOOGLE_API_ENDPOINT")
+
+# Semester history mode for routine_scrapper.py: "" scrapes only the current
+# semester as usual; "all" or a comma-separated list of dropdown labels
+# scrapes each of them after one login per profile and writes one routine per
+# semester to output_of_fetched_routine/semesters/. Same as --semesters.
+SCRAPE_SEMESTERS = os.getenv("SCRAPE_SEMESTERS", "")
+# Read the course table and semester options with one execute_script call
+# each (compact rows of cell text) instead of transferring the panel HTML and
+# reading options one by one. Falls back to HTML if the script fails.
+STRUCTURED_EXTRACTION = _env_bool("STRUCTURED_EXTRACTION", True)
+# Select the semester by setting the dropdown and firing its ASP.NET postback
+# in one script call, instead of clicking through the select2 widget and
+# sleeping. Falls back to the clicks if the panel does not refresh.
+SEMESTER_DIRECT_POSTBACK = _env_bool("SEMESTER_DIRECT_POSTBACK", True)
+# With DRIVER_BACKEND=cdp, take the course table straight from the semester
+# postback's response (the UpdatePanel fragment of the ASP.NET delta body,
+# read from the browser's network events) the moment it has loaded, instead
+# of waiting for the page to render it. Falls back to the DOM wait.
+POSTBACK_CAPTURE = _env_bool("POSTBACK_CAPTURE", True)
+
+# iCalendar export alongside the final routine: one .ics per section and per
+# teacher in CALENDAR_DIR, rewritten only when its entries change. Weekly
+# events start on CALENDAR_START_DATE (YYYY-MM-DD; default: the current week,
+# per calendar, moved when its entries change or its weeks run out) and repeat
+# CALENDAR_WEEKS times (0 = no end).
+EXPORT_CALENDARS = _env_bool("EXPORT_CALENDARS", True)
+CALENDAR_DIR = os.getenv("CALENDAR_DIR", "output_of_fetched_routine/calendars")
+CALENDAR_START_DATE = os.getenv("CALENDAR_START_DATE", "")
+CALENDAR_WEEKS = int(os.getenv("CALENDAR_WEEKS", "16"))
+# Timezone of the portal's time slots (Code.gs stamps times in GMT+6).
+CALENDAR_TIMEZONE = os.getenv("CALENDAR_TIMEZONE", "Asia/Dhaka")
+
+# Attendance summary: one row per profile section and course with classes
+# held, attended and the percentage, read from the dashboard's attendance
+# column during the normal scrape. Written to
+# output_of_fetched_routine/attendance_summary.csv/.json (and per semester in
+# semester history mode).
+EXPORT_ATTENDANCE_SUMMARY = _env_bool("EXPORT_ATTENDANCE_SUMMARY", False)
+
+# Static HTML routine page per section (plus index.html) in PAGES_DIR, for
+# serving with any static web server; a page is rewritten only when its
+# section's entries change.
+EXPORT_HTML_PAGES = _env_bool("EXPORT_HTML_PAGES", True)
+PAGES_DIR = os.getenv("PAGES_DIR", "output_of_fetched_routine/site")
+
+# Local read API (routine_api.py): serves the final routine JSON
+# (API_ROUTINE_FILE, default output_of_fetched_routine/
+# final_combined_routine.json) from in-memory indexes and reloads it when the
+# file changes, checking every API_RELOAD_INTERVAL_S seconds.
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8780"))
+API_ROUTINE_FILE = os.getenv("API_ROUTINE_FILE", "")
+API_RELOAD_INTERVAL_S = float(os.getenv("API_RELOAD_INTERVAL_S", "2"))
+
+# Time budgets in seconds (0 = unlimited): the whole run, each profile's
+# browser session, and each phase of it. Every wait and settle is cut to the
+# time left, and a watchdog kills a session's browser process tree once its
+# budget is exceeded by DEADLINE_GRACE_S (e.g. a page load that never returns).
+RUN_BUDGET_S = float(os.getenv("RUN_BUDGET_S", "900"))
+PROFILE_BUDGET_S = float(os.getenv("PROFILE_BUDGET_S", "300"))
+LOGIN_BUDGET_S = float(os.getenv("LOGIN_BUDGET_S", "150"))
+SEMESTER_BUDGET_S = float(os.getenv("SEMESTER_BUDGET_S", "90"))
+DASHBOARD_BUDGET_S = float(os.getenv("DASHBOARD_BUDGET_S", "60"))
+DEADLINE_GRACE_S = float(os.getenv("DEADLINE_GRACE_S", "5"))
+
+# Preflight checks (preflight.py, scripts/check_setup.py): per-check timeout
+# for the network checks, and how long a passed network check is trusted
+# before it is repeated (0 = always repeat). pipeline.py runs the checks its
+# stages need before each run unless PIPELINE_PREFLIGHT is off.
+PREFLIGHT_TIMEOUT_S = float(os.getenv("PREFLIGHT_TIMEOUT_S", "20"))
+PREFLIGHT_CACHE_TTL_MIN = float(os.getenv("PREFLIGHT_CACHE_TTL_MIN", "10"))
+PREFLIGHT_CACHE_FILE = os.getenv("PREFLIGHT_CACHE_FILE", "tmp/preflight_cache.json")
+PIPELINE_PREFLIGHT = _env_bool("PIPELINE_PREFLIGHT", True)
+
+# Combined pipeline (pipeline.py): also write the final routine CSV/JSON to
+# output_of_fetched_routine/ while handing it to the publish step in memory.
+WRITE_OUTPUT_FILES = _env_bool("WRITE_OUTPUT_FILES", True)
+# Prepare the Google clients (auth, spreadsheet, worksheets, Apps Script
+# token) on a background thread while the browser scrapes.
+WARM_PUBLISH_CLIENTS = _env_bool("WARM_PUBLISH_CLIENTS", True)
+# Stage outputs and the manifest of their input hashes, so unchanged stages
+# are skipped and `pipeline.py --from STAGE` can resume from cached outputs.
+PIPELINE_CACHE_DIR = os.getenv("PIPELINE_CACHE_DIR", "tmp/pipeline")
+
+# Per-profile checkpoints: a profile scraped successfully less than
+# CHECKPOINT_TTL_MIN minutes ago is reused instead of rescraped, so a rerun
+# after a failure only opens browsers for the stale or failed profiles
+# (0 = always scrape; --force ignores checkpoints). routine_scrapper.py keeps
+# them in CHECKPOINT_DIR, pipeline.py in its stage cache.
+CHECKPOINT_TTL_MIN = float(os.getenv("CHECKPOINT_TTL_MIN", "30"))
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "tmp/checkpoints")
+# Sections a routine must contain before it is merged and published: "" for
+# the first profile's section, "all", or a comma-separated list of labels.
+# --allow-partial publishes without them.
+REQUIRED_SECTIONS = os.getenv("REQUIRED_SECTIONS", "")
+
+# Adaptive schedule (scheduler.py, `run_routine.sh --scheduled`): the timer
+# fires hourly and a pipeline run only starts when due. The interval resets
+# to MIN after a routine change and grows by BACKOFF per unchanged run up to
+# MAX; it stays at MIN for SEMESTER_WINDOW_DAYS after a semester start (the
+# MM-DD dates in SEMESTER_STARTS, or the dashboard switching semesters). No
+# run starts during QUIET_HOURS ("start-end" local hours, may wrap midnight;
+# "" = none).
+SCHEDULER_MIN_INTERVAL_H = float(os.getenv("SCHEDULER_MIN_INTERVAL_H", "2"))
+SCHEDULER_MAX_INTERVAL_H = float(os.getenv("SCHEDULER_MAX_INTERVAL_H", "168"))
+SCHEDULER_BACKOFF = float(os.getenv("SCHEDULER_BACKOFF", "2"))
+SCHEDULER_SEMESTER_STARTS = os.getenv("SCHEDULER_SEMESTER_STARTS", "")
+SCHEDULER_SEMESTER_WINDOW_DAYS = float(os.getenv("SCHEDULER_SEMESTER_WINDOW_DAYS", "21"))
+SCHEDULER_QUIET_HOURS = os.getenv("SCHEDULER_QUIET_HOURS", "0-7")
+SCHEDULER_STATE_FILE = os.getenv("SCHEDULER_STATE_FILE", "tmp/scheduler_state.json")
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
+# Profiling: wrap each pipeline stage in cProfile and write per-stage .pstats
+# files into a timestamped run directory under PROFILE_DIR (also: --profile).
+PROFILE = _env_bool("PROFILE", False)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Also record tracemalloc allocation growth per stage (top PROFILE_TOP_N sites).
+PROFILE_TRACEMALLOC = _env_bool("PROFILE_TRACEMALLOC", False)
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "25"))
+
+# WebDriver tracing: record every browser command per profile and export a
+# Chrome trace-event timeline (webdriver_trace_<id>.json) into the profiling
+# run directory, or PROFILE_DIR when profiling is off.
+TRACE_WEBDRIVER = _env_bool("TRACE_WEBDRIVER", False)
+
+# Resource monitor: sample RSS of Python and the browser process tree from
+# /proc (Linux) and write per-phase peaks to resource_usage.json.
+MONITOR_RESOURCES = _env_bool("MONITOR_RESOURCES", False)
+RESOURCE_SAMPLE_INTERVAL_S = float(os.getenv("RESOURCE_SAMPLE_INTERVAL_S", "0.5"))
+# Combined RSS ceiling in MiB (0 = off). When crossed, the browser tree is
+# killed and the profile is retried once with a fresh driver. Implies monitoring.
+MEMORY_CEILING_MB = int(os.getenv("MEMORY_CEILING_MB", "0"))
+
+# Debug capture on scrape failure: gzipped page source, screenshot and
+# URL/title per failure, written in the background under DEBUG_CAPTURE_DIR
+# and pruned per profile to the newest N, at most MAX_MB, at most MAX_AGE_DAYS.
+DEBUG_CAPTURE_DIR = os.getenv("DEBUG_CAPTURE_DIR", "tmp/debug")
+DEBUG_CAPTURE_MAX_PER_PROFILE = int(os.getenv("DEBUG_CAPTURE_MAX_PER_PROFILE", "5"))
+DEBUG_CAPTURE_MAX_MB = float(os.getenv("DEBUG_CAPTURE_MAX_MB", "50"))
+DEBUG_CAPTURE_MAX_AGE_DAYS = float(os.getenv("DEBUG_CAPTURE_MAX_AGE_DAYS", "7"))
+
 
 def setup_logging():
     logging.basicConfig(
@@ -0,0 +1,193 @@
+"""
+Time budgets for the run, each profile and each scrape phase.
+
+Budgets nest: `with phase("login", 150):` inside a profile inside the run
+gets whichever of the three expires first. Browser waits ask `clamp()` for
+their timeout, so a 45 s wait in a phase with 10 s left waits 10 s and then
+raises DeadlineExceeded instead of TimeoutException. Fixed settles are
+shortened the same way.
+
+Waits cannot interrupt a WebDriver command that is itself stuck (a hung
+page load, a dead renderer), so `watchdog()` arms a timer per browser
+session: once the session's deadline has passed by the grace period, it
+kills the driver's process tree. The stuck command then fails and the
+profile is abandoned like any other failure.
+
+A budget of 0 means no limit. Budgets are per thread: only the thread that
+opened a phase sees it.
+"""
+import contextlib
+import logging
+import math
+import os
+import signal
+import threading
+import time
+
+import resource_monitor
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    A phase, profile or run budget ran out.
+    """
+
+
+class Deadline:
+    """
+    A named budget, capped by its parent's.
+
+    Args:
+        name (str): Shown in logs and errors.
+        budget_s (float): Seconds from now; 0 or less means unlimited.
+        parent (Deadline): Enclosing budget, or None.
+    """
+
+    def __init__(self, name, budget_s, parent=None):
+        self.name = name
+        self.budget_s = budget_s
+        self.parent = parent
+        self.expires_at = time.monotonic() + budget_s if budget_s and budget_s > 0 else None
+
+    def remaining(self):
+        """
+        Seconds left (math.inf when neither this nor any parent has a limit).
+        """
+        own = math.inf if self.expires_at is None else self.expires_at - time.monotonic()
+        return min(own, self.parent.remaining()) if self.parent else own
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def extend(self, seconds):
+        """
+        Moves this budget's own expiry `seconds` later (no-op when it has
+        none); parents still cap it.
+        """
+        if self.expires_at is not None and seconds > 0:
+            self.expires_at += seconds
+
+    def exhausted_by(self):
+        """
+        Name of the innermost expired budget in the chain, or None.
+        """
+        node, name = self, None
+        while node:
+            if node.expires_at is not None and node.expires_at <= time.monotonic():
+                name = name or node.name
+            node = node.parent
+        return name
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current():
+    """
+    The innermost open Deadline of this thread, or None.
+    """
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+@contextlib.contextmanager
+def phase(name, budget_s):
+    """
+    Opens a nested budget for the duration of the block and yields it.
+    """
+    deadline = Deadline(name, budget_s, parent=current())
+    stack = _stack()
+    stack.append(deadline)
+    try:
+        yield deadline
+    finally:
+        stack.remove(deadline)
+
+
+def remaining():
+    deadline = current()
+    return math.inf if deadline is None else deadline.remaining()
+
+
+def clamp(timeout_s):
+    """
+    `timeout_s` cut down to the time left in the current budgets (never < 0).
+    """
+    return max(0.0, min(timeout_s, remaining()))
+
+
+def check(what=""):
+    """
+    Raises DeadlineExceeded if the current budget has run out.
+    """
+    deadline = current()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded(f"{deadline.exhausted_by() or deadline.name} budget exhausted"
+                               + (f" before {what}" if what else ""))
+
+
+def kill_driver(driver):
+    """
+    Kills the driver's process tree (falling back to the root processes
+    where /proc is unavailable). Returns the number of processes signalled.
+    """
+    roots = resource_monitor.driver_root_pids(driver)
+    killed = resource_monitor.kill_process_tree(roots)
+    if not killed:
+        for pid in roots:
+            try:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+                killed += 1
+            except OSError:
+                pass
+    return killed
+
+
+@contextlib.contextmanager
+def watchdog(deadline, driver, grace_s=5.0, on_expire=None):
+    """
+    Kills `driver`'s browser once `deadline` has been exceeded by `grace_s`
+    while the block is still running (re-armed if the deadline was extended
+    meanwhile). Yields a dict whose "fired" flag tells the caller the session
+    was killed.
+    """
+    state = {"fired": False}
+    if math.isinf(deadline.remaining()):
+        yield state
+        return
+    lock = threading.Lock()
+    timer = None
+
+    def _arm():
+        nonlocal timer
+        timer = threading.Timer(max(0.0, deadline.remaining()) + grace_s, _expire)
+        timer.daemon = True
+        timer.start()
+
+    def _expire():
+        with lock:
+            if timer is None:
+                return
+            if deadline.remaining() > -grace_s:
+                _arm()
+                return
+        state["fired"] = True
+        killed = (on_expire or kill_driver)(driver)
+        logger.error("Watchdog: %s budget exceeded; killed %s browser process(es).",
+                     deadline.exhausted_by() or deadline.name, killed)
+
+    with lock:
+        _arm()
+    try:
+        yield state
+    finally:
+        with lock:
+            timer.cancel()
+            timer = None
@@ -0,0 +1,220 @@
+"""
+Bounded, asynchronous capture of browser state when a scrape fails.
+
+`capture(driver, profile_id, reason)` pulls the page source, a screenshot and
+the current URL/title from the browser once, on the calling thread, and hands
+them to a background writer. The writer gzips the HTML and writes one
+artifact directory per failure:
+
+    DEBUG_CAPTURE_DIR/<profile>/<YYYYmmdd-HHMMSS>-<reason>/
+        page.html.gz      page source
+        screenshot.png    viewport screenshot (when the driver could take one)
+        meta.json         profile, reason, url, title, error, captured_at
+
+Each profile keeps a ring buffer: after every write the oldest artifacts are
+pruned until at most DEBUG_CAPTURE_MAX_PER_PROFILE remain, they total no more
+than DEBUG_CAPTURE_MAX_MB, and none is older than DEBUG_CAPTURE_MAX_AGE_DAYS.
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+from config import (
+    DEBUG_CAPTURE_DIR, DEBUG_CAPTURE_MAX_PER_PROFILE, DEBUG_CAPTURE_MAX_MB, DEBUG_CAPTURE_MAX_AGE_DAYS,
+)
+from atomic_file import slug
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGE_FILENAME = "page.html.gz"
+SCREENSHOT_FILENAME = "screenshot.png"
+META_FILENAME = "meta.json"
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def snapshot(driver):
+    """
+    Reads URL, title, page source and a PNG screenshot from the browser.
+    Each read is best-effort: a dead session yields None for that field.
+    """
+    state = {}
+    for key, read in (
+        ("url", lambda: driver.current_url),
+        ("title", lambda: driver.title),
+        ("html", lambda: driver.page_source),
+        ("screenshot", lambda: driver.get_screenshot_as_png()),
+    ):
+        try:
+            state[key] = read()
+        except Exception as e:
+            logger.debug("Debug capture could not read %s: %s", key, e)
+            state[key] = None
+    return state
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ArtifactWriter:
+    """
+    Writes captured artifacts on a daemon thread and prunes each profile's
+    ring buffer.
+
+    Args:
+        root (str): Base directory; one subdirectory per profile.
+        max_per_profile (int): Artifacts kept per profile.
+        max_bytes (int): Total on-disk size kept per profile.
+        max_age_s (float): Artifacts older than this are removed.
+    """
+
+    def __init__(self, root, max_per_profile=5, max_bytes=50 * 1024 * 1024, max_age_s=7 * 86400):
+        self.root = root
+        self.max_per_profile = max_per_profile
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="debug-capture", daemon=True)
+        self._thread.start()
+
+    def submit(self, profile_id, reason, state, error=None):
+        """
+        Queues one capture and returns the directory it will be written to.
+        """
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.root, slug(profile_id), f"{stamp}-{slug(reason)}")
+        meta = {
+            "profile": profile_id,
+            "reason": reason,
+            "url": state.get("url"),
+            "title": state.get("title"),
+            "error": error,
+            "captured_at": time.time(),
+        }
+        self._queue.put((path, meta, state.get("html"), state.get("screenshot")))
+        return path
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every queued capture is written (or `timeout` expires).
+        Returns True when the queue drained.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            path, meta, html, screenshot = self._queue.get()
+            try:
+                self._write(path, meta, html, screenshot)
+                self.prune(os.path.dirname(path))
+            except Exception as e:
+                logger.warning("Could not write debug capture %s: %s", path, e)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path, meta, html, screenshot):
+        # Same-second failures of one profile get distinct directories.
+        base, suffix = path, 1
+        while os.path.exists(path):
+            path = f"{base}.{suffix}"
+            suffix += 1
+        os.makedirs(path)
+        if html is not None:
+            with gzip.open(os.path.join(path, PAGE_FILENAME), "wt", encoding="utf-8") as f:
+                f.write(html)
+        if screenshot:
+            with open(os.path.join(path, SCREENSHOT_FILENAME), "wb") as f:
+                f.write(screenshot)
+        with open(os.path.join(path, META_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=4)
+        logger.info("Debug capture saved: %s", path)
+
+    def prune(self, profile_dir):
+        """
+        Trims a profile's artifacts to the count, size and age limits,
+        removing the oldest first.
+        """
+        try:
+            names = os.listdir(profile_dir)
+        except OSError:
+            return
+        artifacts = []
+        for name in names:
+            path = os.path.join(profile_dir, name)
+            if os.path.isdir(path):
+                artifacts.append((os.path.getmtime(path), path, _dir_size(path)))
+        artifacts.sort(reverse=True)
+
+        now = time.time()
+        kept_bytes = 0
+        for index, (mtime, path, size) in enumerate(artifacts):
+            expired = self.max_age_s and now - mtime > self.max_age_s
+            over_count = index >= self.max_per_profile
+            # The newest artifact is always kept, however large.
+            over_size = index > 0 and kept_bytes + size > self.max_bytes
+            if expired or over_count or over_size:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                kept_bytes += size
+
+
+def writer():
+    """
+    The process-wide ArtifactWriter, started on first use from config.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            root = DEBUG_CAPTURE_DIR if os.path.isabs(DEBUG_CAPTURE_DIR) else os.path.join(BASE_DIR, DEBUG_CAPTURE_DIR)
+            _writer = ArtifactWriter(
+                root,
+                max_per_profile=DEBUG_CAPTURE_MAX_PER_PROFILE,
+                max_bytes=int(DEBUG_CAPTURE_MAX_MB * 1024 * 1024),
+                max_age_s=DEBUG_CAPTURE_MAX_AGE_DAYS * 86400,
+            )
+            atexit.register(_writer.flush, 30)
+        return _writer
+
+
+def capture(driver, profile_id, reason, error=None):
+    """
+    Snapshots the browser and queues the artifact for writing. Returns the
+    artifact directory; never raises.
+    """
+    try:
+        return writer().submit(profile_id, reason, snapshot(driver), error=error)
+    except Exception as e:
+        logger.warning("Debug capture failed for %s: %s", profile_id, e)
+        return None
+
+
+def flush(timeout=None):
+    """
+    Waits for pending captures; a no-op if nothing was ever captured.
+    """
+    if _writer is None:
+        return True
+    return _writer.flush(timeout)
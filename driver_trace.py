@@ -0,0 +1,207 @@
+"""
+WebDriver command-level latency tracing.
+
+`instrument(driver, tracer)` wraps the driver's `execute` method, which every
+Selenium command funnels through (element commands call back into the parent
+driver), as does every DevTools command of the CDP backend (cdp_driver.py).
+Each round trip is recorded with its command name, target and start/end
+time. Higher-level spans such as explicit waits and settle sleeps
+are added by the scraper through `span(driver, ...)`.
+
+A tracer exports a Chrome trace-event JSON file that opens in
+chrome://tracing, https://ui.perfetto.dev or speedscope.
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+import profiling
+from config import PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+TRACER_ATTR = "_routine_tracer"
+TARGET_MAX_LEN = 120
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def _shorten(text, limit=TARGET_MAX_LEN):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def describe_target(command, params):
+    """
+    Summarizes what a WebDriver command acted on (URL, locator, script, ...).
+    """
+    if not params:
+        return ""
+    if "url" in params:
+        return params["url"]
+    if "using" in params and "value" in params:
+        target = f"{params['using']}={params['value']}"
+        if "id" in params:
+            target += f" (in element {params['id']})"
+        return target
+    if "script" in params:
+        script = params["script"]
+        # Selenium's atoms are prefixed with a marker such as /* getAttribute */
+        if script.startswith("/*"):
+            script = script.split("*/", 1)[0] + "*/"
+        extras = [a for a in params.get("args", []) if isinstance(a, (str, int, float))]
+        return _shorten(" ".join([script] + [str(a) for a in extras]))
+    # CDP backend (cdp_driver.py): Runtime.evaluate / Runtime.callFunctionOn.
+    if "expression" in params or "functionDeclaration" in params:
+        script = params.get("expression") or params["functionDeclaration"]
+        extras = [a["value"] for a in params.get("arguments", []) if isinstance(a.get("value"), (str, int, float))]
+        return _shorten(" ".join([script] + [str(a) for a in extras]))
+    if "name" in params:
+        return f"{params['name']} (element {params.get('id', '?')})"
+    if "text" in params:
+        return f"element {params.get('id', '?')} <- {len(params['text'])} chars"
+    if "id" in params:
+        return f"element {params['id']}"
+    return ""
+
+
+class CommandTracer:
+    """
+    Records WebDriver commands and named spans for one browser session.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.events = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _now_us(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def record(self, name, target, start_us, end_us, category="command", error=None):
+        event = {
+            "name": name,
+            "cat": category,
+            "start_us": start_us,
+            "end_us": end_us,
+            "target": target,
+            "thread": threading.get_ident(),
+        }
+        if error:
+            event["error"] = error
+        with self._lock:
+            self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name, target="", category="wait"):
+        start = self._now_us()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record(name, target, start, self._now_us(), category, error)
+
+    def wrap_execute(self, execute):
+        def traced_execute(driver_command, params=None):
+            start = self._now_us()
+            error = None
+            try:
+                return execute(driver_command, params)
+            except BaseException as e:
+                error = type(e).__name__
+                raise
+            finally:
+                self.record(driver_command, describe_target(driver_command, params),
+                            start, self._now_us(), "command", error)
+        return traced_execute
+
+    def summary(self):
+        """
+        Returns {command name: (count, total seconds)} for commands only.
+        """
+        totals = {}
+        for event in self.events:
+            if event["cat"] != "command":
+                continue
+            count, total = totals.get(event["name"], (0, 0.0))
+            totals[event["name"]] = (count + 1, total + (event["end_us"] - event["start_us"]) / 1e6)
+        return totals
+
+    def to_trace_events(self):
+        """
+        Converts recorded events to the Chrome trace-event format.
+        """
+        pid = os.getpid()
+        lanes = {}
+        trace_events = [{
+            "name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+            "args": {"name": f"scrape {self.label}"},
+        }]
+        for event in sorted(self.events, key=lambda e: (e["start_us"], -e["end_us"])):
+            tid = lanes.setdefault(event["thread"], len(lanes) + 1)
+            args = {"target": event["target"]}
+            if "error" in event:
+                args["error"] = event["error"]
+            trace_events.append({
+                "name": event["name"],
+                "cat": event["cat"],
+                "ph": "X",
+                "ts": round(event["start_us"], 1),
+                "dur": round(event["end_us"] - event["start_us"], 1),
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            })
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms",
+                "otherData": {"profile": self.label}}
+
+    def export(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_trace_events(), f)
+        commands = sum(count for count, _ in self.summary().values())
+        logger.info("WebDriver trace (%d commands) written to: %s", commands, path)
+        return path
+
+
+def trace_path(label):
+    """
+    Where the timeline for one profile run is written: the active profiling
+    run directory, else a timestamped file under PROFILE_DIR.
+    """
+    safe_label = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(label))
+    profiler = profiling.active()
+    if profiler is not None:
+        return os.path.join(profiler.run_dir, f"webdriver_trace_{safe_label}.json")
+    base = PROFILE_DIR if os.path.isabs(PROFILE_DIR) else os.path.join(profiling.BASE_DIR, PROFILE_DIR)
+    return os.path.join(base, f"webdriver_trace_{safe_label}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+
+
+def instrument(driver, tracer):
+    """
+    Routes every command of `driver` through `tracer`. Returns the driver.
+    """
+    driver.execute = tracer.wrap_execute(driver.execute)
+    setattr(driver, TRACER_ATTR, tracer)
+    return driver
+
+
+def tracer_for(driver):
+    return getattr(driver, TRACER_ATTR, None)
+
+
+def span(driver, name, target="", category="wait"):
+    """
+    Records a named span (wait, sleep, ...) on a traced driver; no-op otherwise.
+    """
+    tracer = getattr(driver, TRACER_ATTR, None)
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, target, category)
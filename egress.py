@@ -0,0 +1,299 @@
+"""
+Per-profile network egress, so portal sessions are spread across IPs.
+
+Each user in ucam_login_credentials.json may set "proxy" to a proxy URL
+(http://, https://, socks4:// or socks5://host:port) or "direct". Users
+without one take the next entry of the optional top-level "proxies" pool in
+turn (by position, so a profile keeps its egress from run to run), or go
+direct when there is no pool. load_credentials() resolves the pool, so a
+profile dict carries its final "proxy" (absent = direct).
+
+The egress is honoured by every path that talks to the portal:
+
+    Chrome (Selenium and CDP)  --proxy-server
+    Firefox                    network.proxy.* preferences
+    HTTP fetches (requests)    proxies= mapping (socks needs requests[socks])
+
+Browsers take no proxy credentials from the command line or preferences, so
+a proxy URL with user:password@ is rejected; use IP-allowlisted proxies or a
+local forwarder.
+
+Every portal access is counted per egress in EGRESS_STATS_FILE: sessions,
+attempts, Cloudflare challenge pages and blocked sessions, plus the
+challenge rate over the last STATS_WINDOW sessions. `python egress.py`
+prints them next to the current profile assignment.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from config import EGRESS_STATS_FILE, setup_logging
+from atomic_file import atomic_open
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIRECT = "direct"
+PROXY_SCHEMES = ("http", "https", "socks4", "socks5")
+# Sessions per egress the challenge rate is computed over.
+STATS_WINDOW = 50
+
+_stats_lock = threading.Lock()
+
+
+class Proxy:
+    """
+    One proxy egress.
+
+    Args:
+        scheme (str): One of PROXY_SCHEMES.
+        host (str): Proxy host name or IP.
+        port (int): Proxy port.
+    """
+
+    def __init__(self, scheme, host, port):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+
+    def __eq__(self, other):
+        return isinstance(other, Proxy) and (other.scheme, other.host, other.port) == (
+            self.scheme, self.host, self.port)
+
+    def __hash__(self):
+        return hash((self.scheme, self.host, self.port))
+
+    @property
+    def url(self):
+        host = f"[{self.host}]" if ":" in self.host else self.host
+        return f"{self.scheme}://{host}:{self.port}"
+
+    def __repr__(self):
+        return f"Proxy({self.url})"
+
+
+def parse_proxy(value):
+    """
+    Proxy for a "proxy" setting, or None for direct ("", None, "direct").
+
+    Raises:
+        ValueError: Unsupported scheme, missing host/port, or credentials.
+    """
+    value = (value or "").strip()
+    if not value or value.lower() == DIRECT:
+        return None
+    parts = urlsplit(value if "://" in value else f"http://{value}")
+    scheme = parts.scheme.lower()
+    if scheme not in PROXY_SCHEMES:
+        raise ValueError(f"proxy {value!r}: scheme must be one of {', '.join(PROXY_SCHEMES)}")
+    if parts.username or parts.password:
+        raise ValueError(f"proxy {parts.hostname}: browsers cannot take proxy credentials; "
+                         f"use an IP-allowlisted proxy or a local forwarder")
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if not parts.hostname or not port:
+        raise ValueError(f"proxy {value!r}: needs host:port")
+    if parts.path not in ("", "/"):
+        raise ValueError(f"proxy {value!r}: unexpected path {parts.path!r}")
+    return Proxy(scheme, parts.hostname, port)
+
+
+def label(proxy):
+    """
+    Name of an egress in logs and stats.
+    """
+    return proxy.url if proxy else DIRECT
+
+
+def assign(users, pool=()):
+    """
+    Resolves each user's "proxy" in place: its own setting, else the next
+    pool entry in turn, else direct (left unset). Returns {user id: Proxy
+    or None}.
+
+    Raises:
+        ValueError: An invalid proxy setting (naming the user or pool entry).
+    """
+    try:
+        pool = [parse_proxy(entry) for entry in pool or ()]
+    except ValueError as e:
+        raise ValueError(f"'proxies' pool: {e}") from None
+    assigned = {}
+    turn = 0
+    for user in users:
+        if user.get("proxy"):
+            try:
+                proxy = parse_proxy(user["proxy"])
+            except ValueError as e:
+                raise ValueError(f"user {user.get('id')}: {e}") from None
+        elif pool:
+            proxy = pool[turn % len(pool)]
+            turn += 1
+        else:
+            assigned[user.get("id")] = None
+            continue
+        user["proxy"] = label(proxy)
+        assigned[user.get("id")] = proxy
+    return assigned
+
+
+def for_profile(profile):
+    """
+    The Proxy a profile's sessions go out through, or None for direct.
+    """
+    return parse_proxy(profile.get("proxy"))
+
+
+# [Backends]
+
+def chrome_arguments(proxy):
+    """
+    Chrome command-line arguments routing all traffic through `proxy`,
+    loopback included, so a local portal stand-in goes through it too.
+    """
+    if proxy is None:
+        return []
+    return [f"--proxy-server={proxy.url}", "--proxy-bypass-list=<-loopback>"]
+
+
+def firefox_preferences(proxy):
+    """
+    Firefox preferences for a manual proxy configuration (loopback
+    included, as for Chrome).
+    """
+    if proxy is None:
+        return {}
+    if proxy.scheme.startswith("socks"):
+        return {
+            "network.proxy.type": 1,
+            "network.proxy.allow_hijacking_localhost": True,
+            "network.proxy.socks": proxy.host,
+            "network.proxy.socks_port": proxy.port,
+            "network.proxy.socks_version": 4 if proxy.scheme == "socks4" else 5,
+            "network.proxy.socks_remote_dns": proxy.scheme == "socks5",
+        }
+    return {
+        "network.proxy.type": 1,
+        "network.proxy.allow_hijacking_localhost": True,
+        "network.proxy.http": proxy.host,
+        "network.proxy.http_port": proxy.port,
+        "network.proxy.ssl": proxy.host,
+        "network.proxy.ssl_port": proxy.port,
+    }
+
+
+def requests_proxies(proxy):
+    """
+    `proxies=` mapping for requests (None for direct). socks5 resolves
+    names through the proxy, like the browsers.
+    """
+    if proxy is None:
+        return None
+    url = proxy.url.replace("socks5://", "socks5h://", 1)
+    return {"http": url, "https": url}
+
+
+# [Challenge statistics]
+
+def stats_path():
+    return EGRESS_STATS_FILE if os.path.isabs(EGRESS_STATS_FILE) else os.path.join(BASE_DIR, EGRESS_STATS_FILE)
+
+
+def load_stats(path=None):
+    try:
+        with open(path or stats_path(), "r", encoding="utf-8") as f:
+            stats = json.load(f)
+        return stats if isinstance(stats, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def challenge_rate(entry):
+    """
+    Challenge pages per portal access attempt over the recent sessions.
+    """
+    recent = entry.get("recent", [])
+    attempts = sum(session["attempts"] for session in recent)
+    return sum(session["challenges"] for session in recent) / attempts if attempts else 0.0
+
+
+def record_session(egress_label, attempts, challenges, passed, path=None, now=None):
+    """
+    Adds one login session's portal access counts to the stats file.
+
+    Args:
+        attempts (int): Login page loads.
+        challenges (int): Of those, how many were Cloudflare challenge pages.
+        passed (bool): Whether the login fields were reached.
+    """
+    if not EGRESS_STATS_FILE and path is None:
+        return
+    now = time.time() if now is None else now
+    with _stats_lock:
+        stats = load_stats(path)
+        entry = stats.setdefault(egress_label, {"sessions": 0, "attempts": 0, "challenges": 0, "blocked": 0})
+        entry["sessions"] += 1
+        entry["attempts"] += attempts
+        entry["challenges"] += challenges
+        entry["blocked"] += 0 if passed else 1
+        entry["last_session_at"] = now
+        entry["recent"] = (entry.get("recent", []) + [
+            {"at": now, "attempts": attempts, "challenges": challenges, "passed": passed},
+        ])[-STATS_WINDOW:]
+        entry["challenge_rate"] = round(challenge_rate(entry), 4)
+        try:
+            with atomic_open(path or stats_path()) as f:
+                json.dump(stats, f, indent=4)
+        except OSError as e:
+            logger.warning("Could not write egress stats: %s", e)
+
+
+def print_stats(stats, assignment=None):
+    """
+    Prints per-egress challenge statistics and which profiles use each.
+    """
+    profiles = {}
+    for profile_id, proxy in (assignment or {}).items():
+        profiles.setdefault(label(proxy), []).append(str(profile_id))
+    print("Egress stats: %s\n" % stats_path())
+    labels = sorted(set(stats) | set(profiles))
+    if not labels:
+        print("  no sessions recorded yet")
+    for name in labels:
+        entry = stats.get(name, {})
+        print("  %s" % name)
+        print("    profiles:        %s" % (", ".join(profiles.get(name, [])) or "-"))
+        print("    sessions:        %d (%d blocked)" % (entry.get("sessions", 0), entry.get("blocked", 0)))
+        print("    challenge rate:  %.0f%% of %d recent attempt(s)" % (
+            100 * challenge_rate(entry), sum(s["attempts"] for s in entry.get("recent", []))))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Show per-egress Cloudflare challenge statistics.")
+    parser.add_argument("--json", action="store_true", help="print the raw stats file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    setup_logging()
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    stats = load_stats()
+    if args.json:
+        print(json.dumps(stats, indent=4))
+        return 0
+    import routine_scrapper
+    credentials = routine_scrapper.load_credentials(routine_scrapper.CREDENTIALS_FILE)
+    assignment = {user["id"]: for_profile(user) for user in credentials["users"]} if credentials else {}
+    print_stats(stats, assignment)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
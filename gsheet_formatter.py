@@ -5,11 +5,14 @@ import pickle
 import sys
 import traceback
 import logging
+import requests
 from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.credentials import AnonymousCredentials
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 
-from config import SPREADSHEET_NAME, TARGET_SHEET_NAME, APP_SCRIPT_ID, setup_logging
+from config import SPREADSHEET_NAME, TARGET_SHEET_NAME, APP_SCRIPT_ID, GOOGLE_API_ENDPOINT, setup_logging
+import profiling
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -42,6 +45,9 @@ APP_SCRIPT_SCOPES = [
 ]
 TOKEN_PICKLE_FILE = 'token.pickle'
 
+# Hosts redirected to GOOGLE_API_ENDPOINT when it is set
+GOOGLE_API_HOSTS = ("https://sheets.googleapis.com", "https://www.googleapis.com")
+
 
 # [Helper Functions]
 
@@ -71,6 +77,24 @@ def load_routine_data(json_file_path):
         logger.error("Unexpected error in load_routine_data: %s", e)
         return []
 
+class EndpointSession(requests.Session):
+    """
+    Session that sends Sheets/Drive calls to a local endpoint (such as
+    scripts/fake_google_api.py) instead of googleapis.com, unauthenticated.
+    """
+
+    def __init__(self, endpoint):
+        super().__init__()
+        self.endpoint = endpoint.rstrip("/")
+
+    def request(self, method, url, *args, **kwargs):
+        for host in GOOGLE_API_HOSTS:
+            if url.startswith(host):
+                url = self.endpoint + url[len(host):]
+                break
+        return super().request(method, url, *args, **kwargs)
+
+
 def authenticate_gsheet(service_account_json_path):
     """
     Authenticates with the Google Sheets API using a service account.
@@ -82,6 +106,9 @@ def authenticate_gsheet(service_account_json_path):
         gspread.Client: Authenticated gspread client or None if authentication fails.
     """
     logger.info("Authenticating with Google Sheets API...")
+    if GOOGLE_API_ENDPOINT:
+        logger.info("Using Google API endpoint override: %s", GOOGLE_API_ENDPOINT)
+        return gspread.Client(auth=None, session=EndpointSession(GOOGLE_API_ENDPOINT))
     try:
         if not os.path.isabs(service_account_json_path):
             script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -231,31 +258,36 @@ def _headless_environment():
     return not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
 
 
-def call_apps_script_function(script_id, function_name, client_secrets_file, token_pickle_file, scopes):
+def load_apps_script_credentials(client_secrets_file, token_pickle_file, scopes, interactive=True):
     """
-    Authenticates and executes a Google Apps Script function via the API.
-    
+    Loads the cached OAuth token, refreshing or re-authorizing it if needed.
+
     Args:
-        script_id (str): The unique Script ID for the Apps Script project.
-        function_name (str): The name of the function to execute.
         client_secrets_file (str): Path to the OAuth 2.0 client secret.
         token_pickle_file (str): Path to the cached authentication token.
         scopes (list): Required API scopes.
-        
+        interactive (bool): Allow the browser consent flow when the token
+            cannot be refreshed. Background warm-up passes False.
+
     Returns:
-        bool: True if execution succeeded, False otherwise.
+        google.oauth2.credentials.Credentials: Valid credentials, or None.
     """
+    if GOOGLE_API_ENDPOINT:
+        return AnonymousCredentials()
     creds = None
     if os.path.exists(token_pickle_file):
         with open(token_pickle_file, 'rb') as token:
             creds = pickle.load(token)
-    
+
     # Refresh or obtain new credentials if necessary
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             logger.info("Refreshing API credentials...")
             creds.refresh(Request())
         else:
+            if not interactive:
+                logger.info("Apps Script token needs interactive authorization; deferring.")
+                return None
             if _headless_environment():
                 logger.error(
                     "Cached token is missing or expired with no refresh token. "
@@ -264,17 +296,50 @@ def call_apps_script_function(script_id, function_name, client_secrets_file, tok
                     "complete the OAuth flow and refresh '%s'.",
                     token_pickle_file,
                 )
-                return False
+                return None
             logger.info("Authenticating with Google OAuth...")
             flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, scopes)
             creds = flow.run_local_server(port=0)
-        
+
         with open(token_pickle_file, 'wb') as token:
             pickle.dump(creds, token)
         logger.info("API credentials cached successfully.")
+    return creds
+
+
+def build_script_service(creds):
+    """
+    Builds the Apps Script API client, pointed at GOOGLE_API_ENDPOINT if set.
+    """
+    client_options = {"api_endpoint": GOOGLE_API_ENDPOINT} if GOOGLE_API_ENDPOINT else None
+    return build('script', 'v1', credentials=creds, client_options=client_options)
+
+
+def call_apps_script_function(script_id, function_name, client_secrets_file, token_pickle_file, scopes,
+                              service=None):
+    """
+    Authenticates and executes a Google Apps Script function via the API.
+    
+    Args:
+        script_id (str): The unique Script ID for the Apps Script project.
+        function_name (str): The name of the function to execute.
+        client_secrets_file (str): Path to the OAuth 2.0 client secret.
+        token_pickle_file (str): Path to the cached authentication token.
+        scopes (list): Required API scopes.
+        service (googleapiclient.discovery.Resource): Already-built Apps
+            Script service (skips credential loading when given).
+        
+    Returns:
+        bool: True if execution succeeded, False otherwise.
+    """
+    if service is None:
+        creds = load_apps_script_credentials(client_secrets_file, token_pickle_file, scopes)
+        if not creds:
+            return False
 
     try:
-        service = build('script', 'v1', credentials=creds)
+        if service is None:
+            service = build_script_service(creds)
         logger.info("Executing Apps Script: %s...", function_name)
         
         request_body = {"function": function_name}
@@ -294,82 +359,211 @@ def call_apps_script_function(script_id, function_name, client_secrets_file, tok
         return False
 
 
-# [Main Execution]
+class PublishContext:
+    """
+    Authorized Google handles prepared before the routine is available.
+
+    Attributes:
+        gc (gspread.Client): Authorized Sheets client.
+        spreadsheet (gspread.Spreadsheet): The opened target spreadsheet.
+        target_ws (gspread.Worksheet): The raw data ('backend') worksheet.
+        new_main_ws (gspread.Worksheet): The Apps Script output worksheet.
+        script_service (Resource): Apps Script service, or None when the
+            token needs interactive authorization (done at publish time).
+    """
 
-def main():
-    logger.info("Initializing Google Sheets formatting workflow...")
+    def __init__(self, gc, spreadsheet, target_ws, new_main_ws, script_service=None):
+        self.gc = gc
+        self.spreadsheet = spreadsheet
+        self.target_ws = target_ws
+        self.new_main_ws = new_main_ws
+        self.script_service = script_service
 
-    # 1. Load data source
-    routine_data = load_routine_data(SCRAPED_DATA_JSON_PATH)
-    if not routine_data:
-        logger.warning("Data source empty. Termination sequence initiated.")
-        return
 
-    # 2. Authenticate and establish connection
-    gc = authenticate_gsheet(GOOGLE_SERVICE_ACCOUNT_KEY_FILE)
+def prepare_publish(interactive=True, expected_rows=0):
+    """
+    Authenticates, opens the spreadsheet, resolves both worksheets and
+    readies the Apps Script service. Safe to run on a background thread
+    with interactive=False.
+
+    Args:
+        interactive (bool): Allow the OAuth browser flow for Apps Script.
+        expected_rows (int): Routine size hint for newly created worksheets.
+
+    Returns:
+        PublishContext: Ready handles, or None if the Google config is broken.
+    """
+    with profiling.stage("authenticate_gsheet"):
+        gc = authenticate_gsheet(GOOGLE_SERVICE_ACCOUNT_KEY_FILE)
     if not gc:
         logger.error("Authentication failure. Exiting.")
-        return
+        return None
 
     try:
         logger.info("Opening spreadsheet: '%s'", SPREADSHEET_NAME)
-        spreadsheet = gc.open(SPREADSHEET_NAME)
-
-        # 3. Synchronize data with the 'backend' worksheet
-        target_ws = get_or_create_worksheet(
-            spreadsheet,
-            TARGET_SHEET_NAME,
-            rows=len(routine_data) + 5,
-            cols=10,
-        )
-
-        if target_ws:
-            if write_data_to_sheet(target_ws, routine_data):
-                logger.info("Spreadsheet synchronization successful.")
-            else:
-                logger.error("Synchronization failed.")
-        else:
-            logger.error("Target worksheet unreachable. Exiting.")
-
-        # 3b. Ensure the 'NewMain' worksheet exists for Apps Script post-processing
-        new_main_ws = get_or_create_worksheet(
-            spreadsheet,
-            NEW_MAIN_SHEET_NAME,
-            rows=max(30, len(routine_data) + 5),
-            cols=10,
-            seed_headers=True,
-        )
-        if not new_main_ws:
-            logger.error("NewMain worksheet unreachable. Exiting.")
-            return
-
+        with profiling.stage("open_spreadsheet"):
+            spreadsheet = gc.open(SPREADSHEET_NAME)
+
+        with profiling.stage("worksheet_metadata"):
+            target_ws = get_or_create_worksheet(
+                spreadsheet,
+                TARGET_SHEET_NAME,
+                rows=expected_rows + 5 if expected_rows else 100,
+                cols=10,
+            )
+            if not target_ws:
+                logger.error("Target worksheet unreachable. Exiting.")
+                return None
+
+            # Ensure the 'NewMain' worksheet exists for Apps Script post-processing
+            new_main_ws = get_or_create_worksheet(
+                spreadsheet,
+                NEW_MAIN_SHEET_NAME,
+                rows=max(30, expected_rows + 5),
+                cols=10,
+                seed_headers=True,
+            )
+            if not new_main_ws:
+                logger.error("NewMain worksheet unreachable. Exiting.")
+                return None
     except gspread.exceptions.SpreadsheetNotFound:
         logger.error("Spreadsheet '%s' not found.", SPREADSHEET_NAME)
-        return
+        return None
     except Exception as e:
         logger.error("Critical error during synchronization: %s", e)
         traceback.print_exc()
-        return
+        return None
 
-    # 4. Trigger post-processing via Apps Script
+    script_service = None
+    if APP_SCRIPT_ID != 'YOUR_APP_SCRIPT_ID_GOES_HERE':
+        try:
+            with profiling.stage("apps_script_credentials"):
+                creds = load_apps_script_credentials(
+                    GOOGLE_OAUTH_CLIENT_SECRET_FILE, TOKEN_PICKLE_FILE, APP_SCRIPT_SCOPES,
+                    interactive=interactive,
+                )
+                if creds:
+                    script_service = build_script_service(creds)
+        except Exception as e:
+            # Retried (and reported) by the Apps Script call at publish time.
+            logger.warning("Could not prepare Apps Script credentials: %s", e)
+
+    return PublishContext(gc, spreadsheet, target_ws, new_main_ws, script_service)
+
+
+def _ensure_rows(worksheet, rows):
+    """
+    Grows a worksheet that was created (or warmed up) smaller than the data.
+    """
+    row_count = getattr(worksheet, "row_count", None)
+    if row_count is not None and row_count < rows:
+        worksheet.resize(rows=rows)
+        logger.info("Resized '%s' to %d rows.", worksheet.title, rows)
+
+
+# [Main Execution]
+
+def write_routine_to_sheet(routine_data, context):
+    """
+    Synchronizes routine entries into the 'backend' worksheet.
+
+    Args:
+        routine_data (list): Final routine entry dictionaries.
+        context (PublishContext): Handles from prepare_publish().
+
+    Returns:
+        bool: True if the worksheet was written, False otherwise.
+    """
+    try:
+        _ensure_rows(context.target_ws, len(routine_data) + 5)
+        # Code.gs writes the processed routine into NewMain below its header rows.
+        _ensure_rows(context.new_main_ws, max(30, len(routine_data) + 5))
+        with profiling.stage("write_sheet"):
+            written = write_data_to_sheet(context.target_ws, routine_data)
+    except Exception as e:
+        logger.error("Critical error during synchronization: %s", e)
+        traceback.print_exc()
+        return False
+    if written:
+        logger.info("Spreadsheet synchronization successful.")
+    else:
+        logger.error("Synchronization failed.")
+    return written
+
+
+def run_post_processing(context):
+    """
+    Triggers the Apps Script sort/format of 'NewMain'.
+
+    Args:
+        context (PublishContext): Handles from prepare_publish().
+
+    Returns:
+        bool: True on success or when APP_SCRIPT_ID is not configured.
+    """
     logger.info("\nTriggering post-processing workflow...")
     if APP_SCRIPT_ID == 'YOUR_APP_SCRIPT_ID_GOES_HERE':
         logger.warning("APP_SCRIPT_ID is not configured.")
-    else:
+        return True
+
+    with profiling.stage("apps_script"):
         call_success = call_apps_script_function(
             script_id=APP_SCRIPT_ID,
             function_name=FUNCTION_NAME,
             client_secrets_file=GOOGLE_OAUTH_CLIENT_SECRET_FILE,
             token_pickle_file=TOKEN_PICKLE_FILE,
             scopes=APP_SCRIPT_SCOPES,
+            service=context.script_service,
         )
-        if call_success:
-            logger.info("Post-processing complete. Sheets updated.")
-        else:
-            logger.error("Post-processing trigger failed.")
+    if call_success:
+        logger.info("Post-processing complete. Sheets updated.")
+    else:
+        logger.error("Post-processing trigger failed.")
+    return call_success
+
+
+def publish_routine(routine_data, context=None):
+    """
+    Writes routine entries to the spreadsheet and triggers Apps Script
+    post-processing.
+
+    Args:
+        routine_data (list): Final routine entry dictionaries.
+        context (PublishContext): Handles from prepare_publish(); prepared
+            here when omitted.
+
+    Returns:
+        bool: True if every publish step succeeded, False otherwise.
+    """
+    # 2. Authenticate and establish connection
+    if context is None:
+        context = prepare_publish(expected_rows=len(routine_data))
+    if context is None:
+        return False
+
+    # 3. Synchronize data with the 'backend' worksheet
+    written = write_routine_to_sheet(routine_data, context)
+
+    # 4. Trigger post-processing via Apps Script
+    post_processed = run_post_processing(context)
+    return written and post_processed
+
+
+@profiling.session("formatter")
+def main():
+    logger.info("Initializing Google Sheets formatting workflow...")
+
+    # 1. Load data source
+    with profiling.stage("load_routine"):
+        routine_data = load_routine_data(SCRAPED_DATA_JSON_PATH)
+    if not routine_data:
+        logger.warning("Data source empty. Termination sequence initiated.")
+        return
 
+    publish_routine(routine_data)
     logger.info("Workflow execution finished.")
 
 
 if __name__ == "__main__":
+    profiling.request_from_argv(sys.argv[1:])
     main()
@@ -0,0 +1,82 @@
+"""
+ASP.NET AJAX partial-postback ("delta") responses.
+
+When an UpdatePanel posts back, the portal answers the XHR (sent with
+`X-MicrosoftAjax: Delta=true`) with a plain-text body of records:
+
+    <length>|<type>|<id>|<content>|
+
+where <length> is the number of characters in <content>, which may itself
+contain "|". Record types include updatePanel (id = panel client id,
+content = its new inner HTML), hiddenField (__VIEWSTATE etc.), pageRedirect
+(e.g. an expired session sent back to the login page) and error.
+
+With POSTBACK_CAPTURE on the CDP driver backend, the scraper reads the
+semester postback's response body from the browser's network events and
+takes the course table straight from the UpdatePanel02 record, instead of
+waiting for the page to render it and reading the DOM.
+"""
+import collections
+
+DELTA_HEADER = "X-MicrosoftAjax"
+
+DeltaRecord = collections.namedtuple("DeltaRecord", "type id content")
+
+
+class DeltaError(ValueError):
+    """
+    The body is not a well-formed delta, or the server answered with an
+    error or redirect record instead of panel content.
+    """
+
+
+def is_delta_request(request):
+    """
+    True for a partial-postback request (CDP Network.Request dict).
+    """
+    if (request.get("method") or "").upper() != "POST":
+        return False
+    headers = {name.lower(): value for name, value in (request.get("headers") or {}).items()}
+    return "delta=true" in str(headers.get(DELTA_HEADER.lower(), "")).lower()
+
+
+def parse_delta(body):
+    """
+    Splits a delta body into DeltaRecords; raises DeltaError.
+    """
+    records = []
+    position = 0
+    while position < len(body):
+        length_end = body.find("|", position)
+        type_end = body.find("|", length_end + 1) if length_end >= 0 else -1
+        id_end = body.find("|", type_end + 1) if type_end >= 0 else -1
+        if id_end < 0:
+            raise DeltaError(f"truncated delta record at offset {position}")
+        length_text = body[position:length_end]
+        if not length_text.isdigit():
+            raise DeltaError(f"bad delta record length {length_text[:20]!r} at offset {position}")
+        start, end = id_end + 1, id_end + 1 + int(length_text)
+        if body[end:end + 1] != "|":
+            raise DeltaError(f"delta record at offset {position} overruns the body")
+        records.append(DeltaRecord(body[length_end + 1:type_end], body[type_end + 1:id_end], body[start:end]))
+        position = end + 1
+    return records
+
+
+def panel_html(body, panel_id):
+    """
+    New inner HTML of `panel_id` from a delta body, or None when the
+    response does not update that panel.
+
+    Raises:
+        DeltaError: Malformed body, or an error/pageRedirect record.
+    """
+    html = None
+    for record in parse_delta(body):
+        if record.type == "error":
+            raise DeltaError(f"server error {record.id}: {record.content[:200]}")
+        if record.type == "pageRedirect":
+            raise DeltaError(f"redirected to {record.content}")
+        if record.type == "updatePanel" and record.id == panel_id:
+            html = record.content
+    return html
@@ -0,0 +1,510 @@
+"""
+Stage-graph runner for the routine pipeline: scrape, then publish to Google
+Sheets, in one process.
+
+Stages, in order:
+
+    provision      load credentials and teacher details (always runs)
+    scrape         one browser session per profile -> raw dashboard HTML
+    parse          dashboard HTML -> per-section entries
+    merge          per-section entries -> final routine
+    persist        final routine (and attendance summary) -> CSV/JSON in output_of_fetched_routine/
+    publish_sheet  final routine -> 'backend' worksheet
+    post_process   Apps Script sort/format into 'NewMain'
+
+Stage outputs are handed to the next stage in memory and also cached in
+PIPELINE_CACHE_DIR, next to a manifest recording the hash of the inputs each
+output was computed from. A stage whose inputs match its last successful run
+is skipped and its cached output reused, and `--from STAGE` runs only a
+suffix of the graph on top of cached outputs, so retrying a failed publish
+does not open a browser. The live portal cannot be hashed, so a profile's
+scrape output is only reused while it is younger than CHECKPOINT_TTL_MIN:
+after a failed run, the next one scrapes just the failed profiles. A scrape
+missing a REQUIRED_SECTIONS section stops before merging unless
+--allow-partial is given. --force reruns every selected stage. The whole run
+shares RUN_BUDGET_S (see deadlines.py); profiles left when it runs out are
+not scraped.
+
+Before anything runs, the preflight checks the selected stages need (portal
+reachable, spreadsheet opens, Apps Script token valid; see preflight.py) run
+concurrently, reusing results that passed within PREFLIGHT_CACHE_TTL_MIN. A
+failed portal check stops the run; a failed Google check lets scrape and
+persist run and fails the run at publish_sheet.
+
+While the browser scrapes, a background thread authenticates with Google,
+opens the spreadsheet, resolves the worksheets and refreshes the Apps Script
+token (WARM_PUBLISH_CLIENTS), so publishing starts immediately afterwards.
+A broken Google config stops the scrape before the next browser session.
+
+Usage:
+    python pipeline.py [run] [--from STAGE] [--force] [--allow-partial] [--profile] [--no-files] [--record DIR]
+    python pipeline.py publish [--force]    # same as: run --from publish_sheet
+    python pipeline.py status               # show the cached stage manifest
+
+Exit codes:
+    0  all selected stages succeeded (or were unchanged)
+    3  a scrape-side stage failed (scrape, parse, merge, persist)
+    4  a publish-side stage failed (publish_sheet, post_process)
+    5  --from needs a cached output that does not exist yet
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    WRITE_OUTPUT_FILES, WARM_PUBLISH_CLIENTS, PIPELINE_CACHE_DIR, CHECKPOINT_TTL_MIN, RUN_BUDGET_S,
+    PIPELINE_PREFLIGHT, EXPORT_ATTENDANCE_SUMMARY, setup_logging,
+)
+import checkpoints
+import deadlines
+import preflight
+import profiling
+import routine_scrapper
+import gsheet_formatter
+import replay
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+EXIT_OK = 0
+# 1 and 2 are left to uncaught errors and argparse usage errors.
+EXIT_SCRAPE_FAILED = 3
+EXIT_PUBLISH_FAILED = 4
+EXIT_MISSING_INPUT = 5
+
+STAGES = ("provision", "scrape", "parse", "merge", "persist", "publish_sheet", "post_process")
+PUBLISH_STAGES = ("publish_sheet", "post_process")
+MANIFEST_FILENAME = "manifest.json"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class StageFailed(Exception):
+    """
+    A stage could not produce its output; carries the process exit code.
+    """
+
+    def __init__(self, stage, message, exit_code=None):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+        if exit_code is None:
+            exit_code = EXIT_PUBLISH_FAILED if _stage_name(stage) in PUBLISH_STAGES else EXIT_SCRAPE_FAILED
+        self.exit_code = exit_code
+
+
+def _stage_name(key):
+    """'scrape.<profile>' -> 'scrape'."""
+    return key.split(".", 1)[0]
+
+
+def hash_inputs(*parts):
+    """
+    Stable SHA-256 over JSON-serializable stage inputs.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """
+    Stage outputs (<key>.json) plus manifest.json in one directory.
+
+    Manifest entries record the inputs hash and time of the last successful
+    run, and the error of the last failed run if it failed afterwards.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest = {"stages": {}}
+        path = os.path.join(root, MANIFEST_FILENAME)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.manifest = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning("Ignoring unreadable stage manifest %s: %s", path, e)
+
+    def _write_json(self, filename, payload):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, filename)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def entry(self, key):
+        return self.manifest["stages"].get(key)
+
+    def load(self, key):
+        """
+        Returns the last successful output of `key`, or None.
+        """
+        entry = self.entry(key)
+        if not entry or "output" not in entry:
+            return None
+        try:
+            with open(os.path.join(self.root, entry["output"]), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def is_fresh(self, key, inputs_hash, max_age_s=None):
+        """
+        True when `key` last succeeded on the same inputs and, if
+        `max_age_s` is given, less than that many seconds ago.
+        """
+        entry = self.entry(key)
+        if not entry or entry.get("inputs") != inputs_hash or "error" in entry:
+            return False
+        if max_age_s is not None and not 0 <= time.time() - entry.get("stored_at", 0) < max_age_s:
+            return False
+        return os.path.exists(os.path.join(self.root, entry.get("output", "")))
+
+    def store(self, key, inputs_hash, output):
+        filename = f"{key}.json"
+        self._write_json(filename, output)
+        self.manifest["stages"][key] = {
+            "inputs": inputs_hash,
+            "output": filename,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "stored_at": time.time(),
+        }
+        self._write_json(MANIFEST_FILENAME, self.manifest)
+
+    def mark_failed(self, key, error):
+        entry = self.manifest["stages"].setdefault(key, {})
+        entry["error"] = error
+        entry["failed_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._write_json(MANIFEST_FILENAME, self.manifest)
+
+
+def default_cache():
+    root = PIPELINE_CACHE_DIR if os.path.isabs(PIPELINE_CACHE_DIR) else os.path.join(BASE_DIR, PIPELINE_CACHE_DIR)
+    return StageCache(root)
+
+
+def _warm_publish():
+    try:
+        return gsheet_formatter.prepare_publish(interactive=False)
+    except Exception as e:
+        logger.error("Publish warm-up crashed: %s", e)
+        traceback.print_exc()
+        return None
+
+
+def _preflight(start):
+    """
+    Runs the preflight checks for the stages from `start` on.
+
+    Returns:
+        list: Names of the failed checks (empty if all passed).
+    """
+    scrape = STAGES.index(start) <= STAGES.index("scrape")
+    results = preflight.run_checks(preflight.default_checks(), preflight.pipeline_targets(scrape=scrape),
+                                   preflight.default_cache())
+    preflight.log_results(results)
+    failed = [result.name for result in results if not result.ok]
+    if failed:
+        logger.error("Preflight failed (%s); run scripts/check_setup.py for details.", ", ".join(failed))
+    return failed
+
+
+def _warmup_failed(warmup):
+    return warmup is not None and warmup.done() and warmup.result() is None
+
+
+class PipelineRun:
+    """
+    One execution of the stage graph from `start` to the end.
+    """
+
+    def __init__(self, cache, start="provision", force=False, write_outputs=True, warmup=None, record_dir=None,
+                 allow_partial=False, publish_blocked=()):
+        self.cache = cache
+        self.start_index = STAGES.index(start)
+        self.force = force
+        self.allow_partial = allow_partial
+        self.write_outputs = write_outputs
+        self.warmup = warmup
+        self.record_dir = record_dir
+        # Failed publish-side preflight checks: scrape and persist still run,
+        # publishing fails when it needs Google.
+        self.publish_blocked = list(publish_blocked)
+        self._publish_context = None
+
+    def selected(self, stage):
+        return STAGES.index(_stage_name(stage)) >= self.start_index
+
+    def stage(self, key, inputs_hash, compute, max_age_s=None, outputs=()):
+        """
+        Runs, skips or loads one stage and returns its output.
+
+        compute() returns the output, or None on failure (already logged).
+        A cached output older than `max_age_s` seconds, or one whose files
+        in `outputs` went missing, is recomputed even if the inputs are
+        unchanged.
+        """
+        if not self.selected(key):
+            output = self.cache.load(key)
+            if output is None:
+                raise StageFailed(key, "no cached output; run an earlier stage first", EXIT_MISSING_INPUT)
+            return output
+        if (not self.force and self.cache.is_fresh(key, inputs_hash, max_age_s)
+                and all(os.path.exists(path) for path in outputs)):
+            logger.info("Stage '%s' unchanged since its last run; reusing cached output.", key)
+            return self.cache.load(key)
+
+        logger.info("--- Stage: %s ---", key)
+        try:
+            with routine_scrapper.pipeline_stage(key):
+                output = compute()
+        except StageFailed:
+            self.cache.mark_failed(key, "stage failed")
+            raise
+        except Exception as e:
+            logger.error("Stage '%s' crashed: %s", key, e)
+            traceback.print_exc()
+            output = None
+        if output is None:
+            self.cache.mark_failed(key, "stage failed")
+            raise StageFailed(key, "stage failed")
+        self.cache.store(key, inputs_hash, output)
+        return output
+
+    # [Stages]
+
+    def provision(self):
+        credentials = routine_scrapper.load_credentials(routine_scrapper.CREDENTIALS_FILE)
+        if not credentials:
+            raise StageFailed("provision", "missing configuration", EXIT_SCRAPE_FAILED)
+        teacher_details = routine_scrapper.load_teacher_details_from_file(routine_scrapper.TEACHER_DETAILS_FILE)
+        return credentials, teacher_details
+
+    def scrape(self, credentials):
+        """
+        Captures every profile's dashboard; returns the successful captures.
+        """
+        common_urls = {
+            "login_url": credentials["login_url"],
+            "attendance_dashboard_url": credentials["attendance_dashboard_url"],
+        }
+        captures = []
+        for profile in credentials["users"]:
+            key = f"scrape.{profile['id']}"
+            if self.selected(key) and _warmup_failed(self.warmup):
+                raise StageFailed("publish_sheet", "Google Sheets setup failed; scrape aborted")
+            inputs = hash_inputs(profile["id"], profile["section_label"], common_urls)
+            try:
+                captures.append(self.stage(
+                    key, inputs,
+                    lambda: routine_scrapper.scrape_profile_with_retry(
+                        profile, common_urls, work=routine_scrapper.capture_dashboard),
+                    max_age_s=CHECKPOINT_TTL_MIN * 60,
+                ))
+            except StageFailed as e:
+                if e.exit_code == EXIT_MISSING_INPUT:
+                    raise
+                logger.error("Continuing without %s.", profile["id"])
+        if not captures:
+            raise StageFailed("scrape", "data collection yielded zero results")
+        missing = checkpoints.missing_sections(credentials["users"], [c["section_label"] for c in captures])
+        if missing and not self.allow_partial:
+            raise StageFailed("scrape", f"required section(s) missing: {', '.join(missing)}; rerun to scrape only "
+                                        f"the missing profiles, or pass --allow-partial")
+        return captures
+
+    def parse(self, captures):
+        if captures is None:
+            return self.stage("parse", None, None)["entries"]
+        inputs = hash_inputs([(c["section_label"], hash_inputs(c.get("rows"), c.get("html"))) for c in captures])
+
+        def compute():
+            entries = []
+            for capture in captures:
+                entries.extend(routine_scrapper.process_capture(capture))
+            return {"entries": entries} if entries else None
+
+        return self.stage("parse", inputs, compute)["entries"]
+
+    def merge(self, entries, credentials, teacher_details):
+        if entries is None:
+            return self.stage("merge", None, None)["routine"]
+        primary, secondary = routine_scrapper.merge_sections(credentials["users"])
+        inputs = hash_inputs(entries, primary, secondary, teacher_details)
+
+        def compute():
+            routine = routine_scrapper.build_final_routine(entries, primary, secondary, teacher_details)
+            if not routine:
+                logger.warning("No valid routine entries filtered.")
+            return {"routine": routine} if routine else None
+
+        return self.stage("merge", inputs, compute)["routine"]
+
+    def persist(self, routine, entries):
+        # Nothing downstream consumes persist's output, so a run that starts
+        # after it (e.g. `publish`) skips it instead of loading a cached one.
+        if not self.write_outputs or not self.selected("persist"):
+            return
+        files = [
+            os.path.join(routine_scrapper.FORMATTED_OUTPUT_DIR, routine_scrapper.FINAL_ROUTINE_CSV_FILENAME),
+            os.path.join(routine_scrapper.FORMATTED_OUTPUT_DIR, routine_scrapper.FINAL_ROUTINE_JSON_FILENAME),
+        ]
+        summary = None
+        if EXPORT_ATTENDANCE_SUMMARY:
+            if entries is None:
+                entries = self.parse(None)
+            summary = routine_scrapper.attendance_summary(entries)
+            if routine_scrapper.has_attendance(summary):
+                files.append(os.path.join(routine_scrapper.FORMATTED_OUTPUT_DIR,
+                                          routine_scrapper.ATTENDANCE_SUMMARY_FILENAME_TPL.format(ext="json")))
+        inputs = hash_inputs(routine, summary, files)
+
+        def compute():
+            logger.info("Exporting %d unique entries.", len(routine))
+            routine_scrapper.save_final_routine(routine)
+            if summary is not None:
+                routine_scrapper.save_attendance_summary(entries)
+            return {"files": files}
+
+        # Files deleted since the last run are written again.
+        self.stage("persist", inputs, compute, outputs=files)
+
+    def publish_context(self, routine):
+        if self.publish_blocked:
+            raise StageFailed("publish_sheet", f"preflight failed: {', '.join(self.publish_blocked)}")
+        if self._publish_context is None:
+            if self.warmup is not None:
+                self._publish_context = self.warmup.result()
+            else:
+                self._publish_context = gsheet_formatter.prepare_publish(expected_rows=len(routine))
+        if self._publish_context is None:
+            raise StageFailed("publish_sheet", "Google Sheets setup failed")
+        return self._publish_context
+
+    def publish_sheet(self, routine):
+        inputs = hash_inputs(routine, gsheet_formatter.SPREADSHEET_NAME, gsheet_formatter.TARGET_SHEET_NAME)
+
+        def compute():
+            logger.info("Publishing %d routine entries...", len(routine))
+            written = gsheet_formatter.write_routine_to_sheet(routine, self.publish_context(routine))
+            return {"rows": len(routine)} if written else None
+
+        self.stage("publish_sheet", inputs, compute)
+        return inputs
+
+    def post_process(self, routine, publish_inputs):
+        inputs = hash_inputs(publish_inputs, gsheet_formatter.APP_SCRIPT_ID, gsheet_formatter.FUNCTION_NAME)
+
+        def compute():
+            ok = gsheet_formatter.run_post_processing(self.publish_context(routine))
+            return {"ok": True} if ok else None
+
+        self.stage("post_process", inputs, compute)
+
+    def execute(self):
+        credentials, teacher_details = self.provision()
+        # Upstream outputs are only loaded when a selected stage consumes them.
+        captures = self.scrape(credentials) if self.selected("parse") else None
+        if captures is not None and self.record_dir:
+            replay.write_bundle(replay.build_bundle(captures, credentials["users"], teacher_details),
+                                replay.record_path(self.record_dir))
+        entries = self.parse(captures) if self.selected("merge") else None
+        routine = self.merge(entries, credentials, teacher_details)
+        self.persist(routine, entries)
+        publish_inputs = self.publish_sheet(routine)
+        self.post_process(routine, publish_inputs)
+
+
+def run(start="provision", force=False, write_outputs=WRITE_OUTPUT_FILES, warm_publish=WARM_PUBLISH_CLIENTS,
+        cache=None, record_dir=None, allow_partial=False):
+    """
+    Runs the stage graph from `start` to the end.
+
+    Returns:
+        int: One of the EXIT_* codes.
+    """
+    cache = cache or default_cache()
+    with profiling.session("pipeline"), routine_scrapper.resource_monitoring(), ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="publish-warmup"
+    ) as pool:
+        logger.info("Executing routine pipeline from stage '%s'...", start)
+        failed = _preflight(start) if PIPELINE_PREFLIGHT else []
+        if any(name in preflight.SCRAPE_CHECKS for name in failed):
+            return EXIT_SCRAPE_FAILED
+        # A failing Google check would fail the warm-up too and abort the scrape.
+        warmup = pool.submit(_warm_publish) if warm_publish and not failed else None
+        pipeline_run = PipelineRun(cache, start=start, force=force, write_outputs=write_outputs, warmup=warmup,
+                                   record_dir=record_dir, allow_partial=allow_partial, publish_blocked=failed)
+        try:
+            with deadlines.phase("run", RUN_BUDGET_S):
+                pipeline_run.execute()
+        except StageFailed as e:
+            logger.error("Pipeline stopped at %s", e)
+            if e.exit_code == EXIT_SCRAPE_FAILED and _warmup_failed(warmup):
+                return EXIT_PUBLISH_FAILED
+            return e.exit_code
+
+        logger.info("Routine pipeline finished.")
+        return EXIT_OK
+
+
+def print_status(cache):
+    stages = cache.manifest.get("stages", {})
+    if not stages:
+        print("No cached stages in %s" % cache.root)
+        return
+    print("Stage cache: %s\n" % cache.root)
+    ordered = sorted(stages.items(), key=lambda kv: (STAGES.index(_stage_name(kv[0])), kv[0]))
+    for key, entry in ordered:
+        status = "FAILED" if "error" in entry else "ok"
+        print("  %-28s %-7s last ok: %-20s inputs: %s" % (
+            key, status, entry.get("finished_at", "-"), entry.get("inputs", "-")[:12]))
+
+
+COMMANDS = ("run", "publish", "status")
+
+
+def parse_args(argv):
+    if not argv or argv[0] not in COMMANDS:
+        argv = ["run"] + list(argv)
+    parser = argparse.ArgumentParser(description="Scrape the UCAM routine and publish it to Google Sheets.")
+    commands = parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run", help="run the stage graph (default)")
+    run_parser.add_argument("--from", dest="start", choices=STAGES, default="provision",
+                            help="run only this stage and the ones after it, on cached inputs")
+    run_parser.add_argument("--record", metavar="DIR",
+                            help="save the scraped HTML as a replay bundle in DIR (see replay.py)")
+    run_parser.add_argument("--allow-partial", action="store_true",
+                            help="merge and publish even if a required section could not be scraped")
+    publish_parser = commands.add_parser("publish", help="re-run publish_sheet and post_process from cache")
+    for sub in (run_parser, publish_parser):
+        sub.add_argument("--force", action="store_true", help="rerun selected stages even if unchanged")
+        sub.add_argument("--profile", action="store_true", help="profile each stage (see profiling.py)")
+        sub.add_argument("--no-files", action="store_true",
+                         help="skip the CSV/JSON exports in output_of_fetched_routine/")
+    commands.add_parser("status", help="show cached stage outputs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command == "status":
+        print_status(default_cache())
+        return EXIT_OK
+    if args.profile:
+        profiling.request_from_argv([profiling.PROFILE_FLAG])
+    start = "publish_sheet" if args.command == "publish" else args.start
+    write_outputs = WRITE_OUTPUT_FILES and not args.no_files
+    return run(start=start, force=args.force, write_outputs=write_outputs, record_dir=getattr(args, "record", None),
+               allow_partial=getattr(args, "allow_partial", False))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,439 @@
+"""
+Preflight checks for the routine pipeline, declared as a dependency graph.
+
+Each Check names the checks it requires. run_checks() starts every check
+whose requirements passed on its own thread, so the network checks
+(spreadsheet open, OAuth token, Apps Script, portal) overlap and a preflight
+takes about as long as its slowest check. A check still running after its
+timeout is reported as failed and abandoned; checks whose requirements
+failed are skipped.
+
+Successful network checks are cached in PREFLIGHT_CACHE_FILE for
+PREFLIGHT_CACHE_TTL_MIN minutes, keyed on the settings and files they read,
+so pipeline.py can run preflight before every run without repeating them.
+Editing a key file or a setting invalidates the cached result.
+
+scripts/check_setup.py prints the full report; pipeline.py runs only the
+checks the selected stages need (see pipeline_targets()).
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import requests
+
+from config import (
+    SPREADSHEET_NAME, APP_SCRIPT_ID, GOOGLE_API_ENDPOINT, PREFLIGHT_TIMEOUT_S, PREFLIGHT_CACHE_TTL_MIN,
+    PREFLIGHT_CACHE_FILE,
+)
+from atomic_file import atomic_open
+import egress
+import gsheet_formatter
+from gsheet_formatter import (
+    GOOGLE_SERVICE_ACCOUNT_KEY_FILE, GOOGLE_OAUTH_CLIENT_SECRET_FILE, TOKEN_PICKLE_FILE, APP_SCRIPT_SCOPES,
+)
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CREDENTIALS_FILE = os.path.join(BASE_DIR, "configs_to_edit", "ucam_login_credentials.json")
+PLACEHOLDER_ID = "YOUR_APP_SCRIPT_ID_GOES_HERE"
+
+OK, CACHED, FAILED, SKIPPED = "ok", "cached", "fail", "skipped"
+# Checks whose failure means the scrape cannot run (the rest block publishing).
+SCRAPE_CHECKS = ("ucam_credentials", "portal")
+
+
+class CheckFailed(Exception):
+    """
+    Raised by a check; the message becomes the result's detail line.
+    """
+
+
+class Check:
+    """
+    One preflight check.
+
+    Args:
+        name (str): Unique id, referenced by other checks' `requires`.
+        description (str): Report line.
+        run (callable): run() -> detail string (or None) on success; raises
+            CheckFailed (or anything else) on failure.
+        group (str): Report heading.
+        requires (tuple): Names of checks that must pass first.
+        timeout_s (float): Reported as failed after this long (0 = no limit).
+        inputs (callable): inputs() -> JSON-serializable settings/file states
+            the result depends on. Checks with inputs are cached.
+    """
+
+    def __init__(self, name, description, run, group="", requires=(), timeout_s=0, inputs=None):
+        self.name = name
+        self.description = description
+        self.run = run
+        self.group = group
+        self.requires = tuple(requires)
+        self.timeout_s = timeout_s
+        self.inputs = inputs
+
+
+class CheckResult:
+    def __init__(self, check, status, detail="", duration_s=0.0):
+        self.check = check
+        self.status = status
+        self.detail = detail
+        self.duration_s = duration_s
+
+    @property
+    def name(self):
+        return self.check.name
+
+    @property
+    def ok(self):
+        return self.status in (OK, CACHED)
+
+
+class PreflightCache:
+    """
+    Successful check results in a JSON file, valid for `ttl_s` seconds and
+    only while the check's inputs are unchanged.
+    """
+
+    def __init__(self, path, ttl_s):
+        self.path = path
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, check):
+        if self.ttl_s <= 0 or check.inputs is None:
+            return None
+        entry = self.entries.get(check.name)
+        if not entry or entry.get("fingerprint") != fingerprint(check):
+            return None
+        if not 0 <= time.time() - entry.get("passed_at", 0) < self.ttl_s:
+            return None
+        return entry
+
+    def put(self, result):
+        if self.ttl_s <= 0 or result.check.inputs is None:
+            return
+        with self._lock:
+            self.entries[result.name] = {
+                "fingerprint": fingerprint(result.check),
+                "passed_at": time.time(),
+                "detail": result.detail,
+            }
+
+    def discard(self, name):
+        with self._lock:
+            self.entries.pop(name, None)
+
+    def save(self):
+        with self._lock, atomic_open(self.path) as f:
+            json.dump(self.entries, f, indent=4, ensure_ascii=False)
+
+
+def default_cache():
+    path = PREFLIGHT_CACHE_FILE
+    if not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    return PreflightCache(path, PREFLIGHT_CACHE_TTL_MIN * 60)
+
+
+def fingerprint(check):
+    payload = json.dumps(check.inputs(), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_state(path):
+    """
+    (path, mtime_ns, size) for a check's inputs; None fields if missing.
+    """
+    try:
+        stat = os.stat(path)
+        return [path, stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return [path, None, None]
+
+
+def select(checks, targets=None):
+    """
+    The checks needed for `targets` (names; None = all), in declaration
+    order. Raises ValueError on unknown names or a dependency cycle.
+    """
+    by_name = {check.name: check for check in checks}
+    wanted, visiting = set(), set()
+
+    def visit(name):
+        if name not in by_name:
+            raise ValueError(f"unknown preflight check {name!r}")
+        if name in wanted:
+            return
+        if name in visiting:
+            raise ValueError(f"preflight check {name!r} depends on itself")
+        visiting.add(name)
+        for required in by_name[name].requires:
+            visit(required)
+        visiting.discard(name)
+        wanted.add(name)
+
+    for name in (by_name if targets is None else targets):
+        visit(name)
+    return [check for check in checks if check.name in wanted]
+
+
+def _worker(check, done):
+    started = time.perf_counter()
+    try:
+        status, detail = OK, check.run() or ""
+    except CheckFailed as e:
+        status, detail = FAILED, str(e)
+    except Exception as e:
+        status, detail = FAILED, f"{type(e).__name__}: {e}"
+    done.put((check.name, status, detail, time.perf_counter() - started))
+
+
+def run_checks(checks, targets=None, cache=None):
+    """
+    Runs the checks needed for `targets`, each as soon as its requirements
+    have passed.
+
+    Args:
+        checks (list): Check declarations.
+        targets (iterable): Check names to run with their requirements
+            (None = every check).
+        cache (PreflightCache): Reuse/record successful results; None
+            runs everything.
+
+    Returns:
+        list: CheckResult per selected check, in declaration order.
+    """
+    selected = select(checks, targets)
+    pending = {check.name: check for check in selected}
+    running, results = {}, {}
+    done = queue.Queue()
+
+    while pending or running:
+        for name, check in list(pending.items()):
+            if any(required not in results for required in check.requires):
+                continue
+            del pending[name]
+            failed = [required for required in check.requires if not results[required].ok]
+            cached = cache.get(check) if cache and not failed else None
+            if failed:
+                results[name] = CheckResult(check, SKIPPED, f"needs {', '.join(failed)}")
+            elif cached:
+                results[name] = CheckResult(check, CACHED, cached.get("detail", ""))
+            else:
+                running[name] = (check, time.monotonic())
+                threading.Thread(target=_worker, args=(check, done), name=f"preflight-{name}", daemon=True).start()
+        if not running:
+            continue
+
+        due = [started + check.timeout_s for check, started in running.values() if check.timeout_s > 0]
+        wait_s = max(0.0, min(due) - time.monotonic()) if due else None
+        try:
+            name, status, detail, duration_s = done.get(timeout=wait_s)
+        except queue.Empty:
+            now = time.monotonic()
+            for name, (check, started) in list(running.items()):
+                if check.timeout_s > 0 and now - started >= check.timeout_s:
+                    del running[name]
+                    results[name] = CheckResult(check, FAILED, f"timed out after {check.timeout_s:g}s",
+                                                now - started)
+            continue
+        if name not in running:
+            # Finished after it was already reported as timed out.
+            continue
+        check, _ = running.pop(name)
+        results[name] = CheckResult(check, status, detail, duration_s)
+        if cache:
+            if status == OK:
+                cache.put(results[name])
+            else:
+                cache.discard(name)
+
+    if cache:
+        try:
+            cache.save()
+        except OSError as e:
+            logger.warning("Could not save preflight cache %s: %s", cache.path, e)
+    return [results[check.name] for check in selected]
+
+
+# [Checks]
+
+def _load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise CheckFailed(f"{path}: {e}")
+
+
+def _project_path(path):
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+
+def check_service_account_key():
+    key = _load_json(_project_path(GOOGLE_SERVICE_ACCOUNT_KEY_FILE))
+    if not key.get("client_email"):
+        raise CheckFailed("no client_email in the key; share the spreadsheet with it (SETUP.md Phase A3)")
+    return key["client_email"]
+
+
+def check_oauth_client_secret():
+    _load_json(_project_path(GOOGLE_OAUTH_CLIENT_SECRET_FILE))
+
+
+def check_token_cache():
+    if not os.path.exists(TOKEN_PICKLE_FILE):
+        raise CheckFailed("absent only on a fresh machine; the formatter will create it on first interactive run")
+
+
+def check_app_script_id():
+    if not APP_SCRIPT_ID or APP_SCRIPT_ID == PLACEHOLDER_ID:
+        raise CheckFailed("set APP_SCRIPT_ID in .env (SETUP.md Phase A6)")
+
+
+def check_ucam_credentials():
+    credentials = _load_json(CREDENTIALS_FILE)
+    if not credentials.get("login_url") or not credentials.get("users"):
+        raise CheckFailed(f"{CREDENTIALS_FILE}: needs login_url and a non-empty users list")
+    return f"{len(credentials['users'])} profile(s)"
+
+
+def check_spreadsheet():
+    gc = gsheet_formatter.authenticate_gsheet(GOOGLE_SERVICE_ACCOUNT_KEY_FILE)
+    if gc is None:
+        raise CheckFailed("service account authentication failed")
+    try:
+        gc.open(SPREADSHEET_NAME)
+    except Exception as e:
+        client_email = None
+        try:
+            client_email = check_service_account_key()
+        except CheckFailed:
+            pass
+        raise CheckFailed(f"{type(e).__name__}: {e} - make sure the sheet exists, the name in .env is exact, "
+                          f"and the sheet is shared (Editor) with {client_email or 'the service account'}")
+
+
+def _apps_script_credentials():
+    creds = gsheet_formatter.load_apps_script_credentials(
+        GOOGLE_OAUTH_CLIENT_SECRET_FILE, TOKEN_PICKLE_FILE, APP_SCRIPT_SCOPES, interactive=False,
+    )
+    if not creds:
+        raise CheckFailed("token needs interactive authorization: run gsheet_formatter.py once with a display")
+    return creds
+
+
+def check_oauth_token():
+    _apps_script_credentials()
+
+
+def check_apps_script():
+    service = gsheet_formatter.build_script_service(_apps_script_credentials())
+    project = service.projects().get(scriptId=APP_SCRIPT_ID).execute()
+    return project.get("title") or ""
+
+
+def _portal_status(login_url, proxy):
+    via = f" via {egress.label(proxy)}" if proxy else ""
+    try:
+        response = requests.get(login_url, timeout=PREFLIGHT_TIMEOUT_S or None, allow_redirects=True,
+                                proxies=egress.requests_proxies(proxy))
+    except requests.RequestException as e:
+        raise CheckFailed(f"{login_url}{via}: {type(e).__name__}: {e}")
+    # Cloudflare answers its challenge with 403/503: reachable, the browser
+    # handles the rest.
+    cloudflare = "cloudflare" in response.headers.get("Server", "").lower()
+    if response.status_code >= 500 and not cloudflare:
+        raise CheckFailed(f"{login_url}{via} answered HTTP {response.status_code}")
+    return f"HTTP {response.status_code}" + (" (Cloudflare)" if cloudflare else "") + via
+
+
+def check_portal():
+    """
+    Fetches the login page once through every egress the profiles use.
+    """
+    credentials = _load_json(CREDENTIALS_FILE)
+    try:
+        assigned = egress.assign([dict(user) for user in credentials.get("users", [])], credentials.get("proxies"))
+    except ValueError as e:
+        raise CheckFailed(f"{CREDENTIALS_FILE}: {e}")
+    proxies = list(dict.fromkeys(assigned.values())) or [None]
+    return ", ".join(_portal_status(credentials["login_url"], proxy) for proxy in proxies)
+
+
+def _google_inputs():
+    return [GOOGLE_API_ENDPOINT, file_state(_project_path(GOOGLE_SERVICE_ACCOUNT_KEY_FILE))]
+
+
+def _token_inputs():
+    return [GOOGLE_API_ENDPOINT, file_state(_project_path(GOOGLE_OAUTH_CLIENT_SECRET_FILE)),
+            file_state(TOKEN_PICKLE_FILE)]
+
+
+def default_checks(timeout_s=PREFLIGHT_TIMEOUT_S):
+    """
+    The pipeline's preflight checks. Local file checks are cheap and never
+    cached; the four network checks run concurrently once their local
+    requirements pass.
+    """
+    return [
+        Check("service_account_key", "service account key is valid JSON with client_email",
+              check_service_account_key, group="Local files"),
+        Check("oauth_client_secret", "OAuth client secret is valid JSON", check_oauth_client_secret,
+              group="Local files"),
+        Check("token_cache", "cached token exists (token.pickle)", check_token_cache, group="Local files"),
+        Check("app_script_id", "APP_SCRIPT_ID is configured (not placeholder)", check_app_script_id,
+              group="Local files"),
+        Check("ucam_credentials", "UCAM credentials file is valid", check_ucam_credentials, group="Local files"),
+        Check("spreadsheet", f"spreadsheet '{SPREADSHEET_NAME}' opens with service account", check_spreadsheet,
+              group="Google connection", requires=("service_account_key",), timeout_s=timeout_s,
+              inputs=lambda: _google_inputs() + [SPREADSHEET_NAME]),
+        Check("oauth_token", "OAuth token is valid (refreshed if expired)", check_oauth_token,
+              group="Google connection", requires=("oauth_client_secret", "token_cache"), timeout_s=timeout_s,
+              inputs=_token_inputs),
+        Check("apps_script", "Apps Script project is reachable", check_apps_script, group="Apps Script trigger",
+              requires=("oauth_token", "app_script_id"), timeout_s=timeout_s,
+              inputs=lambda: _token_inputs() + [APP_SCRIPT_ID]),
+        Check("portal", "UCAM portal login page is reachable", check_portal, group="UCAM portal",
+              requires=("ucam_credentials",), timeout_s=timeout_s,
+              inputs=lambda: [file_state(CREDENTIALS_FILE)]),
+    ]
+
+
+def pipeline_targets(scrape=True, publish=True):
+    """
+    Checks a pipeline run needs: the portal when it scrapes; the spreadsheet
+    when it publishes, plus Apps Script once it is configured and a token
+    has been cached (a first run authorizes interactively at publish time).
+    """
+    targets = []
+    if scrape:
+        targets.append("portal")
+    if publish:
+        targets.append("spreadsheet")
+        if APP_SCRIPT_ID and APP_SCRIPT_ID != PLACEHOLDER_ID and os.path.exists(TOKEN_PICKLE_FILE):
+            targets.append("apps_script")
+    return targets
+
+
+def log_results(results):
+    for result in results:
+        if result.ok:
+            logger.info("Preflight %s: %s%s", result.status, result.check.description,
+                        f" ({result.detail})" if result.detail else "")
+        else:
+            logger.error("Preflight %s: %s - %s", result.status, result.check.description,
+                         result.detail)
@@ -0,0 +1,189 @@
+"""
+Optional per-stage profiling for the scraper and formatter.
+
+Enable with PROFILE=true in .env or by passing --profile on the command line.
+Each stage wrapped in `stage(name)` then runs under cProfile (and tracemalloc
+when PROFILE_TRACEMALLOC is set), and its results are written into a
+timestamped run directory under PROFILE_DIR:
+
+    <stage>.pstats      cProfile stats, open with `python -m pstats` or snakeviz
+    <stage>.alloc.txt   top-N allocation sites by growth during the stage
+    summary.json        wall time per stage, in execution order
+
+When profiling is disabled `stage()` returns a shared null context, so the
+wrapped code pays for one attribute lookup and nothing else.
+"""
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import re
+import threading
+import time
+import tracemalloc
+
+from config import PROFILE, PROFILE_DIR, PROFILE_TRACEMALLOC, PROFILE_TOP_N
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SUMMARY_FILENAME = "summary.json"
+PROFILE_FLAG = "--profile"
+
+_NULL_STAGE = contextlib.nullcontext()
+_requested = PROFILE
+_active = None
+
+
+class Profiler:
+    """
+    Collects cProfile / tracemalloc results for named stages into run_dir.
+
+    Stages may nest; the outer stage's profiler is paused while an inner one
+    runs, so each .pstats file holds only the time spent in its own stage.
+    cProfile only sees the thread that enabled it, so each thread keeps its
+    own stage stack and stages on worker threads are profiled independently.
+    """
+
+    def __init__(self, run_dir, trace_memory=False, top_n=25):
+        self.run_dir = run_dir
+        self.trace_memory = trace_memory
+        self.top_n = top_n
+        self.stages = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._names = {}
+        os.makedirs(run_dir, exist_ok=True)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @property
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _unique_name(self, name):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "stage"
+        with self._lock:
+            count = self._names.get(slug, 0)
+            self._names[slug] = count + 1
+        return slug if count == 0 else f"{slug}.{count}"
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        slug = self._unique_name(name)
+        if self._stack and self._stack[-1] is not None:
+            self._stack[-1].disable()
+        profile = cProfile.Profile()
+        snapshot = tracemalloc.take_snapshot() if self.trace_memory else None
+        started = time.perf_counter()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active cProfile per process; a stage on
+            # another thread then only gets its wall time recorded.
+            profile = None
+        self._stack.append(profile)
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            elapsed = time.perf_counter() - started
+            self._stack.pop()
+            if self._stack and self._stack[-1] is not None:
+                self._stack[-1].enable()
+            self._write_stage(slug, name, profile, snapshot, elapsed)
+
+    def _write_stage(self, slug, name, profile, snapshot, elapsed):
+        record = {"stage": name, "wall_s": round(elapsed, 6)}
+        try:
+            if profile is not None:
+                record["file"] = f"{slug}.pstats"
+                profile.dump_stats(os.path.join(self.run_dir, record["file"]))
+            if snapshot is not None:
+                record["alloc_file"] = f"{slug}.alloc.txt"
+                self._write_allocations(os.path.join(self.run_dir, record["alloc_file"]), snapshot)
+        except Exception as e:
+            logger.warning("Could not write profile for stage '%s': %s", name, e)
+        with self._lock:
+            self.stages.append(record)
+        logger.debug("Profiled stage '%s' in %.3fs.", name, elapsed)
+
+    def _write_allocations(self, path, before):
+        after = tracemalloc.take_snapshot()
+        stats = after.compare_to(before, "lineno")[:self.top_n]
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"traced current={current / 1024:.1f} KiB peak={peak / 1024:.1f} KiB\n")
+            f.write(f"top {len(stats)} allocation sites by growth:\n")
+            for stat in stats:
+                f.write(f"{stat}\n")
+
+    def finish(self):
+        """
+        Writes summary.json and stops tracemalloc if this profiler started it.
+        """
+        path = os.path.join(self.run_dir, SUMMARY_FILENAME)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"stages": self.stages}, f, indent=4)
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        logger.info("Profiling results written to: %s", self.run_dir)
+
+
+def request_from_argv(argv):
+    """
+    Enables profiling when --profile is present in argv (the CLI switch).
+    """
+    global _requested
+    if PROFILE_FLAG in argv:
+        _requested = True
+
+
+def is_enabled():
+    return _active is not None
+
+
+def active():
+    """Returns the active Profiler, or None when profiling is off."""
+    return _active
+
+
+def stage(name):
+    """
+    Context manager that profiles a pipeline stage, or does nothing when
+    profiling is off.
+    """
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+
+def _new_run_dir(label):
+    base = PROFILE_DIR if os.path.isabs(PROFILE_DIR) else os.path.join(BASE_DIR, PROFILE_DIR)
+    return os.path.join(base, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}")
+
+
+@contextlib.contextmanager
+def session(label):
+    """
+    Starts a profiling run for an entry point when profiling was requested.
+
+    Usable as a decorator. Nested sessions (e.g. the formatter called from a
+    combined pipeline) join the already active run instead of starting one.
+    """
+    global _active
+    if _active is not None or not _requested:
+        yield _active
+        return
+    _active = Profiler(_new_run_dir(label), trace_memory=PROFILE_TRACEMALLOC, top_n=PROFILE_TOP_N)
+    logger.info("Profiling enabled. Run directory: %s", _active.run_dir)
+    try:
+        yield _active
+    finally:
+        profiler, _active = _active, None
+        profiler.finish()
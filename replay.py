@@ -0,0 +1,195 @@
+"""
+Record-and-replay bundles of what the portal returned on a real run.
+
+A bundle holds, per profile, the raw UpdatePanel HTML (or the course table
+rows when the run used structured extraction), the semester dropdown
+options, the chosen semester and the phase timings of the capture, plus the
+section merge settings and teacher details the run used (never credentials).
+Record one with `python pipeline.py --record DIR`; each run then adds
+DIR/<YYYYmmdd-HHMMSS>.json.gz.
+
+Replaying runs the browser-free half of the pipeline on a bundle:
+capture_entries -> build_final_routine -> build_sheet_data.
+
+Usage:
+    python replay.py BUNDLE_OR_DIR [...] [--repeat N] [--json]
+
+Exits 1 if any bundle cannot be loaded or replays to an empty routine.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+
+from config import setup_logging
+import routine_scrapper
+import gsheet_formatter
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT = "ucam-routine-bundle"
+BUNDLE_VERSION = 1
+BUNDLE_SUFFIXES = (".json", ".json.gz")
+CAPTURE_FIELDS = ("profile_id", "section_label", "semester", "semester_options", "html", "rows",
+                  "captured_at", "timings")
+
+
+def build_bundle(captures, users, teacher_details):
+    """
+    Builds a bundle from scrape captures (see routine_scrapper.capture_dashboard).
+
+    Args:
+        captures (list): Capture dicts, one per scraped profile.
+        users (list): Profile entries from the credentials file; only the
+            section merge settings are kept.
+        teacher_details (dict): Initials -> teacher info used by the merge.
+
+    Returns:
+        dict: The bundle.
+    """
+    primary, secondary = routine_scrapper.merge_sections(users)
+    return {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "primary_section": primary,
+        "secondary_section": secondary,
+        "teacher_details": teacher_details,
+        "profiles": [{field: capture.get(field) for field in CAPTURE_FIELDS} for capture in captures],
+    }
+
+
+def _open(path, mode, compressed=None):
+    if compressed is None:
+        compressed = path.endswith(".gz")
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_bundle(bundle, path):
+    """
+    Writes a bundle atomically (gzipped when `path` ends in .gz).
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with _open(tmp_path, "w", compressed=path.endswith(".gz")) as f:
+        json.dump(bundle, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    logger.info("Recorded replay bundle: %s", path)
+    return path
+
+
+def record_path(directory):
+    return os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}.json.gz")
+
+
+def load_bundle(path):
+    """
+    Reads a bundle, checking its format and version.
+
+    Raises:
+        ValueError: If the file is not a bundle or was written by a newer version.
+    """
+    with _open(path, "r") as f:
+        bundle = json.load(f)
+    if not isinstance(bundle, dict) or bundle.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"{path} is not a replay bundle.")
+    if bundle.get("version", 0) > BUNDLE_VERSION:
+        raise ValueError(f"{path} has bundle version {bundle['version']}; this code reads up to {BUNDLE_VERSION}.")
+    return bundle
+
+
+def iter_bundle_paths(paths):
+    """
+    Expands directories to the bundle files they contain, sorted by name.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(BUNDLE_SUFFIXES):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def replay_bundle(bundle):
+    """
+    Runs parse, merge and sheet-building on a bundle without a browser.
+
+    Returns:
+        dict: entries, routine, sheet_rows and timings (seconds per step).
+    """
+    timings = {}
+    started = time.perf_counter()
+    entries = []
+    for profile in bundle["profiles"]:
+        entries.extend(routine_scrapper.capture_entries(profile))
+    timings["parse_s"], started = time.perf_counter() - started, time.perf_counter()
+
+    routine = routine_scrapper.build_final_routine(
+        entries, bundle["primary_section"], bundle["secondary_section"], bundle.get("teacher_details") or {},
+    )
+    timings["merge_s"], started = time.perf_counter() - started, time.perf_counter()
+
+    sheet_rows = gsheet_formatter.build_sheet_data(routine) if routine else None
+    timings["sheet_s"] = time.perf_counter() - started
+    return {"entries": entries, "routine": routine, "sheet_rows": sheet_rows, "timings": timings}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Replay recorded portal bundles without a browser.")
+    parser.add_argument("paths", nargs="+", help="bundle files or directories of bundles")
+    parser.add_argument("--repeat", type=int, default=1, help="replay each bundle N times (for timing)")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per bundle")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    setup_logging()
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    failures = 0
+    count = 0
+    total_s = 0.0
+    for path in iter_bundle_paths(args.paths):
+        count += 1
+        try:
+            bundle = load_bundle(path)
+        except (OSError, ValueError) as e:
+            logger.error("Cannot load %s: %s", path, e)
+            failures += 1
+            continue
+        best = None
+        for _ in range(max(1, args.repeat)):
+            result = replay_bundle(bundle)
+            elapsed = sum(result["timings"].values())
+            if best is None or elapsed < best[0]:
+                best = (elapsed, result)
+        elapsed, result = best
+        total_s += elapsed
+        if not result["routine"]:
+            failures += 1
+        summary = {
+            "bundle": path,
+            "recorded_at": bundle.get("recorded_at"),
+            "entries": len(result["entries"]),
+            "routine_rows": len(result["routine"]),
+            "timings_ms": {k: round(v * 1000, 3) for k, v in result["timings"].items()},
+        }
+        if args.json:
+            print(json.dumps(summary))
+        else:
+            print("%-48s entries=%-4d rows=%-4d %s" % (
+                os.path.basename(path), summary["entries"], summary["routine_rows"],
+                " ".join(f"{k}={v:.2f}ms" for k, v in summary["timings_ms"].items())))
+    if not args.json:
+        print(f"Replayed {count} bundle(s) in {total_s * 1000:.1f} ms (best of {max(1, args.repeat)}); "
+              f"{failures} failed.")
+    return 1 if failures or not count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Memory accounting for the Python process and the browser process tree.
+
+A background thread samples resident set size (VmRSS) from /proc for this
+process and for every process descended from the attached driver (the
+chromedriver/geckodriver service and the browser it launched, including
+renderer and GPU children). Peaks are kept per named phase so a run report
+can show where memory went and how large a runner needs to be.
+
+With a memory ceiling configured, the monitor kills the browser process
+tree as soon as the combined RSS crosses it. The in-flight WebDriver command
+then fails in the scraper, which recycles the session with a fresh driver,
+instead of the kernel OOM killer taking down the whole run.
+
+/proc is Linux-only; elsewhere the monitor logs once and records nothing.
+"""
+import contextlib
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROC_DIR = "/proc"
+IDLE_PHASE = "idle"
+
+_NULL_PHASE = contextlib.nullcontext()
+_active = None
+
+
+def proc_available():
+    return os.path.isdir(os.path.join(PROC_DIR, "self"))
+
+
+def read_rss_kb(pid):
+    """
+    Returns the resident set size of `pid` in KiB, or 0 if it has exited.
+    """
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "status"), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _parent_map():
+    """
+    Maps pid -> ppid for every process visible in /proc.
+    """
+    parents = {}
+    try:
+        entries = os.listdir(PROC_DIR)
+    except OSError:
+        return parents
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join(PROC_DIR, entry, "stat"), "r", encoding="utf-8") as f:
+                stat = f.read()
+            # comm (field 2) may contain spaces/parens; ppid follows the last ')'
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        parents[int(entry)] = ppid
+    return parents
+
+
+def process_tree(root_pids):
+    """
+    Returns the set of root pids that still exist plus all their descendants.
+    """
+    parents = _parent_map()
+    children = {}
+    for pid, ppid in parents.items():
+        children.setdefault(ppid, []).append(pid)
+    tree = set()
+    pending = [pid for pid in root_pids if pid in parents]
+    while pending:
+        pid = pending.pop()
+        if pid in tree:
+            continue
+        tree.add(pid)
+        pending.extend(children.get(pid, ()))
+    return tree
+
+
+def driver_root_pids(driver):
+    """
+    Pids owned by a WebDriver session: the driver service process and, for
+    undetected-chromedriver (which launches Chrome itself), the browser.
+    """
+    pids = []
+    service = getattr(driver, "service", None)
+    process = getattr(service, "process", None)
+    if getattr(process, "pid", None):
+        pids.append(process.pid)
+    browser_pid = getattr(driver, "browser_pid", None)
+    if browser_pid:
+        pids.append(browser_pid)
+    return pids
+
+
+def kill_process_tree(root_pids):
+    """
+    SIGKILLs every process in the tree under `root_pids`, children first.
+    Returns the number of processes signalled.
+    """
+    pids = process_tree(root_pids)
+    killed = 0
+    for pid in sorted(pids, reverse=True):
+        if pid == os.getpid():
+            continue
+        try:
+            os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            killed += 1
+        except OSError:
+            pass
+    return killed
+
+
+class ResourceMonitor:
+    """
+    Samples RSS on a background thread and tracks peaks per phase.
+
+    Args:
+        interval_s (float): Sampling period.
+        ceiling_mb (int): Combined Python + browser RSS limit; 0 disables it.
+    """
+
+    def __init__(self, interval_s=0.5, ceiling_mb=0):
+        self.interval_s = interval_s
+        self.ceiling_kb = int(ceiling_mb) * 1024
+        self.peaks = {}
+        self.ceiling_hits = []
+        self._phase = IDLE_PHASE
+        self._roots = []
+        self._label = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not proc_available():
+            logger.info("Resource monitor disabled: /proc is not available on this platform.")
+            return self
+        self._thread = threading.Thread(target=self._run, name="resource-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval_s * 4)
+        self.sample()
+
+    def attach(self, driver, label):
+        """
+        Starts accounting the process tree of `driver` (None to detach).
+        """
+        with self._lock:
+            self._roots = driver_root_pids(driver) if driver is not None else []
+            self._label = label
+
+    def browser_pids(self):
+        with self._lock:
+            roots = list(self._roots)
+        return process_tree(roots) if roots else set()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        with self._lock:
+            previous, self._phase = self._phase, name
+        try:
+            yield
+        finally:
+            self.sample()
+            with self._lock:
+                self._phase = previous
+
+    def exceeded(self, label):
+        """
+        True if the ceiling was hit while `label`'s browser was attached.
+        """
+        return any(hit["profile"] == label for hit in self.ceiling_hits)
+
+    def sample(self):
+        python_kb = read_rss_kb(os.getpid())
+        browser_tree = self.browser_pids()
+        browser_kb = sum(read_rss_kb(pid) for pid in browser_tree)
+        total_kb = python_kb + browser_kb
+        with self._lock:
+            peak = self.peaks.setdefault(self._phase, {
+                "python_peak_kb": 0, "browser_peak_kb": 0, "total_peak_kb": 0,
+                "browser_processes_peak": 0,
+            })
+            peak["python_peak_kb"] = max(peak["python_peak_kb"], python_kb)
+            peak["browser_peak_kb"] = max(peak["browser_peak_kb"], browser_kb)
+            peak["total_peak_kb"] = max(peak["total_peak_kb"], total_kb)
+            peak["browser_processes_peak"] = max(peak["browser_processes_peak"], len(browser_tree))
+            label, roots, phase = self._label, list(self._roots), self._phase
+        if self.ceiling_kb and roots and total_kb > self.ceiling_kb:
+            self._enforce_ceiling(label, roots, phase, total_kb)
+        return total_kb
+
+    def _enforce_ceiling(self, label, roots, phase, total_kb):
+        logger.warning(
+            "Memory ceiling exceeded for %s during '%s' (%.0f MiB > %.0f MiB). Recycling browser.",
+            label, phase, total_kb / 1024, self.ceiling_kb / 1024,
+        )
+        killed = kill_process_tree(roots)
+        with self._lock:
+            self.ceiling_hits.append({"profile": label, "phase": phase, "total_kb": total_kb,
+                                      "killed_processes": killed, "at": time.time()})
+            self._roots = []
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Resource sampling failed.")
+
+    def report(self):
+        overall = {key: 0 for key in ("python_peak_kb", "browser_peak_kb", "total_peak_kb")}
+        with self._lock:
+            peaks = {phase: dict(values) for phase, values in self.peaks.items()}
+            hits = list(self.ceiling_hits)
+        for values in peaks.values():
+            for key in overall:
+                overall[key] = max(overall[key], values[key])
+        return {"ceiling_mb": self.ceiling_kb // 1024, "overall": overall,
+                "phases": peaks, "ceiling_hits": hits}
+
+    def write_report(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        report = self.report()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        overall = report["overall"]
+        logger.info(
+            "Peak memory: python %.0f MiB, browser tree %.0f MiB, combined %.0f MiB (report: %s)",
+            overall["python_peak_kb"] / 1024, overall["browser_peak_kb"] / 1024,
+            overall["total_peak_kb"] / 1024, path,
+        )
+        return path
+
+
+def start(interval_s=0.5, ceiling_mb=0):
+    """
+    Starts the process-wide monitor used by `phase()`.
+    """
+    global _active
+    _active = ResourceMonitor(interval_s=interval_s, ceiling_mb=ceiling_mb).start()
+    return _active
+
+
+def stop():
+    """
+    Stops the process-wide monitor and returns it (or None if none ran).
+    """
+    global _active
+    monitor, _active = _active, None
+    if monitor is not None:
+        monitor.stop()
+    return monitor
+
+
+def active():
+    return _active
+
+
+def phase(name):
+    """
+    Attributes samples to `name` while active; no-op without a monitor.
+    """
+    if _active is None:
+        return _NULL_PHASE
+    return _active.phase(name)
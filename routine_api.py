@@ -0,0 +1,414 @@
+"""
+Local read-only HTTP API over the latest final routine.
+
+Bots, kiosks and scripts can query the routine here instead of reading the
+Google Sheet. The final routine JSON is loaded into an immutable snapshot:
+
+    - positional indexes by section, day, teacher and room (case-insensitive;
+      N/A/TBA rooms and teachers are not indexed),
+    - per-day timelines (sorted start-minute arrays) for the whole routine
+      and for every section, teacher and room, so "next class" is a bisect,
+    - a cache of encoded responses, so a repeated query is a dict lookup.
+
+A watcher thread stats the file every API_RELOAD_INTERVAL_S seconds; when a
+pipeline run rewrites it (atomically), a new snapshot is built off to the
+side and swapped in with a single reference assignment. Requests already
+running finish on the snapshot they started with. A file that cannot be
+parsed is ignored and the previous snapshot keeps serving.
+
+Every response except /next carries the snapshot's ETag and honours
+If-None-Match with 304 Not Modified.
+
+Endpoints (GET, JSON):
+    /health                                   entries, etag, loaded_at, source
+    /routine?section=&day=&teacher=&room=     matching entries (filters AND)
+    /sections  /days  /teachers  /rooms       values with entry counts
+    /next?[section=|teacher=|room=][&day=SUN&time=10:30]
+                                              classes running now and the
+                                              next one (default: local now)
+
+Usage:
+    python routine_api.py [--routine PATH] [--host HOST] [--port PORT] [-v]
+"""
+import argparse
+import bisect
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from config import API_HOST, API_PORT, API_ROUTINE_FILE, API_RELOAD_INTERVAL_S, setup_logging
+import routine_index
+
+logger = logging.getLogger(__name__)
+
+# datetime.weekday() -> portal day.
+WEEKDAYS = ("MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN")
+# Query parameter -> routine field.
+INDEXED_FIELDS = {"section": "Section", "day": "Day", "teacher": "Teacher", "room": "Room"}
+LISTINGS = {"/sections": "section", "/days": "day", "/teachers": "teacher", "/rooms": "room"}
+TIMELINE_FIELDS = ("section", "teacher", "room")
+# Encoded responses kept per snapshot before the cache is cleared.
+RESPONSE_CACHE_LIMIT = 1024
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def normalize(param, value):
+    """
+    Index key for a query/field value: day prefixes ("Sunday" -> "SUN"),
+    otherwise whitespace-collapsed and case-folded.
+    """
+    value = " ".join(str(value or "").split())
+    if param == "day":
+        return value[:3].upper()
+    return value.casefold()
+
+
+def _encode(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def routine_etag(routine):
+    return '"%s"' % hashlib.sha256(_encode(routine)).hexdigest()[:32]
+
+
+class RoutineSnapshot:
+    """
+    Immutable in-memory indexes over one version of the routine.
+
+    Args:
+        routine (list): Final routine entries.
+        source (str): File the routine was loaded from.
+    """
+
+    def __init__(self, routine, source=None):
+        self.source = source
+        self.loaded_at = time.time()
+        self.etag = routine_etag(routine)
+        slots = [routine_index.parse_time_slot(entry.get("TimeSlot")) for entry in routine]
+        order = sorted(range(len(routine)), key=lambda i: (
+            routine_index.day_rank(normalize("day", routine[i].get("Day"))), slots[i] is None, slots[i] or (0, 0),
+            routine[i].get("CourseCode") or ""))
+        self.entries = tuple(routine[i] for i in order)
+        self.slots = tuple(slots[i] for i in order)
+
+        # param -> key -> [positions in self.entries]; key -> first seen label.
+        self.indexes = {param: defaultdict(list) for param in INDEXED_FIELDS}
+        self.labels = {param: {} for param in INDEXED_FIELDS}
+        # (param, key) -> day -> ([start minutes], [(start, end, position)]);
+        # (None, None) is the whole routine.
+        self.timelines = defaultdict(lambda: defaultdict(list))
+        for position, entry in enumerate(self.entries):
+            keys = [(None, None)]
+            for param, field in INDEXED_FIELDS.items():
+                label = " ".join(str(entry.get(field) or "").split())
+                if not label or label.upper() in routine_index.PLACEHOLDERS:
+                    continue
+                key = normalize(param, label)
+                self.indexes[param][key].append(position)
+                self.labels[param].setdefault(key, label if param != "day" else key)
+                if param in TIMELINE_FIELDS:
+                    keys.append((param, key))
+            day, slot = normalize("day", entry.get("Day")), self.slots[position]
+            if slot is None or day not in routine_index.DAY_ORDER:
+                continue
+            for key in keys:
+                self.timelines[key][day].append((slot[0], slot[1], position))
+        for days in self.timelines.values():
+            for day, items in days.items():
+                items.sort()
+                days[day] = ([start for start, _, _ in items], items)
+        self.indexes = {param: dict(index) for param, index in self.indexes.items()}
+        self.timelines = {key: dict(days) for key, days in self.timelines.items()}
+        self._responses = {}
+        self._responses_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def select(self, filters):
+        """
+        Entries matching every {param: value} filter, in week order.
+        """
+        positions = None
+        for param, value in sorted(filters.items(), key=lambda item: item[0]):
+            if param not in INDEXED_FIELDS:
+                raise BadRequest(f"unknown filter {param!r}")
+            matched = self.indexes[param].get(normalize(param, value), [])
+            positions = set(matched) if positions is None else positions.intersection(matched)
+            if not positions:
+                return []
+        if positions is None:
+            return list(self.entries)
+        return [self.entries[position] for position in sorted(positions)]
+
+    def listing(self, param):
+        def order(item):
+            return (routine_index.day_rank(item[0]), item[0]) if param == "day" else item[0]
+        return [{"name": self.labels[param][key], "count": len(positions)}
+                for key, positions in sorted(self.indexes[param].items(), key=order)]
+
+    def next_class(self, day, minute, param=None, value=None):
+        """
+        Classes running on `day` at `minute` and the next class to start,
+        searching up to a week ahead.
+
+        Returns:
+            dict: "ongoing" entries, "next" entry (or None), its "day" and
+            "starts_in_min".
+        """
+        key = (param, normalize(param, value)) if param else (None, None)
+        days = self.timelines.get(key, {})
+        today = routine_index.DAY_ORDER.index(day)
+        result = {"ongoing": [], "next": None, "day": None, "starts_in_min": None}
+        if day in days:
+            starts, items = days[day]
+            upcoming = bisect.bisect_right(starts, minute)
+            result["ongoing"] = [self.entries[p] for start, end, p in items[:upcoming] if end > minute]
+        for ahead in range(8):
+            candidate = routine_index.DAY_ORDER[(today + ahead) % 7]
+            if candidate not in days:
+                continue
+            starts, items = days[candidate]
+            first = bisect.bisect_right(starts, minute) if ahead == 0 else 0
+            if first < len(items):
+                start, _, position = items[first]
+                result.update(next=self.entries[position], day=candidate,
+                              starts_in_min=ahead * 24 * 60 + start - minute)
+                break
+        return result
+
+    def cached_response(self, key, build):
+        """
+        Encoded response body for `key`, built once per snapshot.
+        """
+        body = self._responses.get(key)
+        if body is None:
+            body = _encode(build())
+            with self._responses_lock:
+                if len(self._responses) >= RESPONSE_CACHE_LIMIT:
+                    self._responses.clear()
+                self._responses[key] = body
+        return body
+
+
+class RoutineStore:
+    """
+    The current snapshot of a routine file, rebuilt when the file changes.
+
+    Args:
+        path (str): Final routine JSON file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """
+        Swaps in a new snapshot if the file changed; returns True if it did.
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return False
+            stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            if stamp == self._stamp:
+                return False
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    routine = json.load(f)
+                if not isinstance(routine, list):
+                    raise ValueError("expected a JSON list of entries")
+            except (OSError, ValueError) as e:
+                logger.warning("Keeping the previous routine; cannot load %s: %s", self.path, e)
+                return False
+            self._stamp = stamp
+            if self.snapshot is not None and self.snapshot.etag == routine_etag(routine):
+                return False
+            started = time.perf_counter()
+            snapshot = RoutineSnapshot(routine, self.path)
+            self.snapshot = snapshot
+            logger.info("Loaded %d routine entries from %s in %.1f ms (etag %s).", len(snapshot), self.path,
+                        (time.perf_counter() - started) * 1000, snapshot.etag)
+            return True
+
+    def watch(self, interval_s, stop):
+        """
+        Reloads every `interval_s` seconds until the `stop` event is set.
+        """
+        while not stop.wait(interval_s):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error("Routine reload failed: %s", e)
+
+
+def parse_moment(query, now=None):
+    """
+    (portal day, minutes after midnight) from ?day=&time=, defaulting to now.
+    """
+    now = now or datetime.datetime.now()
+    day = normalize("day", query["day"]) if "day" in query else WEEKDAYS[now.weekday()]
+    if day not in routine_index.DAY_ORDER:
+        raise BadRequest(f"unknown day {query['day']!r}")
+    if "time" in query:
+        minute = routine_index.parse_clock(query["time"])
+        if minute is None:
+            raise BadRequest(f"cannot parse time {query['time']!r}")
+    else:
+        minute = now.hour * 60 + now.minute
+    return day, minute
+
+
+class RoutineApiHandler(BaseHTTPRequestHandler):
+    server_version = "RoutineAPI/1.0"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _send(self, status, body=b"", etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        else:
+            self.send_header("Cache-Control", "no-store")
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, _encode({"error": {"code": status, "message": message}}))
+
+    def _not_modified(self, etag):
+        header = self.headers.get("If-None-Match")
+        if not header:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+        return "*" in tags or etag in tags
+
+    def do_GET(self):
+        snapshot = self.server.store.snapshot
+        url = urlsplit(self.path)
+        path = unquote(url.path).rstrip("/") or "/health"
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if snapshot is None:
+            self._error(503, "no routine loaded yet")
+            return
+        try:
+            if path == "/next":
+                self._send(200, _encode(self._next(snapshot, query)))
+                return
+            build = self._route(snapshot, path, query)
+        except BadRequest as e:
+            self._error(400, str(e))
+            return
+        if build is None:
+            self._error(404, f"unknown endpoint {path}")
+            return
+        if self._not_modified(snapshot.etag):
+            self._send(304, etag=snapshot.etag)
+            return
+        body = snapshot.cached_response((path, tuple(sorted(query.items()))), build)
+        self._send(200, body, etag=snapshot.etag)
+
+    def _route(self, snapshot, path, query):
+        if path == "/health":
+            return lambda: {
+                "status": "ok", "entries": len(snapshot), "etag": snapshot.etag, "source": snapshot.source,
+                "loaded_at": datetime.datetime.fromtimestamp(snapshot.loaded_at).isoformat(timespec="seconds"),
+            }
+        if path == "/routine":
+            unknown = sorted(set(query) - set(INDEXED_FIELDS))
+            if unknown:
+                raise BadRequest(f"unknown filter(s): {', '.join(unknown)}")
+
+            def build():
+                entries = snapshot.select(query)
+                return {"count": len(entries), "entries": entries}
+            return build
+        if path in LISTINGS:
+            if query:
+                raise BadRequest(f"{path} takes no parameters")
+            return lambda: {"items": snapshot.listing(LISTINGS[path])}
+        return None
+
+    def _next(self, snapshot, query):
+        targets = [param for param in TIMELINE_FIELDS if param in query]
+        unknown = set(query) - set(TIMELINE_FIELDS) - {"day", "time"}
+        if unknown or len(targets) > 1:
+            raise BadRequest("/next takes one of section=, teacher=, room= plus optional day= and time=")
+        day, minute = parse_moment(query)
+        param = targets[0] if targets else None
+        result = snapshot.next_class(day, minute, param, query.get(param))
+        result["at"] = {"day": day, "time": routine_index.format_minutes(minute)}
+        return result
+
+
+def make_server(store, host=API_HOST, port=API_PORT, verbose=False):
+    """
+    Creates (but does not start) the API server; port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), RoutineApiHandler)
+    server.daemon_threads = True
+    server.store = store
+    server.verbose = verbose
+    return server
+
+
+def base_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Serve the final routine as a local JSON API.")
+    parser.add_argument("--routine", default=API_ROUTINE_FILE or routine_index.DEFAULT_ROUTINE_JSON,
+                        help="final routine JSON file (reloaded when it changes)")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    setup_logging()
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    store = RoutineStore(args.routine)
+    if not store.reload():
+        logger.warning("No routine at %s yet; answering 503 until a run writes it.", args.routine)
+    stop = threading.Event()
+    threading.Thread(target=store.watch, args=(API_RELOAD_INTERVAL_S, stop), name="routine-watch",
+                     daemon=True).start()
+    server = make_server(store, args.host, args.port, args.verbose)
+    logger.info("Routine API listening on %s", base_url(server))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
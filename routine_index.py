@@ -0,0 +1,292 @@
+"""
+Interval index over a routine, for clash and room-occupancy checks.
+
+Every routine entry's TimeSlot ("11:0 - 12:15", "2:30 PM - 4:00 PM") is
+normalized to start/end minutes after midnight with the same AM/PM inference
+as apps_script/Code.gs: an explicit AM/PM wins, otherwise hours 7-11 are AM
+and everything else is PM. Entries are then bucketed per day, per
+(day, room) and per (day, teacher), each bucket sorted by start time.
+
+Building the index is O(n log n). Clash detection sweeps each bucket once
+(O(n log n) plus the clashes reported), and a free-room query bisects the
+day's bucket (O(log n) plus the classes overlapping the window).
+
+Usage:
+    python routine_index.py [ROUTINE_JSON] [--by-section]
+    python routine_index.py [ROUTINE_JSON] --free DAY START-END
+
+Exits 1 if any clash is found (without --free).
+"""
+import argparse
+import bisect
+import json
+import logging
+import os
+import re
+import sys
+from collections import defaultdict
+
+from config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROUTINE_JSON = os.path.join(BASE_DIR, "output_of_fetched_routine", "final_combined_routine.json")
+
+RE_CLOCK = re.compile(r"^(\d{1,2}):(\d{1,2})(?:\s*(AM|PM))?", re.IGNORECASE)
+RE_SLOT_SEPARATOR = re.compile(r"\s*-\s*")
+# Room/teacher values that mean "unknown" and never clash with each other.
+PLACEHOLDERS = {"", "N/A", "TBA"}
+# Portal week order.
+DAY_ORDER = ("SAT", "SUN", "MON", "TUE", "WED", "THU", "FRI")
+CLASH_KINDS = ("timetable", "room", "teacher")
+
+
+def parse_clock(text):
+    """
+    Minutes after midnight for "H:M" with optional AM/PM, or None.
+    """
+    match = RE_CLOCK.match(text.strip())
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2))
+    period = match.group(3).upper() if match.group(3) else ("AM" if 7 <= hour <= 11 else "PM")
+    if period == "PM" and hour < 12:
+        hour += 12
+    if period == "AM" and hour == 12:
+        hour = 0
+    return hour * 60 + minute
+
+
+def parse_time_slot(slot):
+    """
+    (start, end) minutes for a TimeSlot string, or None when it has no end
+    time, cannot be parsed, or ends before it starts.
+    """
+    if not slot or not slot.strip():
+        return None
+    parts = RE_SLOT_SEPARATOR.split(slot.strip())
+    if len(parts) < 2:
+        return None
+    start, end = parse_clock(parts[0]), parse_clock(parts[1])
+    if start is None or end is None or end <= start:
+        return None
+    return start, end
+
+
+def format_minutes(minutes):
+    hour, minute = divmod(minutes, 60)
+    return f"{hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def day_rank(day):
+    """
+    Position of a day label ("Sun", "SUNDAY") in DAY_ORDER; unknown days last.
+    """
+    day = (day or "").strip()[:3].upper()
+    return DAY_ORDER.index(day) if day in DAY_ORDER else len(DAY_ORDER)
+
+
+def _day(entry):
+    return (entry.get("Day") or "").strip().upper()
+
+
+def _value(entry, field):
+    value = (entry.get(field) or "").strip()
+    return None if value.upper() in PLACEHOLDERS else value
+
+
+class IntervalIndex:
+    """
+    Intervals grouped by key, each group sorted by start.
+
+    Args:
+        items (iterable): (key, start, end, payload) tuples.
+    """
+
+    def __init__(self, items=()):
+        buckets = defaultdict(list)
+        for seq, (key, start, end, payload) in enumerate(items):
+            buckets[key].append((start, end, seq, payload))
+        self._buckets = {}
+        for key, intervals in buckets.items():
+            intervals.sort(key=lambda interval: (interval[0], interval[1], interval[2]))
+            self._buckets[key] = (
+                intervals,
+                [interval[0] for interval in intervals],
+                max(end - start for start, end, _, _ in intervals),
+            )
+
+    def keys(self):
+        return self._buckets.keys()
+
+    def __len__(self):
+        return sum(len(intervals) for intervals, _, _ in self._buckets.values())
+
+    def overlapping(self, key, start, end):
+        """
+        Payloads in `key`'s group whose interval overlaps [start, end).
+        """
+        if key not in self._buckets:
+            return []
+        intervals, starts, longest = self._buckets[key]
+        # Nothing starting at or before start - longest can still be running.
+        first = bisect.bisect_right(starts, start - longest)
+        last = bisect.bisect_left(starts, end)
+        return [payload for s, e, _, payload in intervals[first:last] if e > start]
+
+    def overlapping_pairs(self, key):
+        """
+        Yields every pair of overlapping payloads in `key`'s group, in start
+        order, with a single sweep.
+        """
+        active = []
+        for start, end, _, payload in self._buckets.get(key, ([], [], 0))[0]:
+            active = [(e, p) for e, p in active if e > start]
+            for _, other in active:
+                yield other, payload
+            active.append((end, payload))
+
+
+class RoutineIndex:
+    """
+    Day, room and teacher interval indexes over routine entries.
+
+    Args:
+        routine (list): Routine entries (FINAL_ROUTINE_FIELDNAMES dicts).
+        timetable_field (str): Entries sharing this field's value form one
+            timetable whose classes must not overlap. None (the default)
+            treats the whole routine as one student's timetable; use
+            "Section" when the routine holds every section of a department.
+    """
+
+    def __init__(self, routine, timetable_field=None):
+        self.timetable_field = timetable_field
+        self.unparsed = []
+        slots = []
+        for entry in routine:
+            interval = parse_time_slot(entry.get("TimeSlot"))
+            if interval is None or not _day(entry):
+                self.unparsed.append(entry)
+                continue
+            slots.append((entry, _day(entry), interval))
+
+        self.by_day = IntervalIndex((day, start, end, entry) for entry, day, (start, end) in slots)
+        self.by_timetable = IntervalIndex(
+            ((self._timetable(entry), day), start, end, entry) for entry, day, (start, end) in slots
+        )
+        self.by_room = IntervalIndex(
+            ((day, _value(entry, "Room")), start, end, entry)
+            for entry, day, (start, end) in slots if _value(entry, "Room")
+        )
+        self.by_teacher = IntervalIndex(
+            ((day, _value(entry, "Teacher")), start, end, entry)
+            for entry, day, (start, end) in slots if _value(entry, "Teacher")
+        )
+        self.rooms = sorted({room for _, room in self.by_room.keys()})
+
+    def _timetable(self, entry):
+        return (entry.get(self.timetable_field) or "") if self.timetable_field else ""
+
+    def clashes(self):
+        """
+        Overlapping class pairs.
+
+        Returns:
+            list: Dicts with kind ("timetable", "room" or "teacher"), day,
+            key (timetable, room or teacher) and the two entries, a and b.
+            A class taught to several sections together (same teacher, room
+            and time) is not reported as a room or teacher clash.
+        """
+        found = []
+        for kind, index in (("timetable", self.by_timetable), ("room", self.by_room), ("teacher", self.by_teacher)):
+            for key in sorted(index.keys()):
+                for a, b in index.overlapping_pairs(key):
+                    if kind != "timetable" and _combined_class(a, b):
+                        continue
+                    if kind == "timetable" and a.get("CourseCode") == b.get("CourseCode"):
+                        continue
+                    group, day = key if kind == "timetable" else (key[1], key[0])
+                    found.append({"kind": kind, "day": day, "key": group, "a": a, "b": b})
+        return found
+
+    def occupied(self, day, start, end):
+        """
+        Entries on `day` overlapping [start, end) minutes.
+        """
+        return self.by_day.overlapping(day.strip().upper(), start, end)
+
+    def free_rooms(self, day, start, end, rooms=None):
+        """
+        Rooms (default: every room in the routine) with no class on `day`
+        during [start, end) minutes.
+        """
+        busy = {_value(entry, "Room") for entry in self.occupied(day, start, end)}
+        return [room for room in (self.rooms if rooms is None else rooms) if room not in busy]
+
+
+def _combined_class(a, b):
+    return all(a.get(field) == b.get(field) for field in ("Room", "Teacher", "TimeSlot"))
+
+
+def describe_clash(clash):
+    a, b = clash["a"], clash["b"]
+    return (f"{clash['kind']} clash on {clash['day']} ({clash['key'] or 'routine'}): "
+            f"{a.get('CourseCode')} [{a.get('Section')}] {a.get('TimeSlot')} vs "
+            f"{b.get('CourseCode')} [{b.get('Section')}] {b.get('TimeSlot')}")
+
+
+def log_clashes(routine, timetable_field=None):
+    """
+    Logs a warning per clash in `routine` and returns the clashes.
+    """
+    index = RoutineIndex(routine, timetable_field)
+    found = index.clashes()
+    for clash in found:
+        logger.warning("Routine %s", describe_clash(clash))
+    if index.unparsed:
+        logger.debug("%d routine entries have no parseable day/time slot.", len(index.unparsed))
+    return found
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Check a routine for clashes or find free rooms.")
+    parser.add_argument("routine", nargs="?", default=DEFAULT_ROUTINE_JSON, help="routine JSON file")
+    parser.add_argument("--by-section", action="store_true",
+                        help="check each Section's timetable separately (department-wide routines)")
+    parser.add_argument("--free", nargs=2, metavar=("DAY", "START-END"),
+                        help='list rooms free on DAY during START-END, e.g. --free Sun "11:00 - 12:15"')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    setup_logging()
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        with open(args.routine, "r", encoding="utf-8") as f:
+            routine = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("Cannot read routine %s: %s", args.routine, e)
+        return 1
+
+    index = RoutineIndex(routine, "Section" if args.by_section else None)
+    if args.free:
+        day, window = args.free
+        interval = parse_time_slot(window)
+        if interval is None:
+            logger.error("Cannot parse time window %r.", window)
+            return 1
+        rooms = index.free_rooms(day, *interval)
+        print(f"Free on {day} {format_minutes(interval[0])} - {format_minutes(interval[1])}: "
+              f"{', '.join(rooms) if rooms else 'none'}")
+        return 0
+
+    found = index.clashes()
+    for clash in found:
+        print(describe_clash(clash))
+    print(f"{len(routine)} entries, {len(index.unparsed)} without a time slot, {len(found)} clash(es).")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Static HTML routine pages, one per section, for any static web server.
+
+Each page is a single self-contained file (inline CSS, no scripts, no
+external assets): the section's classes grouped by day in portal week order
+(Saturday first), sorted by start time, with the room, the teacher and
+their phone/email as tel:/mailto: links. An index.html links every section.
+
+PAGES_DIR/manifest.json keeps a hash of each page's entries; a page is only
+re-rendered when its section's entries changed (or the file went missing),
+and every file is written to a temporary file and renamed into place, so
+the server never sends a half-written page. Pages of sections that
+disappeared are removed.
+
+Usage:
+    python routine_pages.py [ROUTINE_JSON]
+"""
+import datetime
+import html
+import json
+import logging
+import os
+import re
+import sys
+from collections import defaultdict
+
+from config import PAGES_DIR, setup_logging
+from atomic_file import OutputDir, digest, unique_slugs
+import routine_index
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_FILENAME = "index.html"
+DAY_NAMES = {
+    "SAT": "Saturday", "SUN": "Sunday", "MON": "Monday", "TUE": "Tuesday",
+    "WED": "Wednesday", "THU": "Thursday", "FRI": "Friday",
+}
+
+STYLE = """
+body{font-family:system-ui,-apple-system,"Segoe UI",Roboto,sans-serif;margin:0 auto;max-width:960px;padding:1rem;
+color:#1f2328;background:#fff}
+h1{font-size:1.5rem;margin:0 0 .25rem}h2{font-size:1.1rem;margin:1.5rem 0 .5rem}
+p.meta{color:#59636e;margin:0 0 1rem;font-size:.9rem}
+table{border-collapse:collapse;width:100%}th,td{border-bottom:1px solid #d1d9e0;padding:.4rem .5rem;
+text-align:left;vertical-align:top}th{background:#f6f8fa;font-weight:600}
+td.time{white-space:nowrap}a{color:#0969da}ul{padding-left:1.25rem}
+@media (max-width:600px){th.room,td.room{display:none}}
+""".strip()
+
+
+def pages_dir():
+    return PAGES_DIR if os.path.isabs(PAGES_DIR) else os.path.join(BASE_DIR, PAGES_DIR)
+
+
+def sort_entries(entries):
+    """
+    Entries in week order, then by start time; unparseable slots last.
+    """
+    def key(entry):
+        interval = routine_index.parse_time_slot(entry.get("TimeSlot"))
+        return (routine_index.day_rank(entry.get("Day")), interval is None, interval or (0, 0),
+                entry.get("CourseCode") or "")
+    return sorted(entries, key=key)
+
+
+def group_by_section(routine):
+    sections = defaultdict(list)
+    for entry in routine:
+        if entry.get("Section"):
+            sections[entry["Section"]].append(entry)
+    return sections
+
+
+def _e(value):
+    return html.escape(str(value or ""), quote=True)
+
+
+def _time_label(entry):
+    interval = routine_index.parse_time_slot(entry.get("TimeSlot"))
+    if interval is None:
+        return _e(entry.get("TimeSlot") or "TBA")
+    return f"{routine_index.format_minutes(interval[0])} &ndash; {routine_index.format_minutes(interval[1])}"
+
+
+def _contact(entry):
+    links = []
+    if entry.get("TeacherPhone"):
+        phone = re.sub(r"[^\d+]", "", str(entry["TeacherPhone"]))
+        links.append(f'<a href="tel:{_e(phone)}">{_e(entry["TeacherPhone"])}</a>')
+    if entry.get("TeacherEmail"):
+        links.append(f'<a href="mailto:{_e(entry["TeacherEmail"])}">{_e(entry["TeacherEmail"])}</a>')
+    return "<br>".join(links)
+
+
+def _document(title, body, updated):
+    return (
+        "<!DOCTYPE html>\n"
+        '<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        f"<title>{_e(title)}</title>\n<style>{STYLE}</style>\n</head>\n<body>\n"
+        f"{body}"
+        f'<p class="meta">Updated {_e(updated)}</p>\n'
+        "</body>\n</html>\n"
+    )
+
+
+def render_section_page(section, entries, updated):
+    """
+    HTML of one section's routine page.
+    """
+    parts = [f"<h1>Class routine &middot; Section {_e(section)}</h1>\n",
+             f'<p class="meta">{len(entries)} class(es) per week</p>\n']
+    by_day = defaultdict(list)
+    for entry in sort_entries(entries):
+        by_day[(entry.get("Day") or "").strip()[:3].upper()].append(entry)
+    for day in sorted(by_day, key=routine_index.day_rank):
+        label = DAY_NAMES.get(day) or by_day[day][0].get("Day") or "Unscheduled"
+        parts.append(f"<h2>{_e(label)}</h2>\n<table>\n<thead><tr><th>Time</th><th>Course</th>"
+                     '<th class="room">Room</th><th>Teacher</th><th>Contact</th></tr></thead>\n<tbody>\n')
+        for entry in by_day[day]:
+            parts.append(
+                f'<tr><td class="time">{_time_label(entry)}</td>'
+                f"<td><strong>{_e(entry.get('CourseCode'))}</strong><br>{_e(entry.get('CourseTitle'))}</td>"
+                f'<td class="room">{_e(entry.get("Room") or "TBA")}</td>'
+                f"<td>{_e(entry.get('Teacher') or 'N/A')}</td><td>{_contact(entry)}</td></tr>\n"
+            )
+        parts.append("</tbody>\n</table>\n")
+    return _document(f"Section {section} routine", "".join(parts), updated)
+
+
+def render_index(pages, updated):
+    """
+    HTML of the index page; `pages` maps section label -> filename.
+    """
+    items = "".join(f'<li><a href="{_e(filename)}">Section {_e(section)}</a></li>\n'
+                    for section, filename in sorted(pages.items()))
+    return _document("Class routines", f"<h1>Class routines</h1>\n<ul>\n{items}</ul>\n", updated)
+
+
+def export_pages(routine, filename_tpl, out_dir=None):
+    """
+    Writes one page per section plus index.html, skipping pages whose
+    entries are unchanged since the last export.
+
+    Args:
+        routine (list): Final routine entries.
+        filename_tpl (str): Page filename template with a {section} field.
+        out_dir (str): Output directory (default: PAGES_DIR).
+
+    Returns:
+        dict: "written", "unchanged" and "removed" filename lists.
+    """
+    out_dir = out_dir or pages_dir()
+    output = OutputDir(out_dir)
+    updated = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    pages = {}
+    sections = group_by_section(routine)
+    slugs = unique_slugs(sections)
+    for section, entries in sorted(sections.items()):
+        filename = filename_tpl.format(section=slugs[section])
+        pages[section] = filename
+        output.write(filename, digest([section, entries]),
+                     lambda f: f.write(render_section_page(section, entries, updated)))
+    output.write(INDEX_FILENAME, digest(sorted(pages.items())), lambda f: f.write(render_index(pages, updated)))
+
+    result = output.finish()
+    logger.info("Routine pages in %s: %d written, %d unchanged, %d removed.", out_dir,
+                len(result["written"]), len(result["unchanged"]), len(result["removed"]))
+    return result
+
+
+def main(argv=None):
+    setup_logging()
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else routine_index.DEFAULT_ROUTINE_JSON
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            routine = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("Cannot read routine %s: %s", path, e)
+        return 1
+    from routine_scrapper import ATTENDANCE_DASHBOARD_HTML_FILENAME_TPL
+    export_pages(routine, ATTENDANCE_DASHBOARD_HTML_FILENAME_TPL)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
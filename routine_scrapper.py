@@ -1,22 +1,43 @@
+import contextlib
 import json
 import sys
 import time
 import subprocess
 import traceback
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import undetected_chromedriver as uc
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from bs4 import BeautifulSoup
 import os
 import csv
 import re
 import shutil
 
-from config import PREFERRED_BROWSER, HEADLESS, CHROME_BINARY_PATH, setup_logging
+from config import (
+    PREFERRED_BROWSER, DRIVER_BACKEND, HEADLESS, CHROME_BINARY_PATH, TRACE_WEBDRIVER,
+    MONITOR_RESOURCES, MEMORY_CEILING_MB, RESOURCE_SAMPLE_INTERVAL_S, SCRAPE_SEMESTERS, EXPORT_CALENDARS,
+    EXPORT_HTML_PAGES, EXPORT_ATTENDANCE_SUMMARY, STRUCTURED_EXTRACTION, SEMESTER_DIRECT_POSTBACK, POSTBACK_CAPTURE,
+    RUN_BUDGET_S, PROFILE_BUDGET_S, LOGIN_BUDGET_S, SEMESTER_BUDGET_S, DASHBOARD_BUDGET_S, DEADLINE_GRACE_S,
+    setup_logging,
+)
+import profiling
+import driver_trace
+import resource_monitor
+import debug_capture
+import routine_index
+import calendar_export
+import routine_pages
+import checkpoints
+import deadlines
+import cdp_driver
+import partial_postback
+import egress
+from atomic_file import atomic_open
 
 # Browser-specific imports
 from selenium.webdriver.firefox.service import Service as FirefoxService
@@ -35,6 +56,7 @@ TEACHER_DETAILS_FILE = 'configs_to_edit/teacher_contact_details.json'
 BASE_OUTPUT_DIR = os.path.dirname(os.path.abspath(__file__))
 FORMATTED_OUTPUT_DIR = os.path.join(BASE_OUTPUT_DIR, "output_of_fetched_routine")
 TMP_OUTPUT_DIR = os.path.join(BASE_OUTPUT_DIR, "tmp")
+SEMESTER_OUTPUT_DIR = os.path.join(FORMATTED_OUTPUT_DIR, "semesters")
 
 # Output Template Filenames
 ATTENDANCE_DASHBOARD_HTML_FILENAME_TPL = 'attendance_dashboard_{section}.html'
@@ -43,6 +65,24 @@ ATTENDANCE_DATA_JSON_FILENAME_TPL = 'dashboard_data_{section}.json'
 
 FINAL_ROUTINE_CSV_FILENAME = 'final_combined_routine.csv'
 FINAL_ROUTINE_JSON_FILENAME = 'final_combined_routine.json'
+RESOURCE_REPORT_FILENAME = 'resource_usage.json'
+SEMESTER_ROUTINE_FILENAME_TPL = 'final_combined_routine_{semester}.{ext}'
+ATTENDANCE_SUMMARY_FILENAME_TPL = 'attendance_summary.{ext}'
+SEMESTER_ATTENDANCE_SUMMARY_FILENAME_TPL = 'attendance_summary_{semester}.{ext}'
+
+# CLI: scrape these semesters instead of the current one (see wanted_semesters)
+SEMESTERS_FLAG = "--semesters"
+# CLI: rescrape every profile, ignoring checkpoints
+FORCE_FLAG = "--force"
+# CLI: merge even if a required section could not be scraped
+ALLOW_PARTIAL_FLAG = "--allow-partial"
+
+FINAL_ROUTINE_FIELDNAMES = [
+    "CourseCode", "CourseTitle", "Teacher", "TeacherPhone", "TeacherEmail", "Day", "Room", "TimeSlot", "Section",
+]
+ATTENDANCE_SUMMARY_FIELDNAMES = [
+    "Section", "CourseCode", "CourseTitle", "ClassesHeld", "ClassesAttended", "AttendancePercentage",
+]
 
 
 # [Data Loading Functions]
@@ -73,7 +113,16 @@ def load_credentials(file_path):
             if not all(key in user for key in required_user_keys):
                 logger.error("Missing required user keys for ID: %s", user.get('id'))
                 return None
-                
+
+        if not isinstance(credentials.get("proxies", []), list):
+            logger.error("'proxies' must be a list of proxy URLs.")
+            return None
+        try:
+            egress.assign(credentials["users"], credentials.get("proxies"))
+        except ValueError as e:
+            logger.error("Invalid egress configuration: %s", e)
+            return None
+
         return credentials
     except Exception as e:
         logger.error("Critical error loading credentials: %s", e)
@@ -114,62 +163,106 @@ RE_DAY = re.compile(r"Day\s*:\s*(.+)", re.IGNORECASE)
 RE_TIME = re.compile(r"Time\s*:\s*(.+)", re.IGNORECASE)
 RE_ROOM = re.compile(r"Room\s*:\s*(.+)", re.IGNORECASE)
 RE_TEACHER = re.compile(r"Teacher\s*:\s*(\S+)", re.IGNORECASE)
+RE_CLASSES_HELD = re.compile(r"Total Class(?:es)?\s*:\s*(\d+)", re.IGNORECASE)
+RE_CLASSES_ATTENDED = re.compile(r"(?:Present|Attended)\s*:\s*(\d+)", re.IGNORECASE)
+RE_ATTENDANCE_PERCENTAGE = re.compile(r"Percentage\s*:\s*([0-9.]+)", re.IGNORECASE)
 
 def _extract(pattern, text):
     match = pattern.search(text)
     return match.group(1).strip() if match else ""
 
-def parse_attendance_dashboard_data(html_content, user_section_label_tag):
+def _attended_from_percentage(held, percentage):
     """
-    Parses routine data from the UCAM attendance dashboard HTML.
+    Classes attended implied by the portal's counts: the dashboard shows
+    only "Total Class" and "Attendance Percentage", so the attended count is
+    held x percentage, rounded. "" when either is missing.
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
-    dashboard_entries = []
-
-    main_table = soup.find('table', id="ctl00_MainContainer_gvCourseList")
-    if not main_table:
-        logger.error("Data table not found for section %s.", user_section_label_tag)
-        return dashboard_entries
-
-    rows = main_table.find_all('tr')
-    if len(rows) < 2:
-        return dashboard_entries
-
-    for row in rows[1:]:
-        cells = row.find_all('td')
-        if len(cells) < 5:
-            continue
+    try:
+        return str(int(int(held) * float(percentage) / 100 + 0.5))
+    except ValueError:
+        return ""
 
-        entry = {"SL": cells[0].get_text(strip=True), "UserScrapedSection": user_section_label_tag}
+def entry_from_cells(cells, user_section_label_tag):
+    """
+    Builds one dashboard entry from a course row's cell texts (text nodes
+    joined by newlines). Returns None for rows with fewer than five cells.
+    """
+    if len(cells) < 5:
+        return None
 
-        course_info_raw = cells[1].get_text(separator='\n', strip=True)
-        entry["CourseCode"] = _extract(RE_COURSE_CODE, course_info_raw)
-        entry["CourseTitle"] = _extract(RE_TITLE, course_info_raw)
-        entry["Credit"] = _extract(RE_CREDIT, course_info_raw)
-        entry["CourseSection"] = _extract(RE_SECTION, course_info_raw)
+    entry = {"SL": cells[0].replace("\n", ""), "UserScrapedSection": user_section_label_tag}
+
+    course_info_raw = cells[1]
+    entry["CourseCode"] = _extract(RE_COURSE_CODE, course_info_raw)
+    entry["CourseTitle"] = _extract(RE_TITLE, course_info_raw)
+    entry["Credit"] = _extract(RE_CREDIT, course_info_raw)
+    entry["CourseSection"] = _extract(RE_SECTION, course_info_raw)
+
+    schedule_one_raw = cells[2]
+    entry["ScheduleOne_Day"] = _extract(RE_DAY, schedule_one_raw)
+    entry["ScheduleOne_Time"] = _extract(RE_TIME, schedule_one_raw)
+    entry["ScheduleOne_Room"] = _extract(RE_ROOM, schedule_one_raw)
+    entry["ScheduleOne_TeacherInitial"] = _extract(RE_TEACHER, schedule_one_raw)
+
+    schedule_two_raw = cells[3]
+    entry["ScheduleTwo_Day"] = _extract(RE_DAY, schedule_two_raw)
+    entry["ScheduleTwo_Time"] = _extract(RE_TIME, schedule_two_raw)
+    entry["ScheduleTwo_Room"] = _extract(RE_ROOM, schedule_two_raw)
+    entry["ScheduleTwo_TeacherInitial"] = _extract(RE_TEACHER, schedule_two_raw)
+
+    attendance_raw = cells[4]
+    entry["ClassesHeld"] = _extract(RE_CLASSES_HELD, attendance_raw)
+    entry["ClassesAttended"] = _extract(RE_CLASSES_ATTENDED, attendance_raw)
+    entry["AttendancePercentage"] = _extract(RE_ATTENDANCE_PERCENTAGE, attendance_raw)
+    if not entry["ClassesAttended"]:
+        entry["ClassesAttended"] = _attended_from_percentage(entry["ClassesHeld"], entry["AttendancePercentage"])
 
-        schedule_one_raw = cells[2].get_text(separator='\n', strip=True)
-        entry["ScheduleOne_Day"] = _extract(RE_DAY, schedule_one_raw)
-        entry["ScheduleOne_Time"] = _extract(RE_TIME, schedule_one_raw)
-        entry["ScheduleOne_Room"] = _extract(RE_ROOM, schedule_one_raw)
-        entry["ScheduleOne_TeacherInitial"] = _extract(RE_TEACHER, schedule_one_raw)
+    return entry
 
-        schedule_two_raw = cells[3].get_text(separator='\n', strip=True)
-        entry["ScheduleTwo_Day"] = _extract(RE_DAY, schedule_two_raw)
-        entry["ScheduleTwo_Time"] = _extract(RE_TIME, schedule_two_raw)
-        entry["ScheduleTwo_Room"] = _extract(RE_ROOM, schedule_two_raw)
-        entry["ScheduleTwo_TeacherInitial"] = _extract(RE_TEACHER, schedule_two_raw)
+def entries_from_rows(rows, user_section_label_tag):
+    """
+    Builds dashboard entries from course rows (lists of cell texts, header
+    row excluded), as returned by table_rows_from_html() or the in-browser
+    DASHBOARD_EXTRACT_SCRIPT.
+    """
+    dashboard_entries = []
+    for cells in rows:
+        entry = entry_from_cells(cells, user_section_label_tag)
+        if entry:
+            dashboard_entries.append(entry)
+    return dashboard_entries
 
-        dashboard_entries.append(entry)
+def table_rows_from_html(html_content):
+    """
+    Cell texts of the course table's data rows, or None when the table is
+    missing.
+    """
+    soup = BeautifulSoup(html_content, 'html.parser')
+    main_table = soup.find('table', id=COURSE_TABLE_ID)
+    if not main_table:
+        return None
+    return [
+        [cell.get_text(separator='\n', strip=True) for cell in row.find_all('td')]
+        for row in main_table.find_all('tr')[1:]
+    ]
 
-    return dashboard_entries
+def parse_attendance_dashboard_data(html_content, user_section_label_tag):
+    """
+    Parses routine data from the UCAM attendance dashboard HTML.
+    """
+    rows = table_rows_from_html(html_content)
+    if rows is None:
+        logger.error("Data table not found for section %s.", user_section_label_tag)
+        return []
+    return entries_from_rows(rows, user_section_label_tag)
 
 
 # [Persistence Functions]
 
 def save_data_to_file(data, output_dir, filename, file_type='csv', fieldnames=None):
     """
-    Persists data to disk in the specified format.
+    Persists data to disk in the specified format. Files are replaced
+    atomically, so readers (routine_api.py) never load a partial file.
     """
     if not data: return
     os.makedirs(output_dir, exist_ok=True)
@@ -184,7 +277,7 @@ def save_data_to_file(data, output_dir, filename, file_type='csv', fieldnames=No
             fieldnames = list(data[0].keys())
 
         try:
-            with open(output_file_path, 'w', newline='', encoding='utf-8') as f:
+            with atomic_open(output_file_path, newline='') as f:
                 writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
                 writer.writeheader()
                 writer.writerows(data)
@@ -194,7 +287,7 @@ def save_data_to_file(data, output_dir, filename, file_type='csv', fieldnames=No
             
     elif file_type == 'json':
         try:
-            with open(output_file_path, 'w', encoding='utf-8') as f:
+            with atomic_open(output_file_path) as f:
                 json.dump(data, f, indent=4, ensure_ascii=False)
             logger.info("Exported JSON: %s", output_file_path)
         except Exception as e:
@@ -254,13 +347,24 @@ def missing_teacher_initials(all_collected_data, teacher_details):
     return sorted(initial for initial in scraped if initial not in known)
 
 
+def merge_sections(users):
+    """
+    Returns (primary_section, secondary_section) for build_final_routine:
+    the first user's section, and the second user's (labs only) if present.
+    """
+    primary_section = users[0]["section_label"]
+    secondary_section = users[1]["section_label"] if len(users) > 1 else None
+    return primary_section, secondary_section
+
+
 def build_final_routine(all_collected_data, primary_section, secondary_section, teacher_details):
     """
     Merges per-section scraped data into the final deduplicated routine.
 
     The primary section keeps all courses; the secondary section contributes
     only lab courses (title contains "lab"). Entries are deduplicated by
-    (CourseCode, Day, TimeSlot, Section).
+    (CourseCode, Day, TimeSlot, Section), and overlapping classes are logged
+    as warnings (see routine_index).
     """
     missing = missing_teacher_initials(all_collected_data, teacher_details)
     if missing:
@@ -289,6 +393,7 @@ def build_final_routine(all_collected_data, primary_section, secondary_section,
             unique_routine.append(entry)
             seen.add(uid)
 
+    routine_index.log_clashes(unique_routine)
     return unique_routine
 
 
@@ -306,6 +411,9 @@ LOGIN_FIELD_WAIT_S = 10
 LOGIN_SUCCESS_WAIT_S = 45
 SEMESTER_WAIT_S = 20
 COURSE_TABLE_WAIT_S = 45
+# Every element lookup goes through an explicit, deadline-clamped wait; an
+# implicit wait would stretch each of their polls past the budget.
+IMPLICIT_WAIT_S = 0
 
 LOGIN_USERNAME_ID = "logMain_UserName"
 LOGIN_PASSWORD_ID = "logMain_Password"
@@ -317,6 +425,79 @@ COURSE_TABLE_ID = "ctl00_MainContainer_gvCourseList"
 
 CLOUDFLARE_TITLE_MARKERS = ("just a moment", "cloudflare", "attention required")
 
+# In-page extraction, one execute_script round trip each. Cell text mirrors
+# BeautifulSoup's get_text(separator='\n', strip=True): trimmed, non-empty
+# text nodes joined by newlines, so both paths feed entries_from_rows() alike.
+SEMESTER_OPTIONS_SCRIPT = """
+return Array.prototype.map.call(arguments[0].options, function (o) {
+    return {value: o.value, text: o.text};
+});
+"""
+DASHBOARD_EXTRACT_SCRIPT = """
+var panel = document.getElementById(arguments[0]);
+var table = document.getElementById(arguments[1]);
+if (!panel || !table || !panel.contains(table)) return null;
+function cellText(cell) {
+    var parts = [], walker = document.createTreeWalker(cell, NodeFilter.SHOW_TEXT), node;
+    while ((node = walker.nextNode())) {
+        var text = node.nodeValue.trim();
+        if (text) parts.push(text);
+    }
+    return parts.join('\\n');
+}
+var rows = Array.prototype.slice.call(table.querySelectorAll('tr'), 1).map(function (tr) {
+    return Array.prototype.map.call(tr.querySelectorAll('td'), cellText);
+});
+var select = document.getElementById(arguments[2]);
+var options = select ? Array.prototype.map.call(select.options, function (o) {
+    return {value: o.value, text: o.text};
+}) : null;
+return {rows: rows, options: options};
+"""
+# Selects a dropdown value and fires its change handler (the ASP.NET
+# AutoPostBack onchange, and select2's listener). Returns the panel's current
+# first child so the caller can wait for the async postback to replace it.
+SEMESTER_POSTBACK_SCRIPT = """
+var value = arguments[2];
+var select = document.getElementById(arguments[0]), panel = document.getElementById(arguments[1]);
+if (!select || !panel) return null;
+if (!Array.prototype.some.call(select.options, function (o) { return o.value === value; })) return null;
+var marker = panel.firstElementChild;
+select.value = value;
+select.dispatchEvent(new Event('change', {bubbles: true}));
+if (!select.getAttribute('onchange') && typeof window.__doPostBack === 'function') {
+    window.__doPostBack(select.name, '');
+}
+return {marker: marker};
+"""
+
+
+def wait_until(driver, timeout_s, condition, target=""):
+    """
+    WebDriverWait(driver, timeout_s).until(condition), recorded as a "wait"
+    span when the driver is traced. The timeout is cut to the time left in
+    the current budgets; running out of budget raises DeadlineExceeded.
+    """
+    budget_s = deadlines.clamp(timeout_s)
+    with driver_trace.span(driver, "wait", target):
+        try:
+            return WebDriverWait(driver, budget_s).until(condition)
+        except TimeoutException:
+            if budget_s < timeout_s:
+                raise deadlines.DeadlineExceeded(
+                    f"{deadlines.current().exhausted_by() or deadlines.current().name} budget exhausted "
+                    f"waiting for {target or 'condition'}") from None
+            raise
+
+
+def settle(driver, seconds, reason):
+    """
+    Fixed sleep that gives the page time to settle, visible in traces.
+    Never sleeps past the current budgets.
+    """
+    with driver_trace.span(driver, "sleep", reason, category="sleep"):
+        time.sleep(deadlines.clamp(seconds))
+
 
 def _is_cloudflare_blocked(page_title):
     lowered = (page_title or "").lower()
@@ -330,41 +511,53 @@ def masking_visit(driver, url=MASKING_URL, settle_s=MASKING_SETTLE_S):
     try:
         logger.info("Masking entry: Establishing context via Google...")
         driver.get(url)
-        time.sleep(settle_s)
+        settle(driver, settle_s, "masking settle")
     except Exception:
         logger.exception("Masking visit failed; continuing anyway.")
 
 
-def bypass_cloudflare_and_wait_for_login(driver, login_url, max_attempts=PORTAL_ACCESS_ATTEMPTS):
+def bypass_cloudflare_and_wait_for_login(driver, login_url, max_attempts=PORTAL_ACCESS_ATTEMPTS,
+                                         egress_label=egress.DIRECT):
     """
     Opens the login page, retrying until Cloudflare lets us through and the
     UCAM login fields render. Raises TimeoutException if blocked for good.
+    Attempts and challenge pages are counted for `egress_label`.
     """
-    for attempt in range(1, max_attempts + 1):
-        logger.info("Portal access attempt %d to: %s", attempt, login_url)
-        driver.get(login_url)
-
-        time.sleep(PORTAL_GET_SETTLE_S)
-        page_title = driver.title
-        logger.info("Current Page Title: '%s'", page_title)
-
-        if _is_cloudflare_blocked(page_title):
-            logger.info("Cloudflare block persisting. Refreshing session (Attempt %d)...", attempt)
-            time.sleep(CLOUDFLARE_COOLDOWN_S)
-            continue
+    attempts = challenges = 0
+    passed = False
+    try:
+        for attempt in range(1, max_attempts + 1):
+            deadlines.check(f"portal access attempt {attempt}")
+            logger.info("Portal access attempt %d to: %s", attempt, login_url)
+            attempts = attempt
+            driver.get(login_url)
+
+            settle(driver, PORTAL_GET_SETTLE_S, "portal settle")
+            page_title = driver.title
+            logger.info("Current Page Title: '%s'", page_title)
+
+            if _is_cloudflare_blocked(page_title):
+                challenges += 1
+                logger.info("Cloudflare block persisting. Refreshing session (Attempt %d)...", attempt)
+                settle(driver, CLOUDFLARE_COOLDOWN_S, "cloudflare cooldown")
+                continue
 
-        try:
-            WebDriverWait(driver, LOGIN_WAIT_S).until(
-                EC.presence_of_element_located((By.ID, LOGIN_USERNAME_ID))
-            )
-            logger.info("UCAM Login fields detected. Challenge likely bypassed.")
-            return
-        except TimeoutException:
-            if attempt == max_attempts:
-                logger.error("Critical: Failed to bypass Cloudflare after maximum retries.")
-                logger.error("Page Snippet: %s", driver.page_source[:500])
-                raise TimeoutException("Cloudflare challenge block.") from None
-            logger.info("Retrying portal access...")
+            try:
+                wait_until(driver, LOGIN_WAIT_S,
+                           EC.presence_of_element_located((By.ID, LOGIN_USERNAME_ID)),
+                           LOGIN_USERNAME_ID)
+                logger.info("UCAM Login fields detected. Challenge likely bypassed.")
+                passed = True
+                return
+            except TimeoutException:
+                if attempt == max_attempts:
+                    logger.error("Critical: Failed to bypass Cloudflare after maximum retries.")
+                    logger.error("Blocked page: '%s' at %s", page_title, driver.current_url)
+                    raise TimeoutException("Cloudflare challenge block.") from None
+                logger.info("Retrying portal access...")
+    finally:
+        if attempts:
+            egress.record_session(egress_label, attempts, challenges, passed)
 
 
 def authenticate(user_creds, driver):
@@ -372,113 +565,594 @@ def authenticate(user_creds, driver):
     Fills the UCAM login form and waits for the post-login element to appear.
     """
     logger.info("Authenticating with student credentials...")
-    user_field = WebDriverWait(driver, LOGIN_WAIT_S).until(
-        EC.element_to_be_clickable((By.ID, LOGIN_USERNAME_ID))
-    )
-    pass_field = WebDriverWait(driver, LOGIN_FIELD_WAIT_S).until(
-        EC.element_to_be_clickable((By.ID, LOGIN_PASSWORD_ID))
-    )
-    login_btn = WebDriverWait(driver, LOGIN_FIELD_WAIT_S).until(
-        EC.element_to_be_clickable((By.ID, LOGIN_BUTTON_ID))
-    )
+    user_field = wait_until(driver, LOGIN_WAIT_S,
+                            EC.element_to_be_clickable((By.ID, LOGIN_USERNAME_ID)),
+                            LOGIN_USERNAME_ID)
+    pass_field = wait_until(driver, LOGIN_FIELD_WAIT_S,
+                            EC.element_to_be_clickable((By.ID, LOGIN_PASSWORD_ID)),
+                            LOGIN_PASSWORD_ID)
+    login_btn = wait_until(driver, LOGIN_FIELD_WAIT_S,
+                           EC.element_to_be_clickable((By.ID, LOGIN_BUTTON_ID)),
+                           LOGIN_BUTTON_ID)
 
     user_field.send_keys(user_creds['username'])
     pass_field.send_keys(user_creds['password'])
     login_btn.click()
 
-    WebDriverWait(driver, LOGIN_SUCCESS_WAIT_S).until(
-        EC.presence_of_element_located((By.ID, LOGIN_SUCCESS_ID))
-    )
+    wait_until(driver, LOGIN_SUCCESS_WAIT_S,
+               EC.presence_of_element_located((By.ID, LOGIN_SUCCESS_ID)),
+               LOGIN_SUCCESS_ID)
     logger.info("User %s authenticated successfully.", user_creds['id'])
 
 
+def _valid_options(options):
+    return isinstance(options, list) and all(
+        isinstance(opt, dict) and {"value", "text"} <= set(opt) for opt in options
+    )
+
+
+def read_semester_options(select_element):
+    """
+    Returns the semester dropdown's options as [{"value": ..., "text": ...}],
+    in one script call when structured extraction is on, else (or if the
+    script fails) one WebDriver round trip per option.
+    """
+    if STRUCTURED_EXTRACTION:
+        try:
+            options = select_element.parent.execute_script(SEMESTER_OPTIONS_SCRIPT, select_element)
+            if _valid_options(options):
+                return options
+            logger.debug("Semester options script returned %r; reading options one by one.", options)
+        except Exception as e:
+            logger.debug("Semester options script failed (%s); reading options one by one.", e)
+    return [
+        {"value": opt.get_attribute("value"), "text": opt.text}
+        for opt in select_element.find_elements(By.TAG_NAME, "option")
+    ]
+
+
 def select_semester(driver, attendance_dashboard_url, section_label):
     """
     Navigates to the dashboard and selects the first non-placeholder semester
     through the select2 control. Returns the chosen semester label.
     """
-    driver.get(attendance_dashboard_url)
-    WebDriverWait(driver, COURSE_TABLE_WAIT_S).until(
-        EC.presence_of_element_located((By.ID, SEMESTER_DROPDOWN_ID))
-    )
+    return choose_semester(driver, attendance_dashboard_url, section_label)[0]
 
-    original_select = WebDriverWait(driver, SEMESTER_WAIT_S).until(
-        EC.presence_of_element_located((By.ID, SEMESTER_DROPDOWN_ID))
-    )
-    options = original_select.find_elements(By.TAG_NAME, "option")
+
+def choose_semester(driver, attendance_dashboard_url, section_label):
+    """
+    select_semester() that also returns the dropdown options it chose from.
+
+    Returns:
+        tuple: (semester label, list of option dicts)
+    """
+    return _choose_semester(driver, attendance_dashboard_url, section_label)[:2]
+
+
+def _choose_semester(driver, attendance_dashboard_url, section_label):
+    """
+    choose_semester() plus the panel HTML captured from the postback
+    response (None when it was not captured).
+    """
+    options = open_semester_dashboard(driver, attendance_dashboard_url)
     target_semester = next(
-        (opt.text for opt in options if opt.get_attribute("value") != "0"),
+        (opt["text"] for opt in options if opt["value"] != "0"),
         None,
     )
 
     if not target_semester:
         raise ValueError(f"No valid semester options found for section {section_label}.")
 
+    panel_html = pick_semester_option(driver, target_semester, options)
+    return target_semester, options, panel_html
+
+
+def open_semester_dashboard(driver, attendance_dashboard_url):
+    """
+    Loads the dashboard and returns its semester dropdown options.
+    """
+    with deadlines.phase("open_dashboard", SEMESTER_BUDGET_S):
+        driver.get(attendance_dashboard_url)
+        original_select = wait_until(driver, COURSE_TABLE_WAIT_S,
+                                     EC.presence_of_element_located((By.ID, SEMESTER_DROPDOWN_ID)),
+                                     SEMESTER_DROPDOWN_ID)
+        return read_semester_options(original_select)
+
+
+def xpath_literal(text):
+    """
+    Quotes `text` as an XPath 1.0 string literal, using concat() when it
+    contains both quote characters.
+    """
+    if '"' not in text:
+        return f'"{text}"'
+    if "'" not in text:
+        return f"'{text}'"
+    parts = text.split('"')
+    return "concat(" + ", '\"', ".join(f'"{part}"' for part in parts) + ")"
+
+
+def expect_postback(driver):
+    """
+    Arms a capture of the next partial-postback response when
+    POSTBACK_CAPTURE is on and the driver can read network events (the CDP
+    backend). Returns the waiter, or None.
+    """
+    if not POSTBACK_CAPTURE or not hasattr(driver, "expect_response"):
+        return None
+    try:
+        return driver.expect_response(partial_postback.is_delta_request)
+    except WebDriverException as e:
+        logger.debug("Postback capture unavailable (%s); waiting for the DOM.", e)
+        return None
+
+
+def captured_panel(driver, waiter):
+    """
+    The UpdatePanel's new HTML from the captured postback response, as soon
+    as the response has loaded.
+
+    Returns:
+        str: Panel HTML containing the course table, or None when nothing
+        usable was captured in time (the caller then waits for the DOM).
+    """
+    try:
+        with driver_trace.span(driver, "wait", "postback response"):
+            body = waiter.body(deadlines.clamp(COURSE_TABLE_WAIT_S))
+        html = partial_postback.panel_html(body, UPDATE_PANEL_ID)
+    except (WebDriverException, partial_postback.DeltaError) as e:
+        logger.warning("Postback response not captured (%s); waiting for the DOM.", e)
+        return None
+    if not html or COURSE_TABLE_ID not in html:
+        logger.warning("Postback response holds no course table; waiting for the DOM.")
+        return None
+    return html
+
+
+def postback_semester(driver, semester, options):
+    """
+    Sets the dropdown to `semester` and fires its ASP.NET postback in one
+    script call, then waits for the UpdatePanel content to be replaced, or,
+    with a postback capture (see expect_postback()), for the response.
+
+    Returns:
+        str or bool: The panel HTML when the response was captured, True
+        once the DOM refreshed, False when the fast path could not be used
+        or the panel never refreshed, so the caller can fall back to the
+        select2 clicks.
+    """
+    value = next((opt["value"] for opt in options if opt["text"] == semester), None)
+    if value is None:
+        return False
+    waiter = expect_postback(driver)
+    try:
+        result = driver.execute_script(SEMESTER_POSTBACK_SCRIPT, SEMESTER_DROPDOWN_ID, UPDATE_PANEL_ID, value)
+    except Exception as e:
+        logger.debug("Direct semester postback failed (%s); using select2.", e)
+        return False
+    if not isinstance(result, dict):
+        logger.debug("Direct semester postback returned %r; using select2.", result)
+        return False
+
+    if waiter is not None:
+        html = captured_panel(driver, waiter)
+        if html:
+            logger.info("Dashboard synchronized for semester: %s (captured postback).", semester)
+            return html
+
+    try:
+        if result.get("marker") is not None:
+            wait_until(driver, COURSE_TABLE_WAIT_S, EC.staleness_of(result["marker"]), "dashboard panel refresh")
+        else:
+            wait_for_course_table(driver)
+    except TimeoutException:
+        logger.warning("Dashboard panel did not refresh after direct postback for %s; using select2.", semester)
+        return False
+
+    logger.info("Dashboard synchronized for semester: %s (direct postback).", semester)
+    return True
+
+
+def pick_semester_option(driver, semester, options=None):
+    """
+    Selects `semester`, triggering the UpdatePanel postback: directly when
+    the dropdown options are known (see postback_semester()), otherwise or
+    on failure through the select2 control.
+
+    Returns:
+        str: The panel HTML captured from the postback response, or None
+        when the panel has to be read from the page.
+    """
+    with deadlines.phase("select_semester", SEMESTER_BUDGET_S):
+        return _pick_semester_option(driver, semester, options)
+
+
+def _pick_semester_option(driver, semester, options):
+    if options and SEMESTER_DIRECT_POSTBACK:
+        refreshed = postback_semester(driver, semester, options)
+        if refreshed:
+            return refreshed if isinstance(refreshed, str) else None
+
     s2_container = (
         f"//select[@id='{SEMESTER_DROPDOWN_ID}']/"
         f"following-sibling::span[contains(@class,'select2-container')]"
     )
-    WebDriverWait(driver, SEMESTER_WAIT_S).until(
-        EC.element_to_be_clickable((By.XPATH, s2_container))
-    ).click()
+    wait_until(driver, SEMESTER_WAIT_S,
+               EC.element_to_be_clickable((By.XPATH, s2_container)),
+               "select2 container").click()
+
+    s2_option = f"//span[contains(@class, 'select2-results')]//li[text()={xpath_literal(semester)}]"
+    wait_until(driver, SEMESTER_WAIT_S,
+               EC.element_to_be_clickable((By.XPATH, s2_option)),
+               f"select2 option {semester}").click()
+
+    logger.info("Dashboard synchronized for semester: %s.", semester)
+    settle(driver, SEMESTER_SELECT_SETTLE_S, "semester postback settle")
+    return None
+
 
-    s2_option = f"//span[contains(@class, 'select2-results')]//li[text()=\"{target_semester}\"]"
-    WebDriverWait(driver, SEMESTER_WAIT_S).until(
-        EC.element_to_be_clickable((By.XPATH, s2_option))
-    ).click()
+def wanted_semesters(options, setting):
+    """
+    Semester labels to scrape, in dropdown order.
+
+    Args:
+        options (list): Option dicts from read_semester_options().
+        setting (str): "" for the current (first) semester, "all", or a
+            comma-separated list of labels.
+    """
+    available = [opt["text"] for opt in options if opt["value"] != "0"]
+    setting = (setting or "").strip()
+    if not setting:
+        return available[:1]
+    if setting.lower() == "all":
+        return available
+    requested = [label.strip() for label in setting.split(",") if label.strip()]
+    missing = [label for label in requested if label not in available]
+    if missing:
+        logger.warning("Semesters not offered by the portal: %s", ", ".join(missing))
+    return [label for label in available if label in requested]
 
-    logger.info("Dashboard synchronized for semester: %s.", target_semester)
-    time.sleep(SEMESTER_SELECT_SETTLE_S)
-    return target_semester
+
+def wait_for_course_table(driver):
+    wait_until(driver, COURSE_TABLE_WAIT_S,
+               EC.presence_of_element_located(
+                   (By.XPATH, f"//div[@id='{UPDATE_PANEL_ID}']//table[@id='{COURSE_TABLE_ID}']")
+               ),
+               COURSE_TABLE_ID)
+
+
+def read_dashboard_html(driver):
+    """
+    Waits for the course list table and returns the dashboard panel's HTML.
+    """
+    wait_for_course_table(driver)
+    return driver.find_element(By.ID, UPDATE_PANEL_ID).get_attribute('innerHTML')
+
+
+def read_dashboard_structured(driver):
+    """
+    Waits for the course list table and extracts its rows (cell texts) and
+    the semester options with one execute_script call.
+
+    Returns:
+        dict: {"rows": [[cell text, ...], ...], "options": [...] or None},
+        or None when the script fails or returns something unexpected.
+    """
+    wait_for_course_table(driver)
+    try:
+        result = driver.execute_script(DASHBOARD_EXTRACT_SCRIPT, UPDATE_PANEL_ID, COURSE_TABLE_ID,
+                                       SEMESTER_DROPDOWN_ID)
+    except Exception as e:
+        logger.warning("Structured dashboard extraction failed (%s); falling back to HTML.", e)
+        return None
+    rows = result.get("rows") if isinstance(result, dict) else None
+    if not isinstance(rows, list) or not all(
+        isinstance(row, list) and all(isinstance(cell, str) for cell in row) for row in rows
+    ):
+        logger.warning("Structured dashboard extraction returned no course table; falling back to HTML.")
+        return None
+    options = result.get("options")
+    return {"rows": rows, "options": options if _valid_options(options) else None}
+
+
+def read_dashboard(driver, panel_html=None):
+    """
+    Reads the dashboard panel: structured rows when STRUCTURED_EXTRACTION is
+    on and the script works, else the panel HTML. `panel_html` captured from
+    the postback response is used as is, without touching the page.
+
+    Returns:
+        dict: html (None when rows were read), rows (None when HTML was read)
+        and the semester options seen by the script (or None).
+    """
+    if panel_html:
+        return {"html": panel_html, "rows": None, "options": None}
+    with deadlines.phase("read_dashboard", DASHBOARD_BUDGET_S):
+        if STRUCTURED_EXTRACTION:
+            structured = read_dashboard_structured(driver)
+            if structured is not None:
+                return {"html": None, "rows": structured["rows"], "options": structured["options"]}
+        return {"html": read_dashboard_html(driver), "rows": None, "options": None}
+
+
+def capture_entries(capture):
+    """
+    Parses a capture (see capture_dashboard) from its rows or its HTML.
+    """
+    if capture.get("rows") is not None:
+        return entries_from_rows(capture["rows"], capture["section_label"])
+    if capture.get("html"):
+        return parse_attendance_dashboard_data(capture["html"], capture["section_label"])
+    return []
+
+
+def process_dashboard_html(dashboard_html, section_label):
+    """
+    Parses dashboard panel HTML and persists the entries to per-section
+    CSV/JSON files. Returns the parsed entries.
+    """
+    if not dashboard_html:
+        return []
+    return save_dashboard_entries(parse_attendance_dashboard_data(dashboard_html, section_label), section_label)
+
+
+def save_dashboard_entries(user_dashboard_data, section_label):
+    """
+    Persists parsed entries to per-section CSV/JSON files and returns them.
+    """
+    if user_dashboard_data:
+        os.makedirs(TMP_OUTPUT_DIR, exist_ok=True)
+        dash_csv = ATTENDANCE_DATA_CSV_FILENAME_TPL.format(section=section_label)
+        dash_json = ATTENDANCE_DATA_JSON_FILENAME_TPL.format(section=section_label)
+        save_data_to_file(user_dashboard_data, TMP_OUTPUT_DIR, dash_csv, "csv")
+        save_data_to_file(user_dashboard_data, TMP_OUTPUT_DIR, dash_json, "json")
+    return user_dashboard_data
+
+
+def process_capture(capture):
+    """
+    process_dashboard_html() for a capture that may hold structured rows
+    instead of HTML.
+    """
+    if capture.get("rows") is not None:
+        return save_dashboard_entries(entries_from_rows(capture["rows"], capture["section_label"]),
+                                      capture["section_label"])
+    return process_dashboard_html(capture.get("html"), capture["section_label"])
 
 
 def extract_dashboard(driver, section_label):
     """
-    Reads the course list table HTML from the dashboard panel and persists the
+    Reads the course list table from the dashboard panel and persists the
     parsed entries to per-section CSV/JSON files.
     """
-    WebDriverWait(driver, COURSE_TABLE_WAIT_S).until(
-        EC.presence_of_element_located(
-            (By.XPATH, f"//div[@id='{UPDATE_PANEL_ID}']//table[@id='{COURSE_TABLE_ID}']")
-        )
-    )
+    return process_capture(dict(read_dashboard(driver), section_label=section_label))
 
-    dashboard_html = driver.find_element(By.ID, UPDATE_PANEL_ID).get_attribute('innerHTML')
-    user_dashboard_data = []
 
-    if dashboard_html:
-        os.makedirs(TMP_OUTPUT_DIR, exist_ok=True)
-        user_dashboard_data = parse_attendance_dashboard_data(dashboard_html, section_label)
+def login_profile(driver, user_creds, common_urls):
+    """
+    Masking visit, Cloudflare bypass and UCAM login for one profile.
+    """
+    with deadlines.phase("login", LOGIN_BUDGET_S):
+        masking_visit(driver)
 
-        if user_dashboard_data:
-            dash_csv = ATTENDANCE_DATA_CSV_FILENAME_TPL.format(section=section_label)
-            dash_json = ATTENDANCE_DATA_JSON_FILENAME_TPL.format(section=section_label)
-            save_data_to_file(user_dashboard_data, TMP_OUTPUT_DIR, dash_csv, "csv")
-            save_data_to_file(user_dashboard_data, TMP_OUTPUT_DIR, dash_json, "json")
+        try:
+            bypass_cloudflare_and_wait_for_login(driver, common_urls['login_url'],
+                                                 egress_label=egress.label(egress.for_profile(user_creds)))
+            authenticate(user_creds, driver)
+        except Exception as e:
+            logger.error("Authentication Failure: %s | URL: %s", type(e).__name__, driver.current_url)
+            raise
 
-    return user_dashboard_data
+
+def capture_dashboard(driver, user_creds, common_urls):
+    """
+    Logs in as a profile, selects the semester and captures the dashboard
+    table without parsing it: structured rows, or the raw panel HTML when
+    structured extraction is off or fails.
+
+    Returns:
+        dict: profile_id, section_label, semester, semester_options, html,
+        rows, captured_at and per-phase timings in seconds.
+    """
+    section_label = user_creds['section_label']
+    logger.info("--- Processing User Profile: %s (%s) ---", user_creds['id'], section_label)
+    timings = {}
+    started = time.perf_counter()
+
+    login_profile(driver, user_creds, common_urls)
+    timings["login_s"], started = round(time.perf_counter() - started, 3), time.perf_counter()
+
+    semester, options, panel_html = _choose_semester(driver, common_urls['attendance_dashboard_url'],
+                                                     section_label)
+    timings["select_semester_s"], started = round(time.perf_counter() - started, 3), time.perf_counter()
+
+    panel = read_dashboard(driver, panel_html)
+    timings["read_dashboard_s"] = round(time.perf_counter() - started, 3)
+    return {
+        "profile_id": user_creds['id'],
+        "section_label": section_label,
+        "semester": semester,
+        "semester_options": panel["options"] or options,
+        "html": panel["html"],
+        "rows": panel["rows"],
+        "captured_at": time.time(),
+        "timings": timings,
+    }
 
 
 def scrape_dashboard_for_user(driver, user_creds, common_urls):
     """
     Executes the scraping workflow for a specific user profile.
     """
+    return process_capture(capture_dashboard(driver, user_creds, common_urls))
+
+def capture_semesters(driver, user_creds, common_urls, semesters=SCRAPE_SEMESTERS, on_capture=None):
+    """
+    Logs in once and captures the dashboard panel for every wanted semester.
+
+    Args:
+        semesters (str): Semester selection, see wanted_semesters().
+        on_capture (callable): Called with each capture as soon as it is
+            taken, while the browser moves on to the next semester.
+
+    A semester whose dashboard cannot be read is logged and skipped.
+
+    Returns:
+        list: Capture dicts (as capture_dashboard()), one per semester read.
+
+    Raises:
+        ValueError: No wanted semester is offered, or none could be read.
+    """
     section_label = user_creds['section_label']
-    logger.info("--- Processing User Profile: %s (%s) ---", user_creds['id'], section_label)
+    logger.info("--- Processing User Profile: %s (%s), semesters: %s ---",
+                user_creds['id'], section_label, semesters or "current")
+    login_profile(driver, user_creds, common_urls)
+
+    options = open_semester_dashboard(driver, common_urls['attendance_dashboard_url'])
+    labels = wanted_semesters(options, semesters)
+    if not labels:
+        raise ValueError(f"No matching semester options found for section {section_label}.")
+    # The session budget covers one semester; give it SEMESTER_BUDGET_S per
+    # extra one now that the selection is resolved.
+    session = deadlines.current()
+    if session is not None:
+        session.extend(SEMESTER_BUDGET_S * (len(labels) - 1))
+
+    captures = []
+    for index, semester in enumerate(labels):
+        started = time.perf_counter()
+        # After the first postback the panel may still hold the previous
+        # semester's table; wait for the postback to replace it (unless the
+        # new table was captured from the postback response). A semester
+        # without courses leaves no table to wait on.
+        previous_tables = driver.find_elements(By.ID, COURSE_TABLE_ID) if index else []
+        try:
+            panel_html = pick_semester_option(driver, semester, options)
+            if previous_tables and not panel_html:
+                wait_until(driver, COURSE_TABLE_WAIT_S, EC.staleness_of(previous_tables[0]), "course table refresh")
+            panel = read_dashboard(driver, panel_html)
+        except (WebDriverException, partial_postback.DeltaError, deadlines.DeadlineExceeded) as e:
+            # Only this semester's own budgets may run out; a spent profile
+            # or run budget ends the profile.
+            if isinstance(e, deadlines.DeadlineExceeded) and deadlines.current() and deadlines.current().expired():
+                raise
+            logger.warning("Skipping semester %s for profile %s: %s", semester, user_creds['id'],
+                           str(e).strip() or type(e).__name__)
+            continue
+        capture = {
+            "profile_id": user_creds['id'],
+            "section_label": section_label,
+            "semester": semester,
+            "semester_options": panel["options"] or options,
+            "html": panel["html"],
+            "rows": panel["rows"],
+            "captured_at": time.time(),
+            "timings": {"semester_s": round(time.perf_counter() - started, 3)},
+        }
+        captures.append(capture)
+        if on_capture:
+            on_capture(capture)
+    if not captures:
+        raise ValueError(f"No semester dashboard could be read for section {section_label}.")
+    return captures
+
+
+def parse_semester_capture(capture):
+    """
+    Parses one semester capture into entries tagged with their semester.
+    """
+    entries = capture_entries(capture)
+    for entry in entries:
+        entry["Semester"] = capture["semester"]
+    return entries
 
-    masking_visit(driver)
 
-    try:
-        bypass_cloudflare_and_wait_for_login(driver, common_urls['login_url'])
-        authenticate(user_creds, driver)
-    except Exception as e:
-        logger.error("Authentication Failure: %s | URL: %s", type(e).__name__, driver.current_url)
-        raise
+def scrape_semesters_for_user(driver, user_creds, common_urls, semesters=SCRAPE_SEMESTERS):
+    """
+    capture_semesters() with parsing on a background worker, so the browser
+    never waits for BeautifulSoup. A semester that fails to parse is logged
+    and left out.
+
+    Returns:
+        dict: semester label -> parsed entries.
+    """
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="semester-parse") as pool:
+        pending = []
+        capture_semesters(driver, user_creds, common_urls, semesters,
+                          on_capture=lambda c: pending.append((c["semester"], pool.submit(parse_semester_capture, c))))
+        results = {}
+        for semester, future in pending:
+            try:
+                results[semester] = future.result()
+            except Exception as e:
+                logger.warning("Skipping semester %s for profile %s: parse failed: %s",
+                               semester, user_creds['id'], e)
+        return results
+
+
+def semester_history(semesters):
+    """
+    Scrapes the selected semesters for every profile (one login each) and
+    writes one final routine per semester to SEMESTER_OUTPUT_DIR.
+
+    Returns:
+        dict: semester label -> final routine entries.
+    """
+    with deadlines.phase("run", RUN_BUDGET_S):
+        return _semester_history(semesters)
+
+
+def _semester_history(semesters):
+    credentials = load_credentials(CREDENTIALS_FILE)
+    if not credentials:
+        logger.error("Termination: Missing configuration.")
+        return {}
+    teacher_details = load_teacher_details_from_file(TEACHER_DETAILS_FILE)
+    common_urls = {
+        "login_url": credentials["login_url"],
+        "attendance_dashboard_url": credentials["attendance_dashboard_url"]
+    }
+
+    by_semester = {}
+    for profile in credentials["users"]:
+        # One session walks every selected semester; capture_semesters()
+        # extends its budget once it knows how many.
+        results = scrape_profile_with_retry(
+            profile, common_urls,
+            work=lambda driver, user, urls: scrape_semesters_for_user(driver, user, urls, semesters),
+        )
+        for semester, entries in (results or {}).items():
+            by_semester.setdefault(semester, []).extend(entries)
+
+    primary_section, secondary_section = merge_sections(credentials["users"])
+    routines = {}
+    for semester, entries in by_semester.items():
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", semester).strip("_")
+        if EXPORT_ATTENDANCE_SUMMARY:
+            save_attendance_summary(entries, slug)
+        routine = build_final_routine(entries, primary_section, secondary_section, teacher_details)
+        if not routine:
+            logger.warning("No valid routine entries for semester %s.", semester)
+            continue
+        save_data_to_file(routine, SEMESTER_OUTPUT_DIR, SEMESTER_ROUTINE_FILENAME_TPL.format(semester=slug, ext="csv"),
+                          "csv", fieldnames=FINAL_ROUTINE_FIELDNAMES)
+        save_data_to_file(routine, SEMESTER_OUTPUT_DIR,
+                          SEMESTER_ROUTINE_FILENAME_TPL.format(semester=slug, ext="json"), "json")
+        routines[semester] = routine
+    logger.info("Saved routines for %d semester(s) to %s.", len(routines), SEMESTER_OUTPUT_DIR)
+    return routines
 
-    select_semester(driver, common_urls['attendance_dashboard_url'], section_label)
-    return extract_dashboard(driver, section_label)
 
 CHROME_BINARY_NAMES = ["google-chrome-stable", "google-chrome", "chromium-browser", "chromium"]
+CHROME_ARGUMENTS = [
+    "--window-size=1920,1080",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    # Enhanced stealth flags
+    "--disable-blink-features=AutomationControlled",
+    "--profile-directory=Default",
+]
 
 def _platform_chrome_candidates():
     """
@@ -555,15 +1229,184 @@ def get_chrome_major_version(chrome_path=None):
 
 # [Main Workflow]
 
-def main():
-    logger.info("Executing scraper workflow...")
-    
-    credentials = load_credentials(CREDENTIALS_FILE)
-    if not credentials:
-        logger.error("Termination: Missing configuration.")
-        return
+def create_driver(profile_id, proxy=None):
+    """
+    Launches the configured browser (PREFERRED_BROWSER) for one profile,
+    through the DRIVER_BACKEND for Chrome, going out through `proxy` (an
+    egress.Proxy; None = direct).
 
-    teacher_details = load_teacher_details_from_file(TEACHER_DETAILS_FILE)
+    Returns the WebDriver (a cdp_driver.CDPDriver with the cdp backend), or
+    None when no browser could be started.
+    """
+    driver = None
+    if PREFERRED_BROWSER.lower() == "chrome":
+        chrome_path = get_chrome_executable()
+        if not chrome_path:
+            logger.error("No Chrome binary found for %s. Install Chrome/Chromium or set CHROME_BINARY_PATH.", profile_id)
+            return None
+        arguments = CHROME_ARGUMENTS + egress.chrome_arguments(proxy)
+        if DRIVER_BACKEND == "cdp":
+            return cdp_driver.launch(chrome_path, arguments, headless=HEADLESS, profile_id=profile_id)
+
+        options = uc.ChromeOptions()
+        for argument in arguments:
+            options.add_argument(argument)
+        major_v = get_chrome_major_version(chrome_path)
+        driver = uc.Chrome(options=options, version_main=major_v,
+                           browser_executable_path=chrome_path, headless=HEADLESS)
+
+    elif PREFERRED_BROWSER.lower() == "firefox":
+        options = FirefoxOptions()
+        if HEADLESS:
+            options.headless = True
+        for name, value in egress.firefox_preferences(proxy).items():
+            options.set_preference(name, value)
+        service = FirefoxService(GeckoDriverManager().install())
+        driver = webdriver.Firefox(service=service, options=options)
+
+    return driver
+
+
+@contextlib.contextmanager
+def pipeline_stage(name):
+    """
+    Profiles a stage (when profiling is on) and attributes its memory peaks.
+    """
+    with profiling.stage(name), resource_monitor.phase(name):
+        yield
+
+
+def scrape_profile(profile, common_urls, work=scrape_dashboard_for_user, budget_s=None):
+    """
+    Runs one profile in its own browser session.
+
+    Args:
+        work (callable): work(driver, profile, common_urls) run once the
+            browser is up; defaults to the full scrape-and-parse flow.
+        budget_s (float): Session budget (default: PROFILE_BUDGET_S).
+
+    Returns the result of `work`, or None when the session failed (the error
+    and a page dump are logged, never raised). The session runs under
+    PROFILE_BUDGET_S; a watchdog kills the browser if it overruns.
+    """
+    budget_s = PROFILE_BUDGET_S if budget_s is None else budget_s
+    with deadlines.phase(f"profile[{profile['id']}]", budget_s) as deadline:
+        if deadline.expired():
+            logger.error("Skipping %s: %s budget exhausted.", profile['id'], deadline.exhausted_by())
+            return None
+        return _run_profile_session(profile, common_urls, work, deadline)
+
+
+def _run_profile_session(profile, common_urls, work, deadline):
+    driver = None
+    tracer = None
+    watch = {"fired": False}
+    monitor = resource_monitor.active()
+    try:
+        proxy = egress.for_profile(profile)
+        logger.info("--- Initializing Session: %s (egress: %s) ---", profile['id'], egress.label(proxy))
+
+        with pipeline_stage(f"launch_browser[{profile['id']}]"):
+            driver = create_driver(profile['id'], proxy)
+
+        if not driver:
+            logger.error("Driver initialization failure for %s.", profile['id'])
+            return None
+
+        if monitor:
+            monitor.attach(driver, profile['id'])
+        if TRACE_WEBDRIVER:
+            tracer = driver_trace.CommandTracer(profile['id'])
+            driver_trace.instrument(driver, tracer)
+        driver.implicitly_wait(IMPLICIT_WAIT_S)
+        with deadlines.watchdog(deadline, driver, DEADLINE_GRACE_S) as watch:
+            with pipeline_stage(f"scrape[{profile['id']}]"):
+                return work(driver, profile, common_urls)
+
+    except Exception as e:
+        logger.error("Workflow Exception for %s: %s", profile['id'], e)
+        if watch["fired"]:
+            logger.error("Session for %s was killed by the deadline watchdog; no page dump.", profile['id'])
+        elif driver:
+            debug_capture.capture(driver, profile['id'], type(e).__name__, error=str(e))
+        return None
+    finally:
+        if monitor:
+            monitor.attach(None, None)
+        if driver:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.warning("Driver quit failed for %s: %s", profile['id'], e)
+            logger.info("Session closed for %s.", profile['id'])
+        if tracer:
+            tracer.export(driver_trace.trace_path(profile['id']))
+
+
+def scrape_profile_with_retry(profile, common_urls, work=scrape_dashboard_for_user, budget_s=None):
+    """
+    scrape_profile(), retried once with a fresh browser if the session was
+    recycled for exceeding the memory ceiling.
+    """
+    result = scrape_profile(profile, common_urls, work, budget_s)
+    monitor = resource_monitor.active()
+    if result is None and monitor and monitor.exceeded(profile['id']):
+        logger.info("Retrying %s with a fresh browser after memory recycle.", profile['id'])
+        result = scrape_profile(profile, common_urls, work, budget_s)
+    return result
+
+
+def resource_report_path():
+    profiler = profiling.active()
+    if profiler is not None:
+        return os.path.join(profiler.run_dir, RESOURCE_REPORT_FILENAME)
+    return os.path.join(TMP_OUTPUT_DIR, RESOURCE_REPORT_FILENAME)
+
+
+def scrape_routine(write_outputs=True, abort_check=None, force=False, allow_partial=False):
+    """
+    Scrapes every configured profile and merges the results into the final
+    routine.
+
+    Args:
+        write_outputs (bool): Also export the final routine to CSV/JSON in
+            FORMATTED_OUTPUT_DIR.
+        abort_check (callable): Polled before each profile; returning True
+            stops the scrape early (e.g. the publish side already failed).
+        force (bool): Rescrape every profile, ignoring fresh checkpoints.
+        allow_partial (bool): Merge even when a required section is missing.
+
+    Returns:
+        list: Final routine entries ([] when nothing could be collected or a
+        required section is missing).
+    """
+    with resource_monitoring(), deadlines.phase("run", RUN_BUDGET_S):
+        return _collect_routine(write_outputs, abort_check, force, allow_partial)
+
+
+@contextlib.contextmanager
+def resource_monitoring():
+    """
+    Runs the resource monitor (when configured) and writes its report at exit.
+    """
+    if MONITOR_RESOURCES or MEMORY_CEILING_MB:
+        resource_monitor.start(RESOURCE_SAMPLE_INTERVAL_S, MEMORY_CEILING_MB)
+    try:
+        yield
+    finally:
+        monitor = resource_monitor.stop()
+        if monitor:
+            monitor.write_report(resource_report_path())
+
+
+def _collect_routine(write_outputs, abort_check=None, force=False, allow_partial=False):
+    with pipeline_stage("load_config"):
+        credentials = load_credentials(CREDENTIALS_FILE)
+        if not credentials:
+            logger.error("Termination: Missing configuration.")
+            return []
+
+        teacher_details = load_teacher_details_from_file(TEACHER_DETAILS_FILE)
     all_collected_data = []
 
     common_urls = {
@@ -571,83 +1414,151 @@ def main():
         "attendance_dashboard_url": credentials["attendance_dashboard_url"]
     }
 
+    store = checkpoints.default_store()
+    collected_sections = set()
     for profile in credentials["users"]:
-        driver = None 
-        try:
-            logger.info("--- Initializing Session: %s ---", profile['id'])
-
-            if PREFERRED_BROWSER.lower() == "chrome":
-                options = uc.ChromeOptions()
-                options.add_argument("--window-size=1920,1080")
-                options.add_argument("--disable-gpu")
-                options.add_argument("--no-sandbox")
-                options.add_argument("--disable-dev-shm-usage")
-                
-                # Enhanced stealth flags
-                options.add_argument("--disable-blink-features=AutomationControlled")
-                options.add_argument("--profile-directory=Default")
-                
-                chrome_path = get_chrome_executable()
-                if not chrome_path:
-                    logger.error("No Chrome binary found for %s. Install Chrome/Chromium or set CHROME_BINARY_PATH.", profile['id'])
-                    continue
-                major_v = get_chrome_major_version(chrome_path)
-                driver = uc.Chrome(options=options, version_main=major_v,
-                                   browser_executable_path=chrome_path, headless=HEADLESS)
-
-            elif PREFERRED_BROWSER.lower() == "firefox":
-                options = FirefoxOptions()
-                if HEADLESS:
-                    options.headless = True
-                service = FirefoxService(GeckoDriverManager().install())
-                driver = webdriver.Firefox(service=service, options=options)
-
-            if not driver:
-                logger.error("Driver initialization failure for %s.", profile['id'])
-                continue
-
-            driver.implicitly_wait(15)
-            user_data = scrape_dashboard_for_user(driver, profile, common_urls)
-            all_collected_data.extend(user_data)
-
-        except Exception as e:
-            logger.error("Workflow Exception for %s: %s", profile['id'], e)
-            if driver:
-                try:
-                    os.makedirs(TMP_OUTPUT_DIR, exist_ok=True)
-                    log_path = os.path.join(TMP_OUTPUT_DIR, f"error_log_{profile['id']}.html")
-                    with open(log_path, "w", encoding="utf-8") as f:
-                        f.write(driver.page_source)
-                    logger.info("Debug log saved: %s", log_path)
-                except: pass
-        finally:
-            if driver:
-                driver.quit()
-                logger.info("Session closed for %s.", profile['id'])
+        checkpoint = None if force else store.load(profile, common_urls)
+        if checkpoint:
+            user_data, age = checkpoint
+            logger.info("Reusing checkpoint for %s (%s, %.0f min old).",
+                        profile['id'], profile['section_label'], age / 60)
+        else:
+            if abort_check and abort_check():
+                logger.error("Scrape aborted before %s.", profile['id'])
+                return []
+            user_data = scrape_profile_with_retry(profile, common_urls)
+            if user_data:
+                store.save(profile, common_urls, user_data)
+            else:
+                # A forced rescrape that failed must not leave the old
+                # checkpoint for the next run to reuse.
+                store.discard(profile['id'])
+        if user_data:
+            collected_sections.add(profile['section_label'])
+        all_collected_data.extend(user_data or [])
 
     if not all_collected_data:
         logger.error("Data collection yielded zero results. Aborting export.")
-        return
+        return []
+
+    missing = checkpoints.missing_sections(credentials["users"], collected_sections)
+    if missing and not allow_partial:
+        logger.error("Required section(s) missing: %s. Not merging a partial routine; rerun to scrape only "
+                     "the missing profiles, or pass %s.", ", ".join(missing), ALLOW_PARTIAL_FLAG)
+        return []
 
     logger.info("--- Processing Combined Results ---")
-    primary_section = credentials["users"][0]["section_label"]
-    secondary_section = credentials["users"][1]["section_label"] if len(credentials["users"]) > 1 else None
+    if write_outputs and EXPORT_ATTENDANCE_SUMMARY:
+        save_attendance_summary(all_collected_data)
+    primary_section, secondary_section = merge_sections(credentials["users"])
 
-    unique_routine = build_final_routine(all_collected_data, primary_section, secondary_section, teacher_details)
+    with pipeline_stage("merge"):
+        unique_routine = build_final_routine(all_collected_data, primary_section, secondary_section, teacher_details)
 
-    if unique_routine:
-        logger.info("Exporting %d unique entries.", len(unique_routine))
-        save_data_to_file(unique_routine, FORMATTED_OUTPUT_DIR, FINAL_ROUTINE_CSV_FILENAME, "csv",
-                          fieldnames=["CourseCode", "CourseTitle", "Teacher", "TeacherPhone", "TeacherEmail", "Day", "Room", "TimeSlot", "Section"])
-        save_data_to_file(unique_routine, FORMATTED_OUTPUT_DIR, FINAL_ROUTINE_JSON_FILENAME, "json")
-    else:
+    if not unique_routine:
         logger.warning("No valid routine entries filtered.")
+    elif write_outputs:
+        logger.info("Exporting %d unique entries.", len(unique_routine))
+        with pipeline_stage("persist"):
+            save_final_routine(unique_routine)
+
+    return unique_routine
 
+
+def save_final_routine(unique_routine):
+    """
+    Exports the final routine to CSV and JSON in FORMATTED_OUTPUT_DIR, plus
+    the per-section/per-teacher calendars and static section pages when
+    EXPORT_CALENDARS / EXPORT_HTML_PAGES are on.
+    """
+    save_data_to_file(unique_routine, FORMATTED_OUTPUT_DIR, FINAL_ROUTINE_CSV_FILENAME, "csv",
+                      fieldnames=FINAL_ROUTINE_FIELDNAMES)
+    save_data_to_file(unique_routine, FORMATTED_OUTPUT_DIR, FINAL_ROUTINE_JSON_FILENAME, "json")
+    if EXPORT_CALENDARS:
+        try:
+            calendar_export.export_calendars(unique_routine)
+        except Exception as e:
+            logger.error("Failed to export calendars: %s", e)
+    if EXPORT_HTML_PAGES:
+        try:
+            routine_pages.export_pages(unique_routine, ATTENDANCE_DASHBOARD_HTML_FILENAME_TPL)
+        except Exception as e:
+            logger.error("Failed to export routine pages: %s", e)
+
+
+def attendance_summary(entries):
+    """
+    One row per profile section and course with its attendance counts
+    (ATTENDANCE_SUMMARY_FIELDNAMES). The percentage is the portal's, or
+    computed from the counts when the portal shows none.
+    """
+    rows = {}
+    for entry in entries:
+        key = (entry.get("UserScrapedSection") or "", entry.get("CourseCode") or "")
+        if not key[1] or key in rows:
+            continue
+        held, attended = entry.get("ClassesHeld") or "", entry.get("ClassesAttended") or ""
+        percentage = entry.get("AttendancePercentage") or ""
+        if not percentage and held.isdigit() and attended.isdigit() and int(held) > 0:
+            percentage = f"{100 * int(attended) / int(held):.2f}"
+        rows[key] = {
+            "Section": key[0], "CourseCode": key[1], "CourseTitle": entry.get("CourseTitle") or "",
+            "ClassesHeld": held, "ClassesAttended": attended, "AttendancePercentage": percentage,
+        }
+    return [rows[key] for key in sorted(rows)]
+
+
+def has_attendance(summary):
+    """
+    True when any attendance_summary() row carries attendance counts.
+    """
+    return any(row["ClassesHeld"] or row["AttendancePercentage"] for row in summary)
+
+
+def save_attendance_summary(entries, semester_slug=None):
+    """
+    Exports attendance_summary() of the scraped entries to CSV and JSON in
+    FORMATTED_OUTPUT_DIR, or SEMESTER_OUTPUT_DIR for one semester's entries.
+    """
+    summary = attendance_summary(entries)
+    if not has_attendance(summary):
+        logger.info("No attendance columns in the scraped entries; skipping the attendance summary.")
+        return summary
+    output_dir, filename_tpl = FORMATTED_OUTPUT_DIR, ATTENDANCE_SUMMARY_FILENAME_TPL
+    if semester_slug:
+        output_dir, filename_tpl = SEMESTER_OUTPUT_DIR, SEMESTER_ATTENDANCE_SUMMARY_FILENAME_TPL
+    save_data_to_file(summary, output_dir, filename_tpl.format(semester=semester_slug, ext="csv"), "csv",
+                      fieldnames=ATTENDANCE_SUMMARY_FIELDNAMES)
+    save_data_to_file(summary, output_dir, filename_tpl.format(semester=semester_slug, ext="json"), "json")
+    return summary
+
+
+def semesters_from_argv(argv, default=SCRAPE_SEMESTERS):
+    """
+    Value of `--semesters VALUE` in argv, else the configured default.
+    """
+    if SEMESTERS_FLAG in argv:
+        index = argv.index(SEMESTERS_FLAG)
+        if index + 1 < len(argv):
+            return argv[index + 1]
+    return default
+
+
+@profiling.session("scraper")
+def main(semesters=SCRAPE_SEMESTERS, force=False, allow_partial=False):
+    logger.info("Executing scraper workflow...")
+    if semesters:
+        with resource_monitoring():
+            semester_history(semesters)
+    else:
+        scrape_routine(force=force, allow_partial=allow_partial)
     logger.info("Scraper workflow finished.")
 
 if __name__ == "__main__":
+    profiling.request_from_argv(sys.argv[1:])
     try:
-        main()
+        main(semesters_from_argv(sys.argv[1:]), force=FORCE_FLAG in sys.argv[1:],
+             allow_partial=ALLOW_PARTIAL_FLAG in sys.argv[1:])
     except Exception as e:
         logger.error("Fatal global error: %s", e)
         traceback.print_exc()
\ No newline at end of file
@@ -0,0 +1,309 @@
+"""
+Adaptive scheduling for unattended pipeline runs.
+
+The systemd timer / launchd agent / Task Scheduler task fires hourly and
+runs `scheduler.py`, which decides from its stored state whether a pipeline
+run is due and otherwise exits immediately (no browser, no Google calls).
+
+After each run the interval to the next one is adjusted from the result:
+
+    routine changed (or first run)  interval = SCHEDULER_MIN_INTERVAL_H
+    routine unchanged               interval *= SCHEDULER_BACKOFF, up to
+                                    SCHEDULER_MAX_INTERVAL_H
+    run failed                      retry after MIN * BACKOFF^failures,
+                                    interval itself unchanged
+
+Near the start of a semester, within SCHEDULER_SEMESTER_WINDOW_DAYS of a
+configured SCHEDULER_SEMESTER_STARTS date (MM-DD) or of the day the
+dashboard first showed a new semester, the interval is held at the minimum.
+A run never starts during SCHEDULER_QUIET_HOURS; one that falls due then is
+moved to the end of the quiet period.
+
+State (interval, last routine hash, semester, recent run results) lives in
+SCHEDULER_STATE_FILE and is written atomically.
+
+Usage:
+    python scheduler.py              # run the pipeline if due
+    python scheduler.py --force      # run now and reschedule
+    python scheduler.py --status     # print the state and next run time
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+
+from config import (
+    SCHEDULER_STATE_FILE, SCHEDULER_MIN_INTERVAL_H, SCHEDULER_MAX_INTERVAL_H, SCHEDULER_BACKOFF,
+    SCHEDULER_QUIET_HOURS, SCHEDULER_SEMESTER_STARTS, SCHEDULER_SEMESTER_WINDOW_DAYS, setup_logging,
+)
+from atomic_file import atomic_open
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HOUR_S = 3600
+DAY_S = 24 * HOUR_S
+# Run results kept in the state file.
+HISTORY_LIMIT = 50
+
+
+class Policy:
+    """
+    Scheduling settings (defaults from config).
+
+    Args:
+        min_interval_h (float): Interval after a change / near a semester start.
+        max_interval_h (float): Longest interval during stable weeks.
+        backoff (float): Interval multiplier per unchanged run.
+        quiet_hours (tuple): (start_hour, end_hour) local time, or None.
+        semester_starts (list): (month, day) pairs.
+        semester_window_days (float): How long after a start to poll often.
+    """
+
+    def __init__(self, min_interval_h=SCHEDULER_MIN_INTERVAL_H, max_interval_h=SCHEDULER_MAX_INTERVAL_H,
+                 backoff=SCHEDULER_BACKOFF, quiet_hours=None, semester_starts=None,
+                 semester_window_days=SCHEDULER_SEMESTER_WINDOW_DAYS):
+        self.min_interval_h = min_interval_h
+        self.max_interval_h = max(max_interval_h, min_interval_h)
+        self.backoff = max(backoff, 1.0)
+        self.quiet_hours = parse_quiet_hours(SCHEDULER_QUIET_HOURS) if quiet_hours is None else quiet_hours
+        self.semester_starts = (parse_semester_starts(SCHEDULER_SEMESTER_STARTS)
+                                if semester_starts is None else semester_starts)
+        self.semester_window_days = semester_window_days
+
+
+def parse_quiet_hours(value):
+    """
+    "23-7" -> (23, 7); "" -> None. The range may wrap past midnight.
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        start, end = (int(part) % 24 for part in value.split("-", 1))
+    except ValueError:
+        logger.warning("Ignoring malformed SCHEDULER_QUIET_HOURS %r (expected e.g. 23-7).", value)
+        return None
+    return None if start == end else (start, end)
+
+
+def parse_semester_starts(value):
+    """
+    "01-10,07-01" -> [(1, 10), (7, 1)].
+    """
+    starts = []
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            month, day = (int(x) for x in part.split("-", 1))
+            datetime.date(2000, month, day)
+        except ValueError:
+            logger.warning("Ignoring malformed semester start %r (expected MM-DD).", part)
+            continue
+        starts.append((month, day))
+    return starts
+
+
+def in_quiet_hours(ts, quiet_hours):
+    if not quiet_hours:
+        return False
+    hour = datetime.datetime.fromtimestamp(ts).hour
+    start, end = quiet_hours
+    return start <= hour < end if start < end else hour >= start or hour < end
+
+
+def after_quiet_hours(ts, quiet_hours):
+    """
+    `ts`, or the end of the quiet period it falls in.
+    """
+    if not in_quiet_hours(ts, quiet_hours):
+        return ts
+    moment = datetime.datetime.fromtimestamp(ts)
+    end = moment.replace(hour=quiet_hours[1], minute=0, second=0, microsecond=0)
+    if end <= moment:
+        end += datetime.timedelta(days=1)
+    return end.timestamp()
+
+
+def _configured_starts(ts, policy):
+    """
+    Configured semester start timestamps in the years around `ts`.
+    """
+    year = datetime.datetime.fromtimestamp(ts).year
+    return sorted(datetime.datetime(y, month, day).timestamp()
+                  for y in (year - 1, year, year + 1) for month, day in policy.semester_starts)
+
+
+def near_semester_start(state, ts, policy):
+    window_s = policy.semester_window_days * DAY_S
+    starts = _configured_starts(ts, policy)
+    if state.get("semester_seen_at"):
+        starts.append(state["semester_seen_at"])
+    return any(0 <= ts - start < window_s for start in starts)
+
+
+def next_semester_start(ts, policy):
+    upcoming = [start for start in _configured_starts(ts, policy) if start > ts]
+    return min(upcoming) if upcoming else None
+
+
+def record_run(state, now, exit_code, routine_hash=None, semester=None, duration_s=0.0, policy=None):
+    """
+    Updates `state` (in place) with one run's result and schedules the next.
+
+    Args:
+        state (dict): Scheduler state (empty before the first run).
+        now (float): Run end time.
+        exit_code (int): Pipeline exit code (0 = success).
+        routine_hash (str): Hash of the merged routine, when it was built.
+        semester (str): Semester label the dashboard showed, when known.
+
+    Returns:
+        dict: The updated state.
+    """
+    policy = policy or Policy()
+    ok = exit_code == 0
+    changed = ok and routine_hash is not None and routine_hash != state.get("routine_hash")
+    if semester and semester != state.get("semester"):
+        if state.get("semester"):
+            logger.info("Dashboard moved to semester %s.", semester)
+            state["semester_seen_at"] = now
+        state["semester"] = semester
+
+    interval_h = state.get("interval_h", policy.min_interval_h)
+    if ok:
+        state["failures"] = 0
+        if changed:
+            state["routine_hash"] = routine_hash
+            state["last_change_at"] = now
+            interval_h = policy.min_interval_h
+        else:
+            interval_h = min(interval_h * policy.backoff, policy.max_interval_h)
+        if near_semester_start(state, now, policy):
+            interval_h = policy.min_interval_h
+        delay_h = interval_h
+    else:
+        state["failures"] = state.get("failures", 0) + 1
+        delay_h = min(policy.min_interval_h * policy.backoff ** state["failures"], policy.max_interval_h)
+    state["interval_h"] = interval_h
+
+    next_run = now + delay_h * HOUR_S
+    upcoming_start = next_semester_start(now, policy)
+    if upcoming_start is not None and upcoming_start < next_run:
+        next_run = upcoming_start
+    state["next_run_at"] = after_quiet_hours(next_run, policy.quiet_hours)
+    state["last_run_at"] = now
+    state["last_exit_code"] = exit_code
+    state.setdefault("runs", []).append({
+        "at": round(now), "exit_code": exit_code, "changed": changed, "duration_s": round(duration_s, 1),
+    })
+    del state["runs"][:-HISTORY_LIMIT]
+    return state
+
+
+def is_due(state, now, policy=None):
+    policy = policy or Policy()
+    if in_quiet_hours(now, policy.quiet_hours):
+        return False
+    return now >= state.get("next_run_at", 0)
+
+
+def state_path():
+    return SCHEDULER_STATE_FILE if os.path.isabs(SCHEDULER_STATE_FILE) else os.path.join(BASE_DIR, SCHEDULER_STATE_FILE)
+
+
+def load_state(path=None):
+    try:
+        with open(path or state_path(), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=None):
+    with atomic_open(path or state_path()) as f:
+        json.dump(state, f, indent=4)
+
+
+def run_results(cache):
+    """
+    (routine hash, semester label) of the last pipeline run from its stage
+    cache; either may be None.
+    """
+    import pipeline
+    merged = cache.load("merge")
+    routine_hash = pipeline.hash_inputs(merged["routine"]) if merged else None
+    semester = None
+    for key in sorted(cache.manifest.get("stages", {})):
+        if key.startswith("scrape."):
+            capture = cache.load(key)
+            if capture and capture.get("semester"):
+                semester = capture["semester"]
+                break
+    return routine_hash, semester
+
+
+def run_pipeline():
+    """
+    Runs the whole pipeline; returns (exit code, routine hash, semester).
+    """
+    import pipeline
+    cache = pipeline.default_cache()
+    exit_code = pipeline.run(cache=cache)
+    routine_hash, semester = run_results(cache) if exit_code == 0 else (None, None)
+    return exit_code, routine_hash, semester
+
+
+def _when(ts):
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M") if ts else "-"
+
+
+def print_status(state, now):
+    print("Scheduler state: %s\n" % state_path())
+    print("  last run:      %s (exit %s)" % (_when(state.get("last_run_at")), state.get("last_exit_code", "-")))
+    print("  last change:   %s" % _when(state.get("last_change_at")))
+    print("  semester:      %s" % (state.get("semester") or "-"))
+    print("  interval:      %.1f h, %d failure(s) in a row" % (state.get("interval_h", 0), state.get("failures", 0)))
+    print("  next run:      %s%s" % (_when(state.get("next_run_at")), " (due)" if is_due(state, now) else ""))
+    runs = state.get("runs", [])
+    if runs:
+        changed = sum(1 for run in runs if run["changed"])
+        print("  recent runs:   %d, %d with changes" % (len(runs), changed))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run the routine pipeline when the adaptive schedule says so.")
+    parser.add_argument("--force", action="store_true", help="run now, then reschedule")
+    parser.add_argument("--status", action="store_true", help="print the schedule and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    setup_logging()
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    state, now = load_state(), time.time()
+    if args.status:
+        print_status(state, now)
+        return 0
+    if not args.force and not is_due(state, now):
+        logger.info("No run due; next run at %s.", _when(state.get("next_run_at")))
+        return 0
+
+    exit_code, routine_hash, semester = run_pipeline()
+    finished = time.time()
+    record_run(state, finished, exit_code, routine_hash, semester, duration_s=finished - now)
+    save_state(state)
+    logger.info("Routine %s; next run at %s (interval %.1f h).",
+                "changed" if state["runs"][-1]["changed"] else "unchanged" if exit_code == 0 else "run failed",
+                _when(state["next_run_at"]), state["interval_h"])
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
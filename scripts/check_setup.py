@@ -2,103 +2,77 @@
 """Online preflight check for the routine pipeline.
 
 Verifies local config files are present and valid, that the spreadsheet can
-be opened with the service account (catches the "not shared" mistake), and
-that the OAuth/token pieces are in place for the Apps Script call.
+be opened with the service account (catches the "not shared" mistake), that
+the OAuth token is valid and the Apps Script project reachable, and that the
+UCAM portal answers. The checks are declared in preflight.py; the network
+ones run concurrently, each with PREFLIGHT_TIMEOUT_S, and results that
+passed within PREFLIGHT_CACHE_TTL_MIN are reused unless --no-cache is given.
 
 Usage:
-    python scripts/check_setup.py
+    python scripts/check_setup.py [--no-cache] [CHECK ...]
 
 Exits 0 when everything looks ready, 1 otherwise.
 """
-import json
+import argparse
 import os
 import sys
+import time
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
-from config import SPREADSHEET_NAME, APP_SCRIPT_ID, setup_logging
-from gsheet_formatter import (
-    GOOGLE_SERVICE_ACCOUNT_KEY_FILE,
-    GOOGLE_OAUTH_CLIENT_SECRET_FILE,
-    TOKEN_PICKLE_FILE,
-    authenticate_gsheet,
-)
-
-setup_logging()
-
-PLACEHOLDER_ID = "YOUR_APP_SCRIPT_ID_GOES_HERE"
-problems = []
-
-
-def check(description, condition, detail=""):
-    """Report a single check; record it as a problem when it fails."""
-    if condition:
-        print("  [OK]     %s" % description)
-        return True
-    print("  [FAIL]   %s" % description)
-    if detail:
-        print("            %s" % detail)
-    problems.append(description)
-    return False
-
-
-def load_json(path):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        return {"__error__": str(e)}
-
-
-def main():
-    print("Routine pipeline preflight\n")
-
-    print("Local files")
-    key = load_json(GOOGLE_SERVICE_ACCOUNT_KEY_FILE)
-    if "__error__" in key:
-        check("service account key is valid JSON",
-              False, "%s: %s" % (GOOGLE_SERVICE_ACCOUNT_KEY_FILE, key["__error__"]))
-        client_email = None
-    else:
-        check("service account key is valid JSON", True)
-        client_email = key.get("client_email")
-        check("service account key has client_email",
-              bool(client_email), "share the spreadsheet with this email (SETUP.md Phase A3)")
-
-    oauth = load_json(GOOGLE_OAUTH_CLIENT_SECRET_FILE)
-    check("OAuth client secret is valid JSON",
-          "__error__" not in oauth,
-          "%s: %s" % (GOOGLE_OAUTH_CLIENT_SECRET_FILE, oauth.get("__error__", "")))
-
-    check("cached token exists (token.pickle)",
-          os.path.exists(TOKEN_PICKLE_FILE),
-          "absent only on a fresh machine; the formatter will create it on first interactive run")
-
-    print("\nGoogle connection")
-    gc = None
-    if not any("service account key" in p for p in problems):
-        gc = authenticate_gsheet(GOOGLE_SERVICE_ACCOUNT_KEY_FILE)
-        check("service account authentication", gc is not None)
-
-    if gc is not None:
-        try:
-            gc.open(SPREADSHEET_NAME)
-            check("spreadsheet '%s' opens with service account" % SPREADSHEET_NAME, True)
-        except Exception as e:
-            check("spreadsheet '%s' opens with service account" % SPREADSHEET_NAME,
-                  False,
-                  "%s — make sure the sheet exists, the name in .env is exact, and the "
-                  "sheet is shared (Editor) with %s" % (e, client_email))
-
-    print("\nApps Script trigger")
-    check("APP_SCRIPT_ID is configured (not placeholder)",
-          bool(APP_SCRIPT_ID) and APP_SCRIPT_ID != PLACEHOLDER_ID,
-          "set APP_SCRIPT_ID in .env (SETUP.md Phase A6)")
-
-    print()
+from config import setup_logging
+import preflight
+
+LABELS = {
+    preflight.OK: "[OK]",
+    preflight.CACHED: "[CACHED]",
+    preflight.FAILED: "[FAIL]",
+    preflight.SKIPPED: "[SKIP]",
+}
+
+
+def print_report(results):
+    """Print results grouped by heading; return the number of failed checks
+    (checks skipped because of them are not counted again)."""
+    group = None
+    for result in results:
+        if result.check.group != group:
+            group = result.check.group
+            print("\n%s" % group)
+        timing = " (%.1fs)" % result.duration_s if result.status in (preflight.OK, preflight.FAILED) else ""
+        print("  %-9s%s%s" % (LABELS[result.status], result.check.description, timing))
+        if result.detail and not result.ok:
+            print("            %s" % result.detail)
+    return sum(1 for result in results if result.status == preflight.FAILED)
+
+
+def parse_args(argv):
+    checks = [check.name for check in preflight.default_checks()]
+    parser = argparse.ArgumentParser(description="Check that the routine pipeline is ready to run.")
+    parser.add_argument("checks", nargs="*", metavar="CHECK",
+                        help="run only these checks and their requirements: %s" % ", ".join(checks))
+    parser.add_argument("--no-cache", action="store_true", help="repeat network checks that passed recently")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.checks if name not in checks]
+    if unknown:
+        parser.error("unknown check(s): %s" % ", ".join(unknown))
+    return args
+
+
+def main(argv=None):
+    setup_logging()
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    print("Routine pipeline preflight")
+
+    started = time.perf_counter()
+    results = preflight.run_checks(preflight.default_checks(), args.checks or None,
+                                   None if args.no_cache else preflight.default_cache())
+    problems = print_report(results)
+
+    print("\nFinished in %.1fs." % (time.perf_counter() - started))
     if problems:
-        print("Found %d issue(s). See SETUP.md troubleshooting table." % len(problems))
+        print("Found %d issue(s). See SETUP.md troubleshooting table." % problems)
         return 1
     print("All checks passed. You're ready to run routine_scrapper.py then gsheet_formatter.py.")
     return 0
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Google APIs the formatter calls, for offline
+publish benchmarks.
+
+Implements the subset gspread and the Apps Script client use:
+
+    GET  /drive/v3/files?q=name = "..."            open spreadsheet by name
+    GET  /v4/spreadsheets/<id>                     spreadsheet/worksheet metadata
+    POST /v4/spreadsheets/<id>:batchUpdate         addSheet, repeatCell (format),
+                                                   updateSheetProperties (resize)
+    POST /v4/spreadsheets/<id>/values/<range>:clear
+    PUT  /v4/spreadsheets/<id>/values/<range>      values update
+    GET  /v4/spreadsheets/<id>/values/<range>      values get
+    POST /v1/scripts/<id>:run                      Apps Script execution
+    GET  /v1/projects/<id>                         Apps Script project metadata
+    GET  /__stats, POST /__reset                   request accounting
+
+Set GOOGLE_API_ENDPOINT to the printed URL and gsheet_formatter.py /
+pipeline.py talk to this server, unauthenticated. Latency and HTTP 429
+(RESOURCE_EXHAUSTED) responses are injected at configurable rates.
+
+Usage:
+    python scripts/fake_google_api.py [--port 8766] [--spreadsheet NAME ...]
+        [--auto-create] [--latency-ms 0] [--rate-limit-rate 0]
+    python scripts/fake_google_api.py --bench [--rows 2000] [--spreadsheets 5]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+SHEETS_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+STATS_PATH = "/__stats"
+RESET_PATH = "/__reset"
+
+RE_FILES = re.compile(r"^/drive/v3/files$")
+RE_SPREADSHEET = re.compile(r"^/v4/spreadsheets/([^/:]+)$")
+RE_BATCH_UPDATE = re.compile(r"^/v4/spreadsheets/([^/:]+):batchUpdate$")
+RE_VALUES = re.compile(r"^/v4/spreadsheets/([^/:]+)/values/([^:]+)$")
+RE_VALUES_CLEAR = re.compile(r"^/v4/spreadsheets/([^/:]+)/values/([^:]+):clear$")
+RE_SCRIPT_RUN = re.compile(r"^/v1/scripts/([^/:]+):run$")
+RE_SCRIPT_PROJECT = re.compile(r"^/v1/projects/([^/:]+)$")
+RE_NAME_QUERY = re.compile(r'name\s*=\s*"((?:[^"\\]|\\.)*)"')
+RE_CELL = re.compile(r"^([A-Z]+)(\d+)$")
+
+
+def parse_range(range_name):
+    """
+    "'backend'!B3:I3" -> ("backend", row, col) of the top-left cell (1-based).
+    """
+    sheet, _, cells = range_name.rpartition("!")
+    if not sheet:
+        sheet, cells = cells, "A1"
+    sheet = sheet.strip("'").replace("''", "'")
+    match = RE_CELL.match(cells.split(":", 1)[0])
+    if not match:
+        return sheet, 1, 1
+    col = 0
+    for char in match.group(1):
+        col = col * 26 + ord(char) - ord("A") + 1
+    return sheet, int(match.group(2)), col
+
+
+class FakeSheet:
+    def __init__(self, sheet_id, title, index, rows=1000, cols=26):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.index = index
+        self.rows = rows
+        self.cols = cols
+        self.values = []
+        self.formats = 0
+
+    def properties(self):
+        return {
+            "sheetId": self.sheet_id, "title": self.title, "index": self.index, "sheetType": "GRID",
+            "gridProperties": {"rowCount": self.rows, "columnCount": self.cols},
+        }
+
+    def write(self, row, col, values):
+        needed = row - 1 + len(values)
+        while len(self.values) < needed:
+            self.values.append([])
+        for offset, new_row in enumerate(values):
+            target = self.values[row - 1 + offset]
+            while len(target) < col - 1 + len(new_row):
+                target.append("")
+            target[col - 1:col - 1 + len(new_row)] = new_row
+
+
+class FakeSpreadsheet:
+    def __init__(self, title):
+        self.id = uuid.uuid4().hex
+        self.title = title
+        self.sheets = [FakeSheet(0, "Sheet1", 0)]
+
+    def sheet(self, title):
+        return next((sheet for sheet in self.sheets if sheet.title == title), None)
+
+    def metadata(self):
+        return {
+            "spreadsheetId": self.id,
+            "properties": {"title": self.title, "locale": "en_US", "timeZone": "Asia/Dhaka"},
+            "sheets": [{"properties": sheet.properties()} for sheet in self.sheets],
+        }
+
+
+def _duplicate_sheet_title(spreadsheet, requests):
+    """
+    First addSheet title in a batchUpdate that already exists (or is added
+    twice), or None. Like the real API, the whole batch is validated before
+    any of it is applied, so a rejected batch leaves no partial state.
+    """
+    titles = {sheet.title for sheet in spreadsheet.sheets}
+    for request in requests:
+        if "addSheet" in request:
+            title = request["addSheet"].get("properties", {}).get("title")
+            if title in titles:
+                return title
+            titles.add(title)
+    return None
+
+
+class GoogleApiState:
+    """
+    Spreadsheets, script runs and request counters behind the server.
+
+    Args:
+        spreadsheets (list): Titles that exist at startup.
+        auto_create (bool): Create unknown spreadsheets when opened by name.
+        latency_ms (float): Mean added latency per request (uniform 0.5x-1.5x).
+        rate_limit_rate (float): Probability of answering with HTTP 429.
+        seed (int): Seed for the injected randomness.
+    """
+
+    def __init__(self, spreadsheets=(), auto_create=False, latency_ms=0.0, rate_limit_rate=0.0, seed=None):
+        self.auto_create = auto_create
+        self.latency_ms = latency_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.spreadsheets = {}
+        for title in spreadsheets:
+            self.add_spreadsheet(title)
+        self.script_runs = []
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"requests": 0, "rate_limited": 0, "bytes_in": 0, "bytes_out": 0, "endpoints": {}}
+
+    def add_spreadsheet(self, title):
+        spreadsheet = FakeSpreadsheet(title)
+        self.spreadsheets[spreadsheet.id] = spreadsheet
+        return spreadsheet
+
+    def by_title(self, title):
+        with self.lock:
+            found = next((s for s in self.spreadsheets.values() if s.title == title), None)
+            if found is None and self.auto_create:
+                found = self.add_spreadsheet(title)
+            return found
+
+    def roll_rate_limit(self):
+        if self.rate_limit_rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < self.rate_limit_rate
+
+    def delay_s(self):
+        if self.latency_ms <= 0:
+            return 0.0
+        with self.lock:
+            return self.latency_ms / 1000 * self.random.uniform(0.5, 1.5)
+
+    def count(self, endpoint, bytes_in, bytes_out=0, rate_limited=False):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_in"] += bytes_in
+            self.stats["bytes_out"] += bytes_out
+            self.stats["endpoints"][endpoint] = self.stats["endpoints"].get(endpoint, 0) + 1
+            if rate_limited:
+                self.stats["rate_limited"] += 1
+
+    def snapshot_stats(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+
+class GoogleApiHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return raw, (json.loads(raw) if raw else {})
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        # Counted before the response goes out, so a client never sees a
+        # reply that /__stats does not include yet.
+        if self._endpoint is not None:
+            self.server.state.count(self._endpoint, self._bytes_in, len(body), rate_limited=status == 429)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def _error(self, status, message, reason):
+        return self._send_json(status, {"error": {"code": status, "message": message, "status": reason}})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def _dispatch(self, method):
+        state = self.server.state
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        raw, body = self._body()
+        self._endpoint, self._bytes_in = None, len(raw)
+        if path == STATS_PATH:
+            self._send_json(200, state.snapshot_stats())
+            return
+        if path == RESET_PATH:
+            state.reset_stats()
+            self._send_json(200, {})
+            return
+
+        delay = state.delay_s()
+        if delay:
+            time.sleep(delay)
+        self._endpoint, handler, args = self._route(method, path)
+        if state.roll_rate_limit():
+            self._error(429, "Quota exceeded for quota metric 'Requests' (simulated).", "RESOURCE_EXHAUSTED")
+        elif handler is None:
+            self._error(404, f"Unknown endpoint {method} {path}", "NOT_FOUND")
+        else:
+            handler(parse_qs(url.query), body, *args)
+
+    def _route(self, method, path):
+        routes = (
+            ("GET", RE_FILES, "drive.files.list", self._files_list),
+            ("GET", RE_SPREADSHEET, "spreadsheets.get", self._spreadsheet_get),
+            ("POST", RE_BATCH_UPDATE, "spreadsheets.batchUpdate", self._batch_update),
+            ("POST", RE_VALUES_CLEAR, "values.clear", self._values_clear),
+            ("PUT", RE_VALUES, "values.update", self._values_update),
+            ("GET", RE_VALUES, "values.get", self._values_get),
+            ("POST", RE_SCRIPT_RUN, "scripts.run", self._script_run),
+            ("GET", RE_SCRIPT_PROJECT, "projects.get", self._script_project),
+        )
+        for route_method, pattern, endpoint, handler in routes:
+            match = pattern.match(path)
+            if route_method == method and match:
+                return endpoint, handler, match.groups()
+        return f"{method} {path}", None, ()
+
+    def _spreadsheet(self, spreadsheet_id):
+        return self.server.state.spreadsheets.get(spreadsheet_id)
+
+    # [Drive]
+
+    def _files_list(self, query, body):
+        match = RE_NAME_QUERY.search(query.get("q", [""])[0])
+        files = []
+        if match:
+            spreadsheet = self.server.state.by_title(match.group(1).replace('\\"', '"'))
+            if spreadsheet:
+                files.append({"id": spreadsheet.id, "name": spreadsheet.title, "mimeType": SHEETS_MIME_TYPE,
+                              "createdTime": "2026-01-01T00:00:00.000Z",
+                              "modifiedTime": "2026-01-01T00:00:00.000Z"})
+        return self._send_json(200, {"kind": "drive#fileList", "files": files})
+
+    # [Sheets]
+
+    def _spreadsheet_get(self, query, body, spreadsheet_id):
+        spreadsheet = self._spreadsheet(spreadsheet_id)
+        if spreadsheet is None:
+            return self._error(404, "Requested entity was not found.", "NOT_FOUND")
+        with self.server.state.lock:
+            metadata = spreadsheet.metadata()
+        return self._send_json(200, metadata)
+
+    def _batch_update(self, query, body, spreadsheet_id):
+        spreadsheet = self._spreadsheet(spreadsheet_id)
+        if spreadsheet is None:
+            return self._error(404, "Requested entity was not found.", "NOT_FOUND")
+        requests = body.get("requests", [])
+        replies = []
+        with self.server.state.lock:
+            duplicate = _duplicate_sheet_title(spreadsheet, requests)
+            if duplicate is not None:
+                requests = []
+            for request in requests:
+                if "addSheet" in request:
+                    props = request["addSheet"].get("properties", {})
+                    grid = props.get("gridProperties", {})
+                    sheet = FakeSheet(max(s.sheet_id for s in spreadsheet.sheets) + 1, props.get("title"),
+                                      len(spreadsheet.sheets), grid.get("rowCount", 1000),
+                                      grid.get("columnCount", 26))
+                    spreadsheet.sheets.append(sheet)
+                    replies.append({"addSheet": {"properties": sheet.properties()}})
+                elif "updateSheetProperties" in request:
+                    props = request["updateSheetProperties"]["properties"]
+                    sheet = next((s for s in spreadsheet.sheets if s.sheet_id == props.get("sheetId")), None)
+                    grid = props.get("gridProperties", {})
+                    if sheet is not None:
+                        sheet.rows = grid.get("rowCount", sheet.rows)
+                        sheet.cols = grid.get("columnCount", sheet.cols)
+                    replies.append({})
+                elif "repeatCell" in request:
+                    sheet_id = request["repeatCell"].get("range", {}).get("sheetId")
+                    sheet = next((s for s in spreadsheet.sheets if s.sheet_id == sheet_id), None)
+                    if sheet is not None:
+                        sheet.formats += 1
+                    replies.append({})
+                else:
+                    replies.append({})
+        if duplicate is not None:
+            return self._error(400, f"A sheet with the name \"{duplicate}\" already exists.", "INVALID_ARGUMENT")
+        return self._send_json(200, {"spreadsheetId": spreadsheet_id, "replies": replies})
+
+    def _values_target(self, spreadsheet_id, range_name):
+        spreadsheet = self._spreadsheet(spreadsheet_id)
+        if spreadsheet is None:
+            return None, None, 0, 0
+        title, row, col = parse_range(range_name)
+        return spreadsheet, spreadsheet.sheet(title), row, col
+
+    def _values_clear(self, query, body, spreadsheet_id, range_name):
+        spreadsheet, sheet, _, _ = self._values_target(spreadsheet_id, range_name)
+        if sheet is None:
+            return self._error(400, f"Unable to parse range: {range_name}", "INVALID_ARGUMENT")
+        with self.server.state.lock:
+            sheet.values = []
+        return self._send_json(200, {"spreadsheetId": spreadsheet_id, "clearedRange": range_name})
+
+    def _values_update(self, query, body, spreadsheet_id, range_name):
+        spreadsheet, sheet, row, col = self._values_target(spreadsheet_id, range_name)
+        if sheet is None:
+            return self._error(400, f"Unable to parse range: {range_name}", "INVALID_ARGUMENT")
+        values = body.get("values", [])
+        with self.server.state.lock:
+            sheet.write(row, col, values)
+        return self._send_json(200, {
+            "spreadsheetId": spreadsheet_id, "updatedRange": range_name, "updatedRows": len(values),
+            "updatedColumns": max((len(r) for r in values), default=0),
+            "updatedCells": sum(len(r) for r in values),
+        })
+
+    def _values_get(self, query, body, spreadsheet_id, range_name):
+        spreadsheet, sheet, _, _ = self._values_target(spreadsheet_id, range_name)
+        if sheet is None:
+            return self._error(400, f"Unable to parse range: {range_name}", "INVALID_ARGUMENT")
+        with self.server.state.lock:
+            values = [list(r) for r in sheet.values]
+        return self._send_json(200, {"range": range_name, "majorDimension": "ROWS", "values": values})
+
+    # [Apps Script]
+
+    def _script_run(self, query, body, script_id):
+        with self.server.state.lock:
+            self.server.state.script_runs.append({"scriptId": script_id, "function": body.get("function")})
+        return self._send_json(200, {"done": True, "response": {"@type": "type.googleapis.com/google.apps."
+                                                                          "script.v1.ExecutionResponse"}})
+
+
+    def _script_project(self, query, body, script_id):
+        return self._send_json(200, {"scriptId": script_id, "title": "Routine formatter (fake)"})
+
+
+def make_server(state=None, host="127.0.0.1", port=8766, verbose=False):
+    """
+    Creates (but does not start) the API server; port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), GoogleApiHandler)
+    server.daemon_threads = True
+    server.state = state or GoogleApiState()
+    server.verbose = verbose
+    return server
+
+
+def base_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def _bench_routine(rows):
+    days = ("Sun", "Mon", "Tue", "Wed", "Thu")
+    return [{
+        "CourseCode": f"CSE-{1000 + i}", "CourseTitle": f"Course {i}", "Section": "B1",
+        "Day": days[i % len(days)], "Room": str(100 + i % 50), "TimeSlot": "11:0 - 12:15",
+        "TeacherName": f"Teacher {i % 30}", "TeacherContact": "01700000000\nteacher@example.edu",
+    } for i in range(rows)]
+
+
+def run_bench(rows, spreadsheets, latency_ms, rate_limit_rate):
+    """
+    Publishes a synthetic routine to N spreadsheets through the real
+    formatter and reports round trips and wall time per publish.
+    """
+    state = GoogleApiState(auto_create=True, latency_ms=latency_ms, rate_limit_rate=rate_limit_rate, seed=1)
+    server = make_server(state, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    import gsheet_formatter
+    gsheet_formatter.GOOGLE_API_ENDPOINT = base_url(server)
+    gsheet_formatter.APP_SCRIPT_ID = "fake-script"
+
+    routine = _bench_routine(rows)
+    results = []
+    try:
+        for index in range(spreadsheets):
+            gsheet_formatter.SPREADSHEET_NAME = f"bench-{index}"
+            state.reset_stats()
+            started = time.perf_counter()
+            ok = gsheet_formatter.publish_routine(routine)
+            elapsed = time.perf_counter() - started
+            stats = state.snapshot_stats()
+            results.append({"spreadsheet": gsheet_formatter.SPREADSHEET_NAME, "ok": ok,
+                            "wall_ms": round(elapsed * 1000, 1), "round_trips": stats["requests"],
+                            "bytes_in": stats["bytes_in"], "endpoints": stats["endpoints"]})
+            print(json.dumps(results[-1]))
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Sheets/Drive/Apps Script APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--spreadsheet", action="append", default=[], help="spreadsheet title to create")
+    parser.add_argument("--auto-create", action="store_true", help="create spreadsheets on first open")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean added latency per request")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--bench", action="store_true", help="publish a synthetic routine and report, then exit")
+    parser.add_argument("--rows", type=int, default=2000, help="--bench: routine rows")
+    parser.add_argument("--spreadsheets", type=int, default=1, help="--bench: spreadsheets to publish to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.bench:
+        results = run_bench(args.rows, args.spreadsheets, args.latency_ms, args.rate_limit_rate)
+        return 0 if all(r["ok"] for r in results) else 1
+
+    from config import SPREADSHEET_NAME
+    state = GoogleApiState(spreadsheets=args.spreadsheet or [SPREADSHEET_NAME], auto_create=args.auto_create,
+                           latency_ms=args.latency_ms, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    server = make_server(state, args.host, args.port, verbose=args.verbose)
+    print(f"Fake Google APIs on {base_url(server)}")
+    print(f"  GOOGLE_API_ENDPOINT={base_url(server)}")
+    print(f"  spreadsheets: {', '.join(s.title for s in state.spreadsheets.values())}")
+    print(f"  stats: {base_url(server)}{STATS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
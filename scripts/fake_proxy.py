@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Local stand-in for an HTTP forward proxy, for per-profile egress tests.
+
+Forwards absolute-URI requests (GET http://host/path ...) and tunnels
+CONNECT, so a browser or requests can be pointed at it like at a real
+egress proxy (`"proxy": "http://127.0.0.1:8790"` in the credentials file):
+
+    GET|POST http://host:port/...   forwarded, response relayed
+    CONNECT host:port               raw TCP tunnel (HTTPS)
+    GET  /__stats                   JSON counters (asked of the proxy itself)
+
+With --challenge-rate, that fraction of forwarded login page GETs
+(/Security/Login.aspx) is answered by the proxy with a Cloudflare-style
+"Just a moment..." page instead, so several proxies with different rates
+stand in for egress IPs the portal challenges more or less often.
+
+Usage:
+    python scripts/fake_proxy.py [--port 8790] [--challenge-rate 0]
+"""
+import argparse
+import http.client
+import json
+import random
+import selectors
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+STATS_PATH = "/__stats"
+# The fake portal's login page (scripts/fake_ucam_portal.py).
+LOGIN_PATH = "/Security/Login.aspx"
+UPSTREAM_TIMEOUT_S = 30
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "proxy-connection",
+              "te", "trailers", "transfer-encoding", "upgrade"}
+CHALLENGE_PAGE = ("<!DOCTYPE html><html><head><title>Just a moment...</title></head>"
+                  "<body><h1>Checking your browser before accessing the portal.</h1></body></html>")
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    server_version = "FakeProxy/1.0"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _count(self, key, host=None):
+        with self.server.lock:
+            self.server.stats[key] = self.server.stats.get(key, 0) + 1
+            if host:
+                hosts = self.server.stats.setdefault("hosts", {})
+                hosts[host] = hosts.get(host, 0) + 1
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=()):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _challenged(self, method, path):
+        if method != "GET" or urlsplit(path).path != LOGIN_PATH or self.server.challenge_rate <= 0:
+            return False
+        with self.server.lock:
+            return self.server.random.random() < self.server.challenge_rate
+
+    # [Forwarding]
+
+    def _forward(self):
+        method = self.command
+        target = urlsplit(self.path)
+        if not target.scheme:
+            if target.path == STATS_PATH and method == "GET":
+                with self.server.lock:
+                    stats = json.loads(json.dumps(self.server.stats))
+                self._send(200, json.dumps(stats), "application/json")
+                return
+            self._send(400, "<h1>Not a proxy request</h1>")
+            return
+        if target.scheme != "http":
+            self._send(400, f"<h1>Unsupported scheme {target.scheme}</h1>")
+            return
+
+        host = target.hostname
+        port = target.port or 80
+        path = target.path or "/"
+        if target.query:
+            path += "?" + target.query
+        self._count("requests", f"{host}:{port}")
+        if self._challenged(method, path):
+            self._count("challenges")
+            self._send(503, CHALLENGE_PAGE, headers=[("Server", "cloudflare")])
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        headers = {name: value for name, value in self.headers.items() if name.lower() not in HOP_BY_HOP}
+        upstream = http.client.HTTPConnection(host, port, timeout=UPSTREAM_TIMEOUT_S)
+        try:
+            upstream.request(method, path, body=body, headers=headers)
+            response = upstream.getresponse()
+            payload = response.read()
+        except OSError as e:
+            self._count("upstream_errors")
+            self._send(502, f"<h1>Bad gateway: {e}</h1>")
+            return
+        finally:
+            upstream.close()
+
+        self.send_response(response.status, response.reason)
+        for name, value in response.getheaders():
+            if name.lower() not in HOP_BY_HOP and name.lower() != "content-length":
+                self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _forward
+
+    # [Tunnelling]
+
+    def do_CONNECT(self):
+        host, _, port = self.path.rpartition(":")
+        self._count("tunnels", self.path)
+        try:
+            upstream = socket.create_connection((host.strip("[]"), int(port)), timeout=UPSTREAM_TIMEOUT_S)
+        except (OSError, ValueError) as e:
+            self._count("upstream_errors")
+            self._send(502, f"<h1>Bad gateway: {e}</h1>")
+            return
+        self.send_response(200, "Connection established")
+        self.end_headers()
+        self.close_connection = True
+        with upstream, selectors.DefaultSelector() as selector:
+            selector.register(self.connection, selectors.EVENT_READ, upstream)
+            selector.register(upstream, selectors.EVENT_READ, self.connection)
+            while True:
+                for key, _ in selector.select(timeout=UPSTREAM_TIMEOUT_S):
+                    try:
+                        data = key.fileobj.recv(65536)
+                        if data:
+                            key.data.sendall(data)
+                    except OSError:
+                        data = b""
+                    if not data:
+                        return
+
+
+def make_server(host="127.0.0.1", port=8790, challenge_rate=0.0, seed=None, verbose=False):
+    """
+    Creates (but does not start) the proxy server; port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), ProxyHandler)
+    server.daemon_threads = True
+    server.challenge_rate = challenge_rate
+    server.random = random.Random(seed)
+    server.stats = {}
+    server.lock = threading.Lock()
+    server.verbose = verbose
+    return server
+
+
+def proxy_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run a local HTTP forward proxy for egress tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--challenge-rate", type=float, default=0.0,
+                        help="fraction of login page GETs answered with a challenge page")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    server = make_server(args.host, args.port, args.challenge_rate, args.seed, args.verbose)
+    url = proxy_url(server)
+    print(f"Fake proxy on {url}")
+    print(f'  "proxy": "{url}",')
+    print(f"  stats: {url}{STATS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
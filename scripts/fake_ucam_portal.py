@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""Local stand-in for the UCAM portal, for end-to-end and load tests.
+
+Serves just enough of the portal for the scraper's browser flow to run
+unchanged against it:
+
+    /Security/Login.aspx          login form (logMain_UserName, logMain_Password,
+                                  logMain_Button1); optional "Just a moment..."
+                                  interstitial before it
+    /Security/Home.aspx           post-login page with ctl00_lbtnUserName
+    /Module/Dashboard/StudentClassAttendanceDashboard.aspx
+                                  ctl00_MainContainer_ddlHeldIn plus a minimal
+                                  select2 control; picking a semester does an
+                                  UpdatePanel partial postback that fills
+                                  ctl00_MainContainer_UpdatePanel02 with
+                                  gvCourseList
+    /__stats                      JSON request/failure counters
+
+Any username/password logs in except the password "wrong". Each user's
+section is the part of the username after the last "_" (e.g. "alice_B1"),
+or "A". Latency, 5xx failures and the interstitial are injected at
+configurable rates so parallel and browserless modes can be load-tested for
+dozens of profiles on one machine.
+
+Usage:
+    python scripts/fake_ucam_portal.py [--port 8765] [--courses 12]
+        [--latency-ms 0] [--failure-rate 0] [--interstitial-rate 0]
+
+Point login_url/attendance_dashboard_url in the credentials file at the
+URLs it prints.
+"""
+import argparse
+import html
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, urlsplit
+
+LOGIN_PATH = "/Security/Login.aspx"
+HOME_PATH = "/Security/Home.aspx"
+DASHBOARD_PATH = "/Module/Dashboard/StudentClassAttendanceDashboard.aspx"
+STATS_PATH = "/__stats"
+
+SESSION_COOKIE = "ASP.NET_SessionId"
+CLEARANCE_COOKIE = "cf_clearance"
+SEMESTER_FIELD = "ctl00$MainContainer$ddlHeldIn"
+UPDATE_PANEL_ID = "ctl00_MainContainer_UpdatePanel02"
+DELTA_HEADER = "X-MicrosoftAjax"
+
+DAYS = ("Sun", "Mon", "Tue", "Wed", "Thu")
+TIME_SLOTS = ("8:0 - 9:15", "9:30 - 10:45", "11:0 - 12:15", "2:0 - 3:15", "3:30 - 4:45")
+LAB_TIME_SLOTS = ("9:0 - 11:50", "2:0 - 4:50")
+
+
+class PortalConfig:
+    """
+    Knobs for the fake portal.
+
+    Args:
+        courses (int): Rows in gvCourseList per user.
+        semesters (list): Semester labels offered after the placeholder.
+        latency_ms (float): Mean added latency per request (uniform 0.5x-1.5x).
+        failure_rate (float): Probability of answering a request with HTTP 500.
+        interstitial_rate (float): Probability that a login page visit without
+            a clearance cookie gets the Cloudflare-style interstitial.
+        interstitial_s (int): Refresh delay on the interstitial page.
+        seed (int): Seed for the injected randomness, for repeatable runs.
+    """
+
+    def __init__(self, courses=12, semesters=None, latency_ms=0.0, failure_rate=0.0,
+                 interstitial_rate=0.0, interstitial_s=1, seed=None):
+        self.courses = courses
+        self.semesters = list(semesters or ["Fall 2026", "Summer 2026"])
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.interstitial_rate = interstitial_rate
+        self.interstitial_s = interstitial_s
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def roll(self, rate):
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+    def delay_s(self):
+        if self.latency_ms <= 0:
+            return 0.0
+        with self.lock:
+            return self.latency_ms / 1000 * self.random.uniform(0.5, 1.5)
+
+
+def section_for(username):
+    return username.rsplit("_", 1)[1] if "_" in username else "A"
+
+
+def course_rows(section, count, semester):
+    """
+    Deterministic gvCourseList rows in the portal's cell layout.
+    """
+    rows = []
+    for index in range(count):
+        is_lab = index % 4 == 3
+        day_one = DAYS[index % len(DAYS)]
+        day_two = DAYS[(index + 2) % len(DAYS)]
+        slot = LAB_TIME_SLOTS[index % 2] if is_lab else TIME_SLOTS[index % len(TIME_SLOTS)]
+        teacher = f"T{index % 7}"
+        title = f"Course {index + 1}{' Lab' if is_lab else ''} ({semester})"
+        rows.append(
+            "<tr>"
+            f"<td>{index + 1}</td>"
+            f"<td>Course Code :<br/>CSE-{3201 + index}<br/>Title : {html.escape(title)}<br/>"
+            f"Credit : {'1.50' if is_lab else '3.00'}<br/>Section : {html.escape(section)}</td>"
+            f"<td>Day :<br/>{day_one}<br/>Time : {slot}<br/>Room : {100 + index}<br/>Teacher : {teacher}</td>"
+            f"<td>Day :<br/>{day_two}<br/>Time : {slot}<br/>Room : {200 + index}<br/>Teacher : {teacher}</td>"
+            f"<td>Total Class : {10 + index % 5}<br/>Attendance Percentage :<br/>{80 + index % 20}.00</td>"
+            "</tr>"
+        )
+    return rows
+
+
+def course_table(section, count, semester):
+    header = "<tr><th>SL</th><th>Course Info</th><th>Schedule 1</th><th>Schedule 2</th><th>Attendance</th></tr>"
+    return (
+        '<table id="ctl00_MainContainer_gvCourseList">'
+        + header + "".join(course_rows(section, count, semester)) + "</table>"
+    )
+
+
+def delta_response(panel_id, content):
+    """
+    ASP.NET AJAX partial-postback body: length|type|id|content| records.
+    """
+    return f"{len(content)}|updatePanel|{panel_id}|{content}|"
+
+
+def _page(title, body):
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>{html.escape(title)}</title></head><body>{body}</body></html>"
+    )
+
+
+LOGIN_FORM = """
+<form method="post" action="{action}">
+  <input type="text" id="logMain_UserName" name="logMain$UserName">
+  <input type="password" id="logMain_Password" name="logMain$Password">
+  <input type="submit" id="logMain_Button1" name="logMain$Button1" value="Log In">
+  {error}
+</form>
+"""
+
+DASHBOARD_SCRIPT = """
+<script>
+function openS2() { document.getElementById('s2-results').style.display = 'block'; }
+function pickSemester(value, label) {
+  document.getElementById('s2-results').style.display = 'none';
+  document.getElementById('s2-label').textContent = label;
+  var select = document.getElementById('ctl00_MainContainer_ddlHeldIn');
+  select.value = value;
+  __doPostBack(select.name, '');
+}
+function __doPostBack(target, argument) {
+  var select = document.getElementById('ctl00_MainContainer_ddlHeldIn'), value = select.value;
+  var xhr = new XMLHttpRequest();
+  xhr.open('POST', window.location.href);
+  xhr.setRequestHeader('Content-Type', 'application/x-www-form-urlencoded');
+  xhr.setRequestHeader('X-MicrosoftAjax', 'Delta=true');
+  xhr.onload = function () {
+    var body = xhr.responseText, pos = 0;
+    while (pos < body.length) {
+      var bar = body.indexOf('|', pos), len = parseInt(body.substring(pos, bar), 10);
+      var typeEnd = body.indexOf('|', bar + 1), idEnd = body.indexOf('|', typeEnd + 1);
+      var type = body.substring(bar + 1, typeEnd), id = body.substring(typeEnd + 1, idEnd);
+      var content = body.substr(idEnd + 1, len);
+      if (type === 'updatePanel') { document.getElementById(id).innerHTML = content; }
+      pos = idEnd + 1 + len + 1;
+    }
+  };
+  xhr.send(encodeURIComponent('__EVENTTARGET') + '=' + encodeURIComponent(target)
+           + '&' + encodeURIComponent(select.name) + '=' + encodeURIComponent(value));
+}
+</script>
+"""
+
+
+class PortalHandler(BaseHTTPRequestHandler):
+    server_version = "Microsoft-IIS/10.0"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    # [Helpers]
+
+    def _cookies(self):
+        cookie = SimpleCookie()
+        cookie.load(self.headers.get("Cookie", ""))
+        return {key: morsel.value for key, morsel in cookie.items()}
+
+    def _session_user(self):
+        token = self._cookies().get(SESSION_COOKIE)
+        with self.server.lock:
+            return self.server.sessions.get(token)
+
+    def _form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        return {key: values[-1] for key, values in parse_qs(body).items()}
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=()):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _redirect(self, location, headers=()):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _count(self, key):
+        with self.server.lock:
+            self.server.stats[key] = self.server.stats.get(key, 0) + 1
+
+    def _inject(self):
+        """
+        Applies latency and failure injection; True if the request was failed.
+        """
+        config = self.server.config
+        delay = config.delay_s()
+        if delay:
+            time.sleep(delay)
+        if config.roll(config.failure_rate):
+            self._count("injected_failures")
+            self._send(500, _page("Runtime Error", "<h1>Server Error in '/' Application.</h1>"))
+            return True
+        return False
+
+    # [Routing]
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        path = urlsplit(self.path).path
+        self._count(f"{method} {path}")
+        if path == STATS_PATH:
+            with self.server.lock:
+                stats = dict(self.server.stats, sessions=len(self.server.sessions))
+            self._send(200, json.dumps(stats), "application/json")
+            return
+        if self._inject():
+            return
+        routes = {
+            ("GET", LOGIN_PATH): self._login_page,
+            ("POST", LOGIN_PATH): self._login_submit,
+            ("GET", HOME_PATH): self._home,
+            ("GET", DASHBOARD_PATH): self._dashboard,
+            ("POST", DASHBOARD_PATH): self._dashboard_postback,
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            self._send(404, _page("404 - File or directory not found.", "<h1>404</h1>"))
+            return
+        handler()
+
+    # [Pages]
+
+    def _login_page(self, error=""):
+        config = self.server.config
+        if CLEARANCE_COOKIE not in self._cookies() and config.roll(config.interstitial_rate):
+            self._count("interstitials")
+            body = (f"<meta http-equiv='refresh' content='{config.interstitial_s}'>"
+                    "<h1>Checking your browser before accessing the portal.</h1>")
+            self._send(503, _page("Just a moment...", body),
+                       headers=[("Set-Cookie", f"{CLEARANCE_COOKIE}={secrets.token_hex(8)}; Path=/")])
+            return
+        self._send(200, _page("UCAM | Login", LOGIN_FORM.format(action=LOGIN_PATH, error=error)))
+
+    def _login_submit(self):
+        form = self._form()
+        username = form.get("logMain$UserName", "")
+        if not username or form.get("logMain$Password") == "wrong":
+            self._count("login_failures")
+            self._login_page(error="<span class='error'>Invalid user name or password.</span>")
+            return
+        token = secrets.token_hex(12)
+        with self.server.lock:
+            self.server.sessions[token] = username
+        self._redirect(HOME_PATH, headers=[("Set-Cookie", f"{SESSION_COOKIE}={token}; Path=/; HttpOnly")])
+
+    def _home(self):
+        user = self._session_user()
+        if user is None:
+            self._redirect(LOGIN_PATH)
+            return
+        body = f"<a id='ctl00_lbtnUserName' href='#'>{html.escape(user)}</a><h1>Welcome</h1>"
+        self._send(200, _page("UCAM | Home", body))
+
+    def _dashboard_page(self, user, selected=None):
+        config = self.server.config
+        options = ["<option value='0'>Select Semester</option>"]
+        items = []
+        for index, semester in enumerate(config.semesters, start=1):
+            chosen = " selected" if str(index) == selected else ""
+            options.append(f"<option value='{index}'{chosen}>{html.escape(semester)}</option>")
+            items.append(f"<li onclick=\"pickSemester('{index}', this.textContent)\">{html.escape(semester)}</li>")
+        panel = self._panel(user, selected) if selected else ""
+        body = (
+            f"<a id='ctl00_lbtnUserName' href='#'>{html.escape(user)}</a>"
+            f"<form method='post' action='{DASHBOARD_PATH}'>"
+            f"<select id='ctl00_MainContainer_ddlHeldIn' name='{SEMESTER_FIELD}' style='display:none'"
+            f" onchange=\"javascript:setTimeout('__doPostBack(\\'{SEMESTER_FIELD}\\',\\'\\')', 0)\">"
+            f"{''.join(options)}</select>"
+            "<span class='select2 select2-container' onclick='openS2()'>"
+            "<span id='s2-label'>Select Semester</span></span>"
+            f"<span id='s2-results' class='select2-results' style='display:none'><ul>{''.join(items)}</ul></span>"
+            f"<div id='{UPDATE_PANEL_ID}'>{panel}</div>"
+            "</form>" + DASHBOARD_SCRIPT
+        )
+        return _page("UCAM | Class Attendance Dashboard", body)
+
+    def _panel(self, user, selected):
+        semesters = self.server.config.semesters
+        index = int(selected) if selected and selected.isdigit() else 0
+        if not 1 <= index <= len(semesters):
+            return ""
+        return course_table(section_for(user), self.server.config.courses, semesters[index - 1])
+
+    def _dashboard(self):
+        user = self._session_user()
+        if user is None:
+            self._redirect(LOGIN_PATH)
+            return
+        self._send(200, self._dashboard_page(user))
+
+    def _dashboard_postback(self):
+        user = self._session_user()
+        if user is None:
+            self._redirect(LOGIN_PATH)
+            return
+        selected = self._form().get(SEMESTER_FIELD, "0")
+        self._count("postbacks")
+        if "Delta=true" in self.headers.get(DELTA_HEADER, ""):
+            self._send(200, delta_response(UPDATE_PANEL_ID, self._panel(user, selected)),
+                       "text/plain; charset=utf-8")
+        else:
+            self._send(200, self._dashboard_page(user, selected))
+
+
+def make_server(config=None, host="127.0.0.1", port=8765, verbose=False):
+    """
+    Creates (but does not start) the portal server; port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), PortalHandler)
+    server.daemon_threads = True
+    server.config = config or PortalConfig()
+    server.sessions = {}
+    server.stats = {}
+    server.lock = threading.Lock()
+    server.verbose = verbose
+    return server
+
+
+def base_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the UCAM portal.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--courses", type=int, default=12, help="gvCourseList rows per user")
+    parser.add_argument("--semesters", nargs="+", default=None, help="semester labels to offer")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean added latency per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--interstitial-rate", type=float, default=0.0,
+                        help="fraction of uncleared login visits that get the interstitial")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    config = PortalConfig(courses=args.courses, semesters=args.semesters, latency_ms=args.latency_ms,
+                          failure_rate=args.failure_rate, interstitial_rate=args.interstitial_rate,
+                          seed=args.seed)
+    server = make_server(config, args.host, args.port, verbose=args.verbose)
+    url = base_url(server)
+    print(f"Fake UCAM portal on {url}")
+    print(f'  "login_url": "{url}{LOGIN_PATH}",')
+    print(f'  "attendance_dashboard_url": "{url}{DASHBOARD_PATH}"')
+    print(f"  stats: {url}{STATS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
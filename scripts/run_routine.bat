@@ -1,6 +1,6 @@
 @echo off
-rem Windows counterpart to run_routine.sh: runs the scraper, then the
-rem formatter only if the scraper succeeded.
+rem Windows counterpart to run_routine.sh: runs the scraper and formatter in
+rem one process through pipeline.py.
 setlocal
 
 rem Get the directory where this script is located and cd to the project root.
@@ -16,19 +16,28 @@ if exist ".venv\Scripts\python.exe" (
     exit /b 1
 )
 
-echo Starting routine scraper...
-"%PYTHON_EXEC%" routine_scrapper.py
-if errorlevel 1 (
-    echo Scraper failed. Skipping formatter.
-    exit /b 1
+rem With --scheduled (used by the scheduled task), scheduler.py decides
+rem whether a run is due; the flag itself is not passed on (%* ignores shift,
+rem hence the explicit %2..%9).
+set "ENTRY=pipeline.py"
+if "%~1"=="--scheduled" (
+    set "ENTRY=scheduler.py"
 )
 
-echo Scraper finished. Starting gsheet formatter...
-"%PYTHON_EXEC%" gsheet_formatter.py
-if errorlevel 1 (
-    echo Formatter failed.
-    exit /b 1
+echo Starting routine pipeline (%ENTRY%)...
+if "%ENTRY%"=="scheduler.py" (
+    "%PYTHON_EXEC%" scheduler.py %2 %3 %4 %5 %6 %7 %8 %9
+) else (
+    "%PYTHON_EXEC%" pipeline.py %*
 )
-
-echo Done.
-endlocal
+set "STATUS=%errorlevel%"
+if "%STATUS%"=="0" (
+    echo Done.
+) else if "%STATUS%"=="3" (
+    echo Scraper failed. Nothing was published.
+) else if "%STATUS%"=="4" (
+    echo Publishing to Google Sheets failed.
+) else (
+    echo Pipeline exited with status %STATUS%.
+)
+exit /b %STATUS%
@@ -15,23 +15,29 @@ else
     exit 1
 fi
 
-# Run the scraper
-echo "Starting routine scraper..."
+# Run the scraper and formatter in one process (pipeline.py). With
+# --scheduled (used by the timer), scheduler.py decides whether a run is due.
+ENTRY="pipeline.py"
+if [ "$1" = "--scheduled" ]; then
+    ENTRY="scheduler.py"
+    shift
+fi
+echo "Starting routine pipeline ($ENTRY)..."
 
 # Check if xvfb-run is available for headless execution
 if command -v xvfb-run >/dev/null 2>&1; then
     echo "Executing via xvfb-run (headless mode)..."
-    xvfb-run --auto-servernum --server-args="-screen 0 1920x1080x24" "$PYTHON_EXEC" routine_scrapper.py
+    xvfb-run --auto-servernum --server-args="-screen 0 1920x1080x24" "$PYTHON_EXEC" "$ENTRY" "$@"
 else
     echo "xvfb-run not found. Executing in standard mode..."
-    "$PYTHON_EXEC" routine_scrapper.py
+    "$PYTHON_EXEC" "$ENTRY" "$@"
 fi
 
-# If the scraper succeeds, run the formatter
-if [ $? -eq 0 ]; then
-    echo "Scraper finished. Starting gsheet formatter..."
-    "$PYTHON_EXEC" gsheet_formatter.py
-else
-    echo "Scraper failed. Skipping formatter."
-    exit 1
-fi
\ No newline at end of file
+STATUS=$?
+case $STATUS in
+    0) echo "Pipeline finished." ;;
+    3) echo "Scraper failed. Nothing was published." ;;
+    4) echo "Publishing to Google Sheets failed." ;;
+    *) echo "Pipeline exited with status $STATUS." ;;
+esac
+exit $STATUS
@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import atomic_file as af
+
+
+def _manifest(tmp_path):
+    return json.loads((tmp_path / af.MANIFEST_FILENAME).read_text(encoding="utf-8"))
+
+
+# ----------------------------- slugs -----------------------------
+
+def test_unique_slugs_only_suffix_collisions():
+    slugs = af.unique_slugs(["B1", "B 2", "B/2", ""])
+    assert slugs["B1"] == "B1" and slugs[""] == "unknown"
+    assert slugs["B 2"] != slugs["B/2"]
+    assert all(slugs[value].startswith("B_2_") for value in ("B 2", "B/2"))
+
+
+def test_digest_ignores_key_order():
+    assert af.digest({"a": 1, "b": [1, 2]}) == af.digest({"b": [1, 2], "a": 1})
+    assert af.digest({"a": 1}) != af.digest({"a": 2})
+
+
+# ----------------------------- OutputDir -----------------------------
+
+def _export(tmp_path, files, **extra):
+    output = af.OutputDir(str(tmp_path))
+    for filename, text in files.items():
+        output.write(filename, af.digest(text), lambda f: f.write(text))
+    return output.finish(**extra)
+
+
+def test_output_dir_writes_skips_and_removes(tmp_path):
+    result = _export(tmp_path, {"a.txt": "A", "b.txt": "B"}, anchors={"a.txt": 1})
+    assert result == {"written": ["a.txt", "b.txt"], "unchanged": [], "removed": []}
+    assert _manifest(tmp_path)["anchors"] == {"a.txt": 1}
+
+    result = _export(tmp_path, {"a.txt": "A2"})
+    assert result == {"written": ["a.txt"], "unchanged": [], "removed": ["b.txt"]}
+    assert (tmp_path / "a.txt").read_text(encoding="utf-8") == "A2"
+    assert not (tmp_path / "b.txt").exists()
+    assert "anchors" not in _manifest(tmp_path)
+
+
+def test_output_dir_restores_a_missing_file(tmp_path):
+    _export(tmp_path, {"a.txt": "A"})
+    os.remove(tmp_path / "a.txt")
+    assert _export(tmp_path, {"a.txt": "A"})["written"] == ["a.txt"]
+    assert _export(tmp_path, {"a.txt": "A"})["unchanged"] == ["a.txt"]
+
+
+def test_output_dir_failed_render_keeps_the_previous_file(tmp_path):
+    _export(tmp_path, {"a.txt": "A"})
+
+    def _broken(f):
+        f.write("partial")
+        raise RuntimeError("boom")
+
+    output = af.OutputDir(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        output.write("a.txt", af.digest("A2"), _broken)
+    assert (tmp_path / "a.txt").read_text(encoding="utf-8") == "A"
+    assert sorted(os.listdir(tmp_path)) == ["a.txt", af.MANIFEST_FILENAME]
+
+
+def test_output_dir_ignores_a_corrupt_manifest(tmp_path):
+    (tmp_path / af.MANIFEST_FILENAME).write_text("[", encoding="utf-8")
+    assert _export(tmp_path, {"a.txt": "A"})["written"] == ["a.txt"]
@@ -0,0 +1,177 @@
+import datetime
+import json
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calendar_export as ce
+
+
+def _entry(code, day, slot, section="B", teacher="Dr. Sadia Sultana", room="120"):
+    return {"CourseCode": code, "CourseTitle": f"{code} Title", "Section": section, "Day": day, "Room": room,
+            "TimeSlot": slot, "Teacher": teacher, "TeacherPhone": "017", "TeacherEmail": "ss@uap-bd.edu"}
+
+
+ROUTINE = [
+    _entry("CSE-3201", "Sun", "11:0 - 12:15"),
+    _entry("CSE-3212", "Sat", "2:0 - 4:30", section="B2", teacher="JTT"),
+    _entry("CSE-3205", "Tue", "8:30 - 9:45", teacher="N/A"),
+]
+
+
+def _read(path):
+    # Binary read: calendars use CRLF line endings.
+    return path.read_bytes().decode("utf-8")
+
+
+def _unfold(text):
+    return text.replace("\r\n ", "")
+
+
+def _export(tmp_path, routine=ROUTINE, **kwargs):
+    kwargs.setdefault("start_date", "2026-10-17")
+    kwargs.setdefault("weeks", 16)
+    kwargs.setdefault("tzid", "Asia/Dhaka")
+    return ce.export_calendars(routine, out_dir=str(tmp_path), **kwargs)
+
+
+# ----------------------------- lines -----------------------------
+
+def test_fold_limits_octets_without_splitting_characters():
+    line = "DESCRIPTION:" + "শিক্ষক " * 30
+    folded = ce.fold(line)
+    parts = folded[:-2].split("\r\n ")
+    assert all(len(part.encode("utf-8")) <= 75 for part in parts)
+    assert "".join(parts) == line
+    assert ce.fold("SHORT:1") == "SHORT:1\r\n"
+
+
+def test_escape_text():
+    assert ce.escape_text("a,b;c\\d\ne") == "a\\,b\\;c\\\\d\\ne"
+
+
+def test_calendar_groups_per_section_and_teacher():
+    groups = ce.calendar_groups(ROUTINE)
+    assert sorted(groups) == ["section_B.ics", "section_B2.ics", "teacher_Dr._Sadia_Sultana.ics", "teacher_JTT.ics"]
+    assert [e["CourseCode"] for e in groups["section_B.ics"][2]] == ["CSE-3201", "CSE-3205"]
+
+
+# ----------------------------- export -----------------------------
+
+def test_export_writes_weekly_events(tmp_path):
+    result = _export(tmp_path)
+    assert len(result["written"]) == 4
+    text = _read(tmp_path / "section_B.ics")
+    assert text.startswith("BEGIN:VCALENDAR\r\n") and text.endswith("END:VCALENDAR\r\n")
+    body = _unfold(text)
+    # Saturday 2026-10-17 is the term start; the week runs Saturday first.
+    assert body.index("CSE-3205") > body.index("CSE-3201")
+    assert "DTSTART;TZID=Asia/Dhaka:20261018T110000" in body
+    assert "DTEND;TZID=Asia/Dhaka:20261018T121500" in body
+    assert "RRULE:FREQ=WEEKLY;BYDAY=SU;COUNT=16" in body
+    assert "DTSTART;TZID=Asia/Dhaka:20261020T083000" in body
+    assert "LOCATION:Room 120" in body
+    assert "DESCRIPTION:Teacher: Dr. Sadia Sultana\\nPhone: 017\\nEmail: ss@uap-bd.edu" in body
+    assert "TZOFFSETTO:+0600" in body
+    teacher = _unfold(_read(tmp_path / "teacher_JTT.ics"))
+    assert "SUMMARY:CSE-3212 CSE-3212 Title (Section B2)" in teacher
+    assert "DTSTART;TZID=Asia/Dhaka:20261017T140000" in teacher
+
+
+def test_export_without_end_or_timezone(tmp_path):
+    _export(tmp_path, weeks=0, tzid="")
+    body = _unfold(_read(tmp_path / "section_B.ics"))
+    assert "RRULE:FREQ=WEEKLY;BYDAY=SU\r\n" in body
+    assert "DTSTART:20261018T110000" in body
+    assert "VTIMEZONE" not in body
+
+
+def test_calendar_groups_disambiguate_colliding_slugs():
+    groups = ce.calendar_groups([_entry("CSE-3201", "Sun", "11:0 - 12:15", section="B 1", teacher="A Rahman"),
+                                 _entry("CSE-3205", "Tue", "8:30 - 9:45", section="B/1", teacher="A/Rahman")])
+    assert len(groups) == 4
+    assert sorted(re.sub(r"_[0-9a-f]{8}\.ics$", "", name) for name in groups) == [
+        "section_B_1", "section_B_1", "teacher_A_Rahman", "teacher_A_Rahman"]
+    assert {title for title, _, _ in groups.values()} == {"Section B 1", "Section B/1", "A Rahman", "A/Rahman"}
+
+
+def test_event_uids_are_stable_and_distinct():
+    uids = {ce.event_uid(entry) for entry in ROUTINE}
+    assert len(uids) == 3
+    assert ce.event_uid(dict(ROUTINE[0], Room="999")) == ce.event_uid(ROUTINE[0])
+
+
+def test_export_rewrites_only_changed_calendars(tmp_path):
+    _export(tmp_path)
+    changed = [dict(ROUTINE[0], Room="305")] + ROUTINE[1:]
+    result = _export(tmp_path, routine=changed)
+    assert result["written"] == ["section_B.ics", "teacher_Dr._Sadia_Sultana.ics"]
+    assert result["unchanged"] == ["section_B2.ics", "teacher_JTT.ics"]
+    assert "Room 305" in _read(tmp_path / "section_B.ics")
+
+
+def test_export_restores_missing_and_removes_stale_files(tmp_path):
+    _export(tmp_path)
+    os.remove(tmp_path / "section_B2.ics")
+    result = _export(tmp_path, routine=ROUTINE[:2])
+    assert "section_B2.ics" in result["written"]
+    _export(tmp_path, routine=ROUTINE[:1])
+    assert not (tmp_path / "teacher_JTT.ics").exists()
+    assert not (tmp_path / "section_B2.ics").exists()
+
+
+def _manifest(tmp_path):
+    return json.loads((tmp_path / ce.MANIFEST_FILENAME).read_text(encoding="utf-8"))
+
+
+def _anchors(tmp_path):
+    return {name: start for name, (_, start) in _manifest(tmp_path)["anchors"].items()}
+
+
+def test_export_anchors_default_start_on_the_current_week(tmp_path):
+    _export(tmp_path, start_date="", today=datetime.date(2026, 10, 19))
+    assert set(_anchors(tmp_path).values()) == {"2026-10-17"}
+    result = _export(tmp_path, start_date="", today=datetime.date(2026, 12, 1))
+    assert set(_anchors(tmp_path).values()) == {"2026-10-17"}
+    assert len(result["unchanged"]) == 4
+
+
+def test_export_moves_the_anchor_only_for_changed_calendars(tmp_path):
+    _export(tmp_path, start_date="", today=datetime.date(2026, 10, 19))
+    before = _read(tmp_path / "section_B2.ics")
+    result = _export(tmp_path, routine=[dict(ROUTINE[0], Room="305")] + ROUTINE[1:], start_date="",
+                     today=datetime.date(2026, 12, 1))
+    assert result["written"] == ["section_B.ics", "teacher_Dr._Sadia_Sultana.ics"]
+    assert _anchors(tmp_path) == {"section_B.ics": "2026-11-28", "teacher_Dr._Sadia_Sultana.ics": "2026-11-28",
+                                  "section_B2.ics": "2026-10-17", "teacher_JTT.ics": "2026-10-17"}
+    assert _read(tmp_path / "section_B2.ics") == before
+
+
+def test_export_moves_an_expired_anchor_forward(tmp_path):
+    _export(tmp_path, start_date="", today=datetime.date(2026, 10, 19))
+    today = datetime.date(2027, 3, 2)
+    result = _export(tmp_path, start_date="", today=today)
+    assert len(result["written"]) == 4
+    body = _unfold(_read(tmp_path / "section_B.ics"))
+    first = datetime.datetime.strptime(body.split("DTSTART;TZID=Asia/Dhaka:")[1][:8], "%Y%m%d").date()
+    last = first + datetime.timedelta(weeks=15)
+    assert "COUNT=16" in body and first <= today <= last
+
+
+def test_export_failure_leaves_previous_file(tmp_path, monkeypatch):
+    _export(tmp_path)
+    before = _read(tmp_path / "section_B.ics")
+
+    def _broken(*args):
+        yield "BEGIN:VCALENDAR\r\n"
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(ce, "iter_calendar_lines", _broken)
+    with pytest.raises(RuntimeError):
+        _export(tmp_path, routine=[dict(ROUTINE[0], Room="305")])
+    assert _read(tmp_path / "section_B.ics") == before
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
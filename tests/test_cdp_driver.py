@@ -0,0 +1,307 @@
+import base64
+import json
+import os
+import sys
+
+import pytest
+import websocket
+from selenium.common.exceptions import (
+    JavascriptException, NoSuchElementException, StaleElementReferenceException, TimeoutException,
+    WebDriverException,
+)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cdp_driver as cdp
+import driver_trace
+import partial_postback
+import routine_scrapper as rs
+
+NODE = {"type": "object", "subtype": "node"}
+NULL = {"type": "object", "subtype": "null", "value": None}
+
+
+class FakeConnection:
+    """
+    Answers commands from a script of (method, result) pairs; a result may
+    be an exception to raise or a callable taking the params.
+    """
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.calls = []
+        self.events = []
+        self.discarded = []
+
+    def send(self, method, params=None, timeout_s=None):
+        self.calls.append((method, params or {}))
+        if method == "Page.enable":
+            return {}
+        expected, result = self.script.pop(0)
+        assert method == expected, f"expected {expected}, got {method}"
+        if isinstance(result, Exception):
+            raise result
+        return result(params) if callable(result) else result
+
+    def wait_event(self, method, timeout_s, predicate=None):
+        methods = (method,) if isinstance(method, str) else method
+        for index, (name, params) in enumerate(self.events):
+            if name in methods and (predicate is None or predicate(params)):
+                return self.events.pop(index)[1]
+        raise TimeoutException(f"no {method} event")
+
+    def discard_events(self, method):
+        self.discarded.append(method)
+
+    def close(self):
+        pass
+
+
+def _value(value):
+    return {"result": {"type": "object", "value": value}}
+
+
+def _driver(*script):
+    return cdp.CDPDriver(FakeConnection(script))
+
+
+# ----------------------------- elements -----------------------------
+
+def test_find_element_and_wait_for_presence():
+    driver = _driver(
+        ("Runtime.evaluate", {"result": NULL}),
+        ("Runtime.evaluate", {"result": dict(NODE, objectId="n1")}),
+    )
+    element = WebDriverWait(driver, 2, poll_frequency=0.01).until(
+        EC.presence_of_element_located((By.ID, "ctl00_username")))
+    assert element.id == "n1" and element.parent is driver
+    expression = driver.connection.calls[-1][1]["expression"]
+    assert '"id", "ctl00_username", false' in expression
+
+    driver.connection.script.append(("Runtime.evaluate", {"result": NULL}))
+    with pytest.raises(NoSuchElementException):
+        driver.find_element(By.XPATH, "//table")
+    with pytest.raises(WebDriverException, match="not supported"):
+        driver.find_element(By.LINK_TEXT, "Home")
+
+
+def test_find_elements_under_an_element():
+    driver = _driver(
+        ("Runtime.callFunctionOn", {"result": {"type": "object", "subtype": "array", "objectId": "arr"}}),
+        ("Runtime.getProperties", {"result": [
+            {"name": "1", "value": dict(NODE, objectId="o2")},
+            {"name": "0", "value": dict(NODE, objectId="o1")},
+            {"name": "length", "value": {"type": "number", "value": 2}},
+        ]}),
+    )
+    options = cdp.CDPElement(driver, "select").find_elements(By.TAG_NAME, "option")
+    assert [option.id for option in options] == ["o1", "o2"]
+    call = driver.connection.calls[-2][1]
+    assert call["objectId"] == "select" and [a["value"] for a in call["arguments"]] == ["css", "option", True]
+
+
+def test_clickable_and_staleness_conditions():
+    driver = _driver(
+        ("Runtime.evaluate", {"result": dict(NODE, objectId="btn")}),
+        ("Runtime.callFunctionOn", _value(True)),  # displayed
+        ("Runtime.callFunctionOn", _value(True)),  # enabled
+        ("Runtime.callFunctionOn", _value(True)),  # enabled: still attached
+        ("Runtime.callFunctionOn", cdp.CDPError("Runtime.callFunctionOn",
+                                                {"message": "Could not find object with given id"})),
+    )
+    button = EC.element_to_be_clickable((By.ID, "login"))(driver)
+    assert button.id == "btn"
+    assert EC.staleness_of(button)(driver) is False
+    assert EC.staleness_of(button)(driver) is True
+
+
+def test_detached_node_is_stale_and_script_errors_are_javascript_errors():
+    stale = {"result": {}, "exceptionDetails": {"text": "Uncaught", "exception": {"description": "Error: stale element"}}}
+    broken = {"result": {}, "exceptionDetails": {"text": "Uncaught", "exception": {"description": "TypeError: x"}}}
+    driver = _driver(("Runtime.callFunctionOn", stale), ("Runtime.evaluate", broken))
+    with pytest.raises(StaleElementReferenceException):
+        cdp.CDPElement(driver, "old").is_enabled()
+    with pytest.raises(JavascriptException, match="TypeError"):
+        driver.execute_script("return x.y;")
+
+
+def test_click_dispatches_mouse_events_at_the_centre():
+    driver = _driver(("Runtime.callFunctionOn", _value({"x": 50, "y": 20, "width": 100, "height": 40})),
+                     *[("Input.dispatchMouseEvent", {})] * 3,
+                     ("Runtime.callFunctionOn", _value({"x": 0, "y": 0, "width": 0, "height": 0})))
+    cdp.CDPElement(driver, "btn").click()
+    events = [params for method, params in driver.connection.calls if method == "Input.dispatchMouseEvent"]
+    assert [e["type"] for e in events] == ["mouseMoved", "mousePressed", "mouseReleased"]
+    assert all((e["x"], e["y"]) == (50, 20) for e in events)
+    with pytest.raises(WebDriverException, match="no size"):
+        cdp.CDPElement(driver, "hidden").click()
+
+
+def test_send_keys_focuses_then_inserts_text():
+    driver = _driver(("Runtime.callFunctionOn", _value(True)), ("Input.insertText", {}))
+    cdp.CDPElement(driver, "user").send_keys("2020", "01")
+    assert driver.connection.calls[-1] == ("Input.insertText", {"text": "202001"})
+
+
+# ----------------------------- scripts -----------------------------
+
+def test_execute_script_round_trips_elements():
+    driver = _driver(
+        ("Runtime.callFunctionOn", {"result": {"type": "object", "objectId": "r1"}}),
+        ("Runtime.callFunctionOn", _value([{"marker": {"__node__": 0}, "count": 3}, 1])),
+        ("Runtime.callFunctionOn", {"result": {"type": "object", "subtype": "array", "objectId": "nodes"}}),
+        ("Runtime.getProperties", {"result": [{"name": "0", "value": dict(NODE, objectId="m1")}]}),
+    )
+    select = cdp.CDPElement(driver, "select")
+    result = driver.execute_script("return {marker: arguments[0].firstElementChild, count: 3};", select, "42")
+    assert result == {"marker": cdp.CDPElement(driver, "m1"), "count": 3}
+    first = driver.connection.calls[1][1]
+    assert first["objectId"] == "select"
+    assert first["arguments"] == [{"objectId": "select"}, {"value": "42"}]
+    assert "arguments[0].firstElementChild" in first["functionDeclaration"]
+
+
+def test_execute_script_without_elements_is_two_round_trips():
+    driver = _driver(
+        ("Runtime.evaluate", {"result": {"type": "object", "objectId": "r1"}}),
+        ("Runtime.callFunctionOn", _value([{"rows": [["CSE-3201", "B"]]}, 0])),
+    )
+    assert driver.execute_script("return {rows: []};", "panel", 2) == {"rows": [["CSE-3201", "B"]]}
+    assert driver.connection.calls[1][1]["expression"].endswith('.apply(null, ["panel", 2])')
+    assert len(driver.connection.calls) == 3
+
+
+# ----------------------------- navigation -----------------------------
+
+def test_get_waits_for_load_and_reports_navigation_errors():
+    driver = _driver(("Page.navigate", {"frameId": "f"}), ("Page.navigate", {"errorText": "net::ERR_NAME"}))
+    driver.connection.events.append(("Page.loadEventFired", {"timestamp": 1}))
+    driver.get("https://ucam.uap-bd.edu/")
+    assert driver.connection.discarded == ["Page.loadEventFired"] and not driver.connection.events
+    with pytest.raises(WebDriverException, match="ERR_NAME"):
+        driver.get("https://nowhere.invalid/")
+
+
+# ----------------------------- network -----------------------------
+
+def _request(request_id, method="GET", headers=None):
+    return ("Network.requestWillBeSent", {"requestId": request_id, "request": {
+        "url": f"https://ucam.uap-bd.edu/{request_id}", "method": method, "headers": headers or {}}})
+
+
+def test_expect_response_returns_the_matching_body():
+    body = "6|updatePanel|p|<td/>|"
+    driver = _driver(("Network.enable", {}),
+                     ("Network.getResponseBody", {"body": base64.b64encode(body.encode()).decode(),
+                                                  "base64Encoded": True}))
+    waiter = driver.expect_response(partial_postback.is_delta_request)
+    assert driver.connection.discarded == ["Network.requestWillBeSent", *cdp.NETWORK_DONE_EVENTS]
+    driver.connection.events += [
+        _request("css"),
+        _request("delta", "POST", {"X-MicrosoftAjax": "Delta=true"}),
+        ("Network.loadingFinished", {"requestId": "css"}),
+        ("Network.loadingFinished", {"requestId": "delta"}),
+    ]
+    assert waiter.body(1) == body
+    assert driver.connection.calls[-1] == ("Network.getResponseBody", {"requestId": "delta"})
+    assert [event[1]["requestId"] for event in driver.connection.events] == ["css", "css"]
+
+
+def test_expect_response_failures():
+    driver = _driver(("Network.enable", {}))
+    waiter = driver.expect_response(lambda request: request["method"] == "POST")
+    driver.connection.events += [_request("r1", "POST"),
+                                 ("Network.loadingFailed", {"requestId": "r1", "errorText": "net::ERR_ABORTED"})]
+    with pytest.raises(WebDriverException, match="ERR_ABORTED"):
+        waiter.body(1)
+    # Network.enable is sent once per driver.
+    with pytest.raises(TimeoutException):
+        driver.expect_response(lambda request: True).body(0)
+
+
+# ----------------------------- connection -----------------------------
+
+class FakeSocket:
+    def __init__(self, messages):
+        self.messages = [json.dumps(m) for m in messages]
+        self.sent = []
+
+    def send(self, raw):
+        self.sent.append(json.loads(raw))
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv(self):
+        if not self.messages:
+            raise websocket.WebSocketTimeoutException("timed out")
+        return self.messages.pop(0)
+
+
+def _connection(monkeypatch, messages):
+    monkeypatch.setattr(websocket, "create_connection", lambda url, **kwargs: FakeSocket(messages))
+    return cdp.Connection("ws://127.0.0.1:9222/devtools/page/1")
+
+
+def test_connection_buffers_events_while_waiting_for_replies(monkeypatch):
+    connection = _connection(monkeypatch, [
+        {"method": "Page.frameStartedLoading", "params": {"frameId": "f"}},
+        {"method": "Page.loadEventFired", "params": {"timestamp": 2}},
+        {"id": 1, "result": {"frameId": "f"}},
+        {"id": 2, "error": {"code": -32000, "message": "Cannot navigate to invalid URL"}},
+    ])
+    assert connection.send("Page.navigate", {"url": "https://x"}) == {"frameId": "f"}
+    assert connection._ws.sent[0] == {"id": 1, "method": "Page.navigate", "params": {"url": "https://x"}}
+    assert connection.wait_event("Page.loadEventFired", 1) == {"timestamp": 2}
+    assert [method for method, _ in connection.events] == ["Page.frameStartedLoading"]
+    with pytest.raises(cdp.CDPError, match="invalid URL"):
+        connection.send("Page.navigate", {"url": "nope"})
+
+
+def test_wait_event_accepts_several_methods(monkeypatch):
+    connection = _connection(monkeypatch, [
+        {"method": "Network.loadingFinished", "params": {"requestId": "a"}},
+        {"method": "Network.loadingFailed", "params": {"requestId": "b", "errorText": "net::ERR_FAILED"}},
+    ])
+    assert connection.wait_event(cdp.NETWORK_DONE_EVENTS, 1, lambda p: p["requestId"] == "b")["errorText"]
+    assert connection.wait_event(cdp.NETWORK_DONE_EVENTS, 1) == {"requestId": "a"}
+
+
+def test_read_devtools_port(tmp_path):
+    (tmp_path / cdp.DEVTOOLS_PORT_FILE).write_text("40123\n/devtools/browser/abc\n", encoding="utf-8")
+    assert cdp.read_devtools_port(str(tmp_path), timeout_s=1) == 40123
+
+    class Exited:
+        returncode = 1
+
+        def poll(self):
+            return 1
+    with pytest.raises(WebDriverException, match="exited"):
+        cdp.read_devtools_port(str(tmp_path / "missing"), Exited(), timeout_s=1)
+
+
+# ----------------------------- integration -----------------------------
+
+def test_create_driver_uses_the_cdp_backend(monkeypatch):
+    launched = {}
+
+    def _launch(chrome_path, arguments, headless=False, profile_id=""):
+        launched.update(path=chrome_path, arguments=arguments, profile=profile_id)
+        return "driver"
+
+    monkeypatch.setattr(rs, "DRIVER_BACKEND", "cdp")
+    monkeypatch.setattr(rs, "PREFERRED_BROWSER", "chrome")
+    monkeypatch.setattr(rs, "get_chrome_executable", lambda: "/usr/bin/chromium")
+    monkeypatch.setattr(cdp, "launch", _launch)
+    assert rs.create_driver("p1") == "driver"
+    assert launched == {"path": "/usr/bin/chromium", "arguments": rs.CHROME_ARGUMENTS, "profile": "p1"}
+
+
+def test_trace_describes_cdp_commands():
+    params = {"functionDeclaration": "function() { return this.value; }", "arguments": [{"value": "ctl00"}]}
+    assert driver_trace.describe_target("Runtime.callFunctionOn", params) == \
+        "function() { return this.value; } ctl00"
+    assert driver_trace.describe_target("Page.navigate", {"url": "https://x"}) == "https://x"
@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import checkpoints
+import routine_scrapper as rs
+
+URLS = {"login_url": "https://ucam/login", "attendance_dashboard_url": "https://ucam/dashboard"}
+USERS = [{"id": "p1", "section_label": "A"}, {"id": "p2", "section_label": "B"}]
+ENTRIES = [{"CourseCode": "CSE-3201"}]
+
+
+# ----------------------------- CheckpointStore -----------------------------
+
+def test_store_round_trip(tmp_path):
+    store = checkpoints.CheckpointStore(str(tmp_path), ttl_s=60)
+    assert store.load(USERS[0], URLS) is None
+    store.save(USERS[0], URLS, ENTRIES)
+    entries, age = store.load(USERS[0], URLS)
+    assert entries == ENTRIES
+    assert 0 <= age < 60
+
+
+def test_store_rejects_stale_or_changed_profiles(tmp_path):
+    store = checkpoints.CheckpointStore(str(tmp_path), ttl_s=60)
+    store.save(USERS[0], URLS, ENTRIES)
+    assert store.load(dict(USERS[0], section_label="Z"), URLS) is None
+    assert checkpoints.CheckpointStore(str(tmp_path), ttl_s=0).load(USERS[0], URLS) is None
+
+    path = store.path("p1")
+    checkpoint = json.loads(open(path, encoding="utf-8").read())
+    checkpoint["saved_at"] -= 120
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    assert store.load(USERS[0], URLS) is None
+
+
+def test_store_ignores_corrupt_checkpoint(tmp_path):
+    store = checkpoints.CheckpointStore(str(tmp_path), ttl_s=60)
+    with open(store.path("p1"), "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert store.load(USERS[0], URLS) is None
+    store.discard("p1")
+    assert not os.path.exists(store.path("p1"))
+
+
+# ----------------------------- required sections -----------------------------
+
+@pytest.mark.parametrize("setting, expected", [
+    ("", ["A"]),
+    ("all", ["A", "B"]),
+    ("B, C", ["B", "C"]),
+])
+def test_required_sections(setting, expected):
+    assert checkpoints.required_sections(USERS, setting) == expected
+
+
+def test_missing_sections():
+    assert checkpoints.missing_sections(USERS, ["B"], "") == ["A"]
+    assert checkpoints.missing_sections(USERS, ["A", "B"], "all") == []
+
+
+# ----------------------------- scrape_routine -----------------------------
+
+@pytest.fixture
+def scraper(monkeypatch, tmp_path):
+    scraped, state = [], {"failing": set()}
+
+    def _scrape(profile, common_urls, work=None):
+        scraped.append(profile["id"])
+        if profile["id"] in state["failing"]:
+            return None
+        return [dict(ENTRIES[0], UserScrapedSection=profile["section_label"])]
+
+    monkeypatch.setattr(rs, "load_credentials", lambda path: dict(URLS, users=USERS))
+    monkeypatch.setattr(rs, "load_teacher_details_from_file", lambda path: {})
+    monkeypatch.setattr(rs, "scrape_profile_with_retry", _scrape)
+    monkeypatch.setattr(rs, "build_final_routine", lambda data, primary, secondary, details: list(data))
+    monkeypatch.setattr(checkpoints, "default_store",
+                        lambda: checkpoints.CheckpointStore(str(tmp_path / "checkpoints"), ttl_s=600))
+    return scraped, state
+
+
+def test_scrape_routine_resumes_from_checkpoints(scraper):
+    scraped, state = scraper
+    state["failing"] = {"p2"}
+    assert len(rs.scrape_routine(write_outputs=False)) == 1
+    state["failing"] = set()
+    assert len(rs.scrape_routine(write_outputs=False)) == 2
+    assert scraped == ["p1", "p2", "p2"]
+    rs.scrape_routine(write_outputs=False, force=True)
+    assert scraped == ["p1", "p2", "p2", "p1", "p2"]
+
+
+def test_failed_forced_rescrape_discards_the_checkpoint(scraper):
+    scraped, state = scraper
+    rs.scrape_routine(write_outputs=False)
+    state["failing"] = {"p2"}
+    rs.scrape_routine(write_outputs=False, force=True)
+    state["failing"] = set()
+    rs.scrape_routine(write_outputs=False)
+    assert scraped == ["p1", "p2", "p1", "p2", "p2"]
+
+
+def test_scrape_routine_refuses_missing_required_section(scraper, caplog):
+    _, state = scraper
+    state["failing"] = {"p1"}
+    assert rs.scrape_routine(write_outputs=False) == []
+    assert "Required section(s) missing: A" in caplog.text
+    assert len(rs.scrape_routine(write_outputs=False, allow_partial=True)) == 1
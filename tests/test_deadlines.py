@@ -0,0 +1,155 @@
+import math
+import os
+import sys
+import threading
+import time
+
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deadlines
+import routine_scrapper as rs
+
+
+# ----------------------------- budgets -----------------------------
+
+def test_no_budget_means_unlimited():
+    assert deadlines.current() is None
+    assert deadlines.remaining() == math.inf
+    assert deadlines.clamp(45) == 45
+    deadlines.check("anything")
+
+
+def test_zero_budget_is_unlimited():
+    with deadlines.phase("run", 0):
+        assert deadlines.clamp(45) == 45
+
+
+def test_clamp_uses_tightest_enclosing_budget():
+    with deadlines.phase("run", 100):
+        with deadlines.phase("login", 10) as login:
+            assert deadlines.current() is login
+            assert 9 < deadlines.clamp(45) <= 10
+            with deadlines.phase("inner", 50):
+                assert deadlines.clamp(45) <= 10
+        assert 10 < deadlines.clamp(45) <= 45
+    assert deadlines.current() is None
+
+
+def test_check_names_the_exhausted_budget():
+    with deadlines.phase("run", 0.01):
+        with deadlines.phase("login", 60):
+            time.sleep(0.02)
+            assert deadlines.clamp(45) == 0
+            with pytest.raises(deadlines.DeadlineExceeded, match="run budget exhausted before submit"):
+                deadlines.check("submit")
+
+
+def test_budgets_are_per_thread():
+    seen = []
+    with deadlines.phase("run", 5):
+        worker = threading.Thread(target=lambda: seen.append(deadlines.current()))
+        worker.start()
+        worker.join()
+    assert seen == [None]
+
+
+# ----------------------------- watchdog -----------------------------
+
+def test_watchdog_fires_after_grace():
+    killed = threading.Event()
+    with deadlines.phase("profile", 0.01) as deadline:
+        with deadlines.watchdog(deadline, "driver", grace_s=0.01, on_expire=lambda d: killed.set() or 3) as state:
+            assert killed.wait(2)
+    assert state["fired"] is True
+
+
+def test_watchdog_is_cancelled_when_block_finishes():
+    killed = threading.Event()
+    with deadlines.phase("profile", 0.05) as deadline:
+        with deadlines.watchdog(deadline, "driver", grace_s=0, on_expire=lambda d: killed.set()) as state:
+            pass
+    assert not killed.wait(0.1)
+    assert state["fired"] is False
+
+
+def test_watchdog_follows_an_extended_deadline():
+    killed = threading.Event()
+    with deadlines.phase("profile", 0.01) as deadline:
+        with deadlines.watchdog(deadline, "driver", grace_s=0.01, on_expire=lambda d: killed.set()) as state:
+            deadline.extend(0.2)
+            assert not killed.wait(0.1)
+            assert killed.wait(2)
+    assert state["fired"] is True
+
+
+def test_extend_is_capped_by_parents():
+    with deadlines.phase("run", 10):
+        with deadlines.phase("profile", 5) as profile:
+            profile.extend(100)
+            assert 9 < deadlines.remaining() <= 10
+        with deadlines.phase("unlimited", 0) as unlimited:
+            unlimited.extend(100)
+            assert unlimited.expires_at is None
+
+
+def test_watchdog_without_budget_never_arms():
+    with deadlines.phase("profile", 0) as deadline:
+        with deadlines.watchdog(deadline, "driver", on_expire=pytest.fail) as state:
+            pass
+    assert state["fired"] is False
+
+
+# ----------------------------- scraper integration -----------------------------
+
+class _Driver:
+    def __init__(self):
+        self.quit_called = False
+
+    def implicitly_wait(self, seconds):
+        self.implicit_wait = seconds
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_wait_until_raises_deadline_exceeded_when_budget_cuts_wait():
+    with deadlines.phase("read_dashboard", 0.01):
+        with pytest.raises(deadlines.DeadlineExceeded, match="read_dashboard"):
+            rs.wait_until(_Driver(), 30, lambda d: False, "course table")
+
+
+def test_wait_until_keeps_timeout_exception_within_budget():
+    with deadlines.phase("read_dashboard", 30):
+        with pytest.raises(TimeoutException):
+            rs.wait_until(_Driver(), 0.01, lambda d: False, "course table")
+
+
+def test_scrape_profile_watchdog_kills_stuck_session(monkeypatch):
+    driver = _Driver()
+    unstuck = threading.Event()
+    monkeypatch.setattr(rs, "create_driver", lambda profile_id, proxy=None: driver)
+    monkeypatch.setattr(rs, "DEADLINE_GRACE_S", 0.01)
+    monkeypatch.setattr(deadlines, "kill_driver", lambda d: unstuck.set() or 1)
+    captured = []
+    monkeypatch.setattr(rs.debug_capture, "capture", lambda *a, **k: captured.append(a))
+
+    def stuck_work(drv, profile, urls):
+        # A page load that only returns once the browser dies.
+        assert unstuck.wait(2)
+        raise ConnectionError("browser gone")
+
+    result = rs.scrape_profile({"id": "p1"}, {}, work=stuck_work, budget_s=0.02)
+    assert result is None
+    assert driver.implicit_wait == rs.IMPLICIT_WAIT_S
+    assert driver.quit_called
+    assert captured == []
+
+
+def test_scrape_profile_skipped_when_run_budget_exhausted(monkeypatch):
+    monkeypatch.setattr(rs, "create_driver", lambda profile_id, proxy=None: pytest.fail("browser launched"))
+    with deadlines.phase("run", 0.001):
+        time.sleep(0.01)
+        assert rs.scrape_profile({"id": "p1"}, {}) is None
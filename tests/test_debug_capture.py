@@ -0,0 +1,111 @@
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import debug_capture as dc
+
+
+class FakeDriver:
+    def __init__(self, html="<html>blocked</html>", screenshot=b"\x89PNG", dead=False):
+        self._html = html
+        self._screenshot = screenshot
+        self._dead = dead
+        self.current_url = "https://ucam/login"
+        self.title = "Just a moment..."
+
+    @property
+    def page_source(self):
+        if self._dead:
+            raise RuntimeError("session gone")
+        return self._html
+
+    def get_screenshot_as_png(self):
+        if self._dead:
+            raise RuntimeError("session gone")
+        return self._screenshot
+
+
+def _artifacts(root, profile):
+    return sorted(os.listdir(os.path.join(root, profile)))
+
+
+# ----------------------------- snapshot -----------------------------
+
+def test_snapshot_reads_each_field_once():
+    state = dc.snapshot(FakeDriver())
+    assert state == {"url": "https://ucam/login", "title": "Just a moment...",
+                     "html": "<html>blocked</html>", "screenshot": b"\x89PNG"}
+
+
+def test_snapshot_of_dead_session_keeps_partial_state():
+    state = dc.snapshot(FakeDriver(dead=True))
+    assert state["html"] is None and state["screenshot"] is None
+    assert state["url"] == "https://ucam/login"
+
+
+# ----------------------------- ArtifactWriter -----------------------------
+
+def test_writer_writes_compressed_artifact(tmp_path):
+    writer = dc.ArtifactWriter(str(tmp_path))
+    writer.submit("student 1", "TimeoutException", dc.snapshot(FakeDriver()), error="login")
+    assert writer.flush(timeout=5)
+
+    (name,) = _artifacts(str(tmp_path), "student_1")
+    path = tmp_path / "student_1" / name
+    assert name.endswith("-TimeoutException")
+    with gzip.open(path / dc.PAGE_FILENAME, "rt", encoding="utf-8") as f:
+        assert f.read() == "<html>blocked</html>"
+    assert (path / dc.SCREENSHOT_FILENAME).read_bytes() == b"\x89PNG"
+    meta = json.loads((path / dc.META_FILENAME).read_text(encoding="utf-8"))
+    assert meta["title"] == "Just a moment..." and meta["error"] == "login"
+
+
+def test_ring_buffer_keeps_newest_per_profile(tmp_path):
+    writer = dc.ArtifactWriter(str(tmp_path), max_per_profile=2)
+    for reason in ("a", "b", "c"):
+        writer.submit("p1", reason, dc.snapshot(FakeDriver()))
+        writer.flush(timeout=5)
+        time.sleep(0.01)
+    writer.submit("p2", "x", dc.snapshot(FakeDriver()))
+    writer.flush(timeout=5)
+
+    kept = _artifacts(str(tmp_path), "p1")
+    assert [name.rsplit("-", 1)[1] for name in kept] == ["b", "c"]
+    assert len(_artifacts(str(tmp_path), "p2")) == 1
+
+
+def test_prune_by_size_keeps_newest(tmp_path):
+    writer = dc.ArtifactWriter(str(tmp_path), max_bytes=1)
+    for reason in ("a", "b"):
+        writer.submit("p1", reason, dc.snapshot(FakeDriver()))
+        writer.flush(timeout=5)
+        time.sleep(0.01)
+    assert [name.rsplit("-", 1)[1] for name in _artifacts(str(tmp_path), "p1")] == ["b"]
+
+
+def test_prune_by_age(tmp_path):
+    writer = dc.ArtifactWriter(str(tmp_path), max_age_s=60)
+    old = tmp_path / "p1" / "20200101-000000-old"
+    old.mkdir(parents=True)
+    os.utime(old, (time.time() - 3600, time.time() - 3600))
+    writer.submit("p1", "new", dc.snapshot(FakeDriver()))
+    writer.flush(timeout=5)
+    assert [name.rsplit("-", 1)[1] for name in _artifacts(str(tmp_path), "p1")] == ["new"]
+
+
+# ----------------------------- module API -----------------------------
+
+def test_capture_never_raises(monkeypatch):
+    def _broken():
+        raise OSError("read-only filesystem")
+    monkeypatch.setattr(dc, "writer", _broken)
+    assert dc.capture(FakeDriver(), "p1", "boom") is None
+
+
+def test_flush_without_writer_is_noop(monkeypatch):
+    monkeypatch.setattr(dc, "_writer", None)
+    assert dc.flush() is True
@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import driver_trace as dt
+import routine_scrapper as rs
+
+
+class ExecutingDriver:
+    """Driver double whose commands all go through execute(), like Selenium."""
+
+    def __init__(self, fail_on=()):
+        self.commands = []
+        self._fail_on = set(fail_on)
+
+    def execute(self, driver_command, params=None):
+        self.commands.append((driver_command, params))
+        if driver_command in self._fail_on:
+            raise RuntimeError(driver_command)
+        return {"value": None}
+
+    def get(self, url):
+        self.execute("get", {"url": url})
+
+    def find_element(self, by, value):
+        self.execute("findElement", {"using": by, "value": value})
+        return object()
+
+
+# ----------------------------- describe_target -----------------------------
+
+def test_describe_target_variants():
+    assert dt.describe_target("get", {"url": "https://x"}) == "https://x"
+    assert dt.describe_target("findElement", {"using": "id", "value": "a"}) == "id=a"
+    assert dt.describe_target(
+        "executeScript", {"script": "/* getAttribute */return (function(){})", "args": ["value"]}
+    ) == "/* getAttribute */ value"
+    assert dt.describe_target("clickElement", {"id": "e1"}) == "element e1"
+    assert dt.describe_target("getTitle", None) == ""
+
+
+# ----------------------------- instrument -----------------------------
+
+def test_instrument_records_commands_and_errors():
+    driver = ExecutingDriver(fail_on={"getPageSource"})
+    tracer = dt.CommandTracer("p1")
+    dt.instrument(driver, tracer)
+    driver.get("https://login")
+    driver.find_element("id", "logMain_UserName")
+    with pytest.raises(RuntimeError):
+        driver.execute("getPageSource")
+
+    names = [e["name"] for e in tracer.events]
+    assert names == ["get", "findElement", "getPageSource"]
+    assert tracer.events[0]["target"] == "https://login"
+    assert tracer.events[2]["error"] == "RuntimeError"
+    assert all(e["end_us"] >= e["start_us"] for e in tracer.events)
+    assert tracer.summary()["get"][0] == 1
+
+
+def test_span_is_noop_for_untraced_driver():
+    assert dt.span(ExecutingDriver(), "wait") is dt._NULL_SPAN
+
+
+def test_wait_until_records_wait_span_around_polls():
+    driver = ExecutingDriver()
+    tracer = dt.CommandTracer("p1")
+    dt.instrument(driver, tracer)
+    rs.wait_until(driver, 1, lambda d: d.find_element("id", "x"), "x")
+    categories = [(e["cat"], e["name"]) for e in tracer.events]
+    assert ("wait", "wait") in categories
+    assert ("command", "findElement") in categories
+
+
+# ----------------------------- export -----------------------------
+
+def test_export_writes_chrome_trace_events(tmp_path):
+    driver = ExecutingDriver()
+    tracer = dt.CommandTracer("p1")
+    dt.instrument(driver, tracer)
+    with dt.span(driver, "sleep", "settle", category="sleep"):
+        driver.get("https://dash")
+    path = tracer.export(str(tmp_path / "trace.json"))
+
+    payload = json.loads(open(path, encoding="utf-8").read())
+    events = [e for e in payload["traceEvents"] if e["ph"] == "X"]
+    assert [e["name"] for e in events] == ["sleep", "get"]
+    assert events[0]["ts"] <= events[1]["ts"]
+    assert events[0]["dur"] >= events[1]["dur"]
+    assert payload["otherData"]["profile"] == "p1"
+
+
+def test_trace_path_uses_profile_dir_when_profiling_off(tmp_path, monkeypatch):
+    monkeypatch.setattr(dt, "PROFILE_DIR", str(tmp_path))
+    path = dt.trace_path("my id")
+    assert path.startswith(str(tmp_path))
+    assert "webdriver_trace_my_id_" in os.path.basename(path)
@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cdp_driver
+import egress
+import preflight
+import routine_scrapper as rs
+import scripts.fake_proxy as fake_proxy
+import scripts.fake_ucam_portal as portal
+
+
+def _users(*proxies):
+    return [dict({"id": f"p{i}", "section_label": "B"}, **({"proxy": proxy} if proxy else {}))
+            for i, proxy in enumerate(proxies, 1)]
+
+
+@pytest.fixture(autouse=True)
+def _stats_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(egress, "EGRESS_STATS_FILE", str(tmp_path / "egress_stats.json"))
+
+
+# ----------------------------- configuration -----------------------------
+
+def test_parse_proxy():
+    assert egress.parse_proxy("socks5://10.0.0.2:1080") == egress.Proxy("socks5", "10.0.0.2", 1080)
+    assert egress.parse_proxy("10.0.0.3:3128").url == "http://10.0.0.3:3128"
+    assert egress.parse_proxy("http://[::1]:8080/").url == "http://[::1]:8080"
+    assert egress.parse_proxy("direct") is None and egress.parse_proxy("") is None
+    for bad in ("ftp://h:21", "http://h", "http://user:secret@h:8080", "http://h:8080/path"):
+        with pytest.raises(ValueError):
+            egress.parse_proxy(bad)
+
+
+def test_assign_spreads_unassigned_profiles_over_the_pool():
+    users = _users(None, "direct", None, None, "socks5://10.0.0.9:1080")
+    assigned = egress.assign(users, ["http://10.0.0.2:3128", "http://10.0.0.3:3128"])
+    assert [user["proxy"] for user in users] == [
+        "http://10.0.0.2:3128", "direct", "http://10.0.0.3:3128", "http://10.0.0.2:3128", "socks5://10.0.0.9:1080"]
+    assert assigned["p2"] is None and assigned["p5"].scheme == "socks5"
+
+    users = _users(None)
+    assert egress.assign(users) == {"p1": None} and "proxy" not in users[0]
+    with pytest.raises(ValueError, match="user p1"):
+        egress.assign(_users("gopher://h:70"))
+    with pytest.raises(ValueError, match="pool"):
+        egress.assign(_users(None), ["h"])
+
+
+def test_load_credentials_resolves_the_pool(tmp_path):
+    creds = {"users": [{"id": i, "username": "u", "password": "p", "section_label": "B"} for i in (1, 2)],
+             "proxies": ["http://10.0.0.2:3128", "direct"],
+             "login_url": "https://example.com/login", "attendance_dashboard_url": "https://example.com/dash"}
+    path = tmp_path / "creds.json"
+    path.write_text(json.dumps(creds), encoding="utf-8")
+    assert [user["proxy"] for user in rs.load_credentials(str(path))["users"]] == ["http://10.0.0.2:3128", "direct"]
+
+    creds["users"][0]["proxy"] = "http://user:pw@10.0.0.2:3128"
+    path.write_text(json.dumps(creds), encoding="utf-8")
+    assert rs.load_credentials(str(path)) is None
+
+
+# ----------------------------- backends -----------------------------
+
+def test_backend_settings():
+    http_proxy, socks = egress.parse_proxy("http://10.0.0.2:3128"), egress.parse_proxy("socks5://10.0.0.9:1080")
+    assert egress.chrome_arguments(None) == [] and egress.chrome_arguments(socks) == [
+        "--proxy-server=socks5://10.0.0.9:1080", "--proxy-bypass-list=<-loopback>"]
+    assert egress.firefox_preferences(http_proxy)["network.proxy.ssl_port"] == 3128
+    assert egress.firefox_preferences(socks)["network.proxy.socks_remote_dns"] is True
+    assert egress.requests_proxies(socks) == {"http": "socks5h://10.0.0.9:1080", "https": "socks5h://10.0.0.9:1080"}
+    assert egress.requests_proxies(None) is None
+
+
+def test_cdp_backend_launches_chrome_through_the_proxy(monkeypatch):
+    launched = {}
+    monkeypatch.setattr(rs, "DRIVER_BACKEND", "cdp")
+    monkeypatch.setattr(rs, "PREFERRED_BROWSER", "chrome")
+    monkeypatch.setattr(rs, "get_chrome_executable", lambda: "/usr/bin/chromium")
+    monkeypatch.setattr(cdp_driver, "launch", lambda path, arguments, **kwargs: launched.update(args=arguments))
+    rs.create_driver("p1", egress.parse_proxy("http://10.0.0.2:3128"))
+    assert launched["args"] == rs.CHROME_ARGUMENTS + ["--proxy-server=http://10.0.0.2:3128",
+                                                      "--proxy-bypass-list=<-loopback>"]
+
+
+# ----------------------------- statistics -----------------------------
+
+def test_record_session_keeps_a_recent_challenge_rate(monkeypatch):
+    monkeypatch.setattr(egress, "STATS_WINDOW", 2)
+    egress.record_session("direct", 3, 2, True, now=1)
+    egress.record_session("direct", 1, 0, True, now=2)
+    egress.record_session("direct", 1, 1, False, now=3)
+    entry = egress.load_stats()["direct"]
+    assert (entry["sessions"], entry["attempts"], entry["challenges"], entry["blocked"]) == (3, 5, 3, 1)
+    assert [session["at"] for session in entry["recent"]] == [2, 3]
+    assert entry["challenge_rate"] == 0.5
+
+
+def test_record_session_can_be_disabled(monkeypatch, tmp_path):
+    monkeypatch.setattr(egress, "EGRESS_STATS_FILE", "")
+    egress.record_session("direct", 1, 1, True)
+    assert list(tmp_path.iterdir()) == []
+
+
+# ----------------------------- preflight -----------------------------
+
+def _serve(server):
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    return server
+
+
+def test_check_portal_fetches_through_every_egress(tmp_path, monkeypatch):
+    site = _serve(portal.make_server(port=0))
+    proxy = _serve(fake_proxy.make_server(port=0))
+    try:
+        creds = {"users": _users(None, fake_proxy.proxy_url(proxy), None),
+                 "login_url": portal.base_url(site) + portal.LOGIN_PATH}
+        path = tmp_path / "creds.json"
+        path.write_text(json.dumps(creds), encoding="utf-8")
+        monkeypatch.setattr(preflight, "CREDENTIALS_FILE", str(path))
+        assert preflight.check_portal() == f"HTTP 200, HTTP 200 via {fake_proxy.proxy_url(proxy)}"
+        assert proxy.stats["requests"] == 1
+        assert site.stats[f"GET {portal.LOGIN_PATH}"] == 2
+    finally:
+        for server in (site, proxy):
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gsheet_formatter as gf
+import scripts.fake_google_api as fake
+
+
+ROUTINE = [
+    {"CourseCode": "CSE-3201", "CourseTitle": "Operating Systems", "Section": "B1", "Day": "Sun",
+     "Room": "120", "TimeSlot": "11:0 - 12:15", "TeacherName": "S. Sarker", "TeacherContact": "017"},
+    {"CourseCode": "CSE-3212", "CourseTitle": "OS Lab", "Section": "B2", "Day": "Wed",
+     "Room": "302", "TimeSlot": "9:0 - 11:50", "TeacherName": "J. T.", "TeacherContact": ""},
+]
+
+
+@pytest.fixture
+def google(monkeypatch):
+    servers = []
+
+    def _start(**kwargs):
+        kwargs.setdefault("spreadsheets", ["Routine"])
+        state = fake.GoogleApiState(seed=1, **kwargs)
+        server = fake.make_server(state, port=0)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(gf, "GOOGLE_API_ENDPOINT", fake.base_url(server))
+        monkeypatch.setattr(gf, "SPREADSHEET_NAME", "Routine")
+        monkeypatch.setattr(gf, "APP_SCRIPT_ID", "script-1")
+        return state
+
+    yield _start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _spreadsheet(state, title="Routine"):
+    return next(s for s in state.spreadsheets.values() if s.title == title)
+
+
+# ----------------------------- helpers -----------------------------
+
+def test_parse_range():
+    assert fake.parse_range("'backend'!A1") == ("backend", 1, 1)
+    assert fake.parse_range("'New''Main'!B3:I3") == ("New'Main", 3, 2)
+    assert fake.parse_range("'backend'") == ("backend", 1, 1)
+    assert fake.parse_range("Sheet1!AA10") == ("Sheet1", 10, 27)
+
+
+def test_endpoint_session_rewrites_google_hosts():
+    session = gf.EndpointSession("http://127.0.0.1:1/")
+    rewritten = []
+    session.send = lambda request, **kwargs: rewritten.append(request.url)
+    session.request("GET", "https://sheets.googleapis.com/v4/spreadsheets/x")
+    assert rewritten == ["http://127.0.0.1:1/v4/spreadsheets/x"]
+
+
+def _batch_update(spreadsheet, requests):
+    request = urllib.request.Request(
+        f"{gf.GOOGLE_API_ENDPOINT}/v4/spreadsheets/{spreadsheet.id}:batchUpdate",
+        data=json.dumps({"requests": requests}).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_rejected_batch_update_applies_nothing(google):
+    spreadsheet = _spreadsheet(google())
+
+    def add(title):
+        return {"addSheet": {"properties": {"title": title}}}
+
+    assert _batch_update(spreadsheet, [add("Extra"), add("Sheet1")]) == 400
+    assert _batch_update(spreadsheet, [add("Extra"), add("Extra")]) == 400
+    assert [sheet.title for sheet in spreadsheet.sheets] == ["Sheet1"]
+    assert _batch_update(spreadsheet, [add("Extra"), add("Other")]) == 200
+    assert [sheet.title for sheet in spreadsheet.sheets] == ["Sheet1", "Extra", "Other"]
+
+
+# ----------------------------- publish -----------------------------
+
+def test_publish_routine_against_fake(google):
+    state = google()
+    assert gf.publish_routine(ROUTINE) is True
+
+    spreadsheet = _spreadsheet(state)
+    backend = spreadsheet.sheet(gf.TARGET_SHEET_NAME)
+    assert backend.values == gf.build_sheet_data(ROUTINE)
+    assert spreadsheet.sheet(gf.NEW_MAIN_SHEET_NAME).values[2][1:] == gf.SHEET_HEADERS
+    assert state.script_runs == [{"scriptId": "script-1", "function": gf.FUNCTION_NAME}]
+
+    endpoints = state.snapshot_stats()["endpoints"]
+    assert endpoints["drive.files.list"] == 1
+    assert endpoints["values.clear"] == 1
+    assert endpoints["scripts.run"] == 1
+
+
+def test_second_publish_reuses_worksheets(google):
+    state = google()
+    assert gf.publish_routine(ROUTINE) is True
+    state.reset_stats()
+    assert gf.publish_routine(ROUTINE) is True
+    endpoints = state.snapshot_stats()["endpoints"]
+    # No addSheet/header seeding on the second run: only the wrap format.
+    assert endpoints["spreadsheets.batchUpdate"] == 1
+    assert len(_spreadsheet(state).sheets) == 3
+
+
+def test_warm_up_context_grows_both_worksheets(google):
+    state = google()
+    context = gf.prepare_publish(interactive=False)
+    new_main = _spreadsheet(state).sheet(gf.NEW_MAIN_SHEET_NAME)
+    assert new_main.rows == 30
+    routine = [dict(ROUTINE[0], CourseCode=f"CSE-{3200 + i}") for i in range(40)]
+    assert gf.publish_routine(routine, context=context) is True
+    assert new_main.rows == 45
+    assert _spreadsheet(state).sheet(gf.TARGET_SHEET_NAME).rows >= 45
+
+
+def test_missing_spreadsheet_fails_prepare(google):
+    google(spreadsheets=[])
+    assert gf.prepare_publish(interactive=False) is None
+
+
+def test_rate_limit_injection_fails_publish_and_is_counted(google):
+    state = google(rate_limit_rate=1.0)
+    assert gf.publish_routine(ROUTINE) is False
+    stats = state.snapshot_stats()
+    assert stats["rate_limited"] == stats["requests"] >= 1
+
+
+def test_stats_endpoint(google):
+    state = google()
+    gf.prepare_publish(interactive=False)
+    with urllib.request.urlopen(gf.GOOGLE_API_ENDPOINT + fake.STATS_PATH, timeout=5) as response:
+        stats = json.loads(response.read())
+    assert stats["requests"] == state.snapshot_stats()["requests"] > 0
@@ -0,0 +1,69 @@
+import http.client
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scripts.fake_proxy as fake_proxy
+import scripts.fake_ucam_portal as portal
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def _start(server):
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        started.append(server)
+        return server
+
+    yield _start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def _via(proxy):
+    return urllib.request.build_opener(urllib.request.ProxyHandler({"http": fake_proxy.proxy_url(proxy)}))
+
+
+def test_forwards_requests_and_counts_them(servers):
+    site = servers(portal.make_server(port=0))
+    proxy = servers(fake_proxy.make_server(port=0))
+    with _via(proxy).open(portal.base_url(site) + portal.LOGIN_PATH, timeout=5) as response:
+        assert response.status == 200 and b"logMain_UserName" in response.read()
+    with urllib.request.urlopen(fake_proxy.proxy_url(proxy) + fake_proxy.STATS_PATH, timeout=5) as response:
+        stats = json.loads(response.read())
+    host, port = site.server_address[:2]
+    assert stats == {"requests": 1, "hosts": {f"{host}:{port}": 1}}
+    assert site.stats[f"GET {portal.LOGIN_PATH}"] == 1
+
+
+def test_challenges_login_pages_at_the_configured_rate(servers):
+    site = servers(portal.make_server(port=0))
+    proxy = servers(fake_proxy.make_server(port=0, challenge_rate=1.0))
+    with pytest.raises(urllib.error.HTTPError) as raised:
+        _via(proxy).open(portal.base_url(site) + portal.LOGIN_PATH, timeout=5)
+    assert raised.value.code == 503 and b"Just a moment..." in raised.value.read()
+    assert proxy.stats["challenges"] == 1 and f"GET {portal.LOGIN_PATH}" not in site.stats
+
+
+def test_connect_tunnels_to_the_target(servers):
+    site = servers(portal.make_server(port=0))
+    proxy = servers(fake_proxy.make_server(port=0))
+    proxy_host, proxy_port = proxy.server_address[:2]
+    host, port = site.server_address[:2]
+    connection = http.client.HTTPConnection(proxy_host, proxy_port, timeout=5)
+    connection.set_tunnel(host, port)
+    try:
+        connection.request("GET", portal.LOGIN_PATH)
+        assert connection.getresponse().status == 200
+    finally:
+        connection.close()
+    assert proxy.stats["tunnels"] == 1
@@ -0,0 +1,140 @@
+import http.cookiejar
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routine_scrapper as rs
+import scripts.fake_ucam_portal as portal
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def _start(**config):
+        server = portal.make_server(portal.PortalConfig(seed=1, **config), port=0)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        return portal.base_url(server)
+
+    yield _start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _opener():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+
+def _read(opener, url, data=None, headers=None):
+    body = urllib.parse.urlencode(data).encode() if data is not None else None
+    request = urllib.request.Request(url, data=body, headers=headers or {})
+    try:
+        with opener.open(request, timeout=5) as response:
+            return response.status, response.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+
+def _login(opener, url, username="alice_B1", password="pw"):
+    return _read(opener, url + portal.LOGIN_PATH,
+                 {"logMain$UserName": username, "logMain$Password": password})
+
+
+# ----------------------------- login -----------------------------
+
+def test_login_page_has_scraper_ids(serve):
+    url = serve()
+    status, body = _read(_opener(), url + portal.LOGIN_PATH)
+    assert status == 200
+    for element_id in (rs.LOGIN_USERNAME_ID, rs.LOGIN_PASSWORD_ID, rs.LOGIN_BUTTON_ID):
+        assert f'id="{element_id}"' in body
+
+
+def test_interstitial_then_clearance(serve):
+    url = serve(interstitial_rate=1.0)
+    opener = _opener()
+    status, body = _read(opener, url + portal.LOGIN_PATH)
+    assert status == 503
+    assert rs._is_cloudflare_blocked("Just a moment...") and "<title>Just a moment...</title>" in body
+    status, body = _read(opener, url + portal.LOGIN_PATH)
+    assert status == 200 and rs.LOGIN_USERNAME_ID in body
+
+
+def test_login_redirects_home_with_success_marker(serve):
+    url = serve()
+    status, body = _login(_opener(), url)
+    assert status == 200 and rs.LOGIN_SUCCESS_ID in body
+
+
+def test_wrong_password_stays_on_login(serve):
+    url = serve()
+    _, body = _login(_opener(), url, password="wrong")
+    assert rs.LOGIN_SUCCESS_ID not in body and "Invalid" in body
+
+
+# ----------------------------- dashboard -----------------------------
+
+def test_dashboard_requires_session(serve):
+    url = serve()
+    _, body = _read(_opener(), url + portal.DASHBOARD_PATH)
+    assert rs.LOGIN_USERNAME_ID in body
+
+
+def test_dashboard_has_semester_dropdown(serve):
+    url = serve(semesters=["Fall 2026"])
+    opener = _opener()
+    _login(opener, url)
+    _, body = _read(opener, url + portal.DASHBOARD_PATH)
+    assert f"id='{rs.SEMESTER_DROPDOWN_ID}'" in body
+    assert "select2-container" in body and "<li onclick" in body and ">Fall 2026</li>" in body
+
+
+def test_delta_postback_returns_parseable_course_list(serve):
+    url = serve(courses=40)
+    opener = _opener()
+    _login(opener, url)
+    _, body = _read(opener, url + portal.DASHBOARD_PATH, {portal.SEMESTER_FIELD: "1"},
+                    {portal.DELTA_HEADER: "Delta=true"})
+    length, kind, panel_id, rest = body.split("|", 3)
+    assert (kind, panel_id) == ("updatePanel", rs.UPDATE_PANEL_ID)
+    html = rest[:int(length)]
+    entries = rs.parse_attendance_dashboard_data(html, "B1")
+    assert len(entries) == 40
+    assert entries[0]["CourseCode"] == "CSE-3201"
+    assert entries[0]["CourseSection"] == "B1"
+    assert entries[3]["CourseTitle"].startswith("Course 4 Lab")
+
+
+def test_full_postback_renders_panel(serve):
+    url = serve(courses=3)
+    opener = _opener()
+    _login(opener, url)
+    _, body = _read(opener, url + portal.DASHBOARD_PATH, {portal.SEMESTER_FIELD: "1"})
+    assert len(rs.parse_attendance_dashboard_data(body, "B1")) == 3
+
+
+# ----------------------------- injection and stats -----------------------------
+
+def test_failure_injection_and_stats(serve):
+    url = serve(failure_rate=1.0)
+    status, _ = _read(_opener(), url + portal.LOGIN_PATH)
+    assert status == 500
+    _, body = _read(_opener(), url + portal.STATS_PATH)
+    stats = json.loads(body)
+    assert stats["injected_failures"] == 1
+    assert stats["GET " + portal.LOGIN_PATH] == 1
+
+
+def test_section_for_username():
+    assert portal.section_for("alice_B2") == "B2"
+    assert portal.section_for("alice") == "A"
@@ -188,6 +188,64 @@ def test_write_data_to_sheet_invalid_returns_false():
     assert gf.write_data_to_sheet(ws, [["not", "dict"]]) is False
 
 
+# ----------------------------- publish_routine -----------------------------
+
+class _FakeClient:
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+        self.opened = []
+
+    def open(self, name):
+        self.opened.append(name)
+        return self.spreadsheet
+
+
+def test_publish_routine_writes_backend_and_creates_new_main(monkeypatch):
+    backend = _FakeWorksheet("backend")
+    ss = _FakeSpreadsheet(existing={gf.TARGET_SHEET_NAME: backend})
+    monkeypatch.setattr(gf, "authenticate_gsheet", lambda path: _FakeClient(ss))
+    monkeypatch.setattr(gf, "APP_SCRIPT_ID", "YOUR_APP_SCRIPT_ID_GOES_HERE")
+    assert gf.publish_routine([_entry()]) is True
+    assert backend.updated[0][1][0] == "CSE-3201"
+    assert ss.created[0][0] == gf.NEW_MAIN_SHEET_NAME
+
+
+def test_publish_routine_uses_prepared_context(monkeypatch):
+    backend, new_main = _FakeWorksheet("backend"), _FakeWorksheet("NewMain")
+    context = gf.PublishContext(None, None, backend, new_main)
+    monkeypatch.setattr(gf, "authenticate_gsheet", lambda path: pytest.fail("re-authenticated"))
+    monkeypatch.setattr(gf, "APP_SCRIPT_ID", "YOUR_APP_SCRIPT_ID_GOES_HERE")
+    assert gf.publish_routine([_entry()], context=context) is True
+    assert backend.updated is not None
+
+
+def test_prepare_publish_reports_missing_spreadsheet(monkeypatch):
+    class _MissingClient:
+        def open(self, name):
+            raise gf.gspread.exceptions.SpreadsheetNotFound(name)
+
+    monkeypatch.setattr(gf, "authenticate_gsheet", lambda path: _MissingClient())
+    assert gf.prepare_publish(interactive=False) is None
+
+
+def test_load_apps_script_credentials_non_interactive_defers(tmp_path):
+    token_file = tmp_path / "token.pickle"
+    assert gf.load_apps_script_credentials("client.json", str(token_file), [], interactive=False) is None
+
+
+def test_publish_routine_auth_failure_returns_false(monkeypatch):
+    monkeypatch.setattr(gf, "authenticate_gsheet", lambda path: None)
+    assert gf.publish_routine([_entry()]) is False
+
+
+def test_publish_routine_apps_script_failure_returns_false(monkeypatch):
+    ss = _FakeSpreadsheet(existing={gf.TARGET_SHEET_NAME: _FakeWorksheet("backend")})
+    monkeypatch.setattr(gf, "authenticate_gsheet", lambda path: _FakeClient(ss))
+    monkeypatch.setattr(gf, "APP_SCRIPT_ID", "real-id")
+    monkeypatch.setattr(gf, "call_apps_script_function", lambda **kwargs: False)
+    assert gf.publish_routine([_entry()]) is False
+
+
 # ----------------------------- _headless_environment -----------------------------
 
 def test_headless_environment_true_without_display(monkeypatch):
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import partial_postback as pp
+import routine_scrapper as rs
+import scripts.fake_ucam_portal as portal
+
+PANEL = rs.UPDATE_PANEL_ID
+
+
+def _record(kind, record_id, content):
+    return f"{len(content)}|{kind}|{record_id}|{content}|"
+
+
+# ----------------------------- parse_delta -----------------------------
+
+def test_parse_delta_counts_content_length_not_separators():
+    body = (_record("updatePanel", PANEL, "<td>a|b</td>")
+            + _record("hiddenField", "__VIEWSTATE", "/wE=")
+            + _record("asyncPostBackControlIDs", "", ""))
+    assert pp.parse_delta(body) == [
+        ("updatePanel", PANEL, "<td>a|b</td>"),
+        ("hiddenField", "__VIEWSTATE", "/wE="),
+        ("asyncPostBackControlIDs", "", ""),
+    ]
+    assert pp.parse_delta("") == []
+
+
+@pytest.mark.parametrize("body", [
+    "12|updatePanel|x|short|",
+    "5|updatePanel|x|abcdeX",
+    "x|updatePanel|x||",
+    "3|updatePanel",
+    "<html>Login</html>",
+])
+def test_parse_delta_rejects_malformed_bodies(body):
+    with pytest.raises(pp.DeltaError):
+        pp.parse_delta(body)
+
+
+# ----------------------------- panel_html -----------------------------
+
+def test_panel_html_from_the_fake_portal_response():
+    table = portal.course_table("B", 3, "Fall 2026")
+    body = portal.delta_response(PANEL, table) + _record("hiddenField", "__EVENTVALIDATION", "/wEd")
+    html = pp.panel_html(body, PANEL)
+    assert html == table
+    assert len(rs.parse_attendance_dashboard_data(html, "B")) == 3
+    assert pp.panel_html(body, "ctl00_MainContainer_UpdatePanel01") is None
+
+
+def test_panel_html_raises_on_error_and_redirect_records():
+    with pytest.raises(pp.DeltaError, match="500"):
+        pp.panel_html(_record("error", "500", "Object reference not set"), PANEL)
+    with pytest.raises(pp.DeltaError, match="Login.aspx"):
+        pp.panel_html(_record("pageRedirect", "", "/Security/Login.aspx"), PANEL)
+
+
+def test_is_delta_request():
+    headers = {"x-microsoftajax": "Delta=true", "Content-Type": "application/x-www-form-urlencoded"}
+    assert pp.is_delta_request({"method": "POST", "headers": headers})
+    assert not pp.is_delta_request({"method": "GET", "headers": headers})
+    assert not pp.is_delta_request({"method": "POST", "headers": {"Content-Type": "text/html"}})
@@ -0,0 +1,361 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline
+
+
+CREDENTIALS = {
+    "login_url": "https://ucam/login",
+    "attendance_dashboard_url": "https://ucam/dashboard",
+    "users": [{"id": "p1", "section_label": "A"}, {"id": "p2", "section_label": "B"}],
+}
+ENTRIES = [{"CourseCode": "CSE-3201", "Day": "Sun", "TimeSlot": "11:0 - 12:15"}]
+ROUTINE = [{"CourseCode": "CSE-3201", "Day": "Sun", "TimeSlot": "11:0 - 12:15", "Section": "A"}]
+CONTEXT = object()
+
+
+@pytest.fixture
+def stages(monkeypatch, tmp_path):
+    calls = {"scrape": [], "parse": [], "merge": [], "save": [], "publish": [], "post": [], "contexts": []}
+    state = {"html": "<table>v1</table>", "failing": set(), "routine": ROUTINE,
+             "published": True, "post_ok": True, "context": CONTEXT}
+    rs = pipeline.routine_scrapper
+    gf = pipeline.gsheet_formatter
+
+    def _scrape(profile, common_urls, work=None):
+        calls["scrape"].append(profile["id"])
+        if profile["id"] in state["failing"]:
+            return None
+        return {"profile_id": profile["id"], "section_label": profile["section_label"],
+                "semester": "Fall", "html": state["html"], "captured_at": 0}
+
+    def _parse(html, section_label):
+        calls["parse"].append(section_label)
+        return list(ENTRIES)
+
+    def _build(entries, primary, secondary, teacher_details):
+        calls["merge"].append(len(entries))
+        return state["routine"]
+
+    def _write(routine, context):
+        calls["publish"].append(routine)
+        calls["contexts"].append(context)
+        return state["published"]
+
+    def _post(context):
+        calls["post"].append(context)
+        return state["post_ok"]
+
+    monkeypatch.setattr(rs, "load_credentials", lambda path: CREDENTIALS)
+    monkeypatch.setattr(rs, "load_teacher_details_from_file", lambda path: {})
+    monkeypatch.setattr(rs, "scrape_profile_with_retry", _scrape)
+    monkeypatch.setattr(rs, "process_dashboard_html", _parse)
+    monkeypatch.setattr(rs, "build_final_routine", _build)
+    monkeypatch.setattr(rs, "save_final_routine", lambda routine: calls["save"].append(routine))
+    monkeypatch.setattr(gf, "write_routine_to_sheet", _write)
+    monkeypatch.setattr(gf, "run_post_processing", _post)
+    monkeypatch.setattr(gf, "prepare_publish",
+                        lambda interactive=True, expected_rows=0: state["context"])
+    monkeypatch.setattr(pipeline, "PIPELINE_CACHE_DIR", str(tmp_path / "cache"))
+    # Checkpoint reuse is exercised by its own tests; elsewhere scrape always runs.
+    monkeypatch.setattr(pipeline, "CHECKPOINT_TTL_MIN", 0)
+    monkeypatch.setattr(pipeline, "PIPELINE_PREFLIGHT", False)
+    return calls, state
+
+
+def _run(**kwargs):
+    kwargs.setdefault("warm_publish", False)
+    return pipeline.run(**kwargs)
+
+
+# ----------------------------- run -----------------------------
+
+def test_run_hands_routine_to_publish_in_memory(stages):
+    calls, _ = stages
+    assert _run() == pipeline.EXIT_OK
+    assert calls["scrape"] == ["p1", "p2"]
+    assert calls["publish"] == [ROUTINE]
+    assert calls["post"] == [CONTEXT]
+
+
+def test_run_scrape_failure_skips_publish(stages):
+    calls, state = stages
+    state["failing"] = {"p1", "p2"}
+    assert _run() == pipeline.EXIT_SCRAPE_FAILED
+    assert calls["publish"] == []
+
+
+def test_run_continues_without_failed_profile(stages):
+    calls, state = stages
+    state["failing"] = {"p2"}
+    assert _run() == pipeline.EXIT_OK
+    assert calls["parse"] == ["A"]
+
+
+def test_run_publish_failure_has_distinct_code(stages):
+    _, state = stages
+    state["published"] = False
+    assert _run() == pipeline.EXIT_PUBLISH_FAILED
+
+
+def test_run_post_process_failure_is_publish_failure(stages):
+    _, state = stages
+    state["post_ok"] = False
+    assert _run() == pipeline.EXIT_PUBLISH_FAILED
+
+
+def test_run_stage_crash_is_scrape_failure(stages, monkeypatch):
+    def _boom(html, section_label):
+        raise RuntimeError("bad html")
+    monkeypatch.setattr(pipeline.routine_scrapper, "process_dashboard_html", _boom)
+    assert _run() == pipeline.EXIT_SCRAPE_FAILED
+
+
+def test_no_files_skips_persist(stages):
+    calls, _ = stages
+    assert _run(write_outputs=False) == pipeline.EXIT_OK
+    assert calls["save"] == []
+
+
+def _failed_preflight(monkeypatch, failed):
+    monkeypatch.setattr(pipeline, "PIPELINE_PREFLIGHT", True)
+    monkeypatch.setattr(pipeline, "_preflight", lambda start: list(failed))
+
+
+def test_failed_google_preflight_still_scrapes_and_persists(stages, monkeypatch):
+    calls, _ = stages
+    _failed_preflight(monkeypatch, ["spreadsheet"])
+    assert _run(warm_publish=True) == pipeline.EXIT_PUBLISH_FAILED
+    assert calls["scrape"] == ["p1", "p2"]
+    assert calls["save"] == [ROUTINE]
+    assert calls["publish"] == []
+    assert "error" in pipeline.default_cache().entry("publish_sheet")
+
+
+def test_failed_portal_preflight_stops_before_scraping(stages, monkeypatch):
+    calls, _ = stages
+    _failed_preflight(monkeypatch, ["portal", "spreadsheet"])
+    assert _run() == pipeline.EXIT_SCRAPE_FAILED
+    assert calls["scrape"] == []
+
+
+# ----------------------------- stage cache -----------------------------
+
+def test_unchanged_inputs_skip_downstream_stages(stages):
+    calls, _ = stages
+    assert _run() == pipeline.EXIT_OK
+    assert _run() == pipeline.EXIT_OK
+    # Scrape always reruns; everything fed by identical HTML is reused.
+    assert calls["scrape"] == ["p1", "p2", "p1", "p2"]
+    assert calls["parse"] == ["A", "B"]
+    assert len(calls["publish"]) == 1
+    assert len(calls["post"]) == 1
+
+
+def test_changed_html_reruns_downstream_stages(stages):
+    calls, state = stages
+    assert _run() == pipeline.EXIT_OK
+    state["html"] = "<table>v2</table>"
+    assert _run() == pipeline.EXIT_OK
+    assert calls["parse"] == ["A", "B", "A", "B"]
+    # Same routine after re-parsing: the sheet is not rewritten.
+    assert len(calls["publish"]) == 1
+
+
+def test_attendance_summary_written_by_persist_and_restored_when_deleted(stages, monkeypatch, tmp_path):
+    calls, state = stages
+    rs = pipeline.routine_scrapper
+    summary = tmp_path / "attendance_summary.json"
+    saved = []
+
+    def _save(entries):
+        saved.append(len(entries))
+        summary.write_text("[]", encoding="utf-8")
+
+    def _save_routine(routine):
+        calls["save"].append(routine)
+        for name in (rs.FINAL_ROUTINE_CSV_FILENAME, rs.FINAL_ROUTINE_JSON_FILENAME):
+            (tmp_path / name).write_text("", encoding="utf-8")
+
+    monkeypatch.setattr(pipeline, "EXPORT_ATTENDANCE_SUMMARY", True)
+    monkeypatch.setattr(rs, "save_final_routine", _save_routine)
+    monkeypatch.setattr(rs, "FORMATTED_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(rs, "process_dashboard_html",
+                        lambda html, section: [dict(ENTRIES[0], UserScrapedSection=section, ClassesHeld="5")])
+    monkeypatch.setattr(rs, "save_attendance_summary", _save)
+    assert _run() == pipeline.EXIT_OK
+    assert _run() == pipeline.EXIT_OK
+    assert saved == [2] and len(calls["save"]) == 1
+    summary.unlink()
+    assert _run() == pipeline.EXIT_OK
+    assert saved == [2, 2] and len(calls["save"]) == 2
+    # Resuming at persist takes the entries from the cached parse output.
+    summary.unlink()
+    assert _run(start="persist") == pipeline.EXIT_OK
+    assert saved == [2, 2, 2]
+
+
+def test_force_reruns_unchanged_stages(stages):
+    calls, _ = stages
+    assert _run() == pipeline.EXIT_OK
+    assert _run(force=True) == pipeline.EXIT_OK
+    assert len(calls["publish"]) == 2
+
+
+def test_failed_publish_is_retried_on_next_run(stages):
+    calls, state = stages
+    state["published"] = False
+    assert _run() == pipeline.EXIT_PUBLISH_FAILED
+    state["published"] = True
+    assert _run() == pipeline.EXIT_OK
+    assert len(calls["publish"]) == 2
+
+
+def test_resume_from_publish_uses_cached_routine(stages):
+    calls, state = stages
+    state["published"] = False
+    assert _run() == pipeline.EXIT_PUBLISH_FAILED
+    state["published"] = True
+    assert _run(start="publish_sheet") == pipeline.EXIT_OK
+    assert calls["scrape"] == ["p1", "p2"]
+    assert calls["publish"] == [ROUTINE, ROUTINE]
+
+
+def test_publish_after_a_no_files_run_skips_persist(stages):
+    calls, state = stages
+    state["published"] = False
+    assert _run(write_outputs=False) == pipeline.EXIT_PUBLISH_FAILED
+    state["published"] = True
+    assert _run(start="publish_sheet") == pipeline.EXIT_OK
+    assert calls["save"] == [] and len(calls["publish"]) == 2
+
+
+def test_resume_without_cached_input_exits_missing_input(stages):
+    calls, _ = stages
+    assert _run(start="merge") == pipeline.EXIT_MISSING_INPUT
+    assert calls["scrape"] == []
+
+
+def test_manifest_records_stage_inputs(stages):
+    assert _run() == pipeline.EXIT_OK
+    cache = pipeline.default_cache()
+    manifest = json.loads(open(os.path.join(cache.root, pipeline.MANIFEST_FILENAME), encoding="utf-8").read())
+    assert {"scrape.p1", "scrape.p2", "parse", "merge", "publish_sheet", "post_process"} <= set(manifest["stages"])
+    assert cache.load("merge") == {"routine": ROUTINE}
+
+
+def test_record_writes_replayable_bundle(stages, tmp_path):
+    assert _run(record_dir=str(tmp_path / "bundles")) == pipeline.EXIT_OK
+    (name,) = os.listdir(tmp_path / "bundles")
+    bundle = pipeline.replay.load_bundle(str(tmp_path / "bundles" / name))
+    assert [p["section_label"] for p in bundle["profiles"]] == ["A", "B"]
+    assert bundle["profiles"][0]["html"] == "<table>v1</table>"
+
+
+def test_hash_inputs_is_order_independent_for_dicts():
+    assert pipeline.hash_inputs({"a": 1, "b": 2}) == pipeline.hash_inputs({"b": 2, "a": 1})
+    assert pipeline.hash_inputs([1, 2]) != pipeline.hash_inputs([2, 1])
+
+
+# ----------------------------- checkpoints -----------------------------
+
+def test_fresh_scrape_checkpoints_are_reused(stages, monkeypatch):
+    calls, _ = stages
+    monkeypatch.setattr(pipeline, "CHECKPOINT_TTL_MIN", 30)
+    assert _run() == pipeline.EXIT_OK
+    assert _run() == pipeline.EXIT_OK
+    assert calls["scrape"] == ["p1", "p2"]
+
+
+def test_rerun_scrapes_only_failed_profile(stages, monkeypatch):
+    calls, state = stages
+    monkeypatch.setattr(pipeline, "CHECKPOINT_TTL_MIN", 30)
+    state["failing"] = {"p2"}
+    assert _run() == pipeline.EXIT_OK
+    state["failing"] = set()
+    assert _run() == pipeline.EXIT_OK
+    assert calls["scrape"] == ["p1", "p2", "p2"]
+    assert calls["parse"] == ["A", "A", "B"]
+
+
+def test_expired_checkpoints_and_force_rescrape(stages, monkeypatch):
+    calls, _ = stages
+    monkeypatch.setattr(pipeline, "CHECKPOINT_TTL_MIN", 30)
+    assert _run() == pipeline.EXIT_OK
+    assert _run(force=True) == pipeline.EXIT_OK
+    assert calls["scrape"] == ["p1", "p2", "p1", "p2"]
+    monkeypatch.setattr(pipeline.time, "time", lambda: time.monotonic() + 10 ** 10)
+    assert _run() == pipeline.EXIT_OK
+    assert calls["scrape"] == ["p1", "p2", "p1", "p2", "p1", "p2"]
+
+
+def test_missing_required_section_blocks_merge(stages):
+    calls, state = stages
+    state["failing"] = {"p1"}
+    assert _run() == pipeline.EXIT_SCRAPE_FAILED
+    assert calls["merge"] == [] and calls["publish"] == []
+    assert _run(allow_partial=True) == pipeline.EXIT_OK
+    assert calls["publish"] == [ROUTINE]
+
+
+def test_parse_args_allow_partial():
+    assert pipeline.parse_args(["--allow-partial"]).allow_partial is True
+    assert pipeline.parse_args([]).allow_partial is False
+
+
+# ----------------------------- publish warm-up -----------------------------
+
+def test_run_passes_warmed_context_to_publish(stages):
+    calls, _ = stages
+    assert _run(warm_publish=True) == pipeline.EXIT_OK
+    assert calls["contexts"] == [CONTEXT]
+
+
+def test_warmup_failure_aborts_scrape_and_reports_publish_failure(stages, monkeypatch):
+    calls, state = stages
+    state["context"] = None
+    original = pipeline.routine_scrapper.scrape_profile_with_retry
+
+    def _slow_scrape(profile, common_urls, work=None):
+        deadline = time.time() + 2
+        while not pipeline._warmup_failed(warmup[0]) and time.time() < deadline:
+            time.sleep(0.01)
+        return original(profile, common_urls, work)
+
+    warmup = []
+    real_init = pipeline.PipelineRun.__init__
+
+    def _init(self, *args, **kwargs):
+        real_init(self, *args, **kwargs)
+        warmup.append(self.warmup)
+
+    monkeypatch.setattr(pipeline.PipelineRun, "__init__", _init)
+    monkeypatch.setattr(pipeline.routine_scrapper, "scrape_profile_with_retry", _slow_scrape)
+    assert _run(warm_publish=True) == pipeline.EXIT_PUBLISH_FAILED
+    # p1 may start before the warm-up fails; p2 never does.
+    assert "p2" not in calls["scrape"]
+    assert calls["publish"] == []
+
+
+# ----------------------------- main -----------------------------
+
+def test_main_no_files_flag_disables_side_outputs(stages, monkeypatch):
+    calls, _ = stages
+    monkeypatch.setattr(pipeline, "WARM_PUBLISH_CLIENTS", False)
+    assert pipeline.main(["--no-files"]) == pipeline.EXIT_OK
+    assert calls["save"] == []
+
+
+def test_parse_args_subcommands():
+    assert pipeline.parse_args([]).command == "run"
+    args = pipeline.parse_args(["--from", "parse", "--force"])
+    assert (args.command, args.start, args.force) == ("run", "parse", True)
+    assert pipeline.parse_args(["publish"]).command == "publish"
+    with pytest.raises(SystemExit):
+        pipeline.parse_args(["--from", "nope"])
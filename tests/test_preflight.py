@@ -0,0 +1,184 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gsheet_formatter as gf
+import pipeline
+import preflight
+import scripts.fake_google_api as fake
+from preflight import Check, CheckFailed
+
+
+def _sleep_check(name, seconds=0.0, requires=(), fail=False, timeout_s=0, inputs=None, calls=None):
+    def run():
+        if calls is not None:
+            calls.append(name)
+        time.sleep(seconds)
+        if fail:
+            raise CheckFailed(f"{name} broke")
+        return f"{name} fine"
+    return Check(name, name, run, requires=requires, timeout_s=timeout_s, inputs=inputs)
+
+
+def _statuses(results):
+    return {result.name: result.status for result in results}
+
+
+# ----------------------------- select -----------------------------
+
+def test_select_pulls_in_requirements_in_declaration_order():
+    checks = [_sleep_check("a"), _sleep_check("b", requires=("a",)), _sleep_check("c")]
+    assert [c.name for c in preflight.select(checks, ["b"])] == ["a", "b"]
+    assert [c.name for c in preflight.select(checks)] == ["a", "b", "c"]
+
+
+def test_select_rejects_unknown_and_cyclic_checks():
+    with pytest.raises(ValueError, match="unknown"):
+        preflight.select([_sleep_check("a", requires=("missing",))])
+    with pytest.raises(ValueError, match="itself"):
+        preflight.select([_sleep_check("a", requires=("b",)), _sleep_check("b", requires=("a",))])
+
+
+# ----------------------------- run_checks -----------------------------
+
+def test_independent_checks_run_concurrently():
+    checks = [_sleep_check(name, 0.3) for name in ("sheet", "token", "portal")]
+    started = time.perf_counter()
+    results = preflight.run_checks(checks)
+    assert time.perf_counter() - started < 0.8
+    assert _statuses(results) == {"sheet": "ok", "token": "ok", "portal": "ok"}
+    assert results[0].detail == "sheet fine"
+
+
+def test_failed_requirement_skips_dependents():
+    calls = []
+    checks = [
+        _sleep_check("key", fail=True, calls=calls),
+        _sleep_check("sheet", requires=("key",), calls=calls),
+        _sleep_check("portal", calls=calls),
+    ]
+    results = preflight.run_checks(checks)
+    assert _statuses(results) == {"key": "fail", "sheet": "skipped", "portal": "ok"}
+    assert results[0].detail == "key broke"
+    assert results[1].detail == "needs key"
+    assert "sheet" not in calls
+
+
+def test_unexpected_exception_is_a_failure():
+    def boom():
+        raise RuntimeError("socket closed")
+    [result] = preflight.run_checks([Check("x", "x", boom)])
+    assert result.status == "fail"
+    assert result.detail == "RuntimeError: socket closed"
+
+
+def test_slow_check_times_out_without_waiting_for_it():
+    release = threading.Event()
+    checks = [
+        Check("hung", "hung", lambda: release.wait(5), timeout_s=0.1),
+        _sleep_check("after", requires=("hung",)),
+        _sleep_check("fast", 0.05),
+    ]
+    started = time.perf_counter()
+    results = preflight.run_checks(checks)
+    release.set()
+    assert time.perf_counter() - started < 1
+    assert _statuses(results) == {"hung": "fail", "after": "skipped", "fast": "ok"}
+    assert "timed out" in results[0].detail
+
+
+# ----------------------------- cache -----------------------------
+
+def test_cache_reuses_passed_checks_until_inputs_change(tmp_path):
+    calls, state = [], {"version": 1}
+    checks = [
+        _sleep_check("sheet", inputs=lambda: [state["version"]], calls=calls),
+        _sleep_check("local", calls=calls),
+    ]
+    path = str(tmp_path / "preflight.json")
+
+    preflight.run_checks(checks, cache=preflight.PreflightCache(path, ttl_s=60))
+    results = preflight.run_checks(checks, cache=preflight.PreflightCache(path, ttl_s=60))
+    assert _statuses(results) == {"sheet": "cached", "local": "ok"}
+    assert results[0].detail == "sheet fine"
+    assert calls == ["sheet", "local", "local"]
+
+    state["version"] = 2
+    results = preflight.run_checks(checks, cache=preflight.PreflightCache(path, ttl_s=60))
+    assert _statuses(results)["sheet"] == "ok"
+
+
+def test_cache_expires_and_forgets_failures(tmp_path):
+    path = str(tmp_path / "preflight.json")
+    ok = _sleep_check("sheet", inputs=lambda: [])
+    preflight.run_checks([ok], cache=preflight.PreflightCache(path, ttl_s=60))
+    assert _statuses(preflight.run_checks([ok], cache=preflight.PreflightCache(path, ttl_s=0))) == {"sheet": "ok"}
+
+    # A failed rerun (here: past the TTL) drops the earlier pass.
+    broken = _sleep_check("sheet", fail=True, inputs=lambda: [])
+    preflight.run_checks([broken], cache=preflight.PreflightCache(path, ttl_s=0))
+    assert preflight.PreflightCache(path, ttl_s=60).get(ok) is None
+
+
+# ----------------------------- default checks -----------------------------
+
+@pytest.fixture
+def google(monkeypatch):
+    state = fake.GoogleApiState(spreadsheets=["Routine"], seed=1)
+    server = fake.make_server(state, port=0)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    monkeypatch.setattr(gf, "GOOGLE_API_ENDPOINT", fake.base_url(server))
+    monkeypatch.setattr(preflight, "SPREADSHEET_NAME", "Routine")
+    monkeypatch.setattr(preflight, "APP_SCRIPT_ID", "script-1")
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_network_checks_against_fake_google(google):
+    assert preflight.check_apps_script() == "Routine formatter (fake)"
+    preflight.check_spreadsheet()
+    preflight.SPREADSHEET_NAME = "Missing"
+    with pytest.raises(CheckFailed, match="shared"):
+        preflight.check_spreadsheet()
+
+
+def test_pipeline_targets(monkeypatch, tmp_path):
+    monkeypatch.setattr(preflight, "APP_SCRIPT_ID", preflight.PLACEHOLDER_ID)
+    assert preflight.pipeline_targets() == ["portal", "spreadsheet"]
+    assert preflight.pipeline_targets(scrape=False) == ["spreadsheet"]
+
+    token = tmp_path / "token.pickle"
+    token.write_bytes(b"")
+    monkeypatch.setattr(preflight, "APP_SCRIPT_ID", "script-1")
+    monkeypatch.setattr(preflight, "TOKEN_PICKLE_FILE", str(token))
+    assert preflight.pipeline_targets() == ["portal", "spreadsheet", "apps_script"]
+    preflight.select(preflight.default_checks(), preflight.pipeline_targets())
+
+
+# ----------------------------- pipeline -----------------------------
+
+@pytest.mark.parametrize("failing, failed", [
+    ("portal", ["portal"]),
+    ("spreadsheet", ["spreadsheet"]),
+    (None, []),
+])
+def test_pipeline_preflight_reports_failed_checks(monkeypatch, failing, failed):
+    seen = {}
+
+    def _run_checks(checks, targets=None, cache=None):
+        seen["targets"] = targets
+        return [preflight.CheckResult(Check(name, name, None), "fail" if name == failing else "cached")
+                for name in targets]
+
+    monkeypatch.setattr(preflight, "run_checks", _run_checks)
+    monkeypatch.setattr(preflight, "APP_SCRIPT_ID", preflight.PLACEHOLDER_ID)
+    assert pipeline._preflight("provision") == failed
+    assert seen["targets"] == ["portal", "spreadsheet"]
+    pipeline._preflight("publish_sheet")
+    assert seen["targets"] == ["spreadsheet"]
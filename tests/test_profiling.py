@@ -0,0 +1,90 @@
+import json
+import os
+import pstats
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import profiling
+
+
+@pytest.fixture(autouse=True)
+def _reset_profiling(monkeypatch):
+    monkeypatch.setattr(profiling, "_active", None)
+    monkeypatch.setattr(profiling, "_requested", False)
+
+
+def _busy(n=2000):
+    return sum(i * i for i in range(n))
+
+
+# ----------------------------- disabled mode -----------------------------
+
+def test_stage_is_null_context_when_disabled():
+    assert profiling.stage("anything") is profiling._NULL_STAGE
+    with profiling.stage("anything"):
+        _busy()
+    assert not profiling.is_enabled()
+
+
+def test_session_without_request_does_not_create_run_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    with profiling.session("scraper") as profiler:
+        assert profiler is None
+    assert os.listdir(tmp_path) == []
+
+
+# ----------------------------- enabled mode -----------------------------
+
+def test_request_from_argv_enables_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    profiling.request_from_argv(["--profile"])
+    with profiling.session("scraper") as profiler:
+        with profiling.stage("parse"):
+            _busy()
+    assert profiler is not None
+    assert not profiling.is_enabled()
+    summary = json.loads(open(os.path.join(profiler.run_dir, "summary.json")).read())
+    assert [s["stage"] for s in summary["stages"]] == ["parse"]
+    stats = pstats.Stats(os.path.join(profiler.run_dir, "parse.pstats"))
+    assert stats.total_calls > 0
+
+
+def test_repeated_and_unsafe_stage_names_get_unique_files(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path))
+    with profiler.stage("scrape[a/b]"):
+        _busy()
+    with profiler.stage("scrape[a/b]"):
+        _busy()
+    files = [s["file"] for s in profiler.stages]
+    assert files == ["scrape_a_b.pstats", "scrape_a_b.1.pstats"]
+    assert all((tmp_path / f).exists() for f in files)
+
+
+def test_nested_stages_are_both_recorded(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path))
+    with profiler.stage("outer"):
+        with profiler.stage("inner"):
+            _busy()
+    assert [s["stage"] for s in profiler.stages] == ["inner", "outer"]
+
+
+def test_tracemalloc_writes_allocation_report(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path), trace_memory=True, top_n=5)
+    with profiler.stage("merge"):
+        data = [str(i) * 10 for i in range(5000)]
+    profiler.finish()
+    report = (tmp_path / "merge.alloc.txt").read_text(encoding="utf-8")
+    assert "allocation sites" in report
+    assert len(data) == 5000
+
+
+def test_nested_session_joins_active_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    profiling.request_from_argv(["--profile"])
+    with profiling.session("pipeline") as outer:
+        with profiling.session("formatter") as inner:
+            assert inner is outer
+    assert len(os.listdir(tmp_path)) == 1
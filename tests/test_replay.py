@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import replay
+import routine_scrapper as rs
+import gsheet_formatter as gf
+
+
+DASHBOARD_HTML = """
+<table id="ctl00_MainContainer_gvCourseList">
+<tr><th>SL</th><th>Course Info</th><th>Schedule 1</th><th>Schedule 2</th><th>Attendance</th></tr>
+<tr>
+    <td>1</td>
+    <td>Course Code :<br/>CSE-3201<br/>Title : Operating Systems<br/>Credit : 3.00<br/>Section : B</td>
+    <td>Day :<br/>Sun<br/>Time : 11:0 - 12:15<br/>Room : 120<br/>Teacher : SS</td>
+    <td>Day :<br/>Mon<br/>Time : 11:0 - 12:15<br/>Room : 204<br/>Teacher : SS</td>
+    <td>Total Class : 5</td>
+</tr>
+<tr>
+    <td>2</td>
+    <td>Course Code :<br/>CSE-3212<br/>Title : Operating Systems Lab<br/>Credit : 1.50<br/>Section : B2</td>
+    <td>Day :<br/>Wed<br/>Time : 9:0 - 11:50<br/>Room : 302<br/>Teacher : JTT</td>
+    <td>Day :<br/>Thu<br/>Time : 9:0 - 11:50<br/>Room : 302<br/>Teacher : JTT</td>
+    <td>Total Class : 5</td>
+</tr>
+</table>
+"""
+USERS = [
+    {"id": "p1", "username": "u1", "password": "secret", "section_label": "B1"},
+    {"id": "p2", "username": "u2", "password": "secret", "section_label": "B2"},
+]
+TEACHERS = {"SS": {"name": "S. Sarker"}}
+
+
+def _capture(profile_id, section_label):
+    return {"profile_id": profile_id, "section_label": section_label, "semester": "Fall 2026",
+            "semester_options": [{"value": "0", "text": "Select"}, {"value": "7", "text": "Fall 2026"}],
+            "html": DASHBOARD_HTML, "captured_at": 0, "timings": {"login_s": 4.2}}
+
+
+@pytest.fixture
+def bundle():
+    return replay.build_bundle([_capture("p1", "B1"), _capture("p2", "B2")], USERS, TEACHERS)
+
+
+# ----------------------------- bundles -----------------------------
+
+def test_bundle_keeps_capture_and_drops_credentials(bundle):
+    assert bundle["version"] == replay.BUNDLE_VERSION
+    assert bundle["profiles"][0]["semester_options"][1]["text"] == "Fall 2026"
+    assert "secret" not in json.dumps(bundle)
+
+
+def test_write_and_load_roundtrip_gzip(bundle, tmp_path):
+    path = replay.write_bundle(bundle, str(tmp_path / "day.json.gz"))
+    assert replay.load_bundle(path) == bundle
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_load_rejects_newer_version(bundle, tmp_path):
+    bundle["version"] = replay.BUNDLE_VERSION + 1
+    path = replay.write_bundle(bundle, str(tmp_path / "future.json"))
+    with pytest.raises(ValueError):
+        replay.load_bundle(path)
+
+
+def test_load_rejects_foreign_json(tmp_path):
+    path = tmp_path / "other.json"
+    path.write_text("[]", encoding="utf-8")
+    with pytest.raises(ValueError):
+        replay.load_bundle(str(path))
+
+
+# ----------------------------- replay -----------------------------
+
+def test_replay_matches_direct_pipeline(bundle):
+    result = replay.replay_bundle(bundle)
+    entries = (rs.parse_attendance_dashboard_data(DASHBOARD_HTML, "B1")
+               + rs.parse_attendance_dashboard_data(DASHBOARD_HTML, "B2"))
+    primary, secondary = rs.merge_sections(USERS)
+    expected = rs.build_final_routine(entries, primary, secondary, TEACHERS)
+    assert result["routine"] == expected
+    assert result["sheet_rows"] == gf.build_sheet_data(expected)
+    assert set(result["timings"]) == {"parse_s", "merge_s", "sheet_s"}
+
+
+def test_main_replays_directory(bundle, tmp_path, capsys):
+    replay.write_bundle(bundle, str(tmp_path / "a.json.gz"))
+    replay.write_bundle(bundle, str(tmp_path / "b.json"))
+    assert replay.main([str(tmp_path), "--json", "--repeat", "2"]) == 0
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [os.path.basename(line["bundle"]) for line in lines] == ["a.json.gz", "b.json"]
+    assert all(line["routine_rows"] > 0 for line in lines)
+
+
+def test_main_fails_on_empty_routine(bundle, tmp_path):
+    for profile in bundle["profiles"]:
+        profile["html"] = "<div>maintenance</div>"
+    replay.write_bundle(bundle, str(tmp_path / "bad.json"))
+    assert replay.main([str(tmp_path / "bad.json")]) == 1
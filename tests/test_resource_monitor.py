@@ -0,0 +1,114 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resource_monitor as rm
+
+pytestmark = pytest.mark.skipif(not rm.proc_available(), reason="requires /proc")
+
+
+class _Process:
+    def __init__(self, pid):
+        self.pid = pid
+
+
+class _Service:
+    def __init__(self, pid):
+        self.process = _Process(pid)
+
+
+class FakeDriver:
+    def __init__(self, service_pid=None, browser_pid=None):
+        self.service = _Service(service_pid) if service_pid else None
+        self.browser_pid = browser_pid
+
+
+@pytest.fixture
+def sleeper():
+    # A parent shell with a child, like chromedriver -> chrome.
+    proc = subprocess.Popen(["/bin/sh", "-c", "sleep 30 & wait"])
+    time.sleep(0.2)
+    yield proc
+    if proc.poll() is None:
+        proc.kill()
+    proc.wait()
+
+
+# ----------------------------- /proc readers -----------------------------
+
+def test_read_rss_of_self_is_positive():
+    assert rm.read_rss_kb(os.getpid()) > 0
+
+
+def test_read_rss_of_missing_pid_is_zero():
+    assert rm.read_rss_kb(2 ** 22 + 12345) == 0
+
+
+def test_process_tree_includes_descendants(sleeper):
+    tree = rm.process_tree([sleeper.pid])
+    assert sleeper.pid in tree
+    assert len(tree) >= 2
+
+
+def test_driver_root_pids():
+    assert rm.driver_root_pids(FakeDriver(service_pid=10, browser_pid=11)) == [10, 11]
+    assert rm.driver_root_pids(FakeDriver()) == []
+
+
+def test_kill_process_tree(sleeper):
+    assert rm.kill_process_tree([sleeper.pid]) >= 2
+    sleeper.wait(timeout=5)
+    assert sleeper.returncode is not None
+
+
+# ----------------------------- ResourceMonitor -----------------------------
+
+def test_peaks_are_recorded_per_phase(sleeper):
+    monitor = rm.ResourceMonitor()
+    monitor.attach(FakeDriver(service_pid=sleeper.pid), "p1")
+    with monitor.phase("scrape[p1]"):
+        monitor.sample()
+    report = monitor.report()
+    peak = report["phases"]["scrape[p1]"]
+    assert peak["python_peak_kb"] > 0
+    assert peak["browser_peak_kb"] > 0
+    assert peak["browser_processes_peak"] >= 2
+    assert report["overall"]["total_peak_kb"] >= peak["total_peak_kb"]
+
+
+def test_ceiling_kills_browser_tree_and_flags_profile(sleeper):
+    monitor = rm.ResourceMonitor(ceiling_mb=1)
+    monitor.attach(FakeDriver(service_pid=sleeper.pid), "p1")
+    with monitor.phase("scrape[p1]"):
+        monitor.sample()
+    sleeper.wait(timeout=5)
+    assert monitor.exceeded("p1")
+    assert not monitor.exceeded("p2")
+    assert monitor.report()["ceiling_hits"][0]["phase"] == "scrape[p1]"
+
+
+def test_ceiling_ignored_without_attached_driver():
+    monitor = rm.ResourceMonitor(ceiling_mb=1)
+    monitor.sample()
+    assert monitor.ceiling_hits == []
+
+
+def test_background_thread_and_report_file(tmp_path):
+    monitor = rm.ResourceMonitor(interval_s=0.01).start()
+    with monitor.phase("merge"):
+        time.sleep(0.05)
+    monitor.stop()
+    path = monitor.write_report(str(tmp_path / "resource_usage.json"))
+    report = json.loads(open(path, encoding="utf-8").read())
+    assert "merge" in report["phases"]
+
+
+def test_module_phase_is_noop_without_monitor(monkeypatch):
+    monkeypatch.setattr(rm, "_active", None)
+    assert rm.phase("x") is rm._NULL_PHASE
@@ -0,0 +1,149 @@
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routine_api as api
+
+
+def _entry(code, day, slot, section="B", teacher="Dr. Sadia Sultana", room="120"):
+    return {"CourseCode": code, "CourseTitle": f"{code} Title", "Section": section, "Day": day, "Room": room,
+            "TimeSlot": slot, "Teacher": teacher, "TeacherPhone": "", "TeacherEmail": ""}
+
+
+ROUTINE = [
+    _entry("CSE-3201", "Sun", "2:0 - 3:15"),
+    _entry("CSE-3205", "Sun", "8:30 - 9:45", room="305"),
+    _entry("CSE-3207", "Sat", "11:0 - 12:15", teacher="JTT"),
+    _entry("CSE-3299", "Mon", "", room="TBA"),
+    _entry("CSE-3212", "Tue", "2:0 - 4:30", section="B2", teacher="JTT"),
+]
+
+
+def _codes(entries):
+    return [entry["CourseCode"] for entry in entries]
+
+
+# ----------------------------- snapshot -----------------------------
+
+def test_select_intersects_indexes_case_insensitively():
+    snapshot = api.RoutineSnapshot(ROUTINE)
+    assert _codes(snapshot.select({})) == ["CSE-3207", "CSE-3205", "CSE-3201", "CSE-3299", "CSE-3212"]
+    assert _codes(snapshot.select({"section": "b", "day": "sunday"})) == ["CSE-3205", "CSE-3201"]
+    assert _codes(snapshot.select({"teacher": " jtt ", "section": "B2"})) == ["CSE-3212"]
+    assert snapshot.select({"room": "TBA"}) == []
+    with pytest.raises(api.BadRequest):
+        snapshot.select({"colour": "red"})
+
+
+def test_listing_counts_values_in_week_order():
+    snapshot = api.RoutineSnapshot(ROUTINE)
+    assert snapshot.listing("day") == [{"name": "SAT", "count": 1}, {"name": "SUN", "count": 2},
+                                       {"name": "MON", "count": 1}, {"name": "TUE", "count": 1}]
+    assert snapshot.listing("room") == [{"name": "120", "count": 3}, {"name": "305", "count": 1}]
+
+
+def test_next_class_bisects_today_then_wraps_the_week():
+    snapshot = api.RoutineSnapshot(ROUTINE)
+    result = snapshot.next_class("SUN", 9 * 60, "section", "B")
+    assert _codes(result["ongoing"]) == ["CSE-3205"]
+    assert result["next"]["CourseCode"] == "CSE-3201" and result["starts_in_min"] == 5 * 60
+
+    # After Sunday's last class the next one is Saturday's, six days on.
+    result = snapshot.next_class("SUN", 16 * 60, "section", "b")
+    assert result["day"] == "SAT" and result["starts_in_min"] == 6 * 24 * 60 + 11 * 60 - 16 * 60
+    assert snapshot.next_class("SUN", 16 * 60, "teacher", "JTT")["day"] == "TUE"
+    assert snapshot.next_class("SUN", 0, "room", "999")["next"] is None
+
+
+# ----------------------------- store -----------------------------
+
+def _write(path, routine):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(routine, f)
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10 ** 9,) * 2)
+
+
+def test_store_swaps_only_on_changed_content(tmp_path):
+    path = tmp_path / "routine.json"
+    store = api.RoutineStore(str(path))
+    assert not store.reload() and store.snapshot is None
+
+    _write(path, ROUTINE)
+    assert store.reload()
+    first = store.snapshot
+    assert not store.reload()
+    _write(path, ROUTINE)
+    assert not store.reload() and store.snapshot is first
+
+    path.write_text("[{", encoding="utf-8")
+    assert not store.reload() and store.snapshot is first
+
+    _write(path, ROUTINE[:2])
+    assert store.reload() and len(store.snapshot) == 2 and store.snapshot.etag != first.etag
+
+
+# ----------------------------- HTTP -----------------------------
+
+@pytest.fixture
+def server(tmp_path):
+    path = tmp_path / "routine.json"
+    _write(path, ROUTINE)
+    store = api.RoutineStore(str(path))
+    store.reload()
+    server = api.make_server(store, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    server.path = path
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(server, path, headers=None):
+    request = urllib.request.Request(api.base_url(server) + path, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, dict(response.headers), json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        return e.code, dict(e.headers), json.loads(body) if body else None
+
+
+def test_routine_query_with_etag_revalidation(server):
+    status, headers, body = _get(server, "/routine?section=B&day=Sun")
+    assert status == 200 and body["count"] == 2
+    etag = headers["ETag"]
+    assert _get(server, "/routine?section=B&day=Sun", {"If-None-Match": etag})[0] == 304
+    assert _get(server, "/sections", {"If-None-Match": etag})[0] == 304
+
+    _write(server.path, ROUTINE[:1])
+    server.store.reload()
+    status, headers, body = _get(server, "/routine?section=B&day=Sun", {"If-None-Match": etag})
+    assert status == 200 and body["count"] == 1 and headers["ETag"] != etag
+
+
+def test_next_and_errors(server):
+    status, headers, body = _get(server, "/next?section=B&day=Sun&time=9:00")
+    assert status == 200 and "ETag" not in headers
+    assert body["next"]["CourseCode"] == "CSE-3201" and body["at"] == {"day": "SUN", "time": "9:00 AM"}
+    assert _get(server, "/next?section=B&teacher=JTT")[0] == 400
+    assert _get(server, "/next?time=noon")[0] == 400
+    assert _get(server, "/routine?colour=red")[0] == 400
+    assert _get(server, "/nope")[0] == 404
+    assert _get(server, "/health")[2]["entries"] == len(ROUTINE)
+
+
+def test_unloaded_store_answers_503(tmp_path):
+    server = api.make_server(api.RoutineStore(str(tmp_path / "missing.json")), "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    try:
+        assert _get(server, "/health")[0] == 503
+    finally:
+        server.shutdown()
+        server.server_close()
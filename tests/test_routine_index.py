@@ -0,0 +1,158 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routine_index as ri
+
+
+def _entry(code, day, slot, room="120", teacher="SS", section="B"):
+    return {"CourseCode": code, "CourseTitle": code, "Section": section, "Day": day,
+            "Room": room, "TimeSlot": slot, "Teacher": teacher, "TeacherPhone": "", "TeacherEmail": ""}
+
+
+# ----------------------------- time slots -----------------------------
+
+@pytest.mark.parametrize("slot, expected", [
+    ("11:0 - 12:15", (660, 735)),
+    ("8:30 - 9:45", (510, 585)),
+    ("1:0 - 2:15", (780, 855)),
+    ("11:30 - 1:0", (690, 780)),
+    ("2:30 PM - 4:00 PM", (870, 960)),
+    ("6:0 AM-7:0 AM", (360, 420)),
+    ("12:0 AM - 1:0 AM", (0, 60)),
+])
+def test_parse_time_slot_infers_am_pm_like_apps_script(slot, expected):
+    assert ri.parse_time_slot(slot) == expected
+
+
+@pytest.mark.parametrize("slot", ["", None, "TBA", "11:0", "3:0 - 11:0"])
+def test_parse_time_slot_rejects_unusable_slots(slot):
+    assert ri.parse_time_slot(slot) is None
+
+
+def test_format_minutes():
+    assert ri.format_minutes(660) == "11:00 AM"
+    assert ri.format_minutes(735) == "12:15 PM"
+    assert ri.format_minutes(0) == "12:00 AM"
+
+
+def test_day_rank_follows_the_portal_week():
+    assert [ri.day_rank(day) for day in ("Sat", "SUNDAY", " fri ")] == [0, 1, 6]
+    assert ri.day_rank("") == ri.day_rank(None) == ri.day_rank("TBA") == len(ri.DAY_ORDER)
+
+
+# ----------------------------- IntervalIndex -----------------------------
+
+def test_interval_index_overlapping_is_half_open():
+    index = ri.IntervalIndex([("Sun", 60, 120, "a"), ("Sun", 120, 180, "b"), ("Mon", 0, 500, "c")])
+    assert index.overlapping("Sun", 100, 130) == ["a", "b"]
+    assert index.overlapping("Sun", 120, 121) == ["b"]
+    assert index.overlapping("Sun", 0, 60) == []
+    assert index.overlapping("Tue", 0, 1000) == []
+    assert len(index) == 3
+
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(7)
+    items = []
+    for seq in range(2000):
+        start = rng.randrange(480, 1080)
+        items.append((rng.choice("ABC"), start, start + rng.choice((30, 75, 90, 150)), seq))
+    index = ri.IntervalIndex(items)
+    by_seq = {seq: (key, s, e) for key, s, e, seq in items}
+
+    for _ in range(200):
+        key, start = rng.choice("ABC"), rng.randrange(400, 1100)
+        end = start + rng.randrange(1, 120)
+        expected = {seq for k, s, e, seq in items if k == key and s < end and e > start}
+        assert set(index.overlapping(key, start, end)) == expected
+
+    for key in "ABC":
+        pairs = {frozenset(pair) for pair in index.overlapping_pairs(key)}
+        members = [seq for k, _, _, seq in items if k == key]
+        expected = {
+            frozenset((a, b)) for i, a in enumerate(members) for b in members[i + 1:]
+            if by_seq[a][1] < by_seq[b][2] and by_seq[b][1] < by_seq[a][2]
+        }
+        assert pairs == expected
+
+
+# ----------------------------- RoutineIndex -----------------------------
+
+def test_clashes_by_kind():
+    routine = [
+        _entry("CSE-3201", "Sun", "11:0 - 12:15", room="120", teacher="SS"),
+        _entry("CSE-3212", "sun", "12:0 - 1:30", room="120", teacher="JTT"),
+        _entry("CSE-3205", "Sun", "12:15 - 1:30", room="204", teacher="SS"),
+    ]
+    clashes = ri.RoutineIndex(routine).clashes()
+    kinds = sorted((c["kind"], c["a"]["CourseCode"], c["b"]["CourseCode"]) for c in clashes)
+    assert kinds == [
+        ("room", "CSE-3201", "CSE-3212"),
+        ("timetable", "CSE-3201", "CSE-3212"),
+        ("timetable", "CSE-3212", "CSE-3205"),
+    ]
+    assert all(c["day"] == "SUN" for c in clashes)
+
+
+def test_combined_class_is_not_a_room_or_teacher_clash():
+    routine = [
+        _entry("CSE-3201", "Sun", "11:0 - 12:15", section="A"),
+        _entry("CSE-3201", "Sun", "11:0 - 12:15", section="B"),
+    ]
+    assert ri.RoutineIndex(routine).clashes() == []
+
+
+def test_by_section_keeps_timetables_apart():
+    routine = [
+        _entry("CSE-3201", "Sun", "11:0 - 12:15", room="120", teacher="SS", section="A"),
+        _entry("CSE-3205", "Sun", "11:0 - 12:15", room="204", teacher="JTT", section="B"),
+    ]
+    assert [c["kind"] for c in ri.RoutineIndex(routine).clashes()] == ["timetable"]
+    assert ri.RoutineIndex(routine, timetable_field="Section").clashes() == []
+
+
+def test_unparsed_entries_are_kept_aside():
+    routine = [_entry("CSE-3201", "Sun", "TBA"), _entry("CSE-3205", "", "11:0 - 12:15")]
+    index = ri.RoutineIndex(routine)
+    assert index.unparsed == routine
+    assert index.clashes() == []
+
+
+def test_free_rooms():
+    routine = [
+        _entry("CSE-3201", "Sun", "11:0 - 12:15", room="120"),
+        _entry("CSE-3205", "Sun", "8:30 - 9:45", room="204"),
+        _entry("CSE-3212", "Mon", "11:0 - 12:15", room="305"),
+        _entry("CSE-3213", "Mon", "11:0 - 12:15", room="N/A", teacher="TT"),
+    ]
+    index = ri.RoutineIndex(routine)
+    assert index.rooms == ["120", "204", "305"]
+    assert index.free_rooms("Sun", *ri.parse_time_slot("12:0 - 1:0")) == ["204", "305"]
+    assert index.free_rooms("SUN", *ri.parse_time_slot("9:45 - 11:0")) == ["120", "204", "305"]
+    assert index.free_rooms("Mon", 660, 700, rooms=["305", "999"]) == ["999"]
+
+
+def test_log_clashes_warns(caplog):
+    routine = [_entry("CSE-3201", "Sun", "11:0 - 12:15"), _entry("CSE-3205", "Sun", "11:30 - 12:45")]
+    assert len(ri.log_clashes(routine)) == 3
+    assert "CSE-3201" in caplog.text and "clash on SUN" in caplog.text
+
+
+# ----------------------------- main -----------------------------
+
+def test_main_reports_clashes_and_free_rooms(tmp_path, capsys):
+    path = tmp_path / "routine.json"
+    path.write_text(json.dumps([
+        _entry("CSE-3201", "Sun", "11:0 - 12:15", room="120"),
+        _entry("CSE-3205", "Sun", "12:0 - 1:0", room="204", teacher="JTT"),
+    ]), encoding="utf-8")
+    assert ri.main([str(path)]) == 1
+    assert "timetable clash on SUN" in capsys.readouterr().out
+    assert ri.main([str(path), "--free", "Sun", "11:0 - 11:30"]) == 0
+    assert "Free on Sun 11:00 AM - 11:30 AM: 204" in capsys.readouterr().out
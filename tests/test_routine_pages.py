@@ -0,0 +1,91 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routine_pages as rp
+
+TPL = "attendance_dashboard_{section}.html"
+
+
+def _entry(code, day, slot, section="B", teacher="Dr. Sadia Sultana", room="120"):
+    return {"CourseCode": code, "CourseTitle": f"{code} Title", "Section": section, "Day": day, "Room": room,
+            "TimeSlot": slot, "Teacher": teacher, "TeacherPhone": "+880 17-000", "TeacherEmail": "ss@uap-bd.edu"}
+
+
+ROUTINE = [
+    _entry("CSE-3201", "Sun", "2:0 - 3:15"),
+    _entry("CSE-3205", "Sun", "8:30 - 9:45"),
+    _entry("CSE-3207", "Sat", "11:0 - 12:15"),
+    _entry("CSE-3299", "Mon", ""),
+    _entry("CSE-3212", "Sat", "2:0 - 4:30", section="B2", teacher="JTT"),
+]
+
+
+def _export(tmp_path, routine=ROUTINE):
+    return rp.export_pages(routine, TPL, out_dir=str(tmp_path))
+
+
+# ----------------------------- rendering -----------------------------
+
+def test_sort_entries_week_order_then_start_time():
+    ordered = [e["CourseCode"] for e in rp.sort_entries(ROUTINE[:4])]
+    assert ordered == ["CSE-3207", "CSE-3205", "CSE-3201", "CSE-3299"]
+
+
+def test_section_page_is_self_contained_and_ordered():
+    page = rp.render_section_page("B", ROUTINE[:4], "2026-10-19 09:00")
+    assert page.startswith("<!DOCTYPE html>")
+    assert "<script" not in page and "<link" not in page and "src=" not in page
+    assert page.index("Saturday") < page.index("Sunday") < page.index("Monday")
+    assert page.index("8:30 AM") < page.index("2:00 PM")
+    assert '<a href="tel:+88017000">+880 17-000</a>' in page
+    assert 'href="mailto:ss@uap-bd.edu"' in page
+
+
+def test_section_page_escapes_values():
+    page = rp.render_section_page("B<1>", [_entry("<b>CSE</b>", "Sun", "9:0 - 10:0", section="B<1>")], "now")
+    assert "<b>CSE</b>" not in page
+    assert "&lt;b&gt;CSE&lt;/b&gt;" in page
+    assert "Section B&lt;1&gt;" in page
+
+
+# ----------------------------- export -----------------------------
+
+def test_export_writes_section_pages_and_index(tmp_path):
+    result = _export(tmp_path)
+    assert result["written"] == ["attendance_dashboard_B.html", "attendance_dashboard_B2.html", "index.html"]
+    index = (tmp_path / "index.html").read_text(encoding="utf-8")
+    assert 'href="attendance_dashboard_B2.html"' in index
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_export_rewrites_only_changed_sections(tmp_path):
+    _export(tmp_path)
+    assert _export(tmp_path)["written"] == []
+
+    changed = [dict(e, Room="305") if e["Section"] == "B2" else e for e in ROUTINE]
+    result = _export(tmp_path, changed)
+    assert result["written"] == ["attendance_dashboard_B2.html"]
+    assert "305" in (tmp_path / "attendance_dashboard_B2.html").read_text(encoding="utf-8")
+
+
+def test_export_restores_missing_and_removes_stale_pages(tmp_path):
+    _export(tmp_path)
+    os.remove(tmp_path / "attendance_dashboard_B.html")
+    result = _export(tmp_path, [e for e in ROUTINE if e["Section"] == "B"])
+    assert result["written"] == ["attendance_dashboard_B.html", "index.html"]
+    assert result["removed"] == ["attendance_dashboard_B2.html"]
+    assert not (tmp_path / "attendance_dashboard_B2.html").exists()
+
+
+def test_export_keeps_sections_whose_slugs_collide(tmp_path):
+    routine = [_entry("CSE-3201", "Sun", "9:0 - 10:0", section="B 1"),
+               _entry("CSE-3205", "Mon", "9:0 - 10:0", section="B/1")]
+    result = _export(tmp_path, routine)
+    pages = sorted(name for name in result["written"] if name != "index.html")
+    assert len(pages) == 2 and all(name.startswith("attendance_dashboard_B_1_") for name in pages)
+    codes = sorted(code for page in pages for code in ("CSE-3201", "CSE-3205")
+                   if code in (tmp_path / page).read_text(encoding="utf-8"))
+    assert codes == ["CSE-3201", "CSE-3205"]
+    assert _export(tmp_path, routine)["written"] == []
@@ -139,6 +139,59 @@ def test_parse_dashboard_row_without_day_keeps_other_slot():
     assert e3["ScheduleTwo_Day"] == "Fri"
 
 
+def test_parse_dashboard_attendance_columns():
+    entries = rs.parse_attendance_dashboard_data(SAMPLE_HTML, "B1")
+    assert entries[0]["ClassesHeld"] == "5"
+    assert entries[0]["AttendancePercentage"] == "80.00"
+    # The portal shows no attended count; it follows from held x percentage.
+    assert entries[0]["ClassesAttended"] == "4"
+    assert entries[1]["ClassesAttended"] == "5"
+    assert entries[2]["AttendancePercentage"] == "" and entries[2]["ClassesAttended"] == ""
+
+    # An explicit attended count, should the portal show one, wins.
+    cells = ["1", "Course Code :\nCSE-3201", "", "",
+             "Total Class : 12\nPresent : 9\nAttendance Percentage :\n75.00"]
+    entry = rs.entry_from_cells(cells, "B1")
+    assert (entry["ClassesHeld"], entry["ClassesAttended"], entry["AttendancePercentage"]) == ("12", "9", "75.00")
+
+
+# ----------------------------- attendance summary -----------------------------
+
+def _attendance(section, code, held="", attended="", percentage=""):
+    return {"UserScrapedSection": section, "CourseCode": code, "CourseTitle": f"{code} Title",
+            "ClassesHeld": held, "ClassesAttended": attended, "AttendancePercentage": percentage}
+
+
+def test_attendance_summary_dedupes_and_computes_missing_percentage():
+    summary = rs.attendance_summary([
+        _attendance("B2", "CSE-3212", "10", "7"),
+        _attendance("B1", "CSE-3201", "5", "4", "80.00"),
+        _attendance("B1", "CSE-3201", "5", "4", "80.00"),
+        _attendance("B1", "CSE-3299", "0", "0"),
+    ])
+    assert [(r["Section"], r["CourseCode"], r["AttendancePercentage"]) for r in summary] == [
+        ("B1", "CSE-3201", "80.00"), ("B1", "CSE-3299", ""), ("B2", "CSE-3212", "70.00"),
+    ]
+
+
+def test_save_attendance_summary(tmp_path, monkeypatch):
+    monkeypatch.setattr(rs, "FORMATTED_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(rs, "SEMESTER_OUTPUT_DIR", str(tmp_path / "semesters"))
+    entries = [_attendance("B1", "CSE-3201", "5", "4", "80.00")]
+    rs.save_attendance_summary(entries)
+    rs.save_attendance_summary(entries, "Fall_2024")
+    header = (tmp_path / "attendance_summary.csv").read_text(encoding="utf-8").splitlines()[0]
+    assert header.split(",") == rs.ATTENDANCE_SUMMARY_FIELDNAMES
+    assert json.loads((tmp_path / "semesters" / "attendance_summary_Fall_2024.json").read_text(
+        encoding="utf-8"))[0]["ClassesAttended"] == "4"
+
+
+def test_save_attendance_summary_skips_pages_without_attendance(tmp_path, monkeypatch):
+    monkeypatch.setattr(rs, "FORMATTED_OUTPUT_DIR", str(tmp_path))
+    rs.save_attendance_summary([_attendance("B1", "CSE-3201")])
+    assert not list(tmp_path.iterdir())
+
+
 # ----------------------------- save_data_to_file -----------------------------
 
 def test_save_csv(tmp_path):
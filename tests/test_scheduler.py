@@ -0,0 +1,148 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline
+import scheduler
+from scheduler import HOUR_S, Policy
+
+DAY_S = 24 * HOUR_S
+
+
+def _ts(*args):
+    return datetime.datetime(*args).timestamp()
+
+
+def _policy(**overrides):
+    settings = dict(min_interval_h=2, max_interval_h=168, backoff=2, quiet_hours=(), semester_starts=[],
+                    semester_window_days=21)
+    settings.update(overrides)
+    return Policy(**settings)
+
+
+def _delay_h(state):
+    return (state["next_run_at"] - state["last_run_at"]) / HOUR_S
+
+
+# ----------------------------- parsing -----------------------------
+
+def test_parse_quiet_hours_and_semester_starts():
+    assert scheduler.parse_quiet_hours("23-7") == (23, 7)
+    assert scheduler.parse_quiet_hours("") is None
+    assert scheduler.parse_quiet_hours("late") is None
+    assert scheduler.parse_semester_starts("01-10, 07-01,13-40,x") == [(1, 10), (7, 1)]
+
+
+def test_quiet_hours_wrap_past_midnight():
+    quiet = (23, 7)
+    assert scheduler.in_quiet_hours(_ts(2026, 10, 19, 23, 30), quiet)
+    assert scheduler.in_quiet_hours(_ts(2026, 10, 19, 3, 0), quiet)
+    assert not scheduler.in_quiet_hours(_ts(2026, 10, 19, 7, 0), quiet)
+    assert scheduler.after_quiet_hours(_ts(2026, 10, 19, 23, 30), quiet) == _ts(2026, 10, 20, 7, 0)
+    assert scheduler.after_quiet_hours(_ts(2026, 10, 19, 12, 0), quiet) == _ts(2026, 10, 19, 12, 0)
+
+
+# ----------------------------- record_run -----------------------------
+
+def test_interval_backs_off_while_stable_and_resets_on_change():
+    policy, state, now = _policy(), {}, _ts(2026, 10, 19, 12, 0)
+    scheduler.record_run(state, now, 0, "h1", policy=policy)
+    assert _delay_h(state) == 2 and state["runs"][-1]["changed"]
+
+    delays = []
+    for _ in range(9):
+        now = state["next_run_at"]
+        scheduler.record_run(state, now, 0, "h1", policy=policy)
+        delays.append(_delay_h(state))
+    assert delays == [4, 8, 16, 32, 64, 128, 168, 168, 168]
+
+    scheduler.record_run(state, state["next_run_at"], 0, "h2", policy=policy)
+    assert _delay_h(state) == 2
+    assert state["routine_hash"] == "h2" and state["last_change_at"] == state["last_run_at"]
+
+
+def test_failures_retry_sooner_without_losing_the_interval():
+    policy, now = _policy(), _ts(2026, 10, 19, 12, 0)
+    state = {"interval_h": 64, "routine_hash": "h1"}
+    scheduler.record_run(state, now, pipeline.EXIT_SCRAPE_FAILED, policy=policy)
+    assert _delay_h(state) == 4 and state["failures"] == 1
+    scheduler.record_run(state, now, pipeline.EXIT_SCRAPE_FAILED, policy=policy)
+    assert _delay_h(state) == 8 and state["interval_h"] == 64
+
+    scheduler.record_run(state, now, 0, "h1", policy=policy)
+    assert state["failures"] == 0 and _delay_h(state) == 128
+
+
+def test_configured_semester_start_polls_often():
+    policy = _policy(semester_starts=[(1, 10)])
+    state = {"interval_h": 168, "routine_hash": "h1"}
+    # The next run is pulled forward to the start date...
+    scheduler.record_run(state, _ts(2027, 1, 5, 12, 0), 0, "h1", policy=policy)
+    assert state["next_run_at"] == _ts(2027, 1, 10)
+    # ...and stays at the minimum interval inside the window.
+    scheduler.record_run(state, _ts(2027, 1, 20, 12, 0), 0, "h1", policy=policy)
+    assert _delay_h(state) == 2
+    scheduler.record_run(state, _ts(2027, 2, 15, 12, 0), 0, "h1", policy=policy)
+    assert _delay_h(state) == 4
+
+
+def test_detected_semester_change_polls_often():
+    policy, now = _policy(), _ts(2026, 10, 19, 12, 0)
+    state = {"interval_h": 64, "routine_hash": "h1", "semester": "Spring 2026"}
+    scheduler.record_run(state, now, 0, "h1", semester="Fall 2026", policy=policy)
+    assert state["semester"] == "Fall 2026" and state["semester_seen_at"] == now
+    assert _delay_h(state) == 2
+    scheduler.record_run(state, now + 30 * DAY_S, 0, "h1", semester="Fall 2026", policy=policy)
+    assert _delay_h(state) == 4
+
+
+def test_next_run_skips_quiet_hours_and_history_is_bounded():
+    policy = _policy(quiet_hours=(0, 7))
+    state = scheduler.record_run({}, _ts(2026, 10, 19, 23, 0), 0, "h1", policy=policy)
+    assert state["next_run_at"] == _ts(2026, 10, 20, 7, 0)
+    for _ in range(scheduler.HISTORY_LIMIT):
+        scheduler.record_run(state, state["next_run_at"], 0, "h1", policy=policy)
+    assert len(state["runs"]) == scheduler.HISTORY_LIMIT
+    assert not scheduler.is_due({}, _ts(2026, 10, 20, 3, 0), policy)
+    assert scheduler.is_due({}, _ts(2026, 10, 20, 8, 0), policy)
+
+
+# ----------------------------- main -----------------------------
+
+@pytest.fixture
+def state_file(monkeypatch, tmp_path):
+    path = tmp_path / "scheduler_state.json"
+    monkeypatch.setattr(scheduler, "SCHEDULER_STATE_FILE", str(path))
+    monkeypatch.setattr(scheduler, "SCHEDULER_QUIET_HOURS", "")
+    return path
+
+
+def test_main_runs_only_when_due(monkeypatch, state_file):
+    runs = []
+
+    def _run_pipeline():
+        runs.append(True)
+        return pipeline.EXIT_OK, "h1", "Fall 2026"
+
+    monkeypatch.setattr(scheduler, "run_pipeline", _run_pipeline)
+    assert scheduler.main([]) == 0
+    assert scheduler.main([]) == 0
+    assert len(runs) == 1
+    state = scheduler.load_state(str(state_file))
+    assert state["routine_hash"] == "h1" and state["semester"] == "Fall 2026"
+
+    assert scheduler.main(["--force"]) == 0
+    assert len(runs) == 2 and scheduler.load_state(str(state_file))["interval_h"] > 2
+
+
+def test_run_results_read_the_stage_cache(tmp_path):
+    cache = pipeline.StageCache(str(tmp_path))
+    assert scheduler.run_results(cache) == (None, None)
+    routine = [{"CourseCode": "CSE-3201"}]
+    cache.store("scrape.p1", "x", {"semester": "Fall 2026", "rows": []})
+    cache.store("merge", "y", {"routine": routine})
+    assert scheduler.run_results(cache) == (pipeline.hash_inputs(routine), "Fall 2026")
@@ -1,13 +1,19 @@
+import json
 import os
+import shutil
+import subprocess
 import sys
 import time
 
 import pytest
-from selenium.common.exceptions import NoSuchElementException
+from bs4 import BeautifulSoup, Comment, Tag
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import partial_postback
 import routine_scrapper as rs
+import scripts.fake_ucam_portal as portal
 
 TAG_NAME = "tag name"
 S2_CONTAINER_XPATH = (
@@ -20,7 +26,7 @@ TABLE_XPATH = (
 
 
 def _s2_option_xpath(text):
-    return f"//span[contains(@class, 'select2-results')]//li[text()=\"{text}\"]"
+    return f"//span[contains(@class, 'select2-results')]//li[text()={rs.xpath_literal(text)}]"
 
 
 class FakeElement:
@@ -72,6 +78,8 @@ class FakeDriver:
         self.page_source = source
         self.gets = []
         self._elements = elements or {}
+        self.scripts = []
+        self.script_result = None
 
     def get(self, url):
         self.gets.append(url)
@@ -90,6 +98,12 @@ class FakeDriver:
         result = self._elements.get(key, [])
         return result if isinstance(result, list) else [result]
 
+    def execute_script(self, script, *args):
+        self.scripts.append((script, args))
+        if isinstance(self.script_result, Exception):
+            raise self.script_result
+        return self.script_result
+
 
 @pytest.fixture(autouse=True)
 def _fast_time(monkeypatch):
@@ -104,6 +118,11 @@ def _fast_time(monkeypatch):
         monkeypatch.setattr(rs, attr, 0.01)
 
 
+@pytest.fixture(autouse=True)
+def _egress_stats(tmp_path, monkeypatch):
+    monkeypatch.setattr(rs.egress, "EGRESS_STATS_FILE", str(tmp_path / "egress_stats.json"))
+
+
 def _by_id(**kwargs):
     return {(rs.By.ID, k): v for k, v in kwargs.items()}
 
@@ -159,6 +178,16 @@ def test_bypass_retries_through_cloudflare_then_succeeds():
     assert driver.gets == ["https://login", "https://login"]
 
 
+def test_bypass_counts_challenges_per_egress():
+    driver = FakeDriver(titles=["Just a moment...", "UCAM Student Portal"], elements=_login_elements())
+    rs.bypass_cloudflare_and_wait_for_login(driver, "https://login", egress_label="http://10.0.0.2:3128")
+    rs.bypass_cloudflare_and_wait_for_login(FakeDriver(title="Just a moment...", elements={}), "https://login",
+                                            egress_label="http://10.0.0.2:3128")
+    entry = rs.egress.load_stats()["http://10.0.0.2:3128"]
+    assert (entry["sessions"], entry["attempts"], entry["challenges"], entry["blocked"]) == (2, 5, 4, 1)
+    assert entry["challenge_rate"] == 0.8
+
+
 def test_bypass_raises_when_login_never_appears():
     driver = FakeDriver(title="UCAM Student Portal", elements={}, source="snippet")
     with pytest.raises(rs.TimeoutException):
@@ -221,6 +250,63 @@ def test_select_semester_chooses_first_non_placeholder():
     assert driver.gets[-1] == "https://dash"
 
 
+def test_choose_semester_returns_dropdown_options():
+    driver, _, _ = _semester_driver("Fall 2024")
+    chosen, options = rs.choose_semester(driver, "https://dash", "B1")
+    assert chosen == "Fall 2024"
+    assert options == [{"value": "0", "text": "Select Semester"}, {"value": "7", "text": "Fall 2024"}]
+
+
+def test_read_semester_options_uses_one_script_call():
+    driver, _, _ = _semester_driver("Fall 2024")
+    dropdown = driver.find_element(rs.By.ID, rs.SEMESTER_DROPDOWN_ID)
+    dropdown.parent = driver
+    driver.script_result = [{"value": "7", "text": "Fall 2024"}]
+    assert rs.read_semester_options(dropdown) == [{"value": "7", "text": "Fall 2024"}]
+    assert driver.scripts == [(rs.SEMESTER_OPTIONS_SCRIPT, (dropdown,))]
+
+
+def test_read_semester_options_falls_back_per_option():
+    driver, _, _ = _semester_driver("Fall 2024")
+    dropdown = driver.find_element(rs.By.ID, rs.SEMESTER_DROPDOWN_ID)
+    dropdown.parent = driver
+    driver.script_result = RuntimeError("javascript error")
+    assert [opt["value"] for opt in rs.read_semester_options(dropdown)] == ["0", "7"]
+
+
+def test_xpath_literal_quotes():
+    assert rs.xpath_literal("Fall 2024") == '"Fall 2024"'
+    assert rs.xpath_literal('Fall "A"') == "'Fall \"A\"'"
+    assert rs.xpath_literal('Fall\'s "A"') == 'concat("Fall\'s ", \'"\', "A", \'"\', "")'
+
+
+def test_select_semester_direct_postback_skips_select2():
+    driver, s2_container, s2_option = _semester_driver("Fall 2024")
+    old_table = TableElement()
+    old_table.stale = True
+    driver.script_result = {"marker": old_table}
+    assert rs.select_semester(driver, "https://dash", "B1") == "Fall 2024"
+    script, args = driver.scripts[-1]
+    assert script == rs.SEMESTER_POSTBACK_SCRIPT
+    assert args == (rs.SEMESTER_DROPDOWN_ID, rs.UPDATE_PANEL_ID, "7")
+    assert s2_container.clicked is False
+    assert s2_option.clicked is False
+
+
+def test_select_semester_falls_back_when_panel_never_refreshes():
+    driver, s2_container, s2_option = _semester_driver("Fall 2024")
+    driver.script_result = {"marker": TableElement()}
+    assert rs.select_semester(driver, "https://dash", "B1") == "Fall 2024"
+    assert s2_container.clicked is True
+    assert s2_option.clicked is True
+
+
+def test_select_semester_label_with_quotes_uses_select2_fallback():
+    driver, _, s2_option = _semester_driver('Fall "2024"')
+    assert rs.select_semester(driver, "https://dash", "B1") == 'Fall "2024"'
+    assert s2_option.clicked is True
+
+
 def test_select_semester_raises_with_no_valid_option():
     driver = FakeDriver(
         elements=_by_id(ctl00_MainContainer_ddlHeldIn=FakeSelect([]))
@@ -229,6 +315,233 @@ def test_select_semester_raises_with_no_valid_option():
         rs.select_semester(driver, "https://dash", "B1")
 
 
+# ----------------------------- multi-semester -----------------------------
+
+class TableElement(FakeElement):
+    def __init__(self):
+        super().__init__()
+        self.stale = False
+
+    def is_enabled(self):
+        if self.stale:
+            raise StaleElementReferenceException("table replaced")
+        return True
+
+
+class PostbackOption(FakeElement):
+    """select2 option whose click swaps the UpdatePanel content, like a postback."""
+
+    def __init__(self, driver, semester):
+        super().__init__(text=semester)
+        self._driver = driver
+        self._semester = semester
+
+    def click(self):
+        super().click()
+        self._driver.postback(self._semester)
+
+
+def _semester_history_driver(semesters, empty=()):
+    dropdown = FakeSelect([FakeElement(text="Select Semester", value="0")]
+                          + [FakeElement(text=label, value=str(i)) for i, label in enumerate(semesters, 1)])
+    panel = FakeElement(html=None)
+    elements = _login_elements()
+    elements.update(_by_id(ctl00_MainContainer_ddlHeldIn=dropdown, ctl00_MainContainer_UpdatePanel02=panel))
+    elements[(rs.By.XPATH, S2_CONTAINER_XPATH)] = FakeElement()
+    driver = FakeDriver(elements=elements)
+    driver.postbacks = []
+
+    def postback(semester):
+        old = elements.get((rs.By.ID, rs.COURSE_TABLE_ID))
+        if old is not None:
+            old.stale = True
+        driver.postbacks.append(semester)
+        if semester in empty:
+            # No courses that semester: the panel holds no gvCourseList.
+            elements.pop((rs.By.ID, rs.COURSE_TABLE_ID), None)
+            elements.pop((rs.By.XPATH, TABLE_XPATH), None)
+            panel.html = "<span>No courses found.</span>"
+            return
+        table = TableElement()
+        elements[(rs.By.ID, rs.COURSE_TABLE_ID)] = table
+        elements[(rs.By.XPATH, TABLE_XPATH)] = table
+        panel.html = SAMPLE_DASHBOARD_HTML.replace("Operating Systems", f"OS {semester}")
+
+    driver.postback = postback
+
+    def execute_script(script, *args):
+        driver.scripts.append((script, args))
+        if script != rs.SEMESTER_POSTBACK_SCRIPT:
+            return None
+        label = next(opt.text for opt in dropdown.options if opt.get_attribute("value") == args[2])
+        marker = elements.get((rs.By.ID, rs.COURSE_TABLE_ID))
+        postback(label)
+        return {"marker": marker}
+
+    driver.execute_script = execute_script
+    for label in semesters:
+        elements[(rs.By.XPATH, _s2_option_xpath(label))] = PostbackOption(driver, label)
+    return driver
+
+
+def test_wanted_semesters_modes(caplog):
+    options = [{"value": "0", "text": "Select"}, {"value": "2", "text": "Fall 2026"},
+               {"value": "1", "text": "Summer 2026"}]
+    assert rs.wanted_semesters(options, "") == ["Fall 2026"]
+    assert rs.wanted_semesters(options, "all") == ["Fall 2026", "Summer 2026"]
+    assert rs.wanted_semesters(options, "Summer 2026, Spring 2020") == ["Summer 2026"]
+    assert "Spring 2020" in caplog.text
+
+
+def test_scrape_semesters_one_login_many_postbacks():
+    driver = _semester_history_driver(["Fall 2026", "Summer 2026", "Spring 2026"])
+    creds = {"id": 1, "username": "u", "password": "p", "section_label": "B1"}
+    urls = {"login_url": "https://login", "attendance_dashboard_url": "https://dash"}
+
+    results = rs.scrape_semesters_for_user(driver, creds, urls, "all")
+
+    assert driver.postbacks == ["Fall 2026", "Summer 2026", "Spring 2026"]
+    assert driver.gets.count("https://login") == 1
+    assert list(results) == ["Fall 2026", "Summer 2026", "Spring 2026"]
+    entry = results["Summer 2026"][0]
+    assert entry["Semester"] == "Summer 2026"
+    assert entry["CourseTitle"] == "OS Summer 2026"
+
+
+def test_scrape_semesters_direct_postback_never_clicks_select2():
+    driver = _semester_history_driver(["Fall 2026", "Summer 2026"])
+    creds = {"id": 1, "username": "u", "password": "p", "section_label": "B1"}
+    urls = {"login_url": "https://login", "attendance_dashboard_url": "https://dash"}
+
+    results = rs.scrape_semesters_for_user(driver, creds, urls, "all")
+
+    assert results["Summer 2026"][0]["CourseTitle"] == "OS Summer 2026"
+    assert driver.find_element(rs.By.XPATH, S2_CONTAINER_XPATH).clicked is False
+    assert not any(driver.find_element(rs.By.XPATH, _s2_option_xpath(label)).clicked
+                   for label in ("Fall 2026", "Summer 2026"))
+
+
+def test_capture_semesters_extends_the_session_budget_per_semester(monkeypatch):
+    monkeypatch.setattr(rs, "SEMESTER_BUDGET_S", 50)
+    driver = _semester_history_driver(["Fall 2026", "Summer 2026", "Spring 2026"])
+    creds = {"id": 1, "username": "u", "password": "p", "section_label": "B1"}
+    urls = {"login_url": "https://login", "attendance_dashboard_url": "https://dash"}
+    with rs.deadlines.phase("profile[1]", 100):
+        rs.capture_semesters(driver, creds, urls, "Fall 2026, Spring 2026")
+        assert 140 < rs.deadlines.remaining() <= 150
+
+
+def test_semester_history_runs_under_the_run_budget(monkeypatch):
+    seen = []
+    monkeypatch.setattr(rs, "_semester_history", lambda semesters: seen.append(rs.deadlines.current().name) or {})
+    assert rs.semester_history("all") == {}
+    assert seen == ["run"]
+
+
+def test_scrape_semesters_skips_an_empty_semester(caplog):
+    driver = _semester_history_driver(["Fall 2026", "Summer 2026", "Spring 2026"], empty={"Summer 2026"})
+    creds = {"id": 1, "username": "u", "password": "p", "section_label": "B1"}
+    urls = {"login_url": "https://login", "attendance_dashboard_url": "https://dash"}
+
+    results = rs.scrape_semesters_for_user(driver, creds, urls, "all")
+
+    assert driver.postbacks == ["Fall 2026", "Summer 2026", "Spring 2026"]
+    assert list(results) == ["Fall 2026", "Spring 2026"]
+    assert results["Spring 2026"][0]["CourseTitle"] == "OS Spring 2026"
+    assert "Skipping semester Summer 2026" in caplog.text
+
+
+def test_scrape_semesters_keeps_others_when_one_fails_to_parse(monkeypatch, caplog):
+    driver = _semester_history_driver(["Fall 2026", "Summer 2026"])
+    creds = {"id": 1, "username": "u", "password": "p", "section_label": "B1"}
+    urls = {"login_url": "https://login", "attendance_dashboard_url": "https://dash"}
+    parse = rs.parse_semester_capture
+
+    def _parse(capture):
+        if capture["semester"] == "Fall 2026":
+            raise ValueError("unexpected cell layout")
+        return parse(capture)
+
+    monkeypatch.setattr(rs, "parse_semester_capture", _parse)
+    results = rs.scrape_semesters_for_user(driver, creds, urls, "all")
+
+    assert list(results) == ["Summer 2026"]
+    assert "unexpected cell layout" in caplog.text
+
+
+def test_scrape_semesters_fails_when_no_semester_can_be_read():
+    driver = _semester_history_driver(["Fall 2026"], empty={"Fall 2026"})
+    creds = {"id": 1, "username": "u", "password": "p", "section_label": "B1"}
+    urls = {"login_url": "https://login", "attendance_dashboard_url": "https://dash"}
+    with pytest.raises(ValueError, match="No semester dashboard"):
+        rs.capture_semesters(driver, creds, urls, "all")
+
+
+def test_scrape_semesters_rejects_unknown_selection():
+    driver = _semester_history_driver(["Fall 2026"])
+    creds = {"id": 1, "username": "u", "password": "p", "section_label": "B1"}
+    urls = {"login_url": "https://login", "attendance_dashboard_url": "https://dash"}
+    with pytest.raises(ValueError):
+        rs.capture_semesters(driver, creds, urls, "Spring 1999")
+
+
+def _capturing_driver(semesters, error=None):
+    """_semester_history_driver() with a CDP-style postback response capture."""
+    driver = _semester_history_driver(semesters)
+    panel = driver.find_element(rs.By.ID, rs.UPDATE_PANEL_ID)
+    driver.armed = []
+
+    class Waiter:
+        def body(self, timeout_s):
+            if error is not None:
+                raise error
+            return portal.delta_response(rs.UPDATE_PANEL_ID, panel.html)
+
+    def expect_response(matches):
+        driver.armed.append(matches)
+        return Waiter()
+
+    driver.expect_response = expect_response
+    return driver
+
+
+def test_scrape_semesters_takes_tables_from_captured_postbacks():
+    driver = _capturing_driver(["Fall 2026", "Summer 2026"])
+    creds = {"id": 1, "username": "u", "password": "p", "section_label": "B1"}
+    urls = {"login_url": "https://login", "attendance_dashboard_url": "https://dash"}
+
+    results = rs.scrape_semesters_for_user(driver, creds, urls, "all")
+
+    assert results["Summer 2026"][0]["CourseTitle"] == "OS Summer 2026"
+    assert driver.armed == [partial_postback.is_delta_request] * 2
+    assert rs.DASHBOARD_EXTRACT_SCRIPT not in [script for script, _ in driver.scripts]
+
+
+@pytest.mark.parametrize("error", [partial_postback.DeltaError("redirected to /Security/Login.aspx"),
+                                   TimeoutException("no response")])
+def test_failed_capture_falls_back_to_the_dom(error):
+    driver = _capturing_driver(["Fall 2026"], error)
+    creds = {"id": 1, "username": "u", "password": "p", "section_label": "B1"}
+    urls = {"login_url": "https://login", "attendance_dashboard_url": "https://dash"}
+
+    capture = rs.capture_dashboard(driver, creds, urls)
+
+    assert rs.capture_entries(capture)[0]["CourseTitle"] == "OS Fall 2026"
+    assert rs.DASHBOARD_EXTRACT_SCRIPT in [script for script, _ in driver.scripts]
+
+
+def test_postback_capture_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(rs, "POSTBACK_CAPTURE", False)
+    driver = _capturing_driver(["Fall 2026"])
+    assert rs.select_semester(driver, "https://dash", "B1") == "Fall 2026"
+    assert driver.armed == []
+
+
+def test_semesters_from_argv():
+    assert rs.semesters_from_argv(["--semesters", "all"], default="") == "all"
+    assert rs.semesters_from_argv(["--profile"], default="") == ""
+
+
 # ----------------------------- extract_dashboard -----------------------------
 
 def test_extract_dashboard_returns_parsed_entries(tmp_path, monkeypatch):
@@ -244,6 +557,114 @@ def test_extract_dashboard_returns_parsed_entries(tmp_path, monkeypatch):
     assert (tmp_path / "dashboard_data_B1.json").exists()
 
 
+def _dashboard_driver(html=None):
+    elements = _by_id(ctl00_MainContainer_UpdatePanel02=FakeElement(html=html))
+    elements[(rs.By.XPATH, TABLE_XPATH)] = FakeElement()
+    return FakeDriver(elements=elements)
+
+
+def test_extract_dashboard_reads_rows_with_one_script(tmp_path, monkeypatch):
+    monkeypatch.setattr(rs, "TMP_OUTPUT_DIR", str(tmp_path))
+    # No panel HTML: the entries can only come from the script's rows.
+    driver = _dashboard_driver(html=None)
+    driver.script_result = {"rows": SAMPLE_DASHBOARD_ROWS, "options": None}
+    entries = rs.extract_dashboard(driver, "B1")
+    assert [e["CourseCode"] for e in entries] == ["CSE-3201"]
+    assert [script for script, _ in driver.scripts] == [rs.DASHBOARD_EXTRACT_SCRIPT]
+
+
+@pytest.mark.parametrize("result", [None, {"rows": "<table>"}, {"rows": [[1, 2]]}, RuntimeError("js")])
+def test_extract_dashboard_falls_back_to_html(tmp_path, monkeypatch, result):
+    monkeypatch.setattr(rs, "TMP_OUTPUT_DIR", str(tmp_path))
+    driver = _dashboard_driver(html=SAMPLE_DASHBOARD_HTML)
+    driver.script_result = result
+    assert [e["CourseCode"] for e in rs.extract_dashboard(driver, "B1")] == ["CSE-3201"]
+
+
+def test_structured_extraction_can_be_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(rs, "TMP_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(rs, "STRUCTURED_EXTRACTION", False)
+    driver = _dashboard_driver(html=SAMPLE_DASHBOARD_HTML)
+    driver.script_result = {"rows": [], "options": None}
+    assert len(rs.extract_dashboard(driver, "B1")) == 1
+    assert driver.scripts == []
+
+
+def test_sample_rows_build_the_same_entries_as_html():
+    # SAMPLE_DASHBOARD_ROWS (what the structured path hands over) must build
+    # exactly the entries the HTML path parses.
+    assert rs.table_rows_from_html(SAMPLE_DASHBOARD_HTML) == SAMPLE_DASHBOARD_ROWS
+    structured = {"section_label": "B1", "rows": SAMPLE_DASHBOARD_ROWS, "html": None}
+    legacy = {"section_label": "B1", "rows": None, "html": SAMPLE_DASHBOARD_HTML}
+    assert rs.capture_entries(structured) == rs.capture_entries(legacy)
+    assert rs.capture_entries(structured) == rs.parse_attendance_dashboard_data(SAMPLE_DASHBOARD_HTML, "B1")
+
+
+# Runs an in-page script under node against a minimal DOM (elements with
+# ids, text nodes, contains, querySelectorAll by tag, a SHOW_TEXT TreeWalker)
+# built from BeautifulSoup's tree of the same HTML.
+NODE_DOM_RUNNER = r"""
+const input = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+class Node {
+    constructor(data, parent) {
+        this.parent = parent;
+        if (data.tag === undefined) {
+            this.nodeValue = data.text;
+        } else {
+            this.tagName = data.tag.toUpperCase();
+            this.id = data.id;
+        }
+        this.children = (data.children || []).map((child) => new Node(child, this));
+    }
+    descendants() {
+        return this.children.flatMap((child) => [child, ...child.descendants()]);
+    }
+    contains(other) {
+        for (let node = other; node; node = node.parent) if (node === this) return true;
+        return false;
+    }
+    querySelectorAll(tag) {
+        return this.descendants().filter((node) => node.tagName === tag.toUpperCase());
+    }
+}
+const root = new Node(input.tree, null);
+globalThis.NodeFilter = {SHOW_TEXT: 4};
+globalThis.document = {
+    getElementById: (id) => root.descendants().find((node) => node.id === id) || null,
+    createTreeWalker(node, filter) {
+        const texts = node.descendants().filter((child) => child.nodeValue !== undefined);
+        let index = 0;
+        return {nextNode: () => texts[index++] || null};
+    },
+};
+process.stdout.write(JSON.stringify(new Function(input.script).apply(null, input.args)));
+"""
+
+
+def _dom_tree(node):
+    if isinstance(node, Tag):
+        return {"tag": node.name, "id": node.get("id"), "children": [
+            _dom_tree(child) for child in node.children if not isinstance(child, Comment)]}
+    return {"text": str(node)}
+
+
+def _run_in_page_script(script, html, *args):
+    tree = _dom_tree(BeautifulSoup(html, "html.parser"))
+    completed = subprocess.run(["node", "-e", NODE_DOM_RUNNER], check=True, capture_output=True, text=True,
+                               input=json.dumps({"script": script, "tree": tree, "args": list(args)}), timeout=30)
+    return json.loads(completed.stdout)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node to run the in-page script")
+def test_extract_script_rows_match_html_parse():
+    html = f'<div id="{rs.UPDATE_PANEL_ID}">{SAMPLE_DASHBOARD_HTML}</div>'
+    result = _run_in_page_script(rs.DASHBOARD_EXTRACT_SCRIPT, html,
+                                 rs.UPDATE_PANEL_ID, rs.COURSE_TABLE_ID, rs.SEMESTER_DROPDOWN_ID)
+    assert result == {"rows": rs.table_rows_from_html(html), "options": None}
+    assert _run_in_page_script(rs.DASHBOARD_EXTRACT_SCRIPT, SAMPLE_DASHBOARD_HTML,
+                               rs.UPDATE_PANEL_ID, rs.COURSE_TABLE_ID, rs.SEMESTER_DROPDOWN_ID) is None
+
+
 def test_extract_dashboard_no_html_returns_empty(monkeypatch):
     monkeypatch.setattr(rs, "TMP_OUTPUT_DIR", "/tmp/nonexistent_dir")
     panel = FakeElement(html=None)
@@ -300,3 +721,10 @@ SAMPLE_DASHBOARD_HTML = """
 </tr>
 </table>
 """
+SAMPLE_DASHBOARD_ROWS = [[
+    "1",
+    "Course Code :\nCSE-3201\nTitle : Operating Systems\nCredit : 3.00\nSection : B",
+    "Day :\nSun\nTime : 11:0 - 12:15\nRoom : 120\nTeacher : SS",
+    "Day :\nMon\nTime : 11:0 - 12:15\nRoom : 204\nTeacher : SS",
+    "Total Class : 5",
+]]